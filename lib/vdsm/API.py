@@ -33,15 +33,14 @@ from vdsm.network.errors import ConfigNetworkError
 
 from vdsm import utils
 from vdsm import constants
+from vdsm import gluster
 from vdsm import throttledlog
 from vdsm import jobs
-from vdsm import v2v
 from vdsm.clientIF import clientIF
 from vdsm.common import api
 from vdsm.common import commands
 from vdsm.common import exception
 from vdsm.common import hooks
-from vdsm.common import hostdev
 from vdsm.common import logutils
 from vdsm.common import response
 from vdsm.common import supervdsm
@@ -75,17 +74,26 @@ try:
 except ImportError:
     pass
 
-try:
-    import vdsm.gluster.fence as glusterFence
-except ImportError:
-    pass
-
 
 # default message for system shutdown, will be displayed in guest
 USER_SHUTDOWN_MESSAGE = 'System going down'
 
 
 throttledlog.throttle('getAllVmStats', 100)
+throttledlog.throttle('getAllVmStatsChanges', 100)
+
+
+# v2v and hostdev are used only by few verbs, so they are imported when the
+# first verb using them is called instead of during startup.
+
+def _v2v():
+    from vdsm import v2v
+    return v2v
+
+
+def _hostdev():
+    from vdsm.common import hostdev
+    return hostdev
 
 
 class APIBase(object):
@@ -1075,6 +1083,9 @@ class StorageDomain(APIBase):
     def getVolumes(self, storagepoolID, imageID=Image.BLANK_UUID):
         return self._irs.getVolumesList(self._UUID, storagepoolID, imageID)
 
+    def getVolumesMetadata(self):
+        return self._irs.getVolumesMetadata(self._UUID)
+
     def setDescription(self, description):
         return self._irs.setStorageDomainDescription(self._UUID, description)
 
@@ -1268,7 +1279,7 @@ class Global(APIBase):
             hostUuid = policy.get('glusterServerUuid')
             if skipFencingIfGlusterBricksUp \
                     or skipFencingIfGlusterQuorumNotMet:
-                if not glusterFence:
+                if not gluster.enabled():
                     self.log.error("Required vdsm-gluster package is "
                                    "missing on this host. Note that "
                                    "gluster related fencing will not be"
@@ -1276,6 +1287,7 @@ class Global(APIBase):
                                    "package in order to enforce gluster "
                                    "related fencing polices")
                     return True
+                import vdsm.gluster.fence as glusterFence
                 result, msg = glusterFence. \
                     can_fence_host(supervdsm.getProxy(), hostUuid,
                                    skipFencingIfGlusterBricksUp,
@@ -1397,6 +1409,22 @@ class Global(APIBase):
         return {'status': doneCode,
                 'statsList': logutils.Suppressed(statsList)}
 
+    @api.logged(on="api.host")
+    def getAllVmStatsChanges(self, generation=None):
+        """
+        Get statistics of all running VMs changed since generation.
+        """
+        hooks.before_get_all_vm_stats()
+        statsList = self._cif.getAllVmStats()
+        statsList = hooks.after_get_all_vm_stats(statsList)
+        changes = sampling.stats_changes.update(
+            statsList, generation, client=api.client_address())
+        throttledlog.info('getAllVmStatsChanges',
+                          "Current getAllVmStatsChanges: %s",
+                          logutils.AllVmStatsValue(changes['statsList']))
+        return {'status': doneCode,
+                'changes': logutils.Suppressed(changes)}
+
     @api.logged(on="api.host")
     def getAllVmIoTunePolicies(self):
         """
@@ -1408,18 +1436,18 @@ class Global(APIBase):
 
     @api.logged(on="api.host")
     def hostdevListByCaps(self, caps=None):
-        devices = hostdev.list_by_caps(caps)
+        devices = _hostdev().list_by_caps(caps)
         return {'status': doneCode, 'deviceList': devices}
 
     @api.logged(on="api.host")
     def hostdevChangeNumvfs(self, deviceName, numvfs):
         self._cif._netConfigDirty = True
-        hostdev.change_numvfs(deviceName, numvfs)
+        _hostdev().change_numvfs(deviceName, numvfs)
         return {'status': doneCode}
 
     @api.logged(on="api.host")
     def hostdevReattach(self, deviceName):
-        hostdev.reattach_detachable(deviceName)
+        _hostdev().reattach_detachable(deviceName)
         return {'status': doneCode}
 
     @api.logged(on="api.host")
@@ -1488,14 +1516,14 @@ class Global(APIBase):
             disk: dev, alias
             network: type, macAddr, bridge, dev
         """
-        return v2v.get_external_vms(uri, username, password, vm_names)
+        return _v2v().get_external_vms(uri, username, password, vm_names)
 
     @api.logged(on="api.host")
     def getExternalVMNames(self, uri, username, password):
         """
         Return names of VMs running on external hypervisor.
         """
-        return v2v.get_external_vm_names(uri, username, password)
+        return _v2v().get_external_vm_names(uri, username, password)
 
     @api.logged(on="api.host")
     def getExternalVmFromOva(self, ova_path):
@@ -1508,16 +1536,16 @@ class Global(APIBase):
             disk: type, capacity, alias, allocation
             network: dev, model, type, bridge
         """
-        return v2v.get_ova_info(ova_path)
+        return _v2v().get_ova_info(ova_path)
 
     @api.logged(on="api.host")
     def convertExternalVm(self, uri, username, password, vminfo, jobid):
-        return v2v.convert_external_vm(uri, username, password, vminfo, jobid,
-                                       self._irs)
+        return _v2v().convert_external_vm(uri, username, password, vminfo,
+                                          jobid, self._irs)
 
     @api.logged(on="api.host")
     def convertExternalVmFromOva(self, ova_path, vminfo, jobid):
-        return v2v.convert_ova(ova_path, vminfo, jobid, self._cif.irs)
+        return _v2v().convert_ova(ova_path, vminfo, jobid, self._cif.irs)
 
     @api.logged(on="api.host")
     def getJobs(self, job_type=None, job_ids=()):
@@ -1526,15 +1554,15 @@ class Global(APIBase):
 
     @api.logged(on="api.host")
     def getConvertedVm(self, jobid):
-        return v2v.get_converted_vm(jobid)
+        return _v2v().get_converted_vm(jobid)
 
     @api.logged(on="api.host")
     def deleteV2VJob(self, jobid):
-        return v2v.delete_job(jobid)
+        return _v2v().delete_job(jobid)
 
     @api.logged(on="api.host")
     def abortV2VJob(self, jobid):
-        return v2v.abort_job(jobid)
+        return _v2v().abort_job(jobid)
 
     @api.logged(on="api.host")
     def registerSecrets(self, secrets, clear=False):
@@ -1555,7 +1583,12 @@ class Global(APIBase):
 
         try:
             self._cif._netConfigDirty = True
-            supervdsm.getProxy().setupNetworks(networks, bondings, options)
+            try:
+                supervdsm.getProxy().setupNetworks(networks, bondings, options)
+            finally:
+                # The network configuration may have changed even if the
+                # verb failed.
+                caps.invalidate_network_caps()
             return {'status': doneCode}
         except ConfigNetworkError as e:
             self.log.error(e.message, exc_info=True)
@@ -25,6 +25,8 @@ import io
 import json
 import logging
 import os
+import threading
+
 import six
 
 from vdsm import utils
@@ -54,6 +56,17 @@ DEFAULT_VALUES = {'{}': {},
 _log_inconsistency = logging.getLogger("schema.inconsistency").debug
 
 
+def _invalid_type(error):
+    """
+    Return a validator raising error, compiled for types that cannot be
+    compiled. Like interpreting the schema, the error is raised only when
+    validating a value of this type.
+    """
+    def validate(value, identifier):
+        raise error
+    return validate
+
+
 class SchemaNotFound(Exception):
     pass
 
@@ -137,6 +150,10 @@ class Schema(object):
         self._strict_mode = strict_mode
         self._methods = {}
         self._types = {}
+        self._args_validators = {}
+        self._retval_validators = {}
+        self._type_validators = {}
+        self._compile_lock = threading.RLock()
         try:
             for schema_type in schema_types:
                 with io.open(schema_type.path(), 'rb') as f:
@@ -190,6 +207,18 @@ class Schema(object):
     def get_methods(self):
         return utils.picklecopy(self._methods)
 
+    def get_method_priority(self, rep):
+        method = self.get_method(rep)
+        return method.get('priority', 'normal')
+
+    def get_method_concurrency(self, rep):
+        method = self.get_method(rep)
+        return method.get('concurrency')
+
+    def get_method_max_queued(self, rep):
+        method = self.get_method(rep)
+        return method.get('max_queued')
+
     def get_method_description(self, rep):
         method = self.get_method(rep)
         return method.get('description', '')
@@ -204,12 +233,6 @@ class Schema(object):
     def get_types(self):
         return utils.picklecopy(self._types)
 
-    def _check_primitive_type(self, t, value, name):
-        condition = PRIMITIVE_TYPES.get(t)
-        if not condition(value):
-            self._report_inconsistency('Parameter %s is not %s type'
-                                       % (name, t))
-
     def _report_inconsistency(self, message):
         if self._strict_mode:
             raise JsonRpcInvalidParamsError(message)
@@ -218,164 +241,295 @@ class Schema(object):
 
     def verify_args(self, rep, args):
         try:
+            self._args_validator(rep)(args)
+        except JsonRpcInvalidParamsError:
+            raise
+        except Exception:
+            self._report_inconsistency('Unexpected issue with request type'
+                                       ' verification for %s' % rep.id)
+
+    def verify_retval(self, rep, ret):
+        try:
+            self._retval_validator(rep)(ret)
+        except JsonRpcInvalidParamsError:
+            raise
+        except Exception:
+            self._report_inconsistency('Unexpected issue with response type'
+                                       ' verification for %s' % rep.id)
+
+    # Validators are compiled from the schema when a method is verified for
+    # the first time, and reused for the next calls. Interpreting the schema
+    # on every call is too slow for big responses like getAllVmStats.
+    #
+    # SchemaInconsistencyFormatter reports the frames of the validators
+    # named _check_primitive_type, _verify_complex_type and
+    # _verify_object_type, using their t, t_type and arg locals. The schema
+    # type is bound as a default argument so it is always in the frame.
+
+    def _args_validator(self, rep):
+        try:
+            return self._args_validators[rep.id]
+        except KeyError:
+            with self._compile_lock:
+                validator = self._compile_args(rep)
+                self._args_validators[rep.id] = validator
+                return validator
+
+    def _retval_validator(self, rep):
+        try:
+            return self._retval_validators[rep.id]
+        except KeyError:
+            with self._compile_lock:
+                validator = self._compile_retval(rep)
+                self._retval_validators[rep.id] = validator
+                return validator
+
+    def _compile_args(self, rep):
+        identifier = rep.id
+        arg_names = frozenset(self.get_arg_names(rep))
+        params = [(param.get('name'),
+                   'defaultvalue' in param,
+                   self._type_validator(param))
+                  for param in self.get_args(rep)]
+        report = self._report_inconsistency
+
+        def validate(args):
             # check whether there are extra parameters
-            unknown_args = [key for key in args if key not in
-                            self.get_arg_names(rep)]
+            unknown_args = [key for key in args if key not in arg_names]
             if unknown_args:
-                self._report_inconsistency('Following parameters %s were not'
-                                           ' recognized' % (unknown_args))
+                report('Following parameters %s were not'
+                       ' recognized' % (unknown_args))
 
             # verify types of provided parameters
-            for param in self.get_args(rep):
-                name = param.get('name')
+            for name, optional, validate_type in params:
                 arg = args.get(name)
                 if arg is None:
                     # check if missing paramter was defined as optional
-                    if 'defaultvalue' not in param:
-                        self._report_inconsistency(
-                            'Required parameter %s is not '
-                            'provided when calling %s' % (name, rep.id))
+                    if not optional:
+                        report('Required parameter %s is not '
+                               'provided when calling %s' % (name, identifier))
                     continue
-                self._verify_type(param, arg, rep.id)
-        except JsonRpcInvalidParamsError:
-            raise
-        except Exception:
-            self._report_inconsistency('Unexpected issue with request type'
-                                       ' verification for %s' % rep.id)
+                validate_type(arg, identifier)
+
+        return validate
+
+    def _compile_retval(self, rep):
+        identifier = rep.id
+        ret_args = self.get_ret_param(rep)
+        if not ret_args:
+            return lambda ret: None
+
+        validate_type = self._type_validator(ret_args.get('type'))
+
+        def validate(ret):
+            if isinstance(ret, Suppressed):
+                ret = ret.value
+            validate_type(ret, identifier)
+
+        return validate
+
+    def _type_validator(self, param):
+        """
+        Return a function validating a value of param type. Types are
+        compiled once, and may refer to themselves.
+        """
+        with self._compile_lock:
+            key = id(param)
+            try:
+                return self._type_validators[key]
+            except KeyError:
+                pass
+
+            # Recursive types find this validator while being compiled.
+            def deferred(value, identifier):
+                return self._type_validators[key](value, identifier)
+
+            self._type_validators[key] = deferred
+            try:
+                validator = self._compile_type(param)
+            except Exception as e:
+                validator = _invalid_type(e)
+            self._type_validators[key] = validator
+            return validator
+
+    def _primitive_validator(self, t, name):
+        condition = PRIMITIVE_TYPES.get(t)
+        report = self._report_inconsistency
+
+        def _check_primitive_type(value, identifier, t=t):
+            if not condition(value):
+                report('Parameter %s is not %s type' % (name, t))
+
+        return _check_primitive_type
+
+    def _compile_type(self, param):
+        report = self._report_inconsistency
 
-    def _verify_type(self, param, value, identifier):
         # check whether a parameter is in a list
         if isinstance(param, list):
-            if not isinstance(value, list):
-                self._report_inconsistency('Parameter %s is not a list'
-                                           % (value))
-            for a in value:
-                self._verify_type(param[0], a, identifier)
-            return
+            validate_item = self._type_validator(param[0])
+
+            def validate_list(value, identifier):
+                if not isinstance(value, list):
+                    report('Parameter %s is not a list' % (value))
+                for a in value:
+                    validate_item(a, identifier)
+
+            return validate_list
+
         # check whether a parameter is defined as primitive type
         elif param in TYPE_KEYS:
-            self._check_primitive_type(param, value, param)
-            return
+            return self._primitive_validator(param, param)
 
         # get type and name
         name = param.get('name')
         t = param.get('type')
         if t == 'dict':
             # it seems that there is no other way to have it fixed
-            self._report_inconsistency(
-                'Unsupported type %s in %s please fix' % (t, identifier))
+            def validate_dict(value, identifier):
+                report('Unsupported type %s in %s please fix'
+                       % (t, identifier))
+
+            return validate_dict
 
         # check whether it is a primitive type
         elif t in TYPE_KEYS:
-            self._check_primitive_type(t, value, name)
+            return self._primitive_validator(t, name)
 
-        else:
-            # if type is a string call type verification method
-            if isinstance(t, six.string_types):
-                self._verify_complex_type(t, param, value, name, identifier)
+        # if type is a string compile type verification
+        elif isinstance(t, six.string_types):
+            return self._compile_complex_type(t, param, name)
 
-            # if type is in a list we need to get the type and call
-            # type verification method
-            elif isinstance(t, list):
+        # if type is in a list we need to get the type and compile
+        # type verification
+        elif isinstance(t, list):
+            validate_item = self._type_validator(t[0])
+
+            def validate_sequence(value, identifier):
                 if not isinstance(value, (list, tuple)):
-                    self._report_inconsistency('Parameter %s is not a sequence'
-                                               % (value))
+                    report('Parameter %s is not a sequence' % (value))
                 for a in value:
-                    self._verify_type(t[0], a, identifier)
-            else:
-                # call complex type verification
-                self._verify_complex_type(t.get('type'), t, value, name,
-                                          identifier)
+                    validate_item(a, identifier)
+
+            return validate_sequence
 
-    def _verify_complex_type(self, t_type, t, arg, name, identifier):
+        else:
+            # compile complex type verification
+            return self._compile_complex_type(t.get('type'), t, name)
+
+    def _compile_complex_type(self, t_type, t, name):
         """
-        This method verify whether argument value align with different
+        Compile verification whether argument value align with different
         types we support such as: alias, map, union, enum and object.
         """
+        report = self._report_inconsistency
+
         if t_type == 'alias':
             # if alias we need to check sourcetype
-            self._check_primitive_type(t.get('sourcetype'), arg, name)
+            return self._primitive_validator(t.get('sourcetype'), name)
+
         elif t_type == 'map':
             # if map we need to check key and value types
-            for key, value in six.iteritems(arg):
-                self._verify_type(t.get('key-type'), key, identifier)
-                self._verify_type(t.get('value-type'), value, identifier)
+            validate_key = self._type_validator(t.get('key-type'))
+            validate_value = self._type_validator(t.get('value-type'))
+
+            def _verify_complex_type(arg, identifier, t_type=t_type):
+                for key, value in six.iteritems(arg):
+                    validate_key(key, identifier)
+                    validate_value(value, identifier)
+
+            return _verify_complex_type
+
         elif t_type == 'union':
             # if union we need to check whether parameter matches on of the
             # values defined
+            values = []
             for value in t.get('values'):
-                props = value.get('properties')
-                prop_names = [prop.get('name') for prop in props]
-                if not [key for key in arg if key not in prop_names]:
-                    self._verify_complex_type(value.get('type'), value, arg,
-                                              name, identifier)
-                    return
-            self._report_inconsistency('Provided parameters %s do not match'
-                                       ' any of union %s values'
-                                       % (arg, t.get('name')))
+                try:
+                    prop_names = frozenset(
+                        prop.get('name') for prop in value.get('properties'))
+                except Exception as e:
+                    values.append((None, _invalid_type(e)))
+                    continue
+                try:
+                    validate_value = self._compile_complex_type(
+                        value.get('type'), value, name)
+                except Exception as e:
+                    validate_value = _invalid_type(e)
+                values.append((prop_names, validate_value))
+
+            def _verify_complex_type(arg, identifier, t_type=t_type):
+                for prop_names, validate_value in values:
+                    # If the properties of the value are invalid, the
+                    # validator raises the error.
+                    if (prop_names is None or
+                            not [key for key in arg if key not in prop_names]):
+                        validate_value(arg, identifier)
+                        return
+                report('Provided parameters %s do not match'
+                       ' any of union %s values' % (arg, t.get('name')))
+
+            return _verify_complex_type
+
         elif t_type == 'enum':
             # if enum we need to check whether provided parameter is in values
-            if arg not in t.get('values'):
-                self._report_inconsistency('Provided value "%s" not'
-                                           ' defined in %s enum for'
-                                           ' %s' % (arg,
-                                                    t.get('name'),
-                                                    identifier))
+            values = t.get('values')
+
+            def _verify_complex_type(arg, identifier, t_type=t_type):
+                if arg not in values:
+                    report('Provided value "%s" not defined in %s enum for'
+                           ' %s' % (arg, t.get('name'), identifier))
+
+            return _verify_complex_type
+
         else:
             # if custom time (object) we need to check whether all the
             # properties match values provided
-            self._verify_object_type(t, arg, identifier)
+            return self._compile_object_type(t)
 
-    def _verify_object_type(self, t, arg, identifier):
+    def _compile_object_type(self, t):
+        report = self._report_inconsistency
         props = t.get('properties')
-        prop_names = [prop.get('name') for prop in props]
-        # check if there are any extra prarameters
-        unknown_props = [key for key in arg
-                         if key not in prop_names]
-        if unknown_props:
-            if 'any_string' in prop_names:
-                return
-            self._report_inconsistency('Following parameters %s were not'
-                                       ' recognized' % (unknown_props))
-        # iterate over properties
-        for prop in props:
-            p_name = prop.get('name')
-            a = arg.get(p_name)
-
-            # check whether parameter is defined as optional and
-            # check default type
-            if 'defaultvalue' in prop:
-                value = prop.get('defaultvalue')
-                if value == 'needs updating':
-                    self._report_inconsistency(
-                        'No default value specified for %s parameter in'
-                        ' %s' % (p_name, identifier))
-                if value == 'no-default':
-                    continue
-                if a is None or a == value:
-                    continue
-            else:
-                if a is None:
-                    self._report_inconsistency(
-                        'Required property %s is not provided when calling'
-                        ' %s' % (p_name, identifier))
-                    continue
-            # call type verification
-            self._verify_type(prop, a, identifier)
-
-    def verify_retval(self, rep, ret):
-        try:
-            ret_args = self.get_ret_param(rep)
+        prop_names = frozenset(prop.get('name') for prop in props)
+        any_string = 'any_string' in prop_names
+        properties = [(prop.get('name'),
+                       'defaultvalue' in prop,
+                       prop.get('defaultvalue'),
+                       self._type_validator(prop))
+                      for prop in props]
+
+        def _verify_object_type(arg, identifier, t=t):
+            # check if there are any extra prarameters
+            unknown_props = [key for key in arg
+                             if key not in prop_names]
+            if unknown_props:
+                if any_string:
+                    return
+                report('Following parameters %s were not'
+                       ' recognized' % (unknown_props))
+            # iterate over properties
+            for p_name, optional, value, validate_prop in properties:
+                a = arg.get(p_name)
+
+                # check whether parameter is defined as optional and
+                # check default type
+                if optional:
+                    if value == 'needs updating':
+                        report('No default value specified for %s parameter'
+                               ' in %s' % (p_name, identifier))
+                    if value == 'no-default':
+                        continue
+                    if a is None or a == value:
+                        continue
+                else:
+                    if a is None:
+                        report('Required property %s is not provided when'
+                               ' calling %s' % (p_name, identifier))
+                        continue
+                # call type verification
+                validate_prop(a, identifier)
 
-            if ret_args:
-                if isinstance(ret, Suppressed):
-                    ret = ret.value
-                self._verify_type(ret_args.get('type'), ret, rep.id)
-        except JsonRpcInvalidParamsError:
-            raise
-        except Exception:
-            self._report_inconsistency('Unexpected issue with response type'
-                                       ' verification for %s' % rep.id)
+        return _verify_object_type
 
     def verify_event_params(self, sub_id, args):
         rep = EventRep(sub_id)
@@ -388,7 +542,7 @@ class Schema(object):
                     for key, value in six.iteritems(args):
                         if key == "notify_time":
                             continue
-                        self._verify_type(param, {key: value}, rep.id)
+                        self._type_validator(param)({key: value}, rep.id)
                     continue
                 arg = args.get(name)
                 if arg is None:
@@ -397,7 +551,7 @@ class Schema(object):
                             'Required parameter %s is not '
                             'provided when sending %s' % (name, rep.id))
                     continue
-                self._verify_type(param, arg, rep.id)
+                self._type_validator(param)(arg, rep.id)
         except JsonRpcInvalidParamsError:
             raise
         except Exception:
@@ -21,6 +21,7 @@
 from __future__ import absolute_import
 
 import errno
+import logging
 import os
 import os.path
 import socket
@@ -45,6 +46,7 @@ from vdsm.common.hostutils import host_in_shutdown
 import vdsm.common.time
 from vdsm.protocoldetector import MultiProtocolAcceptor
 from vdsm.momIF import MomClient
+from vdsm.profiling import startup
 from vdsm.virt import events
 from vdsm.virt import migration
 from vdsm.virt import recovery
@@ -55,7 +57,9 @@ from vdsm.virt.vmdevices.storage import DISK_TYPE
 from vdsm.virt.utils import isVdsmImage
 import libvirt
 from vdsm import alignmentScan
+from vdsm import gluster
 from vdsm import numa
+from vdsm import utils
 from vdsm.common import concurrent
 from vdsm.common import function
 from vdsm.common import libvirtconnection
@@ -65,12 +69,6 @@ from vdsm.virt import vm
 from vdsm.virt.qemuguestagent import QemuGuestAgentPoller
 from vdsm.virt.vm import DestroyedOnResumeError, Vm
 
-try:
-    import vdsm.gluster.api as gapi
-    _glusterEnabled = True
-except ImportError:
-    _glusterEnabled = False
-
 
 class clientIF(object):
     """
@@ -113,10 +111,7 @@ class clientIF(object):
         self._subscriptions = defaultdict(list)
         self._scheduler = scheduler
         self._unknown_vm_ids = set()
-        if _glusterEnabled:
-            self.gluster = gapi.GlusterApi()
-        else:
-            self.gluster = None
+        self._gluster = None
         try:
             self.vmContainer = {}
             self.lastRemoteAccess = 0
@@ -255,6 +250,17 @@ class clientIF(object):
                         except DestroyedOnResumeError:
                             pass
 
+    @property
+    def gluster(self):
+        """
+        The gluster API, or None if vdsm-gluster is not installed. Gluster
+        modules are imported on first use instead of during startup.
+        """
+        if self._gluster is None and gluster.enabled():
+            import vdsm.gluster.api as gapi
+            self._gluster = gapi.GlusterApi()
+        return self._gluster
+
     @classmethod
     def getInstance(cls, irs=None, log=None, scheduler=None):
         with cls._instanceLock:
@@ -555,10 +561,18 @@ class clientIF(object):
         return {'status': doneCode, 'alignment': aligning}
 
     def createVm(self, vmParams, vmRecover=False):
+        if vmRecover:
+            # Recovered VMs are created concurrently, and are not in the
+            # container yet, so we lock only when adding them.
+            vm = Vm(self, vmParams, vmRecover)
+            ret = vm.run()
+            if not response.is_error(ret):
+                with self.vmContainerLock:
+                    self.vmContainer[vm.id] = vm
+            return ret
         with self.vmContainerLock:
-            if not vmRecover:
-                if vmParams['vmId'] in self.vmContainer:
-                    return errCode['exist']
+            if vmParams['vmId'] in self.vmContainer:
+                return errCode['exist']
             vm = Vm(self, vmParams, vmRecover)
             ret = vm.run()
             if not response.is_error(ret):
@@ -605,7 +619,9 @@ class clientIF(object):
             recovery.all_domains(self)
 
             # recover stage 3: waiting for domains to go up
-            self._waitForDomainsUp()
+            with utils.stopwatch("recovery: waiting for domains",
+                                 level=logging.INFO, log=self.log):
+                self._waitForDomainsUp()
 
             self._recovery = False
 
@@ -615,10 +631,14 @@ class clientIF(object):
             # volumes manipulations
             self._waitForStoragePool()
 
-            self._preparePathsForRecoveredVMs()
+            with utils.stopwatch("recovery: preparing paths",
+                                 level=logging.INFO, log=self.log):
+                self._preparePathsForRecoveredVMs()
 
             self.log.info('recovery: completed in %is',
                           vdsm.common.time.monotonic_time() - start_time)
+            startup.event("recovery completed")
+            startup.write()
 
         except:
             self.log.exception("recovery: failed")
@@ -682,6 +702,12 @@ class clientIF(object):
             elif eventid == libvirt.VIR_DOMAIN_EVENT_ID_DEVICE_REMOVED:
                 device_alias, = args[:-1]
                 v.onDeviceRemoved(device_alias)
+            elif eventid == libvirt.VIR_DOMAIN_EVENT_ID_DEVICE_ADDED:
+                device_alias, = args[:-1]
+                v.onDeviceAdded(device_alias)
+            elif eventid == libvirt.VIR_DOMAIN_EVENT_ID_BLOCK_JOB:
+                path, job_type, status = args[:-1]
+                v.onBlockJobEvent(path, job_type, status)
             elif eventid == libvirt.VIR_DOMAIN_EVENT_ID_BLOCK_THRESHOLD:
                 dev, path, threshold, excess = args[:-1]
                 v.drive_monitor.on_block_threshold(
@@ -714,7 +740,9 @@ class clientIF(object):
     def _preparePathsForRecoveredVMs(self):
         vm_objects = list(self.vmContainer.values())
         num_vm_objects = len(vm_objects)
-        for idx, vm_obj in enumerate(vm_objects):
+
+        def prepare(args):
+            idx, vm_obj = args
             # Let's recover as much VMs as possible
             try:
                 # Do not prepare volumes when system goes down
@@ -728,6 +756,10 @@ class clientIF(object):
                     "recovery [%d/%d]: failed for vm %s",
                     idx + 1, num_vm_objects, vm_obj.id)
 
+        concurrent.tmap(
+            prepare, enumerate(vm_objects),
+            max_workers=config.getint('vars', 'recovery_workers'))
+
     def _prepare_network_drive(self, drive, res):
         """
         Fills drive object for network drives with network-specific data.
@@ -56,6 +56,17 @@ def logged(on=""):
     return method
 
 
+def client_address():
+    """
+    Return the address of the client of the current request as
+    "host:port", or None if called by an internal thread.
+    """
+    ctx = getattr(vars, "context", None)
+    if not ctx:
+        return None
+    return "%s:%s" % (ctx.client_host, ctx.client_port)
+
+
 def context_string(api_object):
     items = []
 
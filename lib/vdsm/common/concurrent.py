@@ -140,19 +140,41 @@ class Barrier(object):
 Result = namedtuple("Result", ["succeeded", "value"])
 
 
-def tmap(func, iterable):
+def tmap(func, iterable, max_workers=None):
+    """
+    Run func with every item of iterable in worker threads, and return a list
+    of Result tuples in the order of iterable.
+
+    If max_workers is None, start a thread per item. Otherwise use up to
+    max_workers threads, each running func with the next unprocessed item.
+
+    Raises ValueError if max_workers is less than one.
+    """
+    if max_workers is not None and max_workers < 1:
+        raise ValueError("Invalid max_workers %d (expecting max_workers >= 1)"
+                         % max_workers)
     args = list(iterable)
     results = [None] * len(args)
+    indexes = iter(range(len(args)))
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                i = next(indexes, None)
+            if i is None:
+                return
+            try:
+                results[i] = Result(True, func(args[i]))
+            except Exception as e:
+                results[i] = Result(False, e)
 
-    def worker(i, f, arg):
-        try:
-            results[i] = Result(True, f(arg))
-        except Exception as e:
-            results[i] = Result(False, e)
+    if max_workers is None:
+        max_workers = len(args)
 
     threads = []
-    for i, arg in enumerate(args):
-        t = thread(worker, args=(i, func, arg), name="tmap/%d" % i)
+    for i in range(min(max_workers, len(args))):
+        t = thread(worker, name="tmap/%d" % i)
         t.start()
         threads.append(t)
 
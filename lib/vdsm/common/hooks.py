@@ -22,6 +22,7 @@ from __future__ import print_function
 from __future__ import absolute_import
 from __future__ import division
 
+import errno
 import glob
 import hashlib
 import itertools
@@ -33,6 +34,7 @@ import os.path
 import pkgutil
 import sys
 import tempfile
+import types
 
 import six
 
@@ -48,15 +50,130 @@ _LAUNCH_FLAGS_PATH = os.path.join(
 )
 
 
-# dir path is relative to '/' for test purposes
-# otherwise path is relative to P_VDSM_HOOKS
-def _scriptsPerDir(dir):
+# Python hooks are modules with a run(data, env) function, running in the
+# vdsm process instead of forking a new process. run() returns the modified
+# data, and may raise to report an error.
+_PYTHON_HOOK_SUFFIX = '.pyhook'
+
+# Hook directories contents, keyed by directory path. Adding, removing or
+# renaming a script modifies the directory mtime, so we list a directory only
+# when it was modified.
+_hookDirs = {}
+
+# Loaded python hooks modules, keyed by module path.
+_pythonHooks = {}
+
+# Hook scripts info reported in the host capabilities, keyed by script path.
+_scriptsInfo = {}
+
+
+def _hookDirPath(dir):
+    # dir path is relative to '/' for test purposes
+    # otherwise path is relative to P_VDSM_HOOKS
     if (dir[0] == '/'):
-        path = dir
+        return dir
     else:
-        path = P_VDSM_HOOKS + dir
-    return [s for s in glob.glob(path + '/*')
-            if os.access(s, os.X_OK)]
+        return P_VDSM_HOOKS + dir
+
+
+def _listHookDir(path):
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
+        return ()
+    cached = _hookDirs.get(path)
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, tuple(sorted(glob.glob(path + '/*'))))
+        _hookDirs[path] = cached
+    return cached[1]
+
+
+def _isPythonHook(path):
+    return path.endswith(_PYTHON_HOOK_SUFFIX)
+
+
+def _scriptsPerDir(dir):
+    return [s for s in _listHookDir(_hookDirPath(dir))
+            if not _isPythonHook(s) and os.access(s, os.X_OK)]
+
+
+def _hooksPerDir(dir):
+    """
+    Return sorted list of scripts and python hooks in dir.
+    """
+    return [s for s in _listHookDir(_hookDirPath(dir))
+            if _isPythonHook(s) or os.access(s, os.X_OK)]
+
+
+def _loadPythonHook(path):
+    mtime = os.stat(path).st_mtime
+    cached = _pythonHooks.get(path)
+    if cached is None or cached[0] != mtime:
+        module = types.ModuleType(os.path.basename(path))
+        module.__file__ = path
+        with open(path) as f:
+            code = compile(f.read(), path, 'exec')
+        six.exec_(code, module.__dict__)
+        cached = (mtime, module)
+        _pythonHooks[path] = cached
+    return cached[1]
+
+
+def _runPythonHook(path, data, env):
+    """
+    Run python hook in path, returning rc, data, err like a hook script.
+    """
+    try:
+        module = _loadPythonHook(path)
+        return 0, module.run(data, env), ''
+    except Exception as e:
+        logging.exception('Error running python hook %s', path)
+        return 1, data, str(e)
+
+
+def _hookEnv(vmconf, params):
+    env = {}
+
+    # Update the environment using params and custom configuration
+    env_update = [six.iteritems(params),
+                  six.iteritems(vmconf.get('custom', {}))]
+
+    # Encode custom properties to UTF-8 and save them to env
+    # Pass str objects (byte-strings) without any conversion
+    for k, v in itertools.chain(*env_update):
+        try:
+            if isinstance(v, six.text_type):
+                env[k] = v.encode('utf-8')
+            else:
+                env[k] = v
+        except UnicodeDecodeError:
+            pass
+
+    if vmconf.get('vmId'):
+        env['vmId'] = vmconf.get('vmId')
+
+    return env
+
+
+def _writeHookData(data, data_filename, hookType):
+    with open(data_filename, 'w') as f:
+        if hookType == _DOMXML_HOOK:
+            f.write(data or '')
+        elif hookType == _JSON_HOOK:
+            f.write(json.dumps(data))
+
+
+def _runHookScript(script, data_filename, scriptenv, hookType):
+    rc, out, err = commands.execCmd([script], raw=True, env=scriptenv)
+
+    with open(data_filename) as f:
+        final_data = f.read()
+    if hookType == _JSON_HOOK:
+        final_data = json.loads(final_data)
+    return rc, final_data, err
+
 
 _DOMXML_HOOK = 1
 _JSON_HOOK = 2
@@ -67,39 +184,21 @@ def _runHooksDir(data, dir, vmconf={}, raiseError=True, errors=None, params={},
     if errors is None:
         errors = []
 
-    scripts = _scriptsPerDir(dir)
-    scripts.sort()
+    hooks = _hooksPerDir(dir)
 
-    if not scripts:
+    if not hooks:
         return data
 
-    data_fd, data_filename = tempfile.mkstemp()
-    try:
-        if hookType == _DOMXML_HOOK:
-            os.write(data_fd, data or '')
-        elif hookType == _JSON_HOOK:
-            os.write(data_fd, json.dumps(data))
-        os.close(data_fd)
+    hookenv = _hookEnv(vmconf, params)
 
+    # Python hooks do not need the environment and the data file, prepared
+    # only when running hook scripts.
+    data_filename = None
+    if not all(_isPythonHook(h) for h in hooks):
+        data_fd, data_filename = tempfile.mkstemp()
+        os.close(data_fd)
         scriptenv = os.environ.copy()
-
-        # Update the environment using params and custom configuration
-        env_update = [six.iteritems(params),
-                      six.iteritems(vmconf.get('custom', {}))]
-
-        # Encode custom properties to UTF-8 and save them to scriptenv
-        # Pass str objects (byte-strings) without any conversion
-        for k, v in itertools.chain(*env_update):
-            try:
-                if isinstance(v, six.text_type):
-                    scriptenv[k] = v.encode('utf-8')
-                else:
-                    scriptenv[k] = v
-            except UnicodeDecodeError:
-                pass
-
-        if vmconf.get('vmId'):
-            scriptenv['vmId'] = vmconf.get('vmId')
+        scriptenv.update(hookenv)
         ppath = scriptenv.get('PYTHONPATH', '')
         hook = pkgutil.get_loader('vdsm.hook').filename
         scriptenv['PYTHONPATH'] = ':'.join(ppath.split(':') + [hook])
@@ -108,10 +207,21 @@ def _runHooksDir(data, dir, vmconf={}, raiseError=True, errors=None, params={},
         elif hookType == _JSON_HOOK:
             scriptenv['_hook_json'] = data_filename
 
-        for s in scripts:
-            rc, out, err = commands.execCmd([s], raw=True,
-                                            env=scriptenv)
-            logging.info('%s: rc=%s err=%s', s, rc, err)
+    try:
+        # The data file is written only when data was modified by a python
+        # hook, scripts modify the data file in place.
+        stale = True
+        for h in hooks:
+            if _isPythonHook(h):
+                rc, data, err = _runPythonHook(h, data, hookenv)
+                stale = True
+            else:
+                if stale:
+                    _writeHookData(data, data_filename, hookType)
+                    stale = False
+                rc, data, err = _runHookScript(
+                    h, data_filename, scriptenv, hookType)
+            logging.info('%s: rc=%s err=%s', h, rc, err)
             if rc != 0:
                 errors.append(err)
 
@@ -122,15 +232,11 @@ def _runHooksDir(data, dir, vmconf={}, raiseError=True, errors=None, params={},
 
         if errors and raiseError:
             raise exception.HookError(err)
-
-        with open(data_filename) as f:
-            final_data = f.read()
     finally:
-        os.unlink(data_filename)
-    if hookType == _DOMXML_HOOK:
-        return final_data
-    elif hookType == _JSON_HOOK:
-        return json.loads(final_data)
+        if data_filename is not None:
+            os.unlink(data_filename)
+
+    return data
 
 
 def before_device_create(devicexml, vmconf={}, customProperties={}):
@@ -438,11 +544,20 @@ def after_hostdev_list_by_caps(devices):
 
 def _getScriptInfo(path):
     try:
-        with open(path) as f:
-            md5 = hashlib.md5(f.read()).hexdigest()
-    except EnvironmentError:
-        md5 = ''
-    return {'md5': md5}
+        st = os.stat(path)
+    except OSError:
+        return {'md5': ''}
+    key = (st.st_mtime, st.st_size)
+    cached = _scriptsInfo.get(path)
+    if cached is None or cached[0] != key:
+        try:
+            with open(path) as f:
+                md5 = hashlib.md5(f.read()).hexdigest()
+        except EnvironmentError:
+            return {'md5': ''}
+        cached = (key, md5)
+        _scriptsInfo[path] = cached
+    return {'md5': cached[1]}
 
 
 def load_vm_launch_flags_from_file(vm_id):
@@ -472,7 +587,7 @@ def remove_vm_launch_flags_file(vm_id):
 
 def _getHookInfo(dir):
     return dict((os.path.basename(script), _getScriptInfo(script))
-                for script in _scriptsPerDir(dir))
+                for script in _hooksPerDir(dir))
 
 
 def installed():
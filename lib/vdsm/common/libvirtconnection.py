@@ -186,6 +186,7 @@ def get(target=None, killOnFailure=True):
                            libvirt.VIR_DOMAIN_EVENT_ID_WATCHDOG,
                            libvirt.VIR_DOMAIN_EVENT_ID_JOB_COMPLETED,
                            libvirt.VIR_DOMAIN_EVENT_ID_DEVICE_REMOVED,
+                           libvirt.VIR_DOMAIN_EVENT_ID_DEVICE_ADDED,
                            libvirt.VIR_DOMAIN_EVENT_ID_BLOCK_THRESHOLD):
                     conn.domainEventRegisterAny(None,
                                                 ev,
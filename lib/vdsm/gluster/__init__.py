@@ -22,13 +22,27 @@ from __future__ import absolute_import
 from __future__ import division
 
 import os
+import pkgutil
 import tempfile
 
+from vdsm.common.cache import memoized
+
 MODULE_LIST = ('cli', 'hooks', 'services', 'tasks',
                'gfapi', 'storagedev', 'api', 'events',
                'thinstorage')
 
 
+@memoized
+def enabled():
+    """
+    Return True if vdsm-gluster is installed.
+
+    The gluster modules are not imported, so this can be used during startup
+    to decide if gluster should be loaded later when it is used.
+    """
+    return pkgutil.find_loader('vdsm.gluster.api') is not None
+
+
 def gluster_mgmt_api(func):
     func.gluster_mgmt_api = True
     return func
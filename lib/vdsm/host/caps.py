@@ -21,19 +21,25 @@
 from __future__ import absolute_import
 from __future__ import division
 
+import copy
 import os
 import logging
+import threading
+
+from contextlib import contextmanager
 
 import libvirt
 
 from vdsm.common import cache
+from vdsm.common import concurrent
 from vdsm.common import cpuarch
 from vdsm.common import dsaversion
 from vdsm.common import hooks
-from vdsm.common import hostdev
 from vdsm.common import supervdsm
+from vdsm.common.time import monotonic_time
 from vdsm.config import config
 from vdsm.host import rngsources
+from vdsm.network.netlink import monitor
 from vdsm.storage import constants as sc
 from vdsm.storage import exception as se
 from vdsm.storage import hba
@@ -72,7 +78,115 @@ def _getIscsiIniName():
     return ''
 
 
+class _NetworkCaps(object):
+    """
+    Cache network capabilities until links or addresses change, or until the
+    network configuration is changed by setupNetworks.
+
+    Changes are detected using a netlink monitor. Network capabilities are
+    cached only while the monitor is running.
+    """
+
+    _GROUPS = ('link', 'ipv4-ifaddr', 'ipv6-ifaddr')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._caps = None
+        self._generation = 0
+        self._monitoring = False
+        self._monitor = None
+        self._thread = None
+
+    def start(self):
+        self._monitor = monitor.Monitor(groups=self._GROUPS)
+        self._monitor.start()
+        with self._lock:
+            self._monitoring = True
+        self._thread = concurrent.thread(self._run, name="caps/network")
+        self._thread.start()
+
+    def stop(self):
+        if not self._monitor.is_stopped():
+            self._monitor.stop()
+        self._thread.join()
+
+    def get(self):
+        with self._lock:
+            if self._caps is not None:
+                return copy.deepcopy(self._caps)
+            generation = self._generation
+            monitoring = self._monitoring
+
+        net_caps = supervdsm.getProxy().network_caps()
+
+        with self._lock:
+            # Do not cache if network changed while we were collecting the
+            # capabilities.
+            if monitoring and generation == self._generation:
+                self._caps = copy.deepcopy(net_caps)
+
+        return net_caps
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._caps = None
+
+    def _run(self):
+        try:
+            for event in self._monitor:
+                logging.debug("Network changed, invalidating network caps "
+                              "(event=%s, name=%s)",
+                              event.get('event'), event.get('name'))
+                self.invalidate()
+        except Exception:
+            logging.exception("Network monitor failed, network caps will "
+                              "not be cached")
+        finally:
+            with self._lock:
+                self._monitoring = False
+            self.invalidate()
+
+
+_network_caps = _NetworkCaps()
+
+
+def start():
+    """
+    Start monitoring network changes, enabling the network caps cache.
+    """
+    _network_caps.start()
+
+
+def stop():
+    _network_caps.stop()
+
+
+def invalidate_network_caps():
+    """
+    Must be called after changing the network configuration.
+    """
+    _network_caps.invalidate()
+
+
+@contextmanager
+def _timed(timing, section):
+    start = monotonic_time()
+    try:
+        yield
+    finally:
+        timing[section] = monotonic_time() - start
+
+
+def _log_timing(timing, elapsed):
+    slowest = sorted(timing.items(), key=lambda item: item[1], reverse=True)
+    logging.debug("Collected capabilities in %.2f seconds (%s)", elapsed,
+                  ", ".join("%s=%.3f" % item for item in slowest))
+
+
 def get():
+    start = monotonic_time()
+    timing = {}
     caps = {}
     cpu_topology = numa.cpu_topology()
 
@@ -86,31 +200,36 @@ def get():
     caps['cpuThreads'] = str(cpu_topology.threads)
     caps['cpuSockets'] = str(cpu_topology.sockets)
     caps['onlineCpus'] = ','.join(cpu_topology.online_cpus)
-    caps['cpuSpeed'] = cpuinfo.frequency()
-    caps['cpuModel'] = cpuinfo.model()
-    caps['cpuFlags'] = ','.join(cpuinfo.flags() +
-                                machinetype.compatible_cpu_models())
+    with _timed(timing, 'cpu'):
+        caps['cpuSpeed'] = cpuinfo.frequency()
+        caps['cpuModel'] = cpuinfo.model()
+        caps['cpuFlags'] = ','.join(cpuinfo.flags() +
+                                    machinetype.compatible_cpu_models())
 
     caps.update(_getVersionInfo())
 
-    net_caps = supervdsm.getProxy().network_caps()
+    with _timed(timing, 'network'):
+        net_caps = _network_caps.get()
     caps.update(net_caps)
 
-    try:
-        caps['hooks'] = hooks.installed()
-    except:
-        logging.debug('not reporting hooks', exc_info=True)
+    with _timed(timing, 'hooks'):
+        try:
+            caps['hooks'] = hooks.installed()
+        except:
+            logging.debug('not reporting hooks', exc_info=True)
 
     caps['operatingSystem'] = osinfo.version()
     caps['uuid'] = host.uuid()
-    caps['packages2'] = osinfo.package_versions()
+    with _timed(timing, 'packages'):
+        caps['packages2'] = osinfo.package_versions()
     caps['realtimeKernel'] = osinfo.runtime_kernel_flags().realtime
     caps['kernelArgs'] = osinfo.kernel_args()
     caps['nestedVirtualization'] = osinfo.nested_virtualization().enabled
     caps['emulatedMachines'] = machinetype.emulated_machines(
         cpuarch.effective())
-    caps['ISCSIInitiatorName'] = _getIscsiIniName()
-    caps['HBAInventory'] = hba.HBAInventory()
+    with _timed(timing, 'storage'):
+        caps['ISCSIInitiatorName'] = _getIscsiIniName()
+        caps['HBAInventory'] = hba.HBAInventory()
     caps['vmTypes'] = ['kvm']
 
     caps['memSize'] = str(utils.readMemInfo()['MemTotal'] // 1024)
@@ -120,9 +239,10 @@ def get():
 
     caps['rngSources'] = rngsources.list_available()
 
-    caps['numaNodes'] = dict(numa.topology())
-    caps['numaNodeDistance'] = dict(numa.distances())
-    caps['autoNumaBalancing'] = numa.autonuma_status()
+    with _timed(timing, 'numa'):
+        caps['numaNodes'] = dict(numa.topology())
+        caps['numaNodeDistance'] = dict(numa.distances())
+        caps['autoNumaBalancing'] = numa.autonuma_status()
 
     caps['selinux'] = osinfo.selinux_status()
 
@@ -131,6 +251,7 @@ def get():
     caps['kdumpStatus'] = osinfo.kdump_status()
     caps["deferred_preallocation"] = True
 
+    from vdsm.common import hostdev
     caps['hostdevPassthrough'] = str(hostdev.is_supported()).lower()
     # TODO This needs to be removed after adding engine side support
     # and adding gdeploy support to enable libgfapi on RHHI by default
@@ -138,22 +259,33 @@ def get():
     if osinfo.glusterEnabled:
         from vdsm.gluster.api import glusterAdditionalFeatures
         caps['additionalFeatures'].extend(glusterAdditionalFeatures())
-    caps['hostedEngineDeployed'] = _isHostedEngineDeployed()
+    with _timed(timing, 'hostedEngine'):
+        caps['hostedEngineDeployed'] = _isHostedEngineDeployed()
     caps['hugepages'] = hugepages.supported()
     caps['kernelFeatures'] = osinfo.kernel_features()
-    caps['vncEncrypted'] = _isVncEncrypted()
+    with _timed(timing, 'vnc'):
+        caps['vncEncrypted'] = _isVncEncrypted()
     caps['backupEnabled'] = False
 
-    try:
-        caps["connector_info"] = managedvolume.connector_info()
-    except se.ManagedVolumeNotSupported as e:
-        logging.info("managedvolume not supported: %s", e)
-    except se.ManagedVolumeHelperFailed as e:
-        logging.exception("Error getting managedvolume connector info: %s", e)
+    with _timed(timing, 'managedVolume'):
+        try:
+            caps["connector_info"] = managedvolume.connector_info()
+        except se.ManagedVolumeNotSupported as e:
+            logging.info("managedvolume not supported: %s", e)
+        except se.ManagedVolumeHelperFailed as e:
+            logging.exception(
+                "Error getting managedvolume connector info: %s", e)
 
     # Which domain versions are supported by this host.
     caps["domain_versions"] = sc.DOMAIN_VERSIONS
 
+    elapsed = monotonic_time() - start
+    _log_timing(timing, elapsed)
+
+    timing['total'] = elapsed
+    caps['capsTiming'] = {section: round(seconds, 3)
+                          for section, seconds in timing.items()}
+
     return caps
 
 
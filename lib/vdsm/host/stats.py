@@ -22,6 +22,7 @@ from __future__ import absolute_import
 from __future__ import division
 
 import logging
+import sys
 
 import six
 
@@ -30,7 +31,6 @@ from vdsm.common import cache
 from vdsm.common import time
 from vdsm.config import config
 
-from vdsm import v2v
 from vdsm.network import api as net_api
 
 
@@ -105,7 +105,9 @@ def produce(first_sample, last_sample):
     stats['cpuStatistics'] = _get_cpu_core_stats(
         first_sample, last_sample)
 
-    stats['v2vJobs'] = v2v.get_jobs_status()
+    # v2v jobs are created only by the v2v verbs, importing v2v on first use.
+    v2v = sys.modules.get('vdsm.v2v')
+    stats['v2vJobs'] = v2v.get_jobs_status() if v2v else {}
     return stats
 
 
@@ -20,16 +20,20 @@
 
 from __future__ import absolute_import
 
+import copy
+import errno
 import itertools
 import glob
 import linecache
 import logging
 import os
+import threading
 
 from collections import namedtuple
 
 import six
 
+from vdsm import gluster
 from vdsm import utils
 from vdsm.common import cache
 from vdsm.common import cpuarch
@@ -48,18 +52,26 @@ try:
 except ImportError:
     pass
 
-try:
-    from vdsm.gluster.api import GLUSTER_RPM_PACKAGES
-    from vdsm.gluster.api import GLUSTER_DEB_PACKAGES
-    glusterEnabled = True
-except ImportError:
-    glusterEnabled = False
+glusterEnabled = gluster.enabled()
 
 
 KernelFlags = namedtuple('KernelFlags', 'version, realtime')
 NestedVirtualization = namedtuple('NestedVirtualization',
                                   'enabled, kvm_module')
 
+# Package database files, modified when packages are installed, upgraded or
+# removed.
+_PACKAGE_DB_FILES = (
+    '/var/lib/rpm/Packages',
+    '/var/lib/rpm/rpmdb.sqlite',
+    '/var/lib/rpm/rpmdb.sqlite-wal',
+    '/var/lib/dpkg/status',
+)
+
+# Key packages versions, cached until the package database is modified.
+_packages = None
+_packages_lock = threading.Lock()
+
 
 class OSName:
     UNKNOWN = 'unknown'
@@ -253,6 +265,30 @@ def selinux_status():
 
 
 def package_versions():
+    """
+    Return the versions of key packages. Querying the package database is
+    slow, so the versions are cached until the database is modified.
+    """
+    global _packages
+    mtime = _package_db_mtime()
+    with _packages_lock:
+        if mtime is None or _packages is None or _packages[0] != mtime:
+            _packages = (mtime, _package_versions())
+        return copy.deepcopy(_packages[1])
+
+
+def _package_db_mtime():
+    mtimes = []
+    for path in _PACKAGE_DB_FILES:
+        try:
+            mtimes.append(os.stat(path).st_mtime)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+    return max(mtimes) if mtimes else None
+
+
+def _package_versions():
     pkgs = {'kernel': runtime_kernel_flags().version}
 
     if _release_name() in (OSName.RHEVH, OSName.OVIRT, OSName.FEDORA,
@@ -271,6 +307,7 @@ def package_versions():
         }
 
         if glusterEnabled:
+            from vdsm.gluster.api import GLUSTER_RPM_PACKAGES
             KEY_PACKAGES.update(GLUSTER_RPM_PACKAGES)
 
         try:
@@ -304,6 +341,7 @@ def package_versions():
         }
 
         if glusterEnabled:
+            from vdsm.gluster.api import GLUSTER_DEB_PACKAGES
             KEY_PACKAGES.update(GLUSTER_DEB_PACKAGES)
 
         cache = apt.Cache()
@@ -0,0 +1,145 @@
+#
+# Copyright 2019 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+"""
+This module records the vdsm startup timeline.
+
+The timeline starts when the process was started. start() records the time
+spent until vdsm started running, mostly importing modules. Startup phases
+are recorded using phase(), and points in time, like the time vdsm started
+to serve clients, using event().
+
+write() logs the timeline and writes it as json to the startup report file,
+so it can be compared between vdsm versions and hosts.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+
+import io
+import json
+import logging
+import os
+import threading
+
+from contextlib import contextmanager
+
+from vdsm.common.time import monotonic_time
+from vdsm.config import config
+
+log = logging.getLogger("vds.startup")
+
+_lock = threading.Lock()
+
+# Serializes write(), called from both the main thread and the recovery
+# thread. Separate from _lock, since write() calls report().
+_write_lock = threading.Lock()
+
+# Monotonic time when the process was started.
+_start = None
+
+# Recorded phases and events, as dicts with "name", "start" and "duration"
+# keys. "start" is the time since the process was started.
+_timeline = []
+
+
+def start():
+    """
+    Start recording the timeline, recording the time since the process was
+    started as the "imports" phase.
+    """
+    global _start
+    now = monotonic_time()
+    with _lock:
+        _start = now - _process_uptime()
+        del _timeline[:]
+        _timeline.append(
+            {"name": "imports", "start": 0.0, "duration": now - _start})
+
+
+@contextmanager
+def phase(name):
+    """
+    Record the wall time of the code in the with block as phase name.
+    """
+    begin = monotonic_time()
+    try:
+        yield
+    finally:
+        _record(name, begin, monotonic_time() - begin)
+
+
+def event(name):
+    """
+    Record the current time as event name.
+    """
+    _record(name, monotonic_time(), 0.0)
+
+
+def report():
+    """
+    Return the timeline recorded so far.
+    """
+    with _lock:
+        return {"phases": [dict(item) for item in _timeline]}
+
+
+def write():
+    """
+    Log the timeline and write it to the startup report file.
+    """
+    with _write_lock:
+        timeline = report()
+        for item in timeline["phases"]:
+            log.info("%s: started at %.3f, took %.3f seconds",
+                     item["name"], item["start"], item["duration"])
+
+        path = config.get("devel", "startup_report_filename")
+        if not path:
+            return
+        tmp = path + ".tmp"
+        try:
+            with io.open(tmp, "wb") as f:
+                f.write(json.dumps(timeline, indent=4).encode("utf-8"))
+            os.rename(tmp, path)
+        except EnvironmentError:
+            log.exception("Error writing startup report %s", path)
+
+
+def _record(name, begin, duration):
+    with _lock:
+        if _start is None:
+            return
+        _timeline.append(
+            {"name": name, "start": begin - _start, "duration": duration})
+
+
+def _process_uptime():
+    """
+    Return the number of seconds since the process was started.
+    """
+    with io.open("/proc/self/stat", "rb") as f:
+        stat = f.read()
+    # Skip the command name, which may contain spaces. The start time is the
+    # 22nd field, 20 fields after the command name.
+    fields = stat.rsplit(b")", 1)[1].split()
+    started = int(fields[19]) / os.sysconf("SC_CLK_TCK")
+    with io.open("/proc/uptime", "rb") as f:
+        uptime = float(f.read().split()[0])
+    return max(0.0, uptime - started)
@@ -25,19 +25,13 @@ import types
 from yajsonrpc import exception
 
 from vdsm import API
+from vdsm import gluster
 from vdsm.api import vdsmapi
 from vdsm.config import config
+from vdsm.gluster import exception as ge
 from vdsm.network.netinfo.addresses import getDeviceByIP
 
 
-try:
-    import vdsm.gluster.apiwrapper as gapi
-    from vdsm.gluster import exception as ge
-    _glusterEnabled = True
-except ImportError:
-    _glusterEnabled = False
-
-
 class VdsmError(Exception):
     def __init__(self, code, message):
         self.code = code
@@ -61,11 +55,18 @@ class InvalidCall(Exception):
 
 class DynamicBridge(object):
     def __init__(self):
-        api_strict_mode = config.getboolean('devel', 'api_strict_mode')
-        self._schema = vdsmapi.Schema.vdsm_api(api_strict_mode,
-                                               with_gluster=_glusterEnabled)
+        self._api_strict_mode = config.getboolean('devel', 'api_strict_mode')
+        self._schema = vdsmapi.Schema.vdsm_api(self._api_strict_mode)
+
+        # Gluster verbs are used only on gluster hosts, so we load the
+        # gluster schema and modules when the first gluster verb is called.
+        self._gluster_schema = None
+        self._gluster_schema_lock = threading.Lock()
 
-        self._event_schema = vdsmapi.Schema.vdsm_events(api_strict_mode)
+        # Events are sent only after vdsm is ready, so we load the events
+        # schema when sending the first event, instead of during startup.
+        self._event_schema = None
+        self._event_schema_lock = threading.Lock()
 
         self._threadLocal = threading.local()
         self.log = logging.getLogger('DynamicBridge')
@@ -75,7 +76,25 @@ class DynamicBridge(object):
 
     @property
     def event_schema(self):
-        return self._event_schema
+        with self._event_schema_lock:
+            if self._event_schema is None:
+                self._event_schema = vdsmapi.Schema.vdsm_events(
+                    self._api_strict_mode)
+            return self._event_schema
+
+    @property
+    def gluster_schema(self):
+        with self._gluster_schema_lock:
+            if self._gluster_schema is None:
+                self._gluster_schema = vdsmapi.Schema(
+                    (vdsmapi.SchemaType.VDSM_API_GLUSTER,),
+                    self._api_strict_mode)
+            return self._gluster_schema
+
+    def _get_schema(self, class_name):
+        if _is_gluster(class_name):
+            return self.gluster_schema
+        return self._schema
 
     def unregister_server_address(self):
         self._threadLocal.server = None
@@ -105,11 +124,28 @@ class DynamicBridge(object):
     def dispatch(self, method):
         try:
             className, methodName = method.split('.', 1)
-            self._schema.get_method(vdsmapi.MethodRep(className, methodName))
+            self._get_schema(className).get_method(
+                vdsmapi.MethodRep(className, methodName))
         except (vdsmapi.MethodNotFound, ValueError):
             raise exception.JsonRpcMethodNotFoundError(method=method)
         return partial(self._dynamicMethod, className, methodName)
 
+    def scheduling_policy(self, method):
+        """
+        Return the priority, concurrency limit and queued requests limit of
+        method, declared in the schema. Used by the jsonrpc request
+        scheduler.
+        """
+        try:
+            className, methodName = method.split('.', 1)
+            rep = vdsmapi.MethodRep(className, methodName)
+            schema = self._get_schema(className)
+            return (schema.get_method_priority(rep),
+                    schema.get_method_concurrency(rep),
+                    schema.get_method_max_queued(rep))
+        except (vdsmapi.MethodNotFound, ValueError):
+            return 'normal', None, None
+
     def _convert_class_name(self, name):
         """
         The schema has a different name for the 'Global' namespace.  Until
@@ -134,16 +170,14 @@ class DynamicBridge(object):
         them from here.  For any given method, the method_args are obtained by
         chopping off the ctor_args from the beginning of argObj.
         """
-        allArgs = self._schema.get_arg_names(rep)
+        schema = self._get_schema(rep.object_name)
+        allArgs = schema.get_arg_names(rep)
 
         class_name = self._convert_class_name(rep.object_name)
-        if _glusterEnabled and class_name.startswith('Gluster'):
-            ctorArgs = getattr(gapi, class_name).ctorArgs
-        else:
-            ctorArgs = getattr(API, class_name).ctorArgs
+        ctorArgs = getattr(_api_module(class_name), class_name).ctorArgs
 
-        defaultArgs = self._schema.get_default_arg_names(rep)
-        defaultValues = self._schema.get_default_arg_values(rep)
+        defaultArgs = schema.get_default_arg_names(rep)
+        defaultValues = schema.get_default_arg_values(rep)
 
         # Determine the method arguments by subtraction
         methodArgs = []
@@ -155,11 +189,7 @@ class DynamicBridge(object):
 
     def _get_api_instance(self, className, argObj):
         className = self._convert_class_name(className)
-
-        if _glusterEnabled and className.startswith('Gluster'):
-            apiObj = getattr(gapi, className)
-        else:
-            apiObj = getattr(API, className)
+        apiObj = getattr(_api_module(className), className)
 
         ctorArgs = self._get_args(argObj, apiObj.ctorArgs, [], [])
         return apiObj(*ctorArgs)
@@ -174,9 +204,10 @@ class DynamicBridge(object):
 
     def _dynamicMethod(self, className, methodName, *args, **kwargs):
         rep = vdsmapi.MethodRep(className, methodName)
-        argobj = self._name_args(args, kwargs, self._schema.get_arg_names(rep))
+        schema = self._get_schema(className)
+        argobj = self._name_args(args, kwargs, schema.get_arg_names(rep))
 
-        self._schema.verify_args(rep, argobj)
+        schema.verify_args(rep, argobj)
         api = self._get_api_instance(className, argobj)
 
         methodArgs = self._get_method_args(rep, argobj)
@@ -189,13 +220,10 @@ class DynamicBridge(object):
         else:
             fn = getattr(api, methodName)
             try:
-                if _glusterEnabled:
-                    try:
-                        result = fn(*methodArgs)
-                    except ge.GlusterException as e:
-                        result = e.response()
-                else:
-                        result = fn(*methodArgs)
+                try:
+                    result = fn(*methodArgs)
+                except ge.GlusterException as e:
+                    result = e.response()
             except TypeError as e:
                 self.log.exception("TypeError raised by dispatched function")
                 raise InvalidCall(fn, methodArgs, e)
@@ -209,17 +237,31 @@ class DynamicBridge(object):
                 ret = retfield(self._threadLocal.server, result)
             else:
                 ret = retfield(result)
-        elif _glusterEnabled and className.startswith('Gluster'):
+        elif _is_gluster(className):
             ret = dict([(key, value) for key, value in result.items()
                         if key is not 'status'])
         else:
             ret = self._get_result(result, retfield)
 
-        self._schema.verify_retval(vdsmapi.MethodRep(className, methodName),
-                                   ret)
+        schema.verify_retval(rep, ret)
         return ret
 
 
+def _is_gluster(class_name):
+    return class_name.startswith('Gluster') and gluster.enabled()
+
+
+def _api_module(class_name):
+    """
+    Return the module implementing API class_name. Gluster modules are
+    imported when the first gluster verb is called.
+    """
+    if _is_gluster(class_name):
+        import vdsm.gluster.apiwrapper as gapi
+        return gapi
+    return API
+
+
 def Host_fenceNode_Ret(ret):
     """
     Only 'power' and 'operationStatus' should be part of return value if they
@@ -350,6 +392,7 @@ command_info = {
     'Host_getVMList': {'call': Host_getVMList_Call, 'ret': 'vmList'},
     'Host_getVMFullList': {'call': Host_getVMFullList_Call, 'ret': 'vmList'},
     'Host_getAllVmStats': {'ret': 'statsList'},
+    'Host_getAllVmStatsChanges': {'ret': 'changes'},
     'Host_getAllVmIoTunePolicies': {'ret': 'io_tune_policies_dict'},
     'Host_setupNetworks': {'ret': 'status'},
     'Host_setKsmTune': {'ret': 'status'},
@@ -373,6 +416,7 @@ command_info = {
     'StorageDomain_getInfo': {'ret': 'info'},
     'StorageDomain_getStats': {'ret': 'stats'},
     'StorageDomain_getVolumes': {'ret': 'uuidlist'},
+    'StorageDomain_getVolumesMetadata': {'ret': 'volumes'},
     'StorageDomain_resizePV': {'ret': 'size'},
     'StoragePool_connectStorageServer': {'ret': 'statuslist'},
     'StoragePool_disconnectStorageServer': {'ret': 'statuslist'},
@@ -20,9 +20,11 @@ import functools
 import logging
 
 from yajsonrpc import JsonRpcServer
+from yajsonrpc import RequestScheduler
 from yajsonrpc.stompserver import StompReactor
 
 from vdsm import executor
+from vdsm import metrics
 from vdsm.common import concurrent
 from vdsm.config import config
 
@@ -33,6 +35,15 @@ _THREADS = config.getint('rpc', 'worker_threads')
 _TASK_PER_WORKER = config.getint('rpc', 'tasks_per_worker')
 _TASKS = _THREADS * _TASK_PER_WORKER
 
+# Limit queued requests per method, so requests for a blocked method cannot
+# fill the queue and starve other methods. Methods may override the limit in
+# the schema, and high priority methods are not limited.
+_METHOD_TASKS = config.getint('rpc', 'method_queued_tasks') or None
+
+# Interval in seconds for dispatching queued requests that can run because
+# running requests timed out.
+_POLL_INTERVAL = 1.0
+
 
 class BindingJsonRpc(object):
     log = logging.getLogger('BindingJsonRpc')
@@ -42,11 +53,22 @@ class BindingJsonRpc(object):
                                            workers_count=_THREADS,
                                            max_tasks=_TASKS,
                                            scheduler=scheduler)
+        self._scheduler = scheduler
+        self._polling = False
+        self._poll_call = None
         self._bridge = bridge
+        request_scheduler = RequestScheduler(
+            max_running=_THREADS,
+            max_queued=_TASKS,
+            timeout=_TIMEOUT,
+            policy=bridge.scheduling_policy,
+            report=_send_metrics,
+            max_method_queued=_METHOD_TASKS)
         self._server = JsonRpcServer(
             bridge, timeout, cif,
             functools.partial(self._executor.dispatch,
-                              timeout=_TIMEOUT, discard=False))
+                              timeout=_TIMEOUT, discard=False),
+            scheduler=request_scheduler)
         self._reactor = StompReactor(subs)
         self.startReactor()
 
@@ -66,6 +88,8 @@ class BindingJsonRpc(object):
 
     def start(self):
         self._executor.start()
+        self._polling = True
+        self._schedule_poll()
 
         t = concurrent.thread(self._server.serve_requests,
                               name='JsonRpcServer')
@@ -78,6 +102,27 @@ class BindingJsonRpc(object):
         t.start()
 
     def stop(self):
+        self._polling = False
+        if self._poll_call:
+            self._poll_call.cancel()
         self._server.stop()
         self._reactor.stop()
         self._executor.stop()
+
+    def _schedule_poll(self):
+        self._poll_call = self._scheduler.schedule(
+            _POLL_INTERVAL, self._poll)
+
+    def _poll(self):
+        try:
+            self._server.dispatch_ready()
+        except Exception:
+            self.log.exception("Error dispatching queued requests")
+        finally:
+            if self._polling:
+                self._schedule_poll()
+
+
+def _send_metrics(stats):
+    metrics.send({"hosts.jsonrpc.scheduler." + k: v
+                  for k, v in stats.items()})
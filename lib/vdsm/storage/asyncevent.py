@@ -633,6 +633,58 @@ class BufferedReader(asyncore.file_dispatcher):
         return False
 
 
+class LineReader(asyncore.file_dispatcher):
+    """
+    Read lines from file, calling line_received for every complete line, and
+    complete when the file was closed.
+    """
+
+    def __init__(self, fd, line_received, complete, bufsize=4096, map=None):
+        asyncore.file_dispatcher.__init__(self, fd, map=map)
+        filecontrol.set_close_on_exec(self._fileno)
+        self._line_received = line_received
+        self._complete = complete
+        self._bufsize = bufsize
+        self._data = bytearray()
+
+    def handle_read(self):
+        chunk = self.socket.read(self._bufsize)
+        if not chunk:
+            self.handle_close()
+            return
+        self._data += chunk
+        while True:
+            end = self._data.find(b"\n")
+            if end == -1:
+                break
+            line = bytes(self._data[:end])
+            del self._data[:end + 1]
+            self._line_received(line)
+
+    def handle_close(self):
+        # Call complete exactly once.
+        if self._complete:
+            complete = self._complete
+            self._complete = None
+            complete()
+        self.close()
+
+    def handle_error(self):
+        log.exception("Unhandled error in %s", self)
+        self.handle_close()
+
+    def close(self):
+        if self.closing:
+            return
+        self.closing = True
+        # Never call complete if closed before completion.
+        self._complete = None
+        asyncore.file_dispatcher.close(self)
+
+    def writable(self):
+        return False
+
+
 class Reaper(object):
     """
     Wait for process and notify when it has terminated.
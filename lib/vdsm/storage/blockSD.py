@@ -106,6 +106,9 @@ MASTER_LV_SIZE_MB = 1024
 
 BlockSDVol = namedtuple("BlockSDVol", "name, image, parent")
 
+# {sdUUID: (lvm.LVIndex, {volUUID: sd.ImgsPar})}, see getAllVolumes().
+_allVolumes = {}
+
 log = logging.getLogger("storage.BlockSD")
 
 # Metadata LV reserved size:
@@ -204,27 +207,13 @@ def lvmTagDecode(s):
     return LVM_ENC_ESCAPE.sub(lambda c: unichr(int(c.groups()[0])), s)
 
 
-def _getVolsTree(sdUUID):
-    lvs = lvm.getLV(sdUUID)
-    vols = {}
-    for lv in lvs:
-        if sc.TEMP_VOL_LVTAG in lv.tags:
-            continue
-        image = ""
-        parent = ""
-        for tag in lv.tags:
-            if tag.startswith(sc.TAG_PREFIX_IMAGE):
-                image = tag[len(sc.TAG_PREFIX_IMAGE):]
-            elif tag.startswith(sc.TAG_PREFIX_PARENT):
-                parent = tag[len(sc.TAG_PREFIX_PARENT):]
-            if parent and image:
-                vols[lv.name] = BlockSDVol(lv.name, image, parent)
-                break
-        else:
-            if lv.name not in SPECIAL_LVS_V4:
-                log.warning("Ignoring Volume %s that lacks minimal tag set"
-                            "tags %s" % (lv.name, lv.tags))
-    return vols
+def _getVolsTree(index):
+    for lv in index.untagged:
+        if lv.name not in SPECIAL_LVS_V4:
+            log.warning("Ignoring Volume %s that lacks minimal tag set"
+                        "tags %s" % (lv.name, lv.tags))
+    return dict((volName, BlockSDVol(volName, image, parent))
+                for volName, (image, parent) in six.iteritems(index.volumes))
 
 
 def getAllVolumes(sdUUID):
@@ -235,8 +224,19 @@ def getAllVolumes(sdUUID):
     For template based volumes, the first image is the template's image.
     For other volumes, there is just a single imageUUID.
     Template self image is the 1st term in template volume entry images.
+
+    The result is computed once for every index of the domain LVs.
     """
-    vols = _getVolsTree(sdUUID)
+    index = lvm.getLvIndex(sdUUID)
+    cached = _allVolumes.get(sdUUID)
+    if cached is None or cached[0] is not index:
+        cached = (index, _buildAllVolumes(sdUUID, index))
+        _allVolumes[sdUUID] = cached
+    return dict(cached[1])
+
+
+def _buildAllVolumes(sdUUID, index):
+    vols = _getVolsTree(index)
     res = {}
     for volName in vols:
         res[volName] = {'imgs': [], 'parent': None}
@@ -876,8 +876,17 @@ class BlockStorageDomainManifest(sd.StorageDomainManifest):
         return free_slot
 
     def occupied_metadata_slots(self):
+        occupiedSlots = [slot for slot, _ in self._volumes_metadata_slots()]
+        occupiedSlots.sort()
+        return occupiedSlots
+
+    def _volumes_metadata_slots(self):
+        """
+        Return list of (slot, vol_id) tuples for all volumes with metadata
+        slot mapping.
+        """
         stripPrefix = lambda s, pfx: s[len(pfx):]
-        occupiedSlots = []
+        slots = []
         special_lvs = self.special_volumes(self.getVersion())
         for lv in lvm.getLV(self.sdUUID):
             if lv.name in special_lvs:
@@ -895,10 +904,38 @@ class BlockStorageDomainManifest(sd.StorageDomainManifest):
                               self.sdUUID, lv.name)
                 continue
 
-            occupiedSlots.append(offset)
+            slots.append((offset, lv.name))
 
-        occupiedSlots.sort()
-        return occupiedSlots
+        return slots
+
+    def get_volumes_metadata(self):
+        """
+        Return dict {vol_id: VolumeMetadata} of all volumes in the domain.
+
+        The metadata slots of all volumes are read using
+        read_metadata_blocks(), reading nearby slots using one I/O, instead
+        of reading every slot separately. Volumes with invalid metadata are
+        logged and skipped.
+        """
+        slots = self._volumes_metadata_slots()
+        if not slots:
+            return {}
+
+        self.log.debug("Reading metadata of %d volumes from %s",
+                       len(slots), self.sdUUID)
+        blocks = self.read_metadata_blocks([slot for slot, _ in slots])
+
+        volumes = {}
+        for slot, vol_id in slots:
+            block = blocks[slot]
+            try:
+                volumes[vol_id] = VolumeMetadata.from_lines(
+                    block.splitlines())
+            except (se.MetaDataGeneralError, ValueError) as e:
+                self.log.warning("Invalid metadata for volume %s/%s in slot "
+                                 "%s: %s", self.sdUUID, vol_id, slot, e)
+
+        return volumes
 
     def _first_available_slot(self):
         version = self.getVersion()
@@ -988,12 +1025,37 @@ class BlockStorageDomainManifest(sd.StorageDomainManifest):
         """
         Reads metadata block from storage.
         """
-        # Function readblock is used here intentionally as it supports
-        # short reads while DirectFile read doesn't.
         return misc.readblock(self.metadata_volume_path(),
                               self.metadata_offset(slot),
                               sc.METADATA_SIZE)
 
+    def read_metadata_blocks(self, slots):
+        """
+        Reads metadata blocks of slots from storage, reading nearby slots
+        using one I/O.
+
+        Returns dict mapping slot to metadata block.
+        """
+        if not slots:
+            return {}
+
+        path = self.metadata_volume_path()
+        offsets = [self.metadata_offset(slot) for slot in slots]
+        try:
+            blocks = directio.read_blocks(path, offsets, sc.METADATA_SIZE)
+        except EnvironmentError as e:
+            self.log.error("Error reading metadata slots %s from %s: %s",
+                           slots, path, e)
+            raise se.MiscBlockReadException(
+                path, min(offsets), sc.METADATA_SIZE)
+
+        for offset, block in zip(offsets, blocks):
+            if len(block) != sc.METADATA_SIZE:
+                raise se.MiscBlockReadIncomplete(
+                    path, offset, sc.METADATA_SIZE)
+
+        return dict(zip(slots, blocks))
+
     def write_metadata_block(self, slot, data):
         """
         Writes prepared metadata block to the specified
@@ -1712,25 +1774,23 @@ class BlockStorageDomain(sd.StorageDomain):
 
         path = self._manifest.metadata_volume_path()
 
-        # Map v4 and v5 areas, read metadata from v4 metadata area, format v5
+        # Map v5 area, read metadata from v4 metadata slots, format v5
         # metadata, and write it to v5 metadata area. Since v5 metadata area is
         # zeroed, we need to write only the metadata block.
-        # To avoid reading stale data from page cache, mics.readblock() is used
-        # instead of reading the block from mmap.
-        offset = METADATA_BASE_V4
-        size = METADATA_BASE_V5 - METADATA_BASE_V4
-        src = misc.readblock(path, offset, size)
+        # To avoid reading stale data from page cache, the occupied v4 slots
+        # are read using direct I/O instead of reading the blocks from mmap.
+        # Only the occupied slots are read, reading nearby slots using one
+        # I/O.
+        slots = self._manifest.occupied_metadata_slots()
+        src = self._manifest.read_metadata_blocks(slots)
 
         with open(path, "rb+") as f:
             dst = mmap.mmap(f.fileno(), RESERVED_METADATA_SIZE)
             with closing(dst):
-                for slot in self._manifest.occupied_metadata_slots():
-                    v4_off = self._manifest.metadata_offset(slot)
-
+                for slot in slots:
                     self.log.debug("Reading v4 metadata slot %s offset=%s",
-                                   slot, v4_off)
-                    v4_data = src[v4_off:v4_off + sc.METADATA_SIZE]
-                    v4_data = v4_data.rstrip(b"\0")
+                                   slot, self._manifest.metadata_offset(slot))
+                    v4_data = src[slot].rstrip(b"\0")
                     md = VolumeMetadata.from_lines(v4_data.splitlines())
 
                     v5_off = self._manifest.metadata_offset(slot, version=5)
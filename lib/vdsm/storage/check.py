@@ -27,11 +27,19 @@ CheckService     entry point for starting and stopping path checkers.
 DirectioChecker  checker using dd process for file or block based
                  volumes.
 
+HelperChecker    checker using a shared check-helper process for file or
+                 block based volumes.
+
+CheckHelper      long lived process performing the reads for all helper
+                 checkers.
+
 CheckResult      result object provided to user callback on each check.
 """
 
 from __future__ import absolute_import
 
+import itertools
+import json
 import logging
 import re
 import threading
@@ -46,6 +54,10 @@ from vdsm.storage import exception
 
 EXEC_ERROR = 127
 
+# Checker backends
+DD = "dd"
+HELPER = "helper"
+
 _log = logging.getLogger("storage.check")
 
 
@@ -75,14 +87,22 @@ class CheckService(object):
 
         service.stop()
 
+    The backend argument selects the checker used for checking paths. DD
+    runs a dd process for every check, HELPER sends all checks to a single
+    long lived check-helper process.
     """
 
-    def __init__(self):
+    def __init__(self, backend=DD):
+        if backend not in (DD, HELPER):
+            raise ValueError("Invalid checker backend %r" % backend)
         self._lock = threading.Lock()
         self._loop = asyncevent.EventLoop()
         self._thread = concurrent.thread(self._loop.run_forever,
                                          name="check/loop")
         self._checkers = {}
+        self._helper = None
+        if backend == HELPER:
+            self._helper = CheckHelper(self._loop)
 
     def start(self):
         """
@@ -106,6 +126,8 @@ class CheckService(object):
             for checker in self._checkers.values():
                 self._loop.call_soon_threadsafe(checker.stop)
             self._checkers.clear()
+            if self._helper:
+                self._loop.call_soon_threadsafe(self._helper.close)
             self._loop.call_soon_threadsafe(self._loop.stop)
             self._thread.join()
             self._loop.close()
@@ -122,8 +144,12 @@ class CheckService(object):
         with self._lock:
             if path in self._checkers:
                 raise RuntimeError("Already checking path %r" % path)
-            checker = DirectioChecker(self._loop, path, complete,
-                                      interval=interval)
+            if self._helper:
+                checker = HelperChecker(self._loop, path, complete,
+                                        self._helper, interval=interval)
+            else:
+                checker = DirectioChecker(self._loop, path, complete,
+                                          interval=interval)
             self._checkers[path] = checker
         self._loop.call_soon_threadsafe(checker.start)
 
@@ -357,13 +383,16 @@ class DirectioChecker(object):
         elapsed = self._loop.time() - self._check_time
         _log.debug("FINISH check %r (rc=%s, elapsed=%.02f)",
                    self._path, rc, elapsed)
-        result = CheckResult(self._path, rc, self._err, self._check_time,
-                             elapsed)
+        result = self._result(rc, elapsed)
         try:
             self._complete(result)
         except Exception:
             _log.exception("Unhandled error in complete callback")
 
+    def _result(self, rc, elapsed):
+        return CheckResult(self._path, rc, self._err, self._check_time,
+                           elapsed)
+
     def __repr__(self):
         info = [self.__class__.__name__,
                 self._path,
@@ -373,22 +402,181 @@ class DirectioChecker(object):
         return "<%s at 0x%x>" % (" ".join(info), id(self))
 
 
+class HelperChecker(DirectioChecker):
+    """
+    Check path availability using direct I/O in a shared check-helper
+    process.
+
+    Behaves exactly like DirectioChecker, but instead of starting a new dd
+    process for every check, submits the check to a CheckHelper shared by all
+    checkers. While a check is running, self._proc is the id of the helper
+    request.
+    """
+
+    def __init__(self, loop, path, complete, helper, interval=10.0):
+        super(HelperChecker, self).__init__(loop, path, complete,
+                                            interval=interval)
+        self._helper = helper
+        self._seconds = None
+
+    def _start_process(self):
+        self._seconds = None
+        self._proc = self._helper.submit(self._path, self._read_completed)
+
+    def _read_completed(self, rc, err, seconds):
+        """
+        Called when the helper completed the read.
+        """
+        assert self._state is not IDLE
+        self._err = err
+        self._seconds = seconds
+        self._check_completed(rc)
+
+    def _result(self, rc, elapsed):
+        return CheckResult(self._path, rc, self._err, self._check_time,
+                           elapsed, seconds=self._seconds)
+
+
+class CheckHelper(object):
+    """
+    Long lived check-helper process, reading the first block of paths using
+    direct I/O on behalf of all helper checkers.
+
+    The helper reads every path in a separate thread, so a read blocked on
+    inaccessible storage does not delay checking other paths. Blocked reads
+    are detected by the checkers, exactly like blocked dd processes.
+
+    If the helper process terminates, pending requests fail and a new helper
+    is started on the next request.
+
+    CheckHelper is not thread safe and must be used only from the event loop
+    thread.
+    """
+
+    log = logging.getLogger("storage.checkhelper")
+
+    def __init__(self, loop, cmd=None):
+        self._loop = loop
+        self._cmd = cmd or [constants.EXT_CHECK_HELPER]
+        self._ids = itertools.count(1)
+        self._proc = None
+        self._reader = None
+        self._pending = {}
+
+    def submit(self, path, complete):
+        """
+        Submit a read request for path. When the read completes, complete
+        will be called with rc, err, and the read delay in seconds.
+
+        Returns the request id.
+
+        Raises if the helper could not be started, or the request could not
+        be sent to the helper.
+        """
+        if self._proc is None:
+            self._start_process()
+        req_id = next(self._ids)
+        line = json.dumps({"id": req_id, "path": path}) + "\n"
+        try:
+            self._proc.stdin.write(line.encode("utf-8"))
+            self._proc.stdin.flush()
+        except EnvironmentError:
+            self._terminated("Error writing to helper")
+            raise
+        self._pending[req_id] = complete
+        return req_id
+
+    def close(self):
+        """
+        Terminate the helper process. Pending requests are dropped.
+        """
+        if self._proc is None:
+            return
+        self._pending.clear()
+        self._kill()
+
+    def _start_process(self):
+        cmd = cmdutils.wrap_command(self._cmd)
+        self._proc = subprocess.Popen(
+            cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=None)
+        self.log.info("Started check helper pid=%s", self._proc.pid)
+        self._reader = self._loop.create_dispatcher(
+            asyncevent.LineReader, self._proc.stdout, self._line_received,
+            self._read_completed)
+
+    def _line_received(self, line):
+        try:
+            response = json.loads(line.decode("utf-8"))
+            req_id = response["id"]
+            rc = response["rc"]
+            err = response["err"]
+            seconds = response["delay"]
+        except (ValueError, KeyError) as e:
+            self.log.error("Invalid response from helper %r: %s", line, e)
+            return
+        complete = self._pending.pop(req_id, None)
+        if complete is None:
+            return
+        try:
+            complete(rc, err, seconds)
+        except Exception:
+            self.log.exception("Unhandled error in complete callback")
+
+    def _read_completed(self):
+        """
+        Called when the helper closed stdout.
+        """
+        self._reader = None
+        self._terminated("Helper terminated")
+
+    def _terminated(self, reason):
+        self.log.warning("Check helper pid=%s failed: %s",
+                         self._proc.pid, reason)
+        pending = self._pending
+        self._pending = {}
+        self._kill()
+        for complete in pending.values():
+            try:
+                complete(EXEC_ERROR, reason, None)
+            except Exception:
+                self.log.exception("Unhandled error in complete callback")
+
+    def _kill(self):
+        if self._reader:
+            self._reader.close()
+            self._reader = None
+        try:
+            self._proc.stdin.close()
+        except EnvironmentError:
+            pass  # Unflushed request to a terminated helper.
+        self._proc.kill()
+        # A helper blocked on inaccessible storage may not terminate
+        # immediately; wait for it without blocking the event loop.
+        asyncevent.Reaper(self._loop, self._proc, lambda rc: None)
+        self._proc = None
+
+
 class CheckResult(object):
 
     _PATTERN = re.compile(br".*, ([\de\-.]+) s,[^,]+")
 
-    def __init__(self, path, rc, err, time, elapsed):
+    def __init__(self, path, rc, err, time, elapsed, seconds=None):
         self.path = path
         self.rc = rc
         self.err = err
         self.time = time
         self.elapsed = elapsed
+        # Read delay reported by the check helper. If not set, the delay is
+        # parsed from dd output in err.
+        self.seconds = seconds
 
     def delay(self):
         # TODO: Raising MiscFileReadException for all errors to keep the old
         # behavior. Should probably use StorageDomainAccessError.
         if self.rc != 0:
             raise exception.MiscFileReadException(self.path, self.rc, self.err)
+        if self.seconds is not None:
+            return float(self.seconds)
         if not self.err:
             raise exception.MiscFileReadException(self.path, "no stats")
         stats = self.err.splitlines()[-1]
@@ -23,6 +23,7 @@ import ctypes
 import io
 import logging
 import os
+import threading
 
 from contextlib import closing
 from contextlib import contextmanager
@@ -35,11 +36,119 @@ CharPointer = ctypes.POINTER(ctypes.c_char)
 _PC_REC_XFER_ALIGN = 17
 _PC_REC_MIN_XFER_SIZE = 16
 
+# Largest I/O issued by DirectFile.pread(). Also the largest aligned buffer
+# cached per thread; larger buffers are allocated for every I/O.
+MAX_IO_SIZE = 1024**2
+
+# Blocks read by read_blocks() are merged into one I/O if the gap between
+# them is smaller than this.
+MAX_MERGE_GAP = 128 * 1024
+
+BLOCK_SIZE = 512
+
+_local = threading.local()
+
 
 def open(path, mode="r"):
     return DirectFile(path, mode)
 
 
+def pread(path, offset, size):
+    """
+    Read size bytes at offset from path using direct I/O.
+
+    offset and size must be aligned to BLOCK_SIZE. Less than size bytes are
+    returned only if the end of the file was reached.
+    """
+    with open(path) as f:
+        return f.pread(offset, size)
+
+
+def read_blocks(path, offsets, size):
+    """
+    Read blocks of size bytes at offsets from path using direct I/O.
+
+    Nearby blocks are read using one I/O, so reading all metadata slots of a
+    volume costs only few reads. Returns a list of blocks in the order of
+    offsets. A block is shorter than size if it crosses the end of the file,
+    and empty if it starts after it.
+    """
+    if size % BLOCK_SIZE:
+        raise ValueError("You can only read in 512 multiplies")
+    for offset in offsets:
+        if offset % BLOCK_SIZE:
+            raise ValueError("Offset %d is not aligned to 512" % offset)
+
+    blocks = {}
+
+    with open(path) as f:
+        for start, end in _merge_ranges(offsets, size):
+            data = f.pread(start, end - start)
+            for offset in range(start, end, size):
+                pos = offset - start
+                blocks[offset] = data[pos:pos + size]
+
+    return [blocks[offset] for offset in offsets]
+
+
+def _merge_ranges(offsets, size):
+    """
+    Yield (start, end) ranges covering blocks of size bytes at offsets,
+    merging blocks separated by less than MAX_MERGE_GAP bytes. Blocks within a
+    range are spaced by size bytes, so the gaps are read too.
+    """
+    start = end = None
+    for offset in sorted(set(offsets)):
+        if start is not None and offset - end < MAX_MERGE_GAP and \
+                (offset - start) % size == 0:
+            end = offset + size
+            continue
+        if start is not None:
+            yield start, end
+        start = offset
+        end = offset + size
+    if start is not None:
+        yield start, end
+
+
+class _AlignedBuffer(object):
+    """
+    Aligned memory buffer, reused by DirectFile I/O in the same thread.
+    """
+
+    def __init__(self, size, alignment):
+        self.size = size
+        self.alignment = alignment
+        self.busy = False
+        self.pointer = ctypes.c_char_p(0)
+        rc = libc.posix_memalign(ctypes.pointer(self.pointer), alignment,
+                                 size)
+        if rc:
+            raise OSError(rc, "Could not allocate aligned buffer")
+
+    def __del__(self):
+        if self.pointer:
+            libc.free(self.pointer)
+            self.pointer = None
+
+
+def _cached_buffer(size, alignment):
+    """
+    Return the thread buffer, reallocating it if it is too small or not
+    aligned enough, or None if the thread buffer is being used.
+    """
+    buf = getattr(_local, "buffer", None)
+    if buf is not None and buf.busy:
+        return None
+    if buf is None or buf.size < size or buf.alignment < alignment:
+        if buf is not None:
+            size = max(size, buf.size)
+        # Free the previous buffer before allocating a new one.
+        buf = _local.buffer = None
+        buf = _local.buffer = _AlignedBuffer(size, alignment)
+    return buf
+
+
 class DirectFile(object):
 
     def __init__(self, path, mode):
@@ -102,10 +211,6 @@ class DirectFile(object):
 
     @contextmanager
     def _createAlignedBuffer(self, size):
-        pbuff = ctypes.c_char_p(0)
-        ppbuff = ctypes.pointer(pbuff)
-        # Because we usually have fixed sizes for our reads, caching
-        # buffers might give a slight performance boost.
         alignment = libc.fpathconf(self.fileno(), _PC_REC_XFER_ALIGN)
         minXferSize = libc.fpathconf(self.fileno(), _PC_REC_MIN_XFER_SIZE)
         chunks, remainder = divmod(size, minXferSize)
@@ -114,14 +219,20 @@ class DirectFile(object):
 
         size = chunks * minXferSize
 
-        rc = libc.posix_memalign(ppbuff, alignment, size)
-        if rc:
-            raise OSError(rc, "Could not allocate aligned buffer")
+        # We usually have fixed sizes for our I/O, so we reuse the thread
+        # buffer instead of allocating a new buffer for every I/O.
+        buf = None
+        if size <= MAX_IO_SIZE:
+            buf = _cached_buffer(size, alignment)
+        if buf is None:
+            buf = _AlignedBuffer(size, alignment)
+
+        buf.busy = True
         try:
-            ctypes.memset(pbuff, 0, size)
-            yield pbuff
+            ctypes.memset(buf.pointer, 0, size)
+            yield buf.pointer
         finally:
-            libc.free(pbuff)
+            buf.busy = False
 
     def read(self, n=-1):
         if (n < 0):
@@ -140,6 +251,27 @@ class DirectFile(object):
             ptr = CharPointer.from_buffer(pbuff)
             return ptr[:numRead]
 
+    def pread(self, offset, size):
+        """
+        Read size bytes at offset, using I/O of up to MAX_IO_SIZE bytes.
+        Less than size bytes are returned only if the end of the file was
+        reached.
+        """
+        if offset % BLOCK_SIZE:
+            raise ValueError("Offset %d is not aligned to 512" % offset)
+        self.seek(offset)
+        res = io.BytesIO()
+        with closing(res):
+            left = size
+            while left > 0:
+                count = min(left, MAX_IO_SIZE)
+                buff = self.read(count)
+                res.write(buff)
+                if len(buff) < count:
+                    break
+                left -= count
+            return res.getvalue()
+
     def readall(self):
         buffsize = 1024
         res = io.BytesIO()
@@ -151,12 +283,19 @@ class DirectFile(object):
                     return res.getvalue()
 
     def write(self, data):
+        """
+        Write data, a bytes or bytearray object. Writing bytearray allows
+        reusing the same buffer for multiple writes.
+        """
         length = len(data)
         if length % 512:
             raise ValueError("You can only write in 512 multiplies")
-        pdata = ctypes.c_char_p(data)
+        if isinstance(data, bytearray):
+            pdata = (ctypes.c_char * length).from_buffer(data)
+        else:
+            pdata = ctypes.c_char_p(data)
         with self._createAlignedBuffer(length) as pbuff:
-            ctypes.memmove(pbuff, pdata, len(data))
+            ctypes.memmove(pbuff, pdata, length)
             numWritten = libc.write(self._fd, pbuff, length)
             if numWritten < 0:
                 err = ctypes.get_errno()
@@ -20,7 +20,6 @@
 
 from __future__ import absolute_import
 
-import collections
 import os
 import errno
 import logging
@@ -39,6 +38,7 @@ from vdsm.storage import clusterlock
 from vdsm.storage import constants as sc
 from vdsm.storage import exception as se
 from vdsm.storage import fileUtils
+from vdsm.storage import fileindex
 from vdsm.storage import fileVolume
 from vdsm.storage import misc
 from vdsm.storage import mount
@@ -163,6 +163,10 @@ FileSDMetadata = lambda metafile: DictValidator(
 
 
 class FileStorageDomainManifest(sd.StorageDomainManifest):
+
+    # (generation, volumes) computed from the domain volume index.
+    _allVolumes = None
+
     def __init__(self, domainPath, metadata=None):
         # Using glob might look like the simplest thing to do but it isn't
         # If one of the mounts is stuck it'll cause the entire glob to fail
@@ -293,20 +297,22 @@ class FileStorageDomainManifest(sd.StorageDomainManifest):
 
         Template volumes have no parent, and thus we report BLANK_UUID as their
         parentUUID.
-        """
-        volMetaPattern = os.path.join(glob_escape(self.mountpoint),
-                                      self.sdUUID,
-                                      sd.DOMAIN_IMAGES, "*", "*.meta")
-        volMetaPaths = self.oop.glob.glob(volMetaPattern)
 
-        # First create mapping from images to volumes
-        images = collections.defaultdict(list)
-        for metaPath in volMetaPaths:
-            head, tail = os.path.split(metaPath)
-            volUUID, volExt = os.path.splitext(tail)
-            imgUUID = os.path.basename(head)
-            images[imgUUID].append(volUUID)
+        The result is computed from the domain volume index, and computed
+        again only when the index changes.
+        """
+        generation, images = self._volumeIndex().images(self.oop)
+        cached = self._allVolumes
+        if cached is None or cached[0] != generation:
+            cached = (generation, self._buildAllVolumes(images))
+            self._allVolumes = cached
+        return dict(cached[1])
 
+    def _buildAllVolumes(self, images):
+        """
+        Create {volUUID: ((imgUUIDs,), parentUUID)} from images to volumes
+        mapping.
+        """
         # Using images to volumes mapping, we can create volumes to images
         # mapping, detecting template volumes and template images, based on
         # these rules:
@@ -345,15 +351,20 @@ class FileStorageDomainManifest(sd.StorageDomainManifest):
         """
         Fetch the set of the Image UUIDs in the SD.
         """
-        # Get Volumes of an image
-        pattern = os.path.join(self.mountpoint, self.sdUUID, sd.DOMAIN_IMAGES,
-                               UUID_GLOB_PATTERN)
-        files = self.oop.glob.glob(pattern)
-        images = set()
-        for i in files:
-            if self.oop.os.path.isdir(i):
-                images.add(os.path.basename(i))
-        return images
+        _, images = self._volumeIndex().images(self.oop)
+        return set(fnmatch.filter(images, UUID_GLOB_PATTERN))
+
+    def refreshImageVolumes(self, imgUUID):
+        """
+        Make sure getAllVolumes() reports volumes created in image imgUUID by
+        other hosts.
+        """
+        self._volumeIndex().refresh_image(self.oop, imgUUID)
+
+    def _volumeIndex(self):
+        imagesDir = os.path.join(self.mountpoint, self.sdUUID,
+                                 sd.DOMAIN_IMAGES)
+        return fileindex.get(self.sdUUID, imagesDir)
 
     def getVolumeLease(self, imgUUID, volUUID):
         """
@@ -747,6 +758,7 @@ class FileStorageDomain(sd.StorageDomain):
 
         This function assumes that template image is used by other volumes.
         """
+        self.refreshImageVolumes(imgUUID)
         allVols = self.getAllVolumes()
         tImgs = allVols[volUUID].imgs
         if len(tImgs) < 2:
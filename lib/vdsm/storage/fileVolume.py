@@ -33,6 +33,7 @@ from vdsm.common.threadlocal import vars
 from vdsm.storage import constants as sc
 from vdsm.storage import exception as se
 from vdsm.storage import fallocate
+from vdsm.storage import fileindex
 from vdsm.storage import outOfProcess as oop
 from vdsm.storage import qemuimg
 from vdsm.storage import task
@@ -56,6 +57,16 @@ def getDomUuidFromVolumePath(volPath):
     return sdUUID
 
 
+def invalidateImageIndex(volPath):
+    """
+    Invalidate the domain volume index after creating, removing or renaming
+    volume files in the image directory of volPath.
+    """
+    sdUUID = getDomUuidFromVolumePath(volPath)
+    imgUUID = os.path.basename(os.path.dirname(os.path.normpath(volPath)))
+    fileindex.invalidate(sdUUID, imgUUID)
+
+
 class FileVolumeManifest(volume.VolumeManifest):
 
     # How this volume is presented to a vm.
@@ -256,6 +267,7 @@ class FileVolumeManifest(volume.VolumeManifest):
             f.write(data)
 
         oop.getProcessPool(meta.domain).os.rename(metaPath + ".new", metaPath)
+        invalidateImageIndex(volPath)
 
     def setImage(self, imgUUID):
         """
@@ -271,6 +283,7 @@ class FileVolumeManifest(volume.VolumeManifest):
         if self.oop.os.path.lexists(metaPath):
             self.log.info("Removing: %s", metaPath)
             self.oop.os.unlink(metaPath)
+            invalidateImageIndex(metaPath)
 
     @classmethod
     def leaseVolumePath(cls, vol_path):
@@ -319,6 +332,7 @@ class FileVolumeManifest(volume.VolumeManifest):
         self.log.debug("Share volume metadata of %s to %s", self.volUUID,
                        dstImgPath)
         self.oop.utils.forceLink(self.getMetaVolumePath(), dstMetaPath)
+        invalidateImageIndex(dstVolPath)
 
         # Link the lease file if the domain uses sanlock
         if sdCache.produce(self.sdUUID).hasVolumeLeases():
@@ -418,6 +432,7 @@ class FileVolume(volume.Volume):
         if oop.getProcessPool(sdUUID).os.path.lexists(metaPath):
             cls.log.info("Unlinking metadata volume %r", metaPath)
             oop.getProcessPool(sdUUID).os.unlink(metaPath)
+            invalidateImageIndex(metaPath)
 
     @classmethod
     def _create(cls, dom, imgUUID, volUUID, size, volFormat, preallocate,
@@ -613,6 +628,7 @@ class FileVolume(volume.Volume):
         procPool.utils.rmFile(volPath)
         procPool.utils.rmFile(cls.manifestClass.metaVolumePath(volPath))
         procPool.utils.rmFile(cls.manifestClass.leaseVolumePath(volPath))
+        invalidateImageIndex(volPath)
 
     def setParentMeta(self, puuid):
         """
@@ -634,6 +650,7 @@ class FileVolume(volume.Volume):
             cls.log.info("oldPath=%s newPath=%s", oldPath, newPath)
             sdUUID = getDomUuidFromVolumePath(oldPath)
             oop.getProcessPool(sdUUID).os.rename(oldPath, newPath)
+            invalidateImageIndex(newPath)
         except Exception:
             cls.log.error("Could not rollback "
                           "volume rename (oldPath=%s newPath=%s)",
@@ -668,6 +685,7 @@ class FileVolume(volume.Volume):
                                                  [metaPath, prevMetaPath]))
         self.log.info("Renaming %s to %s", prevMetaPath, metaPath)
         self.oop.os.rename(prevMetaPath, metaPath)
+        invalidateImageIndex(metaPath)
         if recovery:
             name = "Rename lease-volume rollback: " + leasePath
             vars.task.pushRecovery(task.Recovery(name, "fileVolume",
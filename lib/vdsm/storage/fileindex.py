@@ -0,0 +1,292 @@
+#
+# Copyright 2019 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+
+"""
+Index of images and volumes in file storage domains
+
+Listing the volumes of a file domain requires walking the entire images
+directory, reading every image directory. On NFS domains with many volumes
+this takes seconds, and it is repeated by image garbage collection, image
+listing and template relinking.
+
+This module keeps an index of the volumes in every image, per domain. The
+index is validated on every access by checking the modification time of the
+images directory, so images added, removed, or renamed by any host are
+detected using one stat call. Only the image directories that changed are
+read again.
+
+Changes inside existing image directories do not modify the images
+directory. Vdsm operations creating, removing or renaming volume files
+invalidate the image using invalidate(). Changes made by other hosts are
+detected by reading the entire images directory again when the index is
+older than irs:file_volumes_index_max_age seconds, or by validating the
+modification time of a single image directory using refresh_image() before
+looking up its volumes.
+"""
+
+from __future__ import absolute_import
+
+import errno
+import itertools
+import logging
+import os
+import threading
+import time
+
+from vdsm.common.compat import glob_escape
+from vdsm.common.time import monotonic_time
+from vdsm.config import config
+
+log = logging.getLogger("storage.fileindex")
+
+META_FILEEXT = ".meta"
+
+# The modification time of a directory has limited resolution. A directory
+# modified less than this number of seconds before we read it may be
+# modified again without changing its modification time, so we do not trust
+# it until it becomes older.
+RACY_INTERVAL = 2.0
+
+_lock = threading.Lock()
+_indexes = {}
+
+# Generations are unique across indexes, so a value cached using a replaced
+# index is never considered valid.
+_generations = itertools.count(1)
+
+
+def get(sd_id, images_dir):
+    """
+    Return the index of domain sd_id, creating it if needed.
+    """
+    with _lock:
+        index = _indexes.get(sd_id)
+        if index is None or index.images_dir != images_dir:
+            max_age = config.getfloat("irs", "file_volumes_index_max_age")
+            index = VolumeIndex(images_dir, max_age)
+            _indexes[sd_id] = index
+        return index
+
+
+def invalidate(sd_id, img_id=None):
+    """
+    Invalidate image img_id in the index of domain sd_id. If img_id is not
+    specified, invalidate the entire index.
+
+    Must be called after creating, removing or renaming volume files in an
+    image directory.
+    """
+    with _lock:
+        index = _indexes.get(sd_id)
+    if index is not None:
+        index.invalidate(img_id)
+
+
+class VolumeIndex(object):
+    """
+    Index of the volumes in every image directory of a domain.
+    """
+
+    def __init__(self, images_dir, max_age):
+        self.images_dir = images_dir
+        self._max_age = max_age
+        # Protects the index state. Never held while accessing storage, so
+        # invalidating the index does not wait for unresponsive storage.
+        self._lock = threading.Lock()
+        # Serializes refreshes, held while accessing storage.
+        self._refresh_lock = threading.Lock()
+        # {img_id: frozenset(vol_ids)}, replaced on every change.
+        self._images = None
+        # Changed when self._images changes.
+        self._generation = None
+        self._mtime = None
+        self._scanned = None
+        # Incremented when the entire index is invalidated.
+        self._invalidations = 0
+        self._dirty = set()
+        # {img_id: mtime} of image directories read by _update_image(),
+        # replaced on every change. Images whose modification time was too
+        # recent to trust are not included.
+        self._image_mtimes = {}
+
+    def images(self, oop):
+        """
+        Return tuple (generation, {img_id: frozenset(vol_ids)}) for all
+        directories in the images directory, including images being
+        removed. Storage is accessed using oop.
+
+        The returned dict must not be modified. The generation is changed
+        when the contents of the index changes, so callers can cache values
+        computed from the index.
+        """
+        with self._refresh_lock:
+            self._refresh(oop)
+        with self._lock:
+            return self._generation, self._images
+
+    def invalidate(self, img_id=None):
+        with self._lock:
+            if img_id is None:
+                self._scanned = None
+                self._invalidations += 1
+            else:
+                self._dirty.add(img_id)
+
+    def refresh_image(self, oop, img_id):
+        """
+        Make sure the next images() call reports the current volumes of image
+        img_id. The image is read again if its directory was modified since
+        it was read.
+
+        Volumes created by other hosts in an existing image do not modify the
+        images directory, so this must be called before looking up volumes
+        of an image that may have been modified by another host.
+        """
+        mtime = self._image_dir_mtime(oop, img_id)
+        with self._lock:
+            if mtime is None or self._image_mtimes.get(img_id) != mtime:
+                self._dirty.add(img_id)
+
+    def _refresh(self, oop):
+        # Read the modification time before reading the directory, so changes
+        # made while we read are detected in the next refresh.
+        mtime = self._images_dir_mtime(oop)
+        now = monotonic_time()
+
+        # Take the state to update, and read storage without holding the
+        # lock. Images invalidated while we read are read in the next
+        # refresh.
+        with self._lock:
+            scan_all = (self._scanned is None or
+                        now - self._scanned >= self._max_age)
+            changed = mtime is None or mtime != self._mtime
+            invalidations = self._invalidations
+            images = self._images
+            image_mtimes = self._image_mtimes
+            dirty = self._dirty
+            self._dirty = set()
+
+        try:
+            if scan_all:
+                images = self._scan_all(oop)
+                # We did not stat the image directories.
+                image_mtimes = {}
+            elif changed or dirty:
+                images = dict(images)
+                image_mtimes = dict(image_mtimes)
+                if changed:
+                    self._update_images(oop, images, image_mtimes, dirty)
+                for img_id in dirty:
+                    self._update_image(oop, images, image_mtimes, img_id)
+        except Exception:
+            with self._lock:
+                self._dirty.update(dirty)
+            raise
+
+        if mtime is not None and abs(time.time() - mtime) < RACY_INTERVAL:
+            mtime = None
+
+        with self._lock:
+            # If the entire index was invalidated while we read, the next
+            # refresh must read it again.
+            if scan_all and invalidations == self._invalidations:
+                self._scanned = now
+            self._set_images(images)
+            self._image_mtimes = image_mtimes
+            self._mtime = mtime
+
+    def _set_images(self, images):
+        if images != self._images:
+            self._images = images
+            self._generation = next(_generations)
+
+    def _images_dir_mtime(self, oop):
+        return self._mtime_of(oop, self.images_dir)
+
+    def _image_dir_mtime(self, oop, img_id):
+        return self._mtime_of(oop, os.path.join(self.images_dir, img_id))
+
+    def _mtime_of(self, oop, path):
+        try:
+            return oop.os.stat(path).st_mtime
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            return None
+
+    def _scan_all(self, oop):
+        log.debug("Reading volumes in %s", self.images_dir)
+        pattern = os.path.join(glob_escape(self.images_dir), "*",
+                               "*" + META_FILEEXT)
+        volumes = {}
+        for path in oop.glob.glob(pattern):
+            img_dir, name = os.path.split(path)
+            img_id = os.path.basename(img_dir)
+            vol_id = name[:-len(META_FILEEXT)]
+            volumes.setdefault(img_id, set()).add(vol_id)
+
+        images = {}
+        for img_id in self._list_images(oop):
+            vol_ids = volumes.get(img_id)
+            if vol_ids is not None:
+                images[img_id] = frozenset(vol_ids)
+            elif self._is_image_dir(oop, img_id):
+                images[img_id] = frozenset()
+        return images
+
+    def _update_images(self, oop, images, image_mtimes, dirty):
+        img_ids = self._list_images(oop)
+        for img_id in set(images) - img_ids:
+            log.debug("Image %s removed from %s", img_id, self.images_dir)
+            del images[img_id]
+            dirty.discard(img_id)
+            image_mtimes.pop(img_id, None)
+        for img_id in img_ids - set(images):
+            log.debug("Image %s added to %s", img_id, self.images_dir)
+            dirty.add(img_id)
+
+    def _update_image(self, oop, images, image_mtimes, img_id):
+        # Read the modification time before reading the directory, like
+        # _refresh().
+        mtime = self._image_dir_mtime(oop, img_id)
+        pattern = os.path.join(glob_escape(self.images_dir),
+                               glob_escape(img_id), "*" + META_FILEEXT)
+        vol_ids = frozenset(
+            os.path.basename(path)[:-len(META_FILEEXT)]
+            for path in oop.glob.glob(pattern))
+        if vol_ids or self._is_image_dir(oop, img_id):
+            images[img_id] = vol_ids
+        else:
+            images.pop(img_id, None)
+
+        if mtime is not None and abs(time.time() - mtime) < RACY_INTERVAL:
+            mtime = None
+        if mtime is None:
+            image_mtimes.pop(img_id, None)
+        else:
+            image_mtimes[img_id] = mtime
+
+    def _list_images(self, oop):
+        pattern = os.path.join(glob_escape(self.images_dir), "*")
+        return set(os.path.basename(path)
+                   for path in oop.glob.glob(pattern))
+
+    def _is_image_dir(self, oop, img_id):
+        return oop.os.path.isdir(os.path.join(self.images_dir, img_id))
@@ -64,14 +64,30 @@ def rescan():
         log.debug("Scan finished")
 
 
-def _rescan():
+def rescan_hosts(hosts):
     """
-    Called from supervdsm to perform rescan as root.
+    Rescan only the specified HBAs (e.g. "host2"), discovering new devices
+    and size changes of existing devices.
+    """
+    log.debug("Starting scan of hosts %s", hosts)
+    try:
+        supervdsm.getProxy().hbaRescan(hosts)
+    except Error as e:
+        log.error("Scan failed: %s", e)
+    else:
+        log.debug("Scan finished")
+
+
+def _rescan(hosts=()):
+    """
+    Called from supervdsm to perform rescan as root. If hosts are specified,
+    scan only these hosts.
     """
     timeout = config.getint('irs', 'scsi_rescan_maximal_timeout')
 
-    proc = commands.execCmd([constants.EXT_FC_SCAN], sync=False,
-                            execCmdLogger=log)
+    cmd = [constants.EXT_FC_SCAN]
+    cmd.extend(hosts)
+    proc = commands.execCmd(cmd, sync=False, execCmdLogger=log)
     try:
         proc.wait(timeout)
     finally:
@@ -400,6 +400,7 @@ class HSM(object):
         self.multipathListener = udev.MultipathListener()
         self.mpathhealth_monitor = mpathhealth.Monitor()
         self.multipathListener.register(self.mpathhealth_monitor)
+        self.multipathListener.register(multipath.device_cache)
         self.multipathListener.start()
 
         def storageRefresh():
@@ -1494,6 +1495,7 @@ class HSM(object):
         # hence, we need a unique identifier.
         vars.task.getExclusiveLock(STORAGE, "%s_%s" % (imgUUID, sdUUID))
         vars.task.getSharedLock(STORAGE, sdUUID)
+        dom.refreshImageVolumes(imgUUID)
         allVols = dom.getAllVolumes()
         volsByImg = sd.getVolsOfImage(allVols, imgUUID)
         if not volsByImg:
@@ -1588,8 +1590,8 @@ class HSM(object):
         Moving a template from a data domain is only allowed if there are no
         images based on it in the source data domain.
         """
+        srcDom.refreshImageVolumes(imgUUID)
         srcAllVols = srcDom.getAllVolumes()
-        dstAllVols = dstDom.getAllVolumes()
 
         # Filter volumes related to this image
         srcVolsImgs = sd.getVolsOfImage(srcAllVols, imgUUID)
@@ -1599,15 +1601,18 @@ class HSM(object):
                 # This is the template. Should be only one.
                 tName, tImgs = volName, imgsPar.imgs
                 # Template self image is the 1st entry
-                if imgUUID != tImgs[0] and tName not in dstAllVols.keys():
-                    self.log.error(
-                        "img %s can't be moved to dom %s because template "
-                        "%s is absent on it", imgUUID, dstDom.sdUUID, tName)
-                    e = se.ImageDoesNotExistInSD(imgUUID, dstDom.sdUUID)
-                    e.absentTemplateUUID = tName
-                    e.absentTemplateImageUUID = tImgs[0]
-                    raise e
-                elif imgUUID == tImgs[0] and not srcDom.isBackup():
+                if imgUUID != tImgs[0]:
+                    dstDom.refreshImageVolumes(tImgs[0])
+                    if tName not in dstDom.getAllVolumes():
+                        self.log.error(
+                            "img %s can't be moved to dom %s because "
+                            "template %s is absent on it",
+                            imgUUID, dstDom.sdUUID, tName)
+                        e = se.ImageDoesNotExistInSD(imgUUID, dstDom.sdUUID)
+                        e.absentTemplateUUID = tName
+                        e.absentTemplateImageUUID = tImgs[0]
+                        raise e
+                elif not srcDom.isBackup():
                     raise se.MoveTemplateImageError(imgUUID)
                 break
 
@@ -3188,6 +3193,7 @@ class HSM(object):
 
         imgVolumesInfo = []
         dom = sdCache.produce(sdUUID)
+        dom.refreshImageVolumes(imgUUID)
         allVols = dom.getAllVolumes()
         # Filter volumes related to this image
         imgVolumes = sd.getVolsOfImage(allVols, imgUUID).keys()
@@ -3266,6 +3272,8 @@ class HSM(object):
         """
         vars.task.getSharedLock(STORAGE, sdUUID)
         dom = sdCache.produce(sdUUID=sdUUID)
+        if imgUUID != sc.BLANK_UUID:
+            dom.refreshImageVolumes(imgUUID)
         vols = dom.getAllVolumes()
         if imgUUID == sc.BLANK_UUID:
             volUUIDs = vols.keys()
@@ -3273,6 +3281,23 @@ class HSM(object):
             volUUIDs = [k for k, v in vols.iteritems() if imgUUID in v.imgs]
         return dict(uuidlist=volUUIDs)
 
+    @public
+    def getVolumesMetadata(self, sdUUID, options=None):
+        """
+        Gets the metadata of all volumes in a domain.
+
+        :param sdUUID: The UUID of the storage domain you want to query.
+        :type sdUUID: UUID
+        :param options: ?
+
+        :returns: a dict with a dict mapping volume UUID to volume metadata
+                  and size.
+        :rtype: dict
+        """
+        vars.task.getSharedLock(STORAGE, sdUUID)
+        dom = sdCache.produce(sdUUID=sdUUID)
+        return dict(volumes=dom.dump_volumes())
+
     @public
     def getImagesList(self, sdUUID, options=None):
         """
@@ -31,6 +31,7 @@ from vdsm import utils
 from vdsm import virtsparsify
 from vdsm.config import config
 from vdsm.common import cmdutils
+from vdsm.common import concurrent
 from vdsm.common import logutils
 from vdsm.common.threadlocal import vars
 from vdsm.storage import constants as sc
@@ -70,6 +71,7 @@ def _deleteImage(dom, imgUUID, postZero, discard):
 
     Replaces Image.delete() in Image.[copyCollapsed(), move(), multimove()].
     """
+    dom.refreshImageVolumes(imgUUID)
     allVols = dom.getAllVolumes()
     imgVols = sd.getVolsOfImage(allVols, imgUUID)
     if not imgVols:
@@ -81,6 +83,105 @@ def _deleteImage(dom, imgUUID, postZero, discard):
         dom.deleteImage(dom.sdUUID, imgUUID, imgVols)
 
 
+class ChainCopy(object):
+    """
+    Run the operations copying the volumes of an image chain, running up to
+    parallelism operations concurrently.
+
+    The destination chain must exist before the copy, so every operation
+    writes only its own volume, and the operations can run in any order.
+
+    If an operation fails, the other operations are aborted. abort() and
+    progress are threadsafe and may be called from any thread.
+    """
+
+    log = logging.getLogger('storage.Image')
+
+    def __init__(self, operations, parallelism=1):
+        """
+        Arguments:
+            operations (list): list of (description, operation) tuples.
+                Operations must support run(), abort() and progress, like
+                qemuimg.ProgressCommand.
+            parallelism (int): maximum number of operations to run
+                concurrently.
+        """
+        self._operations = operations
+        self._parallelism = max(1, min(parallelism, len(operations)))
+        self._lock = threading.Lock()
+        self._next = 0
+        self._errors = []
+
+    @property
+    def progress(self):
+        """
+        Returns the progress of the entire chain as float between 0 and
+        100.
+        """
+        if not self._operations:
+            return 100.0
+        total = sum(op.progress for _, op in self._operations)
+        return round(total / len(self._operations), 2)
+
+    def abort(self):
+        """
+        Abort running operations and operations not started yet.
+        """
+        for _, op in self._operations:
+            op.abort()
+
+    def run(self):
+        """
+        Run all operations, raising the error of the first failed
+        operation.
+        """
+        if self._parallelism == 1:
+            self._worker()
+        else:
+            self._run_workers()
+
+        if self._errors:
+            raise self._errors[0]
+
+    def _run_workers(self):
+        self.log.info("Copying %d volumes using %d workers",
+                      len(self._operations), self._parallelism)
+        interval = config.getint("irs", "progress_interval")
+        threads = []
+        for i in range(self._parallelism):
+            t = concurrent.thread(
+                self._worker, name="copy/%d" % i, log=self.log)
+            t.start()
+            threads.append(t)
+
+        for t in threads:
+            while t.is_alive():
+                t.join(interval)
+                if t.is_alive():
+                    self.log.info("Copy progress: %.2f%%", self.progress)
+
+    def _worker(self):
+        while True:
+            with self._lock:
+                if self._errors or self._next == len(self._operations):
+                    return
+                description, op = self._operations[self._next]
+                self._next += 1
+
+            try:
+                with utils.stopwatch(description):
+                    op.run()
+            except Exception as e:
+                if self._parallelism == 1:
+                    raise
+                if not isinstance(e, ActionStopped):
+                    self.log.error("%s failed", description, exc_info=True)
+                with self._lock:
+                    self._errors.append(e)
+                self.abort()
+                return
+
+
 class Image:
     """ Actually represents a whole virtual disk.
         Consist from chain of volumes.
@@ -433,61 +534,71 @@ class Image:
             raise
 
         try:
-            for srcVol in chains['srcChain']:
-                # Do the actual copy
-                try:
-                    dstVol = destDom.produceVolume(imgUUID=imgUUID,
-                                                   volUUID=srcVol.volUUID)
+            try:
+                operations = [
+                    ("Copy volume %s" % srcVol.volUUID,
+                     self._copyVolumeOperation(destDom, imgUUID, srcVol))
+                    for srcVol in chains['srcChain']]
+                copy = ChainCopy(
+                    operations,
+                    config.getint("irs", "copy_image_parallelism"))
+                with vars.task.abort_callback(copy.abort):
+                    copy.run()
+            except ActionStopped:
+                raise
+            except se.StorageException:
+                self.log.error("Unexpected error", exc_info=True)
+                raise
+            except Exception:
+                self.log.error("Copy image error: image=%s, src domain=%s,"
+                               " dst domain=%s", imgUUID, srcSdUUID,
+                               destDom.sdUUID, exc_info=True)
+                raise se.CopyImageError()
+        finally:
+            # teardown volumes
+            self.__cleanupMove(srcLeafVol, dstLeafVol)
 
-                    if workarounds.invalid_vm_conf_disk(srcVol):
-                        srcFormat = dstFormat = qemuimg.FORMAT.RAW
-                    else:
-                        srcFormat = sc.fmt2str(srcVol.getFormat())
-                        dstFormat = sc.fmt2str(dstVol.getFormat())
+    def _copyVolumeOperation(self, destDom, imgUUID, srcVol):
+        """
+        Return qemu-img operation copying srcVol to the volume with the same
+        UUID in destDom. The destination chain must exist.
+        """
+        dstVol = destDom.produceVolume(imgUUID=imgUUID,
+                                       volUUID=srcVol.volUUID)
 
-                    parentVol = dstVol.getParentVolume()
+        if workarounds.invalid_vm_conf_disk(srcVol):
+            srcFormat = dstFormat = qemuimg.FORMAT.RAW
+        else:
+            srcFormat = sc.fmt2str(srcVol.getFormat())
+            dstFormat = sc.fmt2str(dstVol.getFormat())
 
-                    if parentVol is not None:
-                        backing = volume.getBackingVolumePath(
-                            imgUUID, parentVol.volUUID)
-                        backingFormat = sc.fmt2str(parentVol.getFormat())
-                    else:
-                        backing = None
-                        backingFormat = None
+        parentVol = dstVol.getParentVolume()
 
-                    if (destDom.supportsSparseness and
-                            dstVol.getType() == sc.PREALLOCATED_VOL):
-                        preallocation = qemuimg.PREALLOCATION.FALLOC
-                    else:
-                        preallocation = None
+        if parentVol is not None:
+            backing = volume.getBackingVolumePath(
+                imgUUID, parentVol.volUUID)
+            backingFormat = sc.fmt2str(parentVol.getFormat())
+        else:
+            backing = None
+            backingFormat = None
 
-                    operation = qemuimg.convert(
-                        srcVol.getVolumePath(),
-                        dstVol.getVolumePath(),
-                        srcFormat=srcFormat,
-                        dstFormat=dstFormat,
-                        dstQcow2Compat=destDom.qcow2_compat(),
-                        backing=backing,
-                        backingFormat=backingFormat,
-                        preallocation=preallocation,
-                        unordered_writes=destDom.recommends_unordered_writes(
-                            dstVol.getFormat()))
-                    with utils.stopwatch("Copy volume %s"
-                                         % srcVol.volUUID):
-                        self._run_qemuimg_operation(operation)
-                except ActionStopped:
-                    raise
-                except se.StorageException:
-                    self.log.error("Unexpected error", exc_info=True)
-                    raise
-                except Exception:
-                    self.log.error("Copy image error: image=%s, src domain=%s,"
-                                   " dst domain=%s", imgUUID, srcSdUUID,
-                                   destDom.sdUUID, exc_info=True)
-                    raise se.CopyImageError()
-        finally:
-            # teardown volumes
-            self.__cleanupMove(srcLeafVol, dstLeafVol)
+        if (destDom.supportsSparseness and
+                dstVol.getType() == sc.PREALLOCATED_VOL):
+            preallocation = qemuimg.PREALLOCATION.FALLOC
+        else:
+            preallocation = None
+
+        return qemuimg.convert(
+            srcVol.getVolumePath(),
+            dstVol.getVolumePath(),
+            srcFormat=srcFormat,
+            dstFormat=dstFormat,
+            dstQcow2Compat=destDom.qcow2_compat(),
+            backing=backing,
+            backingFormat=backingFormat,
+            preallocation=preallocation,
+            unordered_writes=destDom.recommends_unordered_writes(
+                dstVol.getFormat()))
 
     def _finalizeDestinationImage(self, destDom, imgUUID, chains, force):
         for srcVol in chains['srcChain']:
@@ -1203,6 +1314,7 @@ class Image:
         """
         # Prepare volumes
         dom = sdCache.produce(sdUUID)
+        dom.refreshImageVolumes(imgUUID)
         allVols = dom.getAllVolumes()
         imgVolumes = sd.getVolsOfImage(allVols, imgUUID).keys()
         dom.activateVolumes(imgUUID, imgVolumes)
@@ -1249,6 +1361,7 @@ class Image:
                       sdUUID, vmUUID, imgUUID, ancestor, successor,
                       str(postZero), discard)
         sdDom = sdCache.produce(sdUUID)
+        sdDom.refreshImageVolumes(imgUUID)
         allVols = sdDom.getAllVolumes()
         volsImgs = sd.getVolsOfImage(allVols, imgUUID)
         # Since image namespace should be locked is produce all the volumes is
@@ -1386,7 +1499,8 @@ class Image:
 
         vol = self._activateVolumeForImportExport(domain, imgUUID, volUUID)
         try:
-            imageSharing.copyFromImage(vol.getVolumePath(), methodArgs)
+            imageSharing.copyFromImage(vol.getVolumePath(), methodArgs,
+                                       task=vars.task)
         finally:
             domain.deactivateImage(imgUUID)
 
@@ -1398,6 +1512,7 @@ class Image:
             # Extend the volume (if relevant) to the image size
             vol.extend(imageSharing.getLengthFromArgs(methodArgs) /
                        sc.BLOCK_SIZE)
-            imageSharing.copyToImage(vol.getVolumePath(), methodArgs)
+            imageSharing.copyToImage(vol.getVolumePath(), methodArgs,
+                                     task=vars.task)
         finally:
             domain.deactivateImage(imgUUID)
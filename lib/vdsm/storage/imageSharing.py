@@ -18,25 +18,43 @@
 #
 
 from __future__ import absolute_import
+from __future__ import division
 
+import errno
+import io
 import logging
+import os
+import select
+import sys
 
-from vdsm import constants
+import six
+
+from vdsm import jobs
 from vdsm.common import commands
+from vdsm.common import constants
+from vdsm.common import exception
+from vdsm.common import filecontrol
+from vdsm.common import osutils
+from vdsm.common.compat import subprocess
+from vdsm.common.time import monotonic_time
 from vdsm.storage import curlImgWrap
+from vdsm.storage import directio
 from vdsm.storage import exception as se
 
 log = logging.getLogger("storage.ImageSharing")
-# Time to wait from finishing writing data to dd, until dd exists,
-# Ensure that we don't keep the task active forever if dd cannot
-# access the storage.
+
+# Number of bytes copied between the stream and the image in every I/O.
+# Images are accessed by dd using direct I/O, so we use large I/O to keep the
+# storage busy; the buffer is reused for the entire transfer.
+BUFFER_SIZE = directio.MAX_IO_SIZE
+
+# Direct I/O must be aligned to the logical block size of the storage,
+# which may be 4096 bytes.
+ALIGNMENT = 4096
+
+# Number of seconds to wait for dd without any progress before failing the
+# transfer.
 WAIT_TIMEOUT = 30
-# Number of bytes to read from the socket and write
-# to dd stdin trough the pipe. Based on default socket buffer
-# size(~80KB) and default pipe buffer size (64K), this should
-# minimize system call overhead without consuming too much
-# memory.
-BUFFER_SIZE = 65536
 
 
 def httpGetSize(methodArgs):
@@ -74,61 +92,328 @@ def httpUploadImage(srcImgPath, methodArgs):
                        methodArgs.get("headers", {}))
 
 
-def copyToImage(dstImgPath, methodArgs):
-    totalSize = getLengthFromArgs(methodArgs)
-    fileObj = methodArgs['fileObj']
-    cmd = [constants.EXT_DD, "of=%s" % dstImgPath, "bs=%s" % constants.MEGAB]
-    p = commands.execCmd(cmd, sync=False)
-    with commands.terminating(p):
-        _copyData(fileObj, p.stdin, totalSize)
-        p.stdin.close()
-        if not p.wait(WAIT_TIMEOUT):
-            log.error("timeout waiting for dd process")
-            raise se.StorageException()
-
-        if p.returncode != 0:
-            log.error("dd error - code %s, stderr %s",
-                      p.returncode, p.stderr.read(1000))
-            raise se.MiscFileWriteException()
-
-
-def copyFromImage(dstImgPath, methodArgs):
-    fileObj = methodArgs['fileObj']
-    bytes_left = total_size = methodArgs['length']
-    cmd = [constants.EXT_DD, "if=%s" % dstImgPath, "bs=%s" % constants.MEGAB,
-           "count=%s" % (total_size // constants.MEGAB + 1)]
-
-    p = commands.execCmd(cmd, sync=False)
-    p.blocking = True
-    with commands.terminating(p):
-        _copyData(p.stdout, fileObj, bytes_left)
-
-
-def _copyData(inFile, outFile, totalSize):
-    bytesToRead = totalSize
-    while totalSize > 0:
-        toRead = min(BUFFER_SIZE, totalSize)
-
+class _TransferJob(jobs.Job):
+    """
+    Report the progress of a transfer run by a storage task using the jobs
+    framework, so Host.getJobs() can report it. The job uses the task id.
+    """
+    _JOB_TYPE = "storage"
+    autodelete = True
+
+    def __init__(self, job_id, op):
+        super(_TransferJob, self).__init__(job_id, str(op))
+        self._op = op
+        self._exc_info = None
+
+    @property
+    def progress(self):
+        return self._op.progress
+
+    def raise_error(self):
+        """
+        Raise the error that failed the transfer in the caller thread.
+        """
+        if self._exc_info is not None:
+            six.reraise(*self._exc_info)
+        if self.status == jobs.STATUS.ABORTED:
+            raise exception.ActionStopped()
+
+    def _abort(self):
+        self._op.abort()
+
+    def _run(self):
+        try:
+            self._op.run()
+        except Exception:
+            self._exc_info = sys.exc_info()
+            raise
+
+
+def copyToImage(dstImgPath, methodArgs, task=None):
+    """
+    Copy data from methodArgs['fileObj'] to image dstImgPath.
+
+    If task is specified, the copy is reported as a job using the task id,
+    and aborted when the task is aborted.
+    """
+    op = StreamToImage(methodArgs['fileObj'], dstImgPath,
+                       getLengthFromArgs(methodArgs))
+    _run(op, task)
+
+
+def copyFromImage(dstImgPath, methodArgs, task=None):
+    """
+    Copy data from image dstImgPath to methodArgs['fileObj'].
+
+    If task is specified, the copy is reported as a job using the task id,
+    and aborted when the task is aborted.
+    """
+    op = ImageToStream(dstImgPath, methodArgs['fileObj'],
+                       methodArgs['length'])
+    _run(op, task)
+
+
+def _run(op, task):
+    if task is None:
+        op.run()
+        return
+
+    job = _TransferJob(task.id, op)
+    jobs.add(job)
+    with task.abort_callback(job.abort):
+        job.run()
+    job.raise_error()
+
+
+class _Transfer(object):
+    """
+    Copy size bytes between an image and a stream, using a dd child process
+    to access the image.
+
+    Storage I/O is done by dd, so a transfer blocked on storage fails after
+    WAIT_TIMEOUT seconds without progress instead of blocking the caller.
+    Progress and abort are supported from any thread, so a transfer can be
+    used as the operation of a storage job.
+    """
+
+    # Raised if the transfer fails.
+    _error = se.StorageException
+
+    def __init__(self, path, stream, size):
+        self._path = path
+        self._stream = stream
+        self._size = size
+        self._done = 0
+        self._aborted = False
+
+    @property
+    def progress(self):
+        """
+        Returns transfer progress as float between 0 and 100.
+        """
+        if self._size == 0:
+            return 100.0
+        return round(self._done * 100 / self._size, 2)
+
+    def abort(self):
+        """
+        Abort the transfer. The thread running the transfer will raise
+        exception.ActionStopped after completing the current I/O.
+        """
+        self._aborted = True
+
+    def run(self):
+        log.info("Starting %s", self)
+        start = monotonic_time()
+        self._copy()
+        elapsed = monotonic_time() - start
+        log.info("Finished %s in %.2f seconds (%.2f MiB/s)",
+                 self, elapsed,
+                 self._size / max(elapsed, 0.001) / 1024**2)
+
+    def _copy(self):
+        raise NotImplementedError
+
+    def _check_aborted(self):
+        if self._aborted:
+            log.info("Aborted %s at %.2f%%", self, self.progress)
+            raise exception.ActionStopped()
+
+    def _partial_data(self):
+        error = "partial data %s from %s" % (self._done, self._size)
+        log.error(error)
+        return se.MiscFileReadException(error)
+
+    def _wait_for(self, fd, event):
+        """
+        Wait until fd is ready for event, checking every second if the
+        transfer was aborted.
+        """
+        poller = select.poll()
+        poller.register(fd, event)
+        deadline = monotonic_time() + WAIT_TIMEOUT
+        while True:
+            self._check_aborted()
+            if osutils.uninterruptible_poll(poller.poll, 1000):
+                return
+            if monotonic_time() >= deadline:
+                error = "timeout %s at %.2f%%" % (self, self.progress)
+                log.error(error)
+                raise self._error(error)
+
+    def _wait_for_process(self, proc):
+        deadline = monotonic_time() + WAIT_TIMEOUT
+        while True:
+            self._check_aborted()
+            try:
+                proc.wait(1)
+                break
+            except subprocess.TimeoutExpired:
+                if monotonic_time() >= deadline:
+                    error = "timeout waiting for dd process"
+                    log.error(error)
+                    raise self._error(error)
+
+        if proc.returncode != 0:
+            error = "dd error - code %s, stderr %s" % (
+                proc.returncode, proc.stderr.read(1000))
+            log.error(error)
+            raise self._error(error)
+
+
+class StreamToImage(_Transfer):
+    """
+    Write size bytes read from stream to image path using direct I/O.
+    """
+
+    _error = se.MiscFileWriteException
+
+    def __init__(self, stream, path, size):
+        super(StreamToImage, self).__init__(path, stream, size)
+
+    def __str__(self):
+        return "copying %d bytes from stream to %s" % (self._size, self._path)
+
+    def _copy(self):
+        cmd = [
+            constants.EXT_DD,
+            "of=%s" % self._path,
+            "bs=%d" % BUFFER_SIZE,
+            # Read entire blocks from the pipe, so every write is aligned.
+            # dd writes the unaligned end of the image without direct I/O.
+            "iflag=fullblock",
+            "oflag=direct",
+            # Keep data after the end of the transfer, and ensure that the
+            # data reached storage before dd exits.
+            "conv=notrunc,nocreat,fsync",
+        ]
+        proc = commands.start(
+            cmd, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+        with commands.terminating(proc):
+            fd = proc.stdin.fileno()
+            filecontrol.set_non_blocking(fd)
+            buf = bytearray(min(BUFFER_SIZE, self._size))
+            while self._done < self._size:
+                self._check_aborted()
+                count = min(len(buf), self._size - self._done)
+                view = memoryview(buf)[:count]
+                self._receive(view)
+                self._send(fd, view)
+                self._done += count
+
+            proc.stdin.close()
+            self._wait_for_process(proc)
+
+    def _receive(self, buf):
+        """
+        Fill buf with data from the stream, using readinto() if the stream
+        supports it to avoid copying the data.
+        """
+        readinto = getattr(self._stream, "readinto", None)
+        pos = 0
         try:
-            data = inFile.read(toRead)
+            if readinto is not None:
+                while pos < len(buf):
+                    n = readinto(buf[pos:])
+                    if not n:
+                        raise self._partial_data()
+                    pos += n
+            else:
+                # Python 2 socket file object does not support readinto().
+                while pos < len(buf):
+                    data = self._stream.read(len(buf) - pos)
+                    if not data:
+                        raise self._partial_data()
+                    buf[pos:pos + len(data)] = data
+                    pos += len(data)
         except IOError as e:
             error = "error reading file: %s" % e
             log.error(error)
             raise se.MiscFileReadException(error)
 
-        if not data:
-            error = "partial data %s from %s" % \
-                    (bytesToRead - totalSize, bytesToRead)
-            log.error(error)
-            raise se.MiscFileReadException(error)
-
-        outFile.write(data)
-        # outFile may not be a real file object but a wrapper.
-        # To ensure that we don't use more memory as the input buffer size
-        # we flush on every write.
-        outFile.flush()
-
-        totalSize = totalSize - len(data)
+    def _send(self, fd, buf):
+        pos = 0
+        while pos < len(buf):
+            self._wait_for(fd, select.POLLOUT)
+            try:
+                pos += os.write(fd, buf[pos:])
+            except EnvironmentError as e:
+                if e.errno == errno.EAGAIN:
+                    continue
+                error = "error writing to dd: %s" % e
+                log.error(error)
+                raise se.MiscFileWriteException(error)
+
+
+class ImageToStream(_Transfer):
+    """
+    Write size bytes read from image path using direct I/O to stream.
+    """
+
+    _error = se.MiscFileReadException
+
+    def __str__(self):
+        return "copying %d bytes from %s to stream" % (self._size, self._path)
+
+    def _copy(self):
+        # Direct I/O reads must be aligned; read the unaligned end of the
+        # image up to the next block, and send only the requested data.
+        aligned_size = (self._size + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+        cmd = [
+            constants.EXT_DD,
+            "if=%s" % self._path,
+            "bs=%d" % BUFFER_SIZE,
+            "count=%d" % aligned_size,
+            "iflag=direct,count_bytes",
+        ]
+        proc = commands.start(
+            cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        with commands.terminating(proc):
+            fd = proc.stdout.fileno()
+            filecontrol.set_non_blocking(fd)
+            src = io.FileIO(fd, "r", closefd=False)
+            buf = bytearray(min(BUFFER_SIZE, self._size))
+            while self._done < self._size:
+                self._check_aborted()
+                count = self._size - self._done
+                if count < len(buf):
+                    buf = bytearray(count)
+                if self._receive(src, memoryview(buf)) < len(buf):
+                    raise self._partial_data()
+
+                self._stream.write(buf)
+                # stream may not be a real file object but a wrapper. Flush
+                # to ensure that we don't buffer more than one chunk.
+                self._stream.flush()
+
+                self._done += len(buf)
+
+            # Drop the rest of the last block.
+            while self._receive(src, memoryview(bytearray(ALIGNMENT))):
+                pass
+
+            self._wait_for_process(proc)
+
+    def _receive(self, src, buf):
+        """
+        Read from src into buf until buf is full or dd closed its output.
+        Returns the number of bytes read.
+        """
+        pos = 0
+        while pos < len(buf):
+            self._wait_for(src.fileno(), select.POLLIN)
+            try:
+                n = src.readinto(buf[pos:])
+            except EnvironmentError as e:
+                error = "error reading from dd: %s" % e
+                log.error(error)
+                raise se.MiscFileReadException(error)
+            if n is None:
+                continue
+            if n == 0:
+                break
+            pos += n
+        return pos
 
 
 _METHOD_IMPLEMENTATIONS = {
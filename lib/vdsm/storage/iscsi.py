@@ -38,6 +38,7 @@ import six
 
 from vdsm.config import config
 from vdsm.common import supervdsm
+from vdsm.common.time import monotonic_time
 from vdsm.common.network.address import hosttail_join
 from vdsm.network.netinfo.routes import getRouteDeviceTo
 from vdsm.storage import devicemapper
@@ -443,6 +444,21 @@ def rescan():
     rescanOp.wait(timeout=timeout)
 
 
+def rescan_sessions(sessionIds):
+    """
+    Rescan only the specified sessions, discovering new devices and size
+    changes of existing devices.
+    """
+    timeout = config.getint('irs', 'scsi_rescan_maximal_timeout')
+    log.debug("Performing SCSI scan of sessions %s, this will take up to %s "
+              "seconds", sorted(sessionIds), timeout)
+    rescanOps = [iscsiadm.session_rescan_async(sessionId)
+                 for sessionId in sorted(sessionIds)]
+    deadline = monotonic_time() + timeout
+    for rescanOp in rescanOps:
+        rescanOp.wait(timeout=max(0, deadline - monotonic_time()))
+
+
 def devIsiSCSI(dev):
     hostdir = os.path.realpath(os.path.join("/sys/block", dev,
                                             "device/../../.."))
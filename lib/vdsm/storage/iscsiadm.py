@@ -337,8 +337,12 @@ def node_login(iface, portal, targetName):
     raise IscsiNodeError(rc, out, err)
 
 
-def session_rescan_async():
-    proc = _runCmd(["-m", "session", "-R"], sync=False)
+def session_rescan_async(sessionId=None):
+    args = ["-m", "session"]
+    if sessionId is not None:
+        args.extend(["-r", str(sessionId)])
+    args.append("-R")
+    proc = _runCmd(args, sync=False)
 
     def parse_result(rc, out, err):
         if rc == 0:
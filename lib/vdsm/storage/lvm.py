@@ -42,12 +42,15 @@ import time
 from itertools import chain
 from subprocess import list2cmdline
 
+import six
+
 from vdsm import constants
 from vdsm.common import errors
 
 from vdsm.storage import devicemapper
 from vdsm.storage import constants as sc
 from vdsm.storage import exception as se
+from vdsm.storage import lvmshell
 from vdsm.storage import misc
 from vdsm.storage import multipath
 from vdsm.storage import rwlock
@@ -62,7 +65,7 @@ PV_FIELDS = ("uuid,name,size,vg_name,vg_uuid,pe_start,pe_count,"
 PV_FIELDS_LEN = len(PV_FIELDS.split(","))
 
 VG_FIELDS = ("uuid,name,attr,size,free,extent_size,extent_count,free_count,"
-             "tags,vg_mda_size,vg_mda_free,lv_count,pv_count,pv_name")
+             "tags,vg_mda_size,vg_mda_free,lv_count,pv_count,seqno,pv_name")
 VG_FIELDS_LEN = len(VG_FIELDS.split(","))
 
 LV_FIELDS = "uuid,name,vg_name,attr,size,seg_start_pe,devices,tags"
@@ -177,7 +180,7 @@ def _buildConfig(dev_filter, locking_type):
 def _normalizeargs(args=None):
     if args is None:
         args = []
-    elif not hasattr(args, "__iter__"):
+    elif isinstance(args, six.string_types) or not hasattr(args, "__iter__"):
         args = [args]
 
     return args
@@ -235,6 +238,47 @@ def makeLV(*args):
     return LV(*args)
 
 
+class LVIndex(object):
+    """
+    Index of the LVs of a VG by tags.
+
+    Built from a snapshot of the VG LVs, and never modified; LVMCache
+    replaces the index when the LVs of the VG change.
+    """
+
+    def __init__(self, lvs):
+        self.lvs = tuple(lvs)
+        # {tag: [lv, ...]}
+        self._by_tag = {}
+        # {lv_name: (imgUUID, parentUUID)} for volume LVs.
+        self.volumes = {}
+        # LVs which are not volumes, lacking image or parent tag.
+        self.untagged = []
+
+        for lv in self.lvs:
+            for tag in lv.tags:
+                self._by_tag.setdefault(tag, []).append(lv)
+
+            if sc.TEMP_VOL_LVTAG in lv.tags:
+                continue
+
+            image = ""
+            parent = ""
+            for tag in lv.tags:
+                if tag.startswith(sc.TAG_PREFIX_IMAGE):
+                    image = tag[len(sc.TAG_PREFIX_IMAGE):]
+                elif tag.startswith(sc.TAG_PREFIX_PARENT):
+                    parent = tag[len(sc.TAG_PREFIX_PARENT):]
+                if parent and image:
+                    self.volumes[lv.name] = (image, parent)
+                    break
+            else:
+                self.untagged.append(lv)
+
+    def lvsByTag(self, tag):
+        return list(self._by_tag.get(tag, ()))
+
+
 class LVMCache(object):
     """
     Keep all the LVM information.
@@ -252,7 +296,8 @@ class LVMCache(object):
     RETRY_DELAY = 0.01
     RETRY_BACKUP_OFF = 2
 
-    def __init__(self):
+    def __init__(self, shell_pool=None):
+        self._shell_pool = shell_pool
         self._read_only_lock = rwlock.RWLock()
         self._read_only = False
         self._filter = None
@@ -266,6 +311,13 @@ class LVMCache(object):
         self._pvs = {}
         self._vgs = {}
         self._lvs = {}
+        # VG metadata sequence number when all LVs of a VG were loaded.
+        self._lvs_seqno = {}
+        # LVs invalidated by _invalidatelvs(vgName, check_seqno=True), that
+        # can be restored if the VG metadata did not change.
+        self._stale_lvs = {}
+        # {vgName: LVIndex}, dropped when the LVs of the VG change.
+        self._lv_index = {}
 
     def set_read_only(self, value):
         """
@@ -307,6 +359,19 @@ class LVMCache(object):
     def invalidateFilter(self):
         self._filterStale = True
 
+    def _run(self, full_cmd):
+        """
+        Run full lvm command, using the shell pool for reporting commands if
+        enabled. If the shell fails, fall back to running a new lvm process.
+        """
+        if self._shell_pool and lvmshell.is_report_command(full_cmd):
+            try:
+                return self._shell_pool.run(full_cmd)
+            except lvmshell.Error as e:
+                log.warning("Running command in lvm shell failed, retrying "
+                            "with a new process: %s", e)
+        return misc.execCmd(full_cmd, sudo=True)
+
     def invalidateCache(self):
         self.invalidateFilter()
         self.flush()
@@ -319,7 +384,7 @@ class LVMCache(object):
             # 1. Try the command with fast specific filter including the
             # specified devices.
             full_cmd = self._addExtraCfg(cmd, devices)
-            rc, out, err = misc.execCmd(full_cmd, sudo=True)
+            rc, out, err = self._run(full_cmd)
             if rc == 0:
                 return rc, out, err
 
@@ -334,7 +399,7 @@ class LVMCache(object):
                     full_cmd, rc, err)
                 full_cmd = wider_cmd
 
-                rc, out, err = misc.execCmd(full_cmd, sudo=True)
+                rc, out, err = self._run(full_cmd)
                 if rc == 0:
                     return rc, out, err
 
@@ -352,7 +417,7 @@ class LVMCache(object):
                     time.sleep(delay)
                     delay *= self.RETRY_BACKUP_OFF
 
-                    rc, out, err = misc.execCmd(full_cmd, sudo=True)
+                    rc, out, err = self._run(full_cmd)
                     if rc == 0:
                         return rc, out, err
 
@@ -403,7 +468,7 @@ class LVMCache(object):
                 self._stalepv = False
                 # Remove stalePVs
                 stalePVs = [staleName for staleName in self._pvs.keys()
-                            if staleName not in updatedPVs.iterkeys()]
+                            if staleName not in updatedPVs]
                 for staleName in stalePVs:
                     log.warning("Removing stale PV: %s", staleName)
                     self._pvs.pop((staleName), None)
@@ -466,7 +531,7 @@ class LVMCache(object):
                     vgsFields[uuid] = fields
                 else:
                     vgsFields[uuid][pvNameIdx].append(pv_name)
-            for fields in vgsFields.itervalues():
+            for fields in vgsFields.values():
                 vg = makeVG(*fields)
                 if int(vg.pv_count) != len(vg.pv_name):
                     log.error("vg %s has pv_count %s but pv_names %s",
@@ -478,7 +543,7 @@ class LVMCache(object):
                 self._stalevg = False
                 # Remove stale VGs
                 staleVGs = [staleName for staleName in self._vgs.keys()
-                            if staleName not in updatedVGs.iterkeys()]
+                            if staleName not in updatedVGs]
                 for staleName in staleVGs:
                     removeVgMapping(staleName)
                     log.warning("Removing stale VG: %s", staleName)
@@ -492,11 +557,20 @@ class LVMCache(object):
         if lvNames:
             cmd.extend(["%s/%s" % (vgName, lvName) for lvName in lvNames])
         else:
+            restored = self._restoreUnchangedLvs(vgName)
+            if restored is not None:
+                return restored
             cmd.append(vgName)
 
+        # Must be taken before reading the LVs; if the VG metadata is
+        # modified while we read the LVs, the next check will detect the
+        # change.
+        seqno = self._cachedVgSeqno(vgName)
+
         rc, out, err = self.cmd(cmd, self._getVGDevs((vgName,)))
 
         with self._lock:
+            self._dropLvIndex(vgName)
             if rc != 0:
                 # This may be a real error (failure to reload existing LV) or
                 # no error at all (failure to reload non-existing LV), so we
@@ -524,18 +598,21 @@ class LVMCache(object):
 
             # Determine if there are stale LVs
             if lvNames:
-                staleLVs = (lvName for lvName in lvNames
-                            if (vgName, lvName) not in updatedLVs.iterkeys())
+                staleLVs = [lvName for lvName in lvNames
+                            if (vgName, lvName) not in updatedLVs]
             else:
                 # All the LVs in the VG
-                staleLVs = (lvName for v, lvName in self._lvs.keys()
+                staleLVs = [lvName for v, lvName in self._lvs
                             if (v == vgName) and
-                            ((vgName, lvName) not in updatedLVs.iterkeys()))
+                            ((vgName, lvName) not in updatedLVs)]
 
             for lvName in staleLVs:
                 log.warning("Removing stale lv: %s/%s", vgName, lvName)
                 self._lvs.pop((vgName, lvName), None)
 
+            if not lvNames:
+                self._setLvsSeqno(vgName, seqno)
+
             log.debug("lvs reloaded")
 
         return updatedLVs
@@ -545,6 +622,9 @@ class LVMCache(object):
         Used only during bootstrap.
         """
         cmd = list(LVS_CMD)
+        with self._lock:
+            seqnos = {name: vg.seqno for name, vg in self._vgs.items()
+                      if not isinstance(vg, Stub)}
         rc, out, err = self.cmd(cmd)
         if rc == 0:
             updatedLVs = set()
@@ -560,13 +640,81 @@ class LVMCache(object):
                     updatedLVs.add((lv.vg_name, lv.name))
 
             # Remove stales
-            for vgName, lvName in self._lvs.keys():
+            for vgName, lvName in list(self._lvs):
                 if (vgName, lvName) not in updatedLVs:
                     self._lvs.pop((vgName, lvName), None)
                     log.error("Removing stale lv: %s/%s", vgName, lvName)
+            with self._lock:
+                self._lvs_seqno = seqnos
+                self._stale_lvs.clear()
+                self._dropLvIndex()
             self._stalelv = False
         return dict(self._lvs)
 
+    def _cachedVgSeqno(self, vgName):
+        """
+        Return the sequence number of the cached VG metadata, or None if the
+        VG is not in the cache.
+        """
+        with self._lock:
+            vg = self._vgs.get(vgName)
+            if vg is None or isinstance(vg, Stub):
+                return None
+            return vg.seqno
+
+    def _setLvsSeqno(self, vgName, seqno):
+        # Must be called with self._lock held.
+        self._stale_lvs.pop(vgName, None)
+        if seqno is None:
+            self._lvs_seqno.pop(vgName, None)
+        else:
+            self._lvs_seqno[vgName] = seqno
+
+    def _restoreUnchangedLvs(self, vgName):
+        """
+        If the LVs of vgName were invalidated with check_seqno=True, and the
+        VG metadata sequence number did not change since the LVs were loaded,
+        restore the invalidated LVs without running lvs.
+
+        Returns a dict of the VG LVs, or None if the LVs must be reloaded.
+        """
+        with self._lock:
+            seqno = self._lvs_seqno.get(vgName)
+            if seqno is None or vgName not in self._stale_lvs:
+                return None
+
+        # Reloads the VG if it was invalidated, so we get the current
+        # sequence number.
+        vg = self.getVg(vgName)
+
+        with self._lock:
+            stale = self._stale_lvs.pop(vgName, None)
+            if stale is None:
+                return None
+
+            if vg is None or isinstance(vg, Stub) or vg.seqno != seqno:
+                log.debug("VG %s metadata changed (seqno=%s), reloading lvs",
+                          vgName, getattr(vg, "seqno", None))
+                return None
+
+            for lvName, lv in stale.items():
+                if isinstance(self._lvs.get((vgName, lvName)), Stub):
+                    self._lvs[(vgName, lvName)] = lv
+
+            lvs = {}
+            for (v, lvName), lv in self._lvs.items():
+                if v != vgName:
+                    continue
+                if isinstance(lv, Stub):
+                    # Invalidated after the VG was invalidated, we need to
+                    # read it from storage.
+                    return None
+                lvs[(v, lvName)] = lv
+
+            log.debug("VG %s metadata unchanged (seqno=%s), reusing %d lvs",
+                      vgName, seqno, len(lvs))
+            return lvs
+
     def _invalidatepvs(self, pvNames):
         pvNames = _normalizeargs(pvNames)
         with self._lock:
@@ -589,25 +737,60 @@ class LVMCache(object):
             self._stalevg = True
             self._vgs.clear()
 
-    def _invalidatelvs(self, vgName, lvNames=None):
+    def _invalidatelvs(self, vgName, lvNames=None, check_seqno=False):
+        """
+        Invalidate specific LVs or all the LVs of a VG.
+
+        If check_seqno is True, the LVs of the VG are kept aside, and
+        restored on the next reload if the VG metadata sequence number did
+        not change since the LVs were loaded. Use only when the LVs may have
+        been modified by another host; changes made on this host that do not
+        modify VG metadata (e.g. activation) are not detected.
+        """
         lvNames = _normalizeargs(lvNames)
         with self._lock:
+            self._dropLvIndex(vgName)
             # Invalidate LVs in a specific VG
             if lvNames:
                 # Invalidate a specific LVs
+                stale = self._stale_lvs.get(vgName, {})
                 for lvName in lvNames:
                     self._lvs[(vgName, lvName)] = Stub(lvName, True)
+                    stale.pop(lvName, None)
             else:
+                if check_seqno and vgName in self._lvs_seqno:
+                    stale = self._stale_lvs.setdefault(vgName, {})
+                else:
+                    stale = None
+                    self._stale_lvs.pop(vgName, None)
                 # Invalidate all the LVs in a given VG
                 for lv in self._lvs.values():
                     if not isinstance(lv, Stub):
                         if lv.vg_name == vgName:
                             self._lvs[(vgName, lv.name)] = Stub(lv.name, True)
+                            if stale is not None:
+                                stale[lv.name] = lv
 
     def _invalidateAllLvs(self):
         with self._lock:
             self._stalelv = True
             self._lvs.clear()
+            self._lvs_seqno.clear()
+            self._stale_lvs.clear()
+            self._dropLvIndex()
+
+    def _dropLvIndex(self, vgName=None):
+        # Must be called with self._lock held.
+        if vgName is None:
+            self._lv_index.clear()
+        else:
+            self._lv_index.pop(vgName, None)
+
+    def _removeLvs(self, vgName, lvNames):
+        with self._lock:
+            self._dropLvIndex(vgName)
+            for lvName in lvNames:
+                self._lvs.pop((vgName, lvName), None)
 
     def flush(self):
         self._invalidateAllPvs()
@@ -628,7 +811,7 @@ class LVMCache(object):
             pvs = self._reloadpvs()
         else:
             pvs = dict(self._pvs)
-            stalepvs = [pv.name for pv in pvs.itervalues()
+            stalepvs = [pv.name for pv in pvs.values()
                         if isinstance(pv, Stub)]
             if stalepvs:
                 reloaded = self._reloadpvs(stalepvs)
@@ -670,7 +853,7 @@ class LVMCache(object):
         Fills the cache but not uses it.
         Only returns found VGs.
         """
-        return [vg for vgName, vg in self._reloadvgs(vgNames).iteritems()
+        return [vg for vgName, vg in self._reloadvgs(vgNames).items()
                 if vgName in vgNames]
 
     def getAllVgs(self):
@@ -679,7 +862,7 @@ class LVMCache(object):
             vgs = self._reloadvgs()
         else:
             vgs = dict(self._vgs)
-            stalevgs = [vg.name for vg in vgs.itervalues()
+            stalevgs = [vg.name for vg in vgs.values()
                         if isinstance(vg, Stub)]
             if stalevgs:
                 reloaded = self._reloadvgs(stalevgs)
@@ -734,7 +917,47 @@ class LVMCache(object):
             lvs = dict(self._lvs)
         return lvs.values()
 
-_lvminfo = LVMCache()
+    def getLvIndex(self, vgName):
+        """
+        Return LVIndex of the LVs in vgName.
+
+        The index is built once from the cached LVs, and reused until the
+        LVs of the VG change.
+        """
+        if not self._stalelv:
+            with self._lock:
+                index = self._lv_index.get(vgName)
+            if index is not None:
+                return index
+
+        # Reloads the LVs of the VG if needed.
+        lvs = self.getLv(vgName)
+
+        with self._lock:
+            index = self._lv_index.get(vgName)
+            if index is None:
+                cached = [lv for (v, _), lv in self._lvs.items()
+                          if v == vgName]
+                if any(isinstance(lv, Stub) for lv in cached):
+                    # Invalidated after we got the LVs, use what we have
+                    # without caching the index.
+                    return LVIndex(lvs)
+                index = LVIndex(cached)
+                self._lv_index[vgName] = index
+            return index
+
+
+def _create_shell_pool():
+    if not config.getboolean("irs", "lvm_shell_enable"):
+        return None
+    size = config.getint("irs", "lvm_shell_pool_size")
+    timeout = config.getint("irs", "lvm_shell_timeout")
+    log.info("Using lvm shell pool (size=%d, timeout=%d)", size, timeout)
+    return lvmshell.ShellPool(
+        size, shell_factory=lambda: lvmshell.Shell(timeout=timeout))
+
+
+_lvminfo = LVMCache(shell_pool=_create_shell_pool())
 
 
 def bootstrap(skiplvs=()):
@@ -1114,7 +1337,7 @@ def createVG(vgName, devices, initialTag, metadataSize, force=False):
 def removeVG(vgName):
     cmd = ["vgremove", "-f", vgName]
     rc, out, err = _lvminfo.cmd(cmd, _lvminfo._getVGDevs((vgName, )))
-    pvs = tuple(pvName for pvName, pv in _lvminfo._pvs.iteritems()
+    pvs = tuple(pvName for pvName, pv in _lvminfo._pvs.items()
                 if not isinstance(pv, Stub) and pv.vg_name == vgName)
     # PVS needs to be reloaded anyhow: if vg is removed they are staled,
     # if vg remove failed, something must be wrong with devices and we want
@@ -1187,9 +1410,15 @@ def deactivateVG(vgName):
 
 
 def invalidateVG(vgName, invalidateLVs=True, invalidatePVs=False):
+    """
+    Invalidate a VG that may have been modified by another host.
+
+    The LVs are reloaded only if the VG metadata sequence number changed
+    since the LVs were loaded.
+    """
     _lvminfo._invalidatevgs(vgName)
     if invalidateLVs:
-        _lvminfo._invalidatelvs(vgName)
+        _lvminfo._invalidatelvs(vgName, check_seqno=True)
     if invalidatePVs:
         vgPvs = listPVNames(vgName)
         _lvminfo._invalidatepvs(pvNames=vgPvs)
@@ -1310,11 +1539,10 @@ def removeLVs(vgName, lvNames):
         cmd.append("%s/%s" % (vgName, lvName))
     rc, out, err = _lvminfo.cmd(cmd, _lvminfo._getVGDevs((vgName, )))
     if rc == 0:
-        for lvName in lvNames:
-            # Remove the LV from the cache
-            _lvminfo._lvs.pop((vgName, lvName), None)
-            # If lvremove succeeded it affected VG as well
-            _lvminfo._invalidatevgs(vgName)
+        # Remove the LVs from the cache
+        _lvminfo._removeLvs(vgName, lvNames)
+        # If lvremove succeeded it affected VG as well
+        _lvminfo._invalidatevgs(vgName)
     else:
         # Otherwise LV info needs to be refreshed
         _lvminfo._invalidatelvs(vgName, lvNames)
@@ -1430,7 +1658,7 @@ def renameLV(vg, oldlv, newlv):
     if rc != 0:
         raise se.LogicalVolumeRenameError("%s %s %s" % (vg, oldlv, newlv))
 
-    _lvminfo._lvs.pop((vg, oldlv), None)
+    _lvminfo._removeLvs(vg, (oldlv,))
     _lvminfo._reloadlvs(vg, newlv)
 
 
@@ -1577,6 +1805,17 @@ def _isMetadataPv(pv):
     return pv.mda_used_count == '2'
 
 
+def getCachedPVNames(vgName):
+    """
+    Return the PV names of VG vgName from the cache, without running lvm
+    commands. Returns None if the VG is not cached or stale.
+    """
+    vg = _lvminfo._vgs.get(vgName)
+    if vg is None or isinstance(vg, Stub):
+        return None
+    return vg.pv_name
+
+
 def listPVNames(vgName):
     try:
         pvNames = _lvminfo._vgs[vgName].pv_name
@@ -1602,8 +1841,19 @@ def setrwLV(vg_name, lv_name, rw=True):
         raise se.CannotSetRWLogicalVolume(vg_name, lv_name, permission)
 
 
+def getLvIndex(vgName):
+    """
+    Return LVIndex of the LVs in vgName.
+    """
+    index = _lvminfo.getLvIndex(vgName)
+    # Like getLV(), should not return an empty index
+    if not index.lvs:
+        raise se.LogicalVolumeDoesNotExistError("%s/%s" % (vgName, None))
+    return index
+
+
 def lvsByTag(vgName, tag):
-    return [lv for lv in getLV(vgName) if tag in lv.tags]
+    return getLvIndex(vgName).lvsByTag(tag)
 
 
 def invalidateFilter():
@@ -0,0 +1,358 @@
+#
+# Copyright 2019 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+
+"""
+Persistent lvm shell
+
+Running a reporting command (pvs, vgs, lvs) forks a new lvm process via sudo,
+loading the lvm configuration and libraries for every query. When refreshing
+the LVM cache on hosts with many domains and LVs, this dominates the cost of
+the refresh.
+
+This module keeps a bounded pool of long lived "lvm shell" processes, and
+streams reporting commands to them. Commands use the json report format with
+the command log enabled, so we can detect the end of the output and the
+command status without running a new process.
+
+A shell that fails, times out, or returns unexpected output is terminated and
+a new shell is started for the next command.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+
+import collections
+import errno
+import json
+import logging
+import os
+import select
+import threading
+
+import six
+
+from vdsm import constants
+from vdsm.common import commands
+from vdsm.common import errors
+from vdsm.common import osutils
+from vdsm.common.compat import subprocess
+from vdsm.common.time import monotonic_time
+
+log = logging.getLogger("storage.lvmshell")
+
+PROMPT = b"lvm> "
+
+# Commands that can be streamed to the shell. Other commands are modifying
+# LVM metadata and must run in a new process.
+REPORT_COMMANDS = frozenset(["pvs", "vgs", "lvs"])
+
+# Returned in the command log when a command was processed successfully.
+ECMD_PROCESSED = 1
+
+# Return code used when a command failed in the shell, like lvm ECMD_FAILED.
+ECMD_FAILED = 5
+
+# Added to the --config option of every command run in the shell.
+LOG_CONFIG = " log { report_command_log=1 }"
+
+BUFSIZE = 64 * 1024
+
+# Separator used to format report rows, must match lvm.SEPARATOR.
+SEPARATOR = "|"
+
+
+class Error(errors.Base):
+    msg = "lvm shell failed: {self.reason}"
+
+    def __init__(self, reason):
+        self.reason = reason
+
+
+class Timeout(Error):
+    msg = "Timeout waiting for lvm shell: {self.reason}"
+
+
+def is_report_command(cmd):
+    """
+    Return True if cmd is a full lvm command that can run in the shell.
+    cmd is expected to be in the format returned by LVMCache._addExtraCfg():
+    [EXT_LVM, command, "--config", config, args...].
+    """
+    return (len(cmd) > 3 and
+            cmd[1] in REPORT_COMMANDS and
+            cmd[2] == "--config")
+
+
+def format_command(cmd):
+    """
+    Format full lvm command for the shell.
+
+    The lvm shell splits the command line on white space. An argument starting
+    with a quote continues until the next identical quote, and quotes cannot
+    be escaped. The lvm config contains double quotes but never single quotes,
+    so we can quote all arguments with single quotes.
+    """
+    args = list(cmd[1:])
+
+    # Enable the command log and json output, used to find the command status.
+    config_index = args.index("--config") + 1
+    args[config_index] += LOG_CONFIG
+    args.extend(("--reportformat", "json"))
+
+    for arg in args:
+        if "'" in arg:
+            raise Error("Cannot quote argument: %r" % arg)
+
+    line = " ".join("'%s'" % arg for arg in args) + "\n"
+    return line.encode("utf-8")
+
+
+def parse_output(out):
+    """
+    Parse lvm shell json output, returning rc, out, err in the same format as
+    misc.execCmd(), so callers can handle output from the shell and from a
+    lvm command in the same way.
+
+    Output rows are formatted using the separator used by lvm.LVMCache, with
+    values ordered by the --options argument.
+    """
+    text = out.decode("utf-8")
+
+    # The shell may echo the command before the report, depending on readline
+    # configuration. The json report always starts with a line containing
+    # only "{".
+    lines = text.splitlines()
+    for i, line in enumerate(lines):
+        if line.strip() == "{":
+            break
+    else:
+        raise Error("No report in output: %r" % text)
+
+    try:
+        report = json.loads("\n".join(lines[i:]),
+                            object_pairs_hook=collections.OrderedDict)
+    except ValueError as e:
+        raise Error("Invalid report %r: %s" % (text, e))
+
+    rows = []
+    for section in report.get("report", ()):
+        for items in section.values():
+            for item in items:
+                rows.append(_format_row(item.values()))
+
+    cmd_log = report.get("log")
+    if not cmd_log:
+        raise Error("No command log in output: %r" % text)
+
+    err = [_native(entry["log_message"]) for entry in cmd_log
+           if entry.get("log_type") == "error"]
+
+    if int(cmd_log[-1]["log_ret_code"]) == ECMD_PROCESSED:
+        rc = 0
+    else:
+        rc = ECMD_FAILED
+
+    return rc, rows, err
+
+
+def _format_row(values):
+    return _native(SEPARATOR.join(values))
+
+
+def _native(s):
+    if six.PY2:
+        return s.encode("utf-8")
+    return s
+
+
+class Shell(object):
+    """
+    A single lvm shell process. Not thread safe; the shell pool ensures that
+    only one thread is using a shell.
+    """
+
+    def __init__(self, cmd=(constants.EXT_LVM, "shell"), sudo=True,
+                 timeout=60):
+        self._timeout = timeout
+        self._proc = commands.start(
+            list(cmd),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            sudo=sudo)
+        try:
+            # Wait for the first prompt, ensuring that the shell is ready.
+            self._read_until_prompt()
+        except:
+            self.close()
+            raise
+
+    @property
+    def pid(self):
+        return self._proc.pid
+
+    def alive(self):
+        return self._proc.poll() is None
+
+    def run(self, cmd):
+        """
+        Run full lvm command in the shell.
+
+        Returns:
+            rc, out, err as returned from misc.execCmd().
+
+        Raises:
+            Error if the shell failed or returned unexpected output. The
+            shell cannot be used after an error.
+        """
+        line = format_command(cmd)
+        try:
+            self._proc.stdin.write(line)
+            self._proc.stdin.flush()
+        except EnvironmentError as e:
+            raise Error("Error writing to shell pid=%s: %s"
+                        % (self._proc.pid, e))
+
+        out = self._read_until_prompt()
+        return parse_output(out)
+
+    def close(self):
+        try:
+            commands.terminate(self._proc)
+        except commands.TerminatingFailure as e:
+            log.error("Error terminating lvm shell: %s", e)
+
+    def _read_until_prompt(self):
+        """
+        Read shell stdout until the shell prints the prompt, and discard
+        anything written to stderr. Errors are reported in the command log,
+        so stderr contains only warnings.
+        """
+        deadline = monotonic_time() + self._timeout
+        out_fd = self._proc.stdout.fileno()
+        err_fd = self._proc.stderr.fileno()
+
+        poller = select.poll()
+        poller.register(out_fd, select.POLLIN)
+        poller.register(err_fd, select.POLLIN)
+
+        out = bytearray()
+
+        while not out.endswith(PROMPT):
+            remaining = deadline - monotonic_time()
+            if remaining <= 0:
+                raise Timeout("pid=%s out=%r" % (self._proc.pid, bytes(out)))
+            try:
+                ready = poller.poll(remaining * 1000)
+            except select.error as e:
+                if e.args[0] != errno.EINTR:
+                    raise
+                continue
+
+            for fd, event in ready:
+                data = b""
+                if event & (select.POLLIN | select.POLLHUP):
+                    data = osutils.uninterruptible(os.read, fd, BUFSIZE)
+                if not data:
+                    raise Error("Shell pid=%s terminated out=%r"
+                                % (self._proc.pid, bytes(out)))
+                if fd == out_fd:
+                    out += data
+                else:
+                    log.debug("lvm shell pid=%s stderr: %r",
+                              self._proc.pid, data)
+
+        return bytes(out[:-len(PROMPT)])
+
+
+class ShellPool(object):
+    """
+    Bounded pool of lvm shells.
+
+    Shells are started on demand, up to size shells. Callers wait when all
+    shells are busy. A shell failing a command is terminated, and a new shell
+    is started for the next caller.
+    """
+
+    def __init__(self, size, shell_factory=Shell):
+        self._size = size
+        self._shell_factory = shell_factory
+        self._sem = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._idle = []
+        self._closed = False
+
+    @property
+    def size(self):
+        return self._size
+
+    def run(self, cmd):
+        """
+        Run cmd in one of the pool shells.
+
+        Raises:
+            Error if the shell could not be started or failed to run the
+            command. The caller may retry the command using a new process.
+        """
+        with self._sem:
+            shell = self._checkout()
+            try:
+                res = shell.run(cmd)
+            except:
+                log.warning("Discarding lvm shell pid=%s", shell.pid)
+                shell.close()
+                raise
+            self._checkin(shell)
+            return res
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            idle = self._idle
+            self._idle = []
+        for shell in idle:
+            shell.close()
+
+    def _checkout(self):
+        with self._lock:
+            if self._closed:
+                raise Error("Shell pool closed")
+            while self._idle:
+                shell = self._idle.pop()
+                if shell.alive():
+                    return shell
+                log.warning("lvm shell pid=%s terminated, respawning",
+                            shell.pid)
+                shell.close()
+
+        try:
+            shell = self._shell_factory()
+        except EnvironmentError as e:
+            raise Error("Error starting shell: %s" % e)
+
+        log.debug("Started lvm shell pid=%s", shell.pid)
+        return shell
+
+    def _checkin(self, shell):
+        with self._lock:
+            if not self._closed:
+                self._idle.append(shell)
+                return
+        shell.close()
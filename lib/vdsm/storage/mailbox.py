@@ -20,6 +20,7 @@
 
 from __future__ import absolute_import
 import array
+import collections
 import os
 import errno
 import time
@@ -29,16 +30,19 @@ import logging
 
 import uuid
 
+import six
 from six.moves import queue
 
+from vdsm import metrics
 from vdsm.config import config
+from vdsm.storage import directio
 from vdsm.storage import misc
 from vdsm.storage import task
 from vdsm.storage.exception import InvalidParameterException
 from vdsm.storage.threadPool import ThreadPool
 
-from vdsm import constants
 from vdsm.common import concurrent
+from vdsm.common.time import monotonic_time
 
 __author__ = "ayalb"
 __date__ = "$Mar 9, 2009 5:25:07 PM$"
@@ -61,6 +65,11 @@ SLOTS_PER_MAILBOX = int(MAILBOX_SIZE // MESSAGE_SIZE)
 # etc)
 MESSAGES_PER_MAILBOX = SLOTS_PER_MAILBOX - 1
 
+# Extend message fields offsets.
+_SD_OFFSET = 5
+_VOLUME_OFFSET = _SD_OFFSET + PACKED_UUID_SIZE
+_SIZE_OFFSET = _VOLUME_OFFSET + PACKED_UUID_SIZE
+
 
 def checksum(string, numBytes):
     bits = 8 * numBytes
@@ -86,8 +95,71 @@ def runTask(args):
     ctask.prepare(cmd, *args)
 
 
-def _mboxExecCmd(*args, **kwargs):
-    return misc.execCmd(*args, **kwargs)
+def _read_mailbox(path, offset, size):
+    """
+    Read size bytes from mailbox file at offset using direct I/O, bypassing
+    the page cache, so we see the data written by other hosts.
+    """
+    with directio.open(path, "r") as f:
+        f.seek(offset)
+        data = f.read(size)
+    if len(data) != size:
+        raise IOError(errno.EIO, "Short read from mailbox %s offset=%d: "
+                      "read %d bytes instead of %d"
+                      % (path, offset, len(data), size))
+    return data
+
+
+def _write_mailbox(path, offset, data):
+    """
+    Write data to mailbox file at offset using direct I/O, so other hosts
+    see the data when we return.
+    """
+    with directio.open(path, "r+") as f:
+        f.seek(offset)
+        f.write(data)
+
+
+def _runs(numbers):
+    """
+    Return list of (first, last) tuples for every run of consecutive numbers
+    in sorted list numbers.
+    """
+    runs = []
+    for n in numbers:
+        if runs and runs[-1][1] == n - 1:
+            runs[-1] = (runs[-1][0], n)
+        else:
+            runs.append((n, n))
+    return runs
+
+
+class PollInterval(object):
+    """
+    Adaptive mailbox poll interval.
+
+    While messages are in flight, the mailbox is polled every minimum seconds.
+    When there is no activity, the interval is doubled after every poll, until
+    it reaches maximum seconds.
+    """
+
+    def __init__(self, maximum, minimum):
+        self._maximum = maximum
+        self._minimum = min(minimum, maximum)
+        self._current = maximum
+
+    def shorten(self):
+        self._current = self._minimum
+
+    def next(self):
+        value = self._current
+        self._current = min(self._current * 2, self._maximum)
+        return value
+
+
+def _poll_interval(monitor_interval):
+    min_interval = config.getfloat('irs', 'mailbox_min_interval')
+    return PollInterval(monitor_interval, min_interval)
 
 
 class SPM_Extend_Message:
@@ -112,6 +184,8 @@ class SPM_Extend_Message:
         self.pool = volumeData['poolID']
         self.volumeData = volumeData
         self.callback = callbackFunction
+        # Used to measure the extension latency when the reply is received.
+        self.created = monotonic_time()
 
         # Message structure is rigid (order must be kept and is relied upon):
         # Version (1 byte), OpCode (4 bytes), Domain UUID (16 bytes), Volume
@@ -146,40 +220,93 @@ class SPM_Extend_Message:
         #    raise RuntimeError('Request failed')
         return REPLY_OK
 
-    @classmethod
-    def processRequest(cls, pool, msgID, payload):
-        cls.log.debug("processRequest, payload:" + repr(payload))
-        sdOffset = 5
-        volumeOffset = sdOffset + PACKED_UUID_SIZE
-        sizeOffset = volumeOffset + PACKED_UUID_SIZE
+    @staticmethod
+    def domainKey(payload):
+        """
+        Return the packed domain UUID of an extend request, used to batch
+        requests for the same domain.
+        """
+        return payload[_SD_OFFSET:_SD_OFFSET + PACKED_UUID_SIZE]
 
+    @staticmethod
+    def parsePayload(poolID, payload):
         volume = {}
-        volume['poolID'] = pool.spUUID
+        volume['poolID'] = poolID
         volume['domainID'] = misc.unpackUuid(
-            payload[sdOffset:sdOffset + PACKED_UUID_SIZE])
+            payload[_SD_OFFSET:_SD_OFFSET + PACKED_UUID_SIZE])
         volume['volumeID'] = misc.unpackUuid(
-            payload[volumeOffset:volumeOffset + PACKED_UUID_SIZE])
-        size = int(payload[sizeOffset:sizeOffset + SIZE_CHARS], 16)
+            payload[_VOLUME_OFFSET:_VOLUME_OFFSET + PACKED_UUID_SIZE])
+        size = int(payload[_SIZE_OFFSET:_SIZE_OFFSET + SIZE_CHARS], 16)
+        return volume, size
 
-        cls.log.info("processRequest: extending volume %s "
-                     "in domain %s (pool %s) to size %d", volume['volumeID'],
-                     volume['domainID'], volume['poolID'], size)
+    @classmethod
+    def processRequests(cls, pool, requests):
+        """
+        Process a batch of extend requests for the same domain, found in a
+        single mailbox read.
 
-        msg = None
-        try:
+        Requests for the same volume are merged, extending the volume once to
+        the largest requested size. Volumes are extended serially in this
+        task, since extending volumes in the same domain is serialized by the
+        domain metadata lock. Replies for all requests are written to the
+        outbox at once.
+
+        Invalid requests are logged and skipped, without a reply, so they do
+        not affect the other requests in the batch.
+        """
+        start = monotonic_time()
+
+        # volumeID -> (volume, size, [msgID, ...])
+        pending = collections.OrderedDict()
+        for msgID, payload in requests:
+            cls.log.debug("processRequests, msgID: %s payload: %r",
+                          msgID, payload)
+            try:
+                volume, size = cls.parsePayload(pool.spUUID, payload)
+            except Exception:
+                cls.log.error("processRequests: Invalid request msgID: %s "
+                              "payload: %r", msgID, payload, exc_info=True)
+                continue
+            if volume['volumeID'] in pending:
+                _, pendingSize, msgIDs = pending[volume['volumeID']]
+                msgIDs.append(msgID)
+                size = max(size, pendingSize)
+            else:
+                msgIDs = [msgID]
+            pending[volume['volumeID']] = (volume, size, msgIDs)
+
+        replies = []
+        for volume, size, msgIDs in pending.values():
+            cls.log.info("processRequests: extending volume %s in domain %s "
+                         "(pool %s) to size %d", volume['volumeID'],
+                         volume['domainID'], volume['poolID'], size)
             try:
                 pool.extendVolume(volume['domainID'], volume['volumeID'], size)
                 msg = SPM_Extend_Message(volume, size)
-            except:
-                cls.log.error("processRequest: Exception caught while trying "
+            except Exception:
+                cls.log.error("processRequests: Exception caught while trying "
                               "to extend volume: %s in domain: %s",
                               volume['volumeID'], volume['domainID'],
                               exc_info=True)
                 msg = SPM_Extend_Message(volume, 0)
-        finally:
-            pool.spmMailer.sendReply(msgID, msg)
+            replies.extend((msgID, msg) for msgID in msgIDs)
+
+        if not replies:
             return {'status': {'code': 0, 'message': 'Done'}}
 
+        pool.spmMailer.sendReplies(replies)
+
+        elapsed = monotonic_time() - start
+        sdUUID = volume['domainID']
+        cls.log.info("processRequests: processed %d requests for %d volumes "
+                     "in domain %s in %.2f seconds", len(requests),
+                     len(pending), sdUUID, elapsed)
+        metrics.send({
+            "hosts.storage.%s.extend_batch_size" % sdUUID: len(requests),
+            "hosts.storage.%s.extend_batch_time" % sdUUID: elapsed,
+        })
+        return {'status': {'code': 0, 'message': 'Done'}}
+
 
 class HSM_Mailbox:
 
@@ -237,27 +364,15 @@ class HSM_MailMonitor(object):
         self._queue = queue
         self._activeMessages = {}
         self._monitorInterval = monitorInterval
+        self._interval = _poll_interval(monitorInterval)
         self._hostID = int(hostID)
         self._used_slots_array = [0] * MESSAGES_PER_MAILBOX
         self._outgoingMail = EMPTYMAILBOX
         self._incomingMail = EMPTYMAILBOX
         # TODO: add support for multiple paths (multiple mailboxes)
-        self._inCmd = [constants.EXT_DD,
-                       'if=' + str(inbox),
-                       'iflag=direct,fullblock',
-                       'bs=' + str(MAILBOX_SIZE),
-                       'count=1',
-                       'skip=' + str(self._hostID)
-                       ]
-        self._outCmd = [constants.EXT_DD,
-                        'of=' + str(outbox),
-                        'iflag=fullblock',
-                        'oflag=direct',
-                        'conv=notrunc',
-                        'bs=' + str(MAILBOX_SIZE),
-                        'count=1',
-                        'seek=' + str(self._hostID)
-                        ]
+        self._inbox = inbox
+        self._outbox = outbox
+        self._offset = self._hostID * MAILBOX_SIZE
         self._init = False
         self._initMailbox()  # Read initial mailbox state
         self._msgCounter = 0
@@ -268,14 +383,15 @@ class HSM_MailMonitor(object):
 
     def _initMailbox(self):
         # Sync initial incoming mail state with storage view
-        (rc, out, err) = _mboxExecCmd(self._inCmd, raw=True)
-        if rc == 0:
-            self._incomingMail = out
-            self._init = True
-        else:
+        try:
+            self._incomingMail = _read_mailbox(
+                self._inbox, self._offset, MAILBOX_SIZE)
+        except EnvironmentError as e:
             self.log.warning("HSM_MailboxMonitor - Could not initialize "
                              "mailbox, will not accept requests until init "
-                             "succeeds")
+                             "succeeds: %s", e)
+        else:
+            self._init = True
 
     def immStop(self):
         self._stop = True
@@ -337,6 +453,7 @@ class HSM_MailMonitor(object):
                                "%s", self._msgCounter, MESSAGES_PER_MAILBOX,
                                repr(newMsg))
                 msg.checkReply(newMsg)
+                self._reportLatency(msg)
                 if msg.callback:
                     try:
                         id = str(uuid.uuid4())
@@ -363,29 +480,35 @@ class HSM_MailMonitor(object):
         self._incomingMail = newMsgs
         return rc
 
+    def _reportLatency(self, msg):
+        latency = monotonic_time() - msg.created
+        self.log.info("HSM_MailMonitor - extend request for volume %s "
+                      "completed in %.2f seconds",
+                      msg.volumeData['volumeID'], latency)
+        metrics.send({
+            "hosts.storage.%s.extend_latency" % msg.volumeData['domainID']:
+                latency,
+        })
+
     def _checkForMail(self):
         # self.log.debug("HSM_MailMonitor - checking for mail")
-        # self.log.debug("Running command: " + str(self._inCmd))
-        (rc, in_mail, err) = misc.execCmd(self._inCmd, raw=True)
-        if rc:
-            raise RuntimeError("_handleResponses.Could not read mailbox - rc "
-                               "%s" % rc)
-        if (len(in_mail) != MAILBOX_SIZE):
-            raise RuntimeError("_handleResponses.Could not read mailbox - len "
-                               "%s != %s" % (len(in_mail), MAILBOX_SIZE))
+        in_mail = _read_mailbox(self._inbox, self._offset, MAILBOX_SIZE)
         # self.log.debug("Parsing inbox content: %s", in_mail)
         return self._handleResponses(in_mail)
 
     def _sendMail(self):
-        self.log.info("HSM_MailMonitor sending mail to SPM - " +
-                      str(self._outCmd))
+        self.log.info("HSM_MailMonitor sending mail to SPM - outbox=%s "
+                      "offset=%s", self._outbox, self._offset)
         chk = checksum(
             self._outgoingMail[0:MAILBOX_SIZE - CHECKSUM_BYTES],
             CHECKSUM_BYTES)
         pChk = struct.pack('<l', chk)  # Assumes CHECKSUM_BYTES equals 4!!!
         self._outgoingMail = \
             self._outgoingMail[0:MAILBOX_SIZE - CHECKSUM_BYTES] + pChk
-        _mboxExecCmd(self._outCmd, data=self._outgoingMail)
+        try:
+            _write_mailbox(self._outbox, self._offset, self._outgoingMail)
+        except EnvironmentError as e:
+            self.log.error("HSM_MailMonitor couldn't send mail to SPM: %s", e)
 
     def _handleMessage(self, message):
         # TODO: add support for multiple mailboxes
@@ -482,6 +605,8 @@ class HSM_MailMonitor(object):
 
                     if sendMail:
                         self._sendMail()
+                        # Poll quickly for the SPM reply.
+                        self._interval.shorten()
 
                     # If there are active messages waiting for SPM reply, wait
                     # a few seconds before performing another IO op
@@ -491,7 +616,7 @@ class HSM_MailMonitor(object):
                         if (failures > 9):
                             time.sleep(60)
                         else:
-                            time.sleep(self._monitorInterval)
+                            time.sleep(self._interval.next())
 
                 except:
                     self.log.error("HSM_MailboxMonitor - Incoming mail"
@@ -508,8 +633,16 @@ class SPM_MailMonitor:
 
     log = logging.getLogger('storage.MailBox.SpmMailMonitor')
 
-    def registerMessageType(self, messageType, callback):
-        self._messageTypes[messageType] = callback
+    def registerMessageType(self, messageType, callback, batchKey=None):
+        """
+        Register callback for handling requests of messageType.
+
+        If batchKey is None, callback(msgID, payload) is called for every
+        request. Otherwise new requests found in the same mailbox read are
+        grouped by batchKey(payload), and callback(requests) is called once
+        for every group, with a list of (msgID, payload) tuples.
+        """
+        self._messageTypes[messageType] = (callback, batchKey)
 
     def unregisterMessageType(self, messageType):
         del self._messageTypes[messageType]
@@ -543,31 +676,20 @@ class SPM_MailMonitor:
         self._numHosts = int(maxHostID)
         self._outMailLen = MAILBOX_SIZE * self._numHosts
         self._monitorInterval = monitorInterval
+        self._interval = _poll_interval(monitorInterval)
         # TODO: add support for multiple paths (multiple mailboxes)
         self._outgoingMail = self._outMailLen * b"\0"
         self._incomingMail = self._outgoingMail
-        self._inCmd = ['dd',
-                       'if=' + str(self._inbox),
-                       'iflag=direct,fullblock',
-                       'count=1'
-                       ]
-        self._outCmd = ['dd',
-                        'of=' + str(self._outbox),
-                        'oflag=direct',
-                        'iflag=fullblock',
-                        'conv=notrunc',
-                        'count=1'
-                        ]
         self._outLock = threading.Lock()
         self._inLock = threading.Lock()
         # Clear outgoing mail
-        self.log.debug("SPM_MailMonitor - clearing outgoing mail, command is: "
-                       "%s", self._outCmd)
-        cmd = self._outCmd + ['bs=' + str(self._outMailLen)]
-        (rc, out, err) = _mboxExecCmd(cmd, data=self._outgoingMail)
-        if rc:
-            self.log.warning("SPM_MailMonitor couldn't clear outgoing mail, "
-                             "dd failed")
+        self.log.debug("SPM_MailMonitor - clearing outgoing mail %s",
+                       self._outbox)
+        try:
+            _write_mailbox(self._outbox, 0, self._outgoingMail)
+        except EnvironmentError as e:
+            self.log.warning("SPM_MailMonitor couldn't clear outgoing mail: "
+                             "%s", e)
 
         self._thread = concurrent.thread(
             self._run, name="mailbox-spm", log=self.log)
@@ -610,6 +732,8 @@ class SPM_MailMonitor:
     def _handleRequests(self, newMail):
 
         send = False
+        # (msgType, key) -> [(msgID, payload), ...]
+        batches = collections.OrderedDict()
 
         # run through all messages and check if new messages have arrived
         # (since last read)
@@ -676,17 +800,17 @@ class SPM_MailMonitor:
                     if msgType in self._messageTypes:
                         # Use message class to process request according to
                         # message specific logic
-                        id = str(uuid.uuid4())
-                        self.log.debug("SPM_MailMonitor: processing request: "
-                                       "%s" % repr(newMail[
-                                           msgStart:msgStart + MESSAGE_SIZE]))
-                        res = self.tp.queueTask(
-                            id, runTask, (self._messageTypes[msgType], msgId,
-                                          newMail[msgStart:
-                                                  msgStart + MESSAGE_SIZE])
-                        )
-                        if not res:
-                            raise Exception()
+                        payload = newMail[msgStart:msgStart + MESSAGE_SIZE]
+                        callback, batchKey = self._messageTypes[msgType]
+                        if batchKey:
+                            key = (msgType, batchKey(payload))
+                            batches.setdefault(key, []).append(
+                                (msgId, payload))
+                        else:
+                            self._queueRequest((callback, msgId, payload))
+                        # Hosts send requests in bursts, poll quickly for
+                        # the next requests.
+                        self._interval.shorten()
                     else:
                         self.log.error("SPM_MailMonitor: unknown message type "
                                        "encountered: %s", msgType)
@@ -700,58 +824,69 @@ class SPM_MailMonitor:
                                    newMail[msgStart:msgStart + MESSAGE_SIZE],
                                    exc_info=True)
 
+        for (msgType, key), requests in six.iteritems(batches):
+            callback = self._messageTypes[msgType][0]
+            try:
+                self._queueRequest((callback, requests))
+            except:
+                self.log.error("SPM_MailMonitor: exception caught while "
+                               "handling %d %s messages", len(requests),
+                               msgType, exc_info=True)
+
         self._incomingMail = newMail
         return send
 
+    def _queueRequest(self, args):
+        id = str(uuid.uuid4())
+        self.log.debug("SPM_MailMonitor: processing request: %r", args[1:])
+        if not self.tp.queueTask(id, runTask, args):
+            raise RuntimeError("Cannot queue request")
+
     def _checkForMail(self):
         # Lock is acquired in order to make sure that
         # incomingMail is not changed during checkForMail
         with self._inLock:
             # self.log.debug("SPM_MailMonitor -_checking for mail")
-            cmd = self._inCmd + ['bs=' + str(self._outMailLen)]
-            # self.log.debug("SPM_MailMonitor - reading incoming mail, "
-            #               "command: " + str(cmd))
-            (rc, in_mail, err) = misc.execCmd(cmd, raw=True)
-            if rc:
-                raise IOError(errno.EIO, "_handleRequests._checkForMail - "
-                              "Could not read mailbox: %s" % self._inbox)
-
-            if (len(in_mail) != (self._outMailLen)):
-                self.log.error('SPM_MailMonitor: _checkForMail - dd succeeded '
-                               'but read %d bytes instead of %d, cannot check '
-                               'mail.  Read mail contains: %s', len(in_mail),
-                               self._outMailLen, repr(in_mail[:80]))
-                raise RuntimeError("_handleRequests._checkForMail - Could not "
-                                   "read mailbox")
+            in_mail = _read_mailbox(self._inbox, 0, self._outMailLen)
             # self.log.debug("Parsing inbox content: %s", in_mail)
             if self._handleRequests(in_mail):
                 with self._outLock:
-                    cmd = self._outCmd + ['bs=' + str(self._outMailLen)]
-                    (rc, out, err) = _mboxExecCmd(cmd,
-                                                  data=self._outgoingMail)
-                    if rc:
+                    try:
+                        _write_mailbox(self._outbox, 0, self._outgoingMail)
+                    except EnvironmentError as e:
                         self.log.warning("SPM_MailMonitor couldn't write "
-                                         "outgoing mail, dd failed")
+                                         "outgoing mail: %s", e)
 
     def sendReply(self, msgID, msg):
+        self.sendReplies([(msgID, msg)])
+
+    def sendReplies(self, replies):
+        """
+        Send replies, a list of (msgID, msg) tuples, writing every run of
+        consecutive modified mailboxes to storage in one write.
+        """
+        if not replies:
+            return
         # Lock is acquired in order to make sure that
         # outgoingMail is not changed while used
         with self._outLock:
-            msgOffset = msgID * MESSAGE_SIZE
-            self._outgoingMail = \
-                self._outgoingMail[0:msgOffset] + msg.payload + \
-                self._outgoingMail[msgOffset + MESSAGE_SIZE:self._outMailLen]
-            mailboxOffset = (msgID // SLOTS_PER_MAILBOX) * MAILBOX_SIZE
-            mailbox = self._outgoingMail[mailboxOffset:
-                                         mailboxOffset + MAILBOX_SIZE]
-            cmd = self._outCmd + ['bs=' + str(MAILBOX_SIZE),
-                                  'seek=' + str(mailboxOffset // MAILBOX_SIZE)]
-            # self.log.debug("Running command: %s, for message id: %s",
-            #               str(cmd), str(msgID))
-            (rc, out, err) = _mboxExecCmd(cmd, data=mailbox)
-            if rc:
-                self.log.error("SPM_MailMonitor: sendReply - couldn't send "
-                               "reply, dd failed")
+            for msgID, msg in replies:
+                msgOffset = msgID * MESSAGE_SIZE
+                self._outgoingMail = \
+                    self._outgoingMail[0:msgOffset] + msg.payload + \
+                    self._outgoingMail[msgOffset + MESSAGE_SIZE:
+                                       self._outMailLen]
+            mailboxes = sorted(set(msgID // SLOTS_PER_MAILBOX
+                                   for msgID, msg in replies))
+            for first, last in _runs(mailboxes):
+                start = first * MAILBOX_SIZE
+                end = (last + 1) * MAILBOX_SIZE
+                try:
+                    _write_mailbox(self._outbox, start,
+                                   self._outgoingMail[start:end])
+                except EnvironmentError as e:
+                    self.log.error("SPM_MailMonitor: sendReplies - couldn't "
+                                   "write mailboxes %d-%d: %s", first, last, e)
 
     def _run(self):
         try:
@@ -760,7 +895,7 @@ class SPM_MailMonitor:
                     self._checkForMail()
                 except:
                     self.log.error("Error checking for mail", exc_info=True)
-                time.sleep(self._monitorInterval)
+                time.sleep(self._interval.next())
         finally:
             self._stopped = True
             self.tp.joinAll(waitForTasks=False)
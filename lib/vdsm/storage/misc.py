@@ -18,11 +18,6 @@
 # Refer to the README and COPYING files for full details of the license
 #
 
-# FIXME: A lot of methods here use DD. A smart thing would be to wrap DD in a
-# method that does all the arg concatenation and stream handling once. Also
-# most method when they fail don't tell why even though DD is more then happy
-# to let you know. Exceptions thrown should contain DD's stderr output.
-
 """
 Various storage misc procedures
 """
@@ -46,20 +41,18 @@ from functools import wraps, partial
 from six.moves import map
 from six.moves import queue
 
-from vdsm import constants
 from vdsm.common import commands
 from vdsm.common import concurrent
 from vdsm.common import logutils
 from vdsm.common import proc
 
+from vdsm.storage import directio
 from vdsm.storage import exception as se
 from vdsm.storage.constants import BLOCK_SIZE
 
 IOUSER = "vdsm"
-DIRECTFLAG = "direct"
 STR_UUID_SIZE = 36
 UUID_HYPHENS = [8, 13, 18, 23]
-MEGA = 1 << 20
 UNLIMITED_THREADS = -1
 
 log = logging.getLogger('storage.Misc')
@@ -97,70 +90,17 @@ def readblock(name, offset, size):
     if (size % 512) or (offset % 512):
         raise se.MiscBlockReadException(name, offset, size)
 
-    left = size
-    ret = ""
-    baseoffset = offset
-
-    while left > 0:
-        (iounit, count, iooffset) = _alignData(left, offset)
-
-        cmd = [constants.EXT_DD, "iflag=%s" % DIRECTFLAG, "skip=%d" % iooffset,
-               "bs=%d" % iounit, "if=%s" % name, "count=%s" % count]
-
-        (rc, out, err) = execCmd(cmd, raw=True)
-        if rc:
-            raise se.MiscBlockReadException(name, offset, size)
-        if not validateDDBytes(err.splitlines(), iounit * count):
-            raise se.MiscBlockReadIncomplete(name, offset, size)
-
-        ret += out
-        left = left % iounit
-        offset = baseoffset + size - left
-    return ret
-
-
-def validateDDBytes(ddstderr, size):
-    log.debug("err: %s, size: %s" % (ddstderr, size))
     try:
-        size = int(size)
-    except (ValueError, ):
-        raise se.InvalidParameterException("size", str(size))
-
-    if len(ddstderr) != 3:
-        raise se.InvalidParameterException("len(ddstderr)", ddstderr)
-
-    try:
-        xferred = int(ddstderr[2].split()[0])
-    except (ValueError, ):
-        raise se.InvalidParameterException("ddstderr", ddstderr[2])
-
-    if xferred != size:
-        return False
-    return True
+        data = directio.pread(name, offset, size)
+    except EnvironmentError as e:
+        log.error("Error reading %s offset=%d size=%d: %s",
+                  name, offset, size, e)
+        raise se.MiscBlockReadException(name, offset, size)
 
+    if len(data) != size:
+        raise se.MiscBlockReadIncomplete(name, offset, size)
 
-def _alignData(length, offset):
-    iounit = MEGA
-    count = length
-    iooffset = offset
-
-    # Keep small IOps in single shot if possible
-    if (length < MEGA) and (offset % length == 0) and (length % 512 == 0):
-        # IO can be direct + single shot
-        count = 1
-        iounit = length
-        iooffset = offset / iounit
-        return (iounit, count, iooffset)
-
-    # Compute largest chunk possible up to 1M for IO
-    while iounit > 1:
-        if (length >= iounit) and (offset % iounit == 0):
-            count = length / iounit
-            iooffset = offset / iounit
-            break
-        iounit = iounit >> 1
-
-    return (iounit, count, iooffset)
+    return data
 
 
 def randomStr(strLen):
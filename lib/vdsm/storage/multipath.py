@@ -28,12 +28,14 @@ import errno
 from glob import glob
 import logging
 import re
+import threading
 from collections import namedtuple
 from contextlib import closing
 
 from vdsm import utils
 from vdsm.common import cmdutils
 from vdsm.common import commands
+from vdsm.common import concurrent
 from vdsm.common import supervdsm
 from vdsm.common import udevadm
 from vdsm.config import config
@@ -42,6 +44,7 @@ from vdsm.storage import hba
 from vdsm.storage import iscsi
 from vdsm.storage import managedvolumedb
 from vdsm.storage import misc
+from vdsm.storage import udev
 
 DEV_ISCSI = "iSCSI"
 DEV_FCP = "FCP"
@@ -51,6 +54,9 @@ QUEUE = "queue"
 
 TOXIC_CHARS = '()*+?|^$.\\'
 
+# Maximum number of threads used for collecting device info.
+MAX_WORKERS = 10
+
 log = logging.getLogger("storage.Multipath")
 
 _SCSI_ID = cmdutils.CommandPath("scsi_id",
@@ -93,15 +99,45 @@ def rescan():
     udevadm.settle(timeout)
 
 
-def resize_devices():
+def rescan_devices(guids):
+    """
+    Like rescan(), but rescan only the iSCSI sessions and FC hosts backing
+    the multipath devices guids.
+
+    Raises OSError if a device does not exist; in this case the caller
+    should use rescan() to discover the device.
+    """
+    sessions = set()
+    hosts = set()
+    for guid in guids:
+        for slave in devicemapper.getSlaves(devicemapper.getDmId(guid)):
+            if iscsi.devIsiSCSI(slave):
+                sessions.add(iscsi.getiScsiSession(slave))
+            else:
+                hosts.add("host" + getHBTL(slave).host)
+
+    if sessions:
+        iscsi.rescan_sessions(sessions)
+    if hosts:
+        hba.rescan_hosts(sorted(hosts))
+
+    timeout = config.getint('irs', 'udev_settle_timeout')
+    udevadm.settle(timeout)
+
+
+def resize_devices(guids=None):
     """
     This is needed in case a device has been increased on the storage server
     Resize multipath map if the underlying slaves are bigger than
     the map size.
     The slaves can be bigger if the LUN size has been increased on the storage
     server after the initial discovery.
+
+    If guids is specified, check only these devices.
     """
-    for dmId, guid in getMPDevsIter():
+    if guids is None:
+        guids = [guid for dmId, guid in getMPDevsIter()]
+    for guid in guids:
         try:
             _resize_if_needed(guid)
         except Exception:
@@ -199,6 +235,94 @@ def getScsiSerial(physdev):
                 return line.split("=")[1]
     return ""
 
+
+def getScsiSerials(physdevs):
+    """
+    Return a dict mapping physdev to scsi serial, running scsi_id for all
+    physdevs in parallel.
+    """
+    physdevs = list(physdevs)
+    serials = _parallel(getScsiSerial, physdevs)
+    return dict(zip(physdevs, serials))
+
+
+def _parallel(func, args, workers=MAX_WORKERS):
+    """
+    Like map(), calling func with every item of args using up to workers
+    threads. Returns the results in the order of args.
+
+    Raises the first error raised by func.
+    """
+    chunks = [args[i::workers] for i in range(min(workers, len(args)))]
+    results = concurrent.tmap(lambda chunk: [func(a) for a in chunk], chunks)
+    for r in results:
+        if not r.succeeded:
+            raise r.value
+    return [results[i % len(chunks)].value[i // len(chunks)]
+            for i in range(len(args))]
+
+
+class DeviceCache(udev.MultipathMonitor):
+    """
+    Cache static attributes of multipath devices.
+
+    Reading the serial, vendor, product and block sizes of a device requires
+    running scsi_id in supervdsm and reading several sysfs files for every
+    path, which is slow on hosts with hundreds of LUNs. The attributes do
+    not change while the device exists, so we read them once.
+
+    An entry is used only if the device has the same dm device and slaves,
+    so adding or removing paths invalidates the entry. Entries are removed
+    when udev reports that a multipath device was removed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._devices = {}
+
+    def get(self, guid, dm_id, slaves):
+        """
+        Return cached attributes of device guid, or None if the device is not
+        cached or its dm device or slaves have changed.
+        """
+        with self._lock:
+            entry = self._devices.get(guid)
+        if entry is None or entry[0] != (dm_id, tuple(slaves)):
+            return None
+        return entry[1]
+
+    def update(self, guid, dm_id, slaves, attributes):
+        with self._lock:
+            self._devices[guid] = ((dm_id, tuple(slaves)), attributes)
+
+    def invalidate(self, guid=None):
+        """
+        Remove device guid from the cache, or all devices if guid is None.
+        """
+        with self._lock:
+            if guid is None:
+                self._devices.clear()
+            else:
+                self._devices.pop(guid, None)
+
+    # udev.MultipathMonitor interface
+
+    def start(self):
+        # We may have missed events while not monitoring.
+        self.invalidate()
+
+    def handle(self, event):
+        if event.type == udev.MPATH_REMOVED:
+            log.debug("Removing multipath device %r from cache",
+                      event.mpath_uuid)
+            self.invalidate(event.mpath_uuid)
+
+    def stop(self):
+        self.invalidate()
+
+
+device_cache = DeviceCache()
+
 HBTL = namedtuple("HBTL", "host bus target lun")
 
 
@@ -226,132 +350,184 @@ def getHBTL(physdev):
 
 
 def pathListIter(filterGuids=()):
-    filterLen = len(filterGuids) if filterGuids else -1
-    devsFound = 0
+    devices = []
+    for dmId, guid in getMPDevsIter():
+        if filterGuids:
+            if len(devices) == len(filterGuids):
+                break
+            if guid not in filterGuids:
+                continue
+        devices.append((dmId, guid, devicemapper.getSlaves(dmId)))
+
+    pathStatuses = devicemapper.getPathsStatus()
+
+    cached = {}
+    missing = []
+    for dmId, guid, slaves in devices:
+        attributes = device_cache.get(guid, dmId, slaves)
+        if attributes is None:
+            missing.append(dmId)
+        else:
+            cached[guid] = attributes
+
+    # Get serials of all uncached devices in one supervdsm call.
+    serials = {}
+    if missing:
+        serials = supervdsm.getProxy().getScsiSerials(missing)
 
     knownSessions = {}
 
-    svdsm = supervdsm.getProxy()
-    pathStatuses = devicemapper.getPathsStatus()
+    def deviceInfo(device):
+        dmId, guid, slaves = device
+        attributes = cached.get(guid)
+        if attributes is None:
+            attributes = _readDeviceAttributes(guid, dmId, slaves,
+                                               serials.get(dmId, ""))
+        return _deviceInfo(dmId, guid, slaves, attributes, pathStatuses,
+                           knownSessions)
 
-    for dmId, guid in getMPDevsIter():
-        if devsFound == filterLen:
-            break
+    for devInfo in _parallel(deviceInfo, devices):
+        yield devInfo
 
-        if filterGuids and guid not in filterGuids:
-            continue
 
-        devsFound += 1
-
-        devInfo = {
-            "guid": guid,
-            "dm": dmId,
-            "capacity": str(getDeviceSize(dmId)),
-            "serial": svdsm.getScsiSerial(dmId),
-            "paths": [],
-            "connections": [],
-            "devtypes": [],
-            "devtype": "",
-            "vendor": "",
-            "product": "",
-            "fwrev": "",
-            "logicalblocksize": "",
-            "physicalblocksize": "",
-            "discard_max_bytes": getDeviceDiscardMaxBytes(dmId),
-        }
-
-        for slave in devicemapper.getSlaves(dmId):
-            if not devicemapper.isBlockDevice(slave):
-                log.warning("No such physdev '%s' is ignored" % slave)
-                continue
+def _readDeviceAttributes(guid, dmId, slaves, serial):
+    """
+    Read device static attributes from the first slave providing them. If
+    all attributes were read, the attributes are cached. serial is empty if
+    scsi_id failed, and then the attributes are not cached, so we read the
+    serial again on the next call.
+    """
+    attributes = {
+        "serial": serial,
+        "vendor": "",
+        "product": "",
+        "fwrev": "",
+        "logicalblocksize": "",
+        "physicalblocksize": "",
+    }
+    complete = bool(serial)
+
+    for slave in slaves:
+        if not devicemapper.isBlockDevice(slave):
+            continue
 
-            if not devInfo["vendor"]:
-                try:
-                    devInfo["vendor"] = getVendor(slave)
-                except Exception:
-                    log.warn("Problem getting vendor from device `%s`",
-                             slave, exc_info=True)
-
-            if not devInfo["product"]:
-                try:
-                    devInfo["product"] = getModel(slave)
-                except Exception:
-                    log.warn("Problem getting model name from device `%s`",
-                             slave, exc_info=True)
-
-            if not devInfo["fwrev"]:
-                try:
-                    devInfo["fwrev"] = getFwRev(slave)
-                except Exception:
-                    log.warn("Problem getting fwrev from device `%s`",
-                             slave, exc_info=True)
-
-            if (not devInfo["logicalblocksize"] or
-                    not devInfo["physicalblocksize"]):
-                try:
-                    logBlkSize, phyBlkSize = getDeviceBlockSizes(slave)
-                    devInfo["logicalblocksize"] = str(logBlkSize)
-                    devInfo["physicalblocksize"] = str(phyBlkSize)
-                except Exception:
-                    log.warn("Problem getting blocksize from device `%s`",
-                             slave, exc_info=True)
-
-            pathInfo = {}
-            pathInfo["physdev"] = slave
-            pathInfo["state"] = pathStatuses.get(slave, "failed")
-            pathInfo["capacity"] = str(getDeviceSize(slave))
+        if not attributes["vendor"]:
             try:
-                hbtl = getHBTL(slave)
-            except OSError as e:
-                if e.errno == errno.ENOENT:
-                    log.warn("Device has no hbtl: %s", slave)
-                    pathInfo["lun"] = 0
-                else:
-                    log.error("Error: %s while trying to get hbtl of device: "
-                              "%s", str(e.message), slave)
-                    raise
-            else:
-                pathInfo["lun"] = hbtl.lun
-
-            if iscsi.devIsiSCSI(slave):
-                devInfo["devtypes"].append(DEV_ISCSI)
-                pathInfo["type"] = DEV_ISCSI
-                sessionID = iscsi.getiScsiSession(slave)
-                if sessionID not in knownSessions:
-                    # FIXME: This entire part is for BC. It should be moved to
-                    # hsm and not preserved for new APIs. New APIs should keep
-                    # numeric types and sane field names.
-                    sess = iscsi.getSessionInfo(sessionID)
-                    sessionInfo = {
-                        "connection": sess.target.portal.hostname,
-                        "port": str(sess.target.portal.port),
-                        "iqn": sess.target.iqn,
-                        "portal": str(sess.target.tpgt),
-                        "initiatorname": sess.iface.name
-                    }
-
-                    # Note that credentials must be sent back in order for
-                    # the engine to tell vdsm how to reconnect later
-                    if sess.credentials:
-                        cred = sess.credentials
-                        sessionInfo['user'] = cred.username
-                        sessionInfo['password'] = cred.password
-
-                    knownSessions[sessionID] = sessionInfo
-                devInfo["connections"].append(knownSessions[sessionID])
-            else:
-                devInfo["devtypes"].append(DEV_FCP)
-                pathInfo["type"] = DEV_FCP
+                attributes["vendor"] = getVendor(slave)
+            except Exception:
+                complete = False
+                log.warn("Problem getting vendor from device `%s`",
+                         slave, exc_info=True)
 
-            if devInfo["devtype"] == "":
-                devInfo["devtype"] = pathInfo["type"]
-            elif (devInfo["devtype"] != DEV_MIXED and
-                  devInfo["devtype"] != pathInfo["type"]):
-                devInfo["devtype"] == DEV_MIXED
+        if not attributes["product"]:
+            try:
+                attributes["product"] = getModel(slave)
+            except Exception:
+                complete = False
+                log.warn("Problem getting model name from device `%s`",
+                         slave, exc_info=True)
 
-            devInfo["paths"].append(pathInfo)
+        if not attributes["fwrev"]:
+            try:
+                attributes["fwrev"] = getFwRev(slave)
+            except Exception:
+                complete = False
+                log.warn("Problem getting fwrev from device `%s`",
+                         slave, exc_info=True)
+
+        if (not attributes["logicalblocksize"] or
+                not attributes["physicalblocksize"]):
+            try:
+                logBlkSize, phyBlkSize = getDeviceBlockSizes(slave)
+                attributes["logicalblocksize"] = str(logBlkSize)
+                attributes["physicalblocksize"] = str(phyBlkSize)
+            except Exception:
+                complete = False
+                log.warn("Problem getting blocksize from device `%s`",
+                         slave, exc_info=True)
+
+    if complete and attributes["vendor"]:
+        device_cache.update(guid, dmId, slaves, attributes)
+
+    return attributes
+
+
+def _deviceInfo(dmId, guid, slaves, attributes, pathStatuses, knownSessions):
+    devInfo = {
+        "guid": guid,
+        "dm": dmId,
+        "capacity": str(getDeviceSize(dmId)),
+        "paths": [],
+        "connections": [],
+        "devtypes": [],
+        "devtype": "",
+        "discard_max_bytes": getDeviceDiscardMaxBytes(dmId),
+    }
+    devInfo.update(attributes)
+
+    for slave in slaves:
+        if not devicemapper.isBlockDevice(slave):
+            log.warning("No such physdev '%s' is ignored" % slave)
+            continue
 
-        yield devInfo
+        pathInfo = {}
+        pathInfo["physdev"] = slave
+        pathInfo["state"] = pathStatuses.get(slave, "failed")
+        pathInfo["capacity"] = str(getDeviceSize(slave))
+        try:
+            hbtl = getHBTL(slave)
+        except OSError as e:
+            if e.errno == errno.ENOENT:
+                log.warn("Device has no hbtl: %s", slave)
+                pathInfo["lun"] = 0
+            else:
+                log.error("Error: %s while trying to get hbtl of device: "
+                          "%s", str(e.message), slave)
+                raise
+        else:
+            pathInfo["lun"] = hbtl.lun
+
+        if iscsi.devIsiSCSI(slave):
+            devInfo["devtypes"].append(DEV_ISCSI)
+            pathInfo["type"] = DEV_ISCSI
+            sessionID = iscsi.getiScsiSession(slave)
+            # Devices are collected in multiple threads, so we may read the
+            # same session more than once; this is harmless.
+            if sessionID not in knownSessions:
+                # FIXME: This entire part is for BC. It should be moved to
+                # hsm and not preserved for new APIs. New APIs should keep
+                # numeric types and sane field names.
+                sess = iscsi.getSessionInfo(sessionID)
+                sessionInfo = {
+                    "connection": sess.target.portal.hostname,
+                    "port": str(sess.target.portal.port),
+                    "iqn": sess.target.iqn,
+                    "portal": str(sess.target.tpgt),
+                    "initiatorname": sess.iface.name
+                }
+
+                # Note that credentials must be sent back in order for
+                # the engine to tell vdsm how to reconnect later
+                if sess.credentials:
+                    cred = sess.credentials
+                    sessionInfo['user'] = cred.username
+                    sessionInfo['password'] = cred.password
+
+                knownSessions[sessionID] = sessionInfo
+            devInfo["connections"].append(knownSessions[sessionID])
+        else:
+            devInfo["devtypes"].append(DEV_FCP)
+            pathInfo["type"] = DEV_FCP
+
+        if devInfo["devtype"] == "":
+            devInfo["devtype"] = pathInfo["type"]
+        elif (devInfo["devtype"] != DEV_MIXED and
+              devInfo["devtype"] != pathInfo["type"]):
+            devInfo["devtype"] == DEV_MIXED
+
+        devInfo["paths"].append(pathInfo)
+
+    return devInfo
 
 
 TOXIC_REGEX = re.compile(r"[%s]" % re.sub(r"[\-\\\]]",
@@ -331,6 +331,9 @@ class StorageDomainManifest(object):
         self.replaceMetadata(metadata)
         self._domainLock = self._makeDomainLock()
         self._external_leases_lock = rwlock.RWLock()
+        # Long lived external leases volume, see external_leases_volume().
+        self._external_leases_volume = None
+        self._external_leases_volume_lock = threading.Lock()
 
     @classmethod
     def special_volumes(cls, version):
@@ -460,6 +463,27 @@ class StorageDomainManifest(object):
         return self.getVolumeClass()(self.mountpoint, self.sdUUID, imgUUID,
                                      volUUID)
 
+    def get_volumes_metadata(self):
+        """
+        Return dict {vol_id: VolumeMetadata} of all volumes in the domain.
+        Volumes with invalid metadata are logged and skipped.
+
+        This implementation reads the metadata of every volume separately.
+        Domains that can read the metadata of all volumes at once should
+        override it.
+        """
+        volumes = {}
+        for vol_id, (img_ids, _) in six.iteritems(self.getAllVolumes()):
+            # The first img_id is the id of the template or the only image
+            # where the volume id appears.
+            vol = self.produceVolume(img_ids[0], vol_id)
+            try:
+                volumes[vol_id] = vol.getMetadata()
+            except (se.StorageException, ValueError) as e:
+                self.log.warning("Cannot read metadata for volume %s/%s: %s",
+                                 self.sdUUID, vol_id, e)
+        return volumes
+
     def isISO(self):
         return self.getMetaParam(DMDK_CLASS) == ISO_DOMAIN
 
@@ -584,6 +608,13 @@ class StorageDomainManifest(object):
     def refresh(self):
         pass
 
+    def refreshImageVolumes(self, imgUUID):
+        """
+        Called before looking up the volumes of image imgUUID, which may have
+        been modified by another host. Domains caching their volumes should
+        revalidate the image here.
+        """
+
     @classmethod
     def validateCreateVolumeParams(cls, volFormat, srcVolUUID, diskType=None,
                                    preallocate=None):
@@ -664,11 +695,30 @@ class StorageDomainManifest(object):
 
         The caller is responsible for holding the external_leases_lock in the
         correct mode.
+
+        The volume index is cached, and refreshed from storage when the volume
+        is used again. Since the index is not thread safe, only one caller can
+        use the volume at the same time.
         """
         path = self.external_leases_path()
         with self.external_leases_backend(self.sdUUID, path) as backend:
-            vol = xlease.LeasesVolume(backend)
-            with utils.closing(vol):
+            with self._external_leases_volume_lock:
+                vol = self._external_leases_volume
+                self._external_leases_volume = None
+                if vol is not None and vol.path == path:
+                    try:
+                        vol.refresh(backend)
+                    except:
+                        vol.close()
+                        raise
+                else:
+                    if vol is not None:
+                        vol.close()
+                    vol = xlease.LeasesVolume(backend)
+                # Changes are written to the index only after they were
+                # written to storage, so the volume is usable after failed
+                # operations.
+                self._external_leases_volume = vol
                 yield vol
 
     def lease_info(self, lease_id):
@@ -748,6 +798,44 @@ class StorageDomain(object):
     def getAllVolumes(self):
         return self._manifest.getAllVolumes()
 
+    def get_volumes_metadata(self):
+        return self._manifest.get_volumes_metadata()
+
+    def dump_volumes(self):
+        """
+        Return dict {vol_id: info} with the metadata and size of all volumes
+        in the domain.
+
+        info["imgs"] is the list of images using the volume. A template
+        volume is used by the template image (first) and by all images based
+        on the template.
+        """
+        all_volumes = self.getAllVolumes()
+        volumes = {}
+        for vol_id, md in six.iteritems(self.get_volumes_metadata()):
+            info = md.dump()
+            info["uuid"] = vol_id
+            if vol_id in all_volumes:
+                info["imgs"] = list(all_volumes[vol_id].imgs)
+            else:
+                info["imgs"] = [md.image]
+            try:
+                info["apparentsize"] = self.getVSize(md.image, vol_id)
+                info["truesize"] = self.getVAllocSize(md.image, vol_id)
+            except (se.StorageException, EnvironmentError) as e:
+                self.log.warning("Cannot get size of volume %s/%s: %s",
+                                 self.sdUUID, vol_id, e)
+                info["apparentsize"] = 0
+                info["truesize"] = 0
+                info["status"] = "INVALID"
+            else:
+                info["status"] = "OK"
+            # Like Volume.getInfo(), report illegal volumes status as illegal.
+            if md.legality == sc.ILLEGAL_VOL:
+                info["status"] = sc.ILLEGAL_VOL
+            volumes[vol_id] = info
+        return volumes
+
     def iter_volumes(self):
         """
         Iterate over all volumes.
@@ -1187,6 +1275,9 @@ class StorageDomain(object):
     def refresh(self):
         self._manifest.refresh()
 
+    def refreshImageVolumes(self, imgUUID):
+        self._manifest.refreshImageVolumes(imgUUID)
+
     def extend(self, devlist, force):
         pass
 
@@ -25,6 +25,7 @@ for keeping storage related data that is expensive to harvest, but needed often
 from __future__ import absolute_import
 
 import logging
+import os
 import threading
 
 from vdsm.storage import constants as sc
@@ -91,6 +92,37 @@ class StorageDomainCache:
             if self.__staleStatus == self.STORAGE_REFRESHING:
                 self.__staleStatus = self.STORAGE_UPDATED
 
+    def refreshDomainStorage(self, sdUUID):
+        """
+        Refresh only the storage backing block domain sdUUID: rescan the
+        iSCSI sessions and FC hosts used by the domain PVs, resize their
+        multipath devices, and invalidate only the domain VG.
+
+        This is much cheaper than refreshStorage(), and does not block other
+        threads looking up other domains.
+
+        Returns True if the domain storage was refreshed, False if the
+        domain is not a known block domain, or refreshing its storage
+        failed. In this case refreshStorage() should be used.
+        """
+        pvNames = lvm.getCachedPVNames(sdUUID)
+        if not pvNames:
+            return False
+
+        guids = [os.path.basename(pvName) for pvName in pvNames]
+        self.log.info("Refreshing storage for domain %s (guids=%s)",
+                      sdUUID, guids)
+        try:
+            multipath.rescan_devices(guids)
+            multipath.resize_devices(guids)
+        except Exception:
+            self.log.exception("Error refreshing storage for domain %s",
+                               sdUUID)
+            return False
+
+        lvm.invalidateVG(sdUUID, invalidatePVs=True)
+        return True
+
     def produce_manifest(self, sdUUID):
         """
         Return a StorageDomainManifest for sdUUID. New code must use this, as
@@ -125,13 +157,10 @@ class StorageDomainCache:
                 self._syncroot.wait()
 
         try:
-            # If multiple calls reach this point and the storage is not
-            # updated the refreshStorage() sampling method is called
-            # serializing (and eventually grouping) the requests.
             if self.__staleStatus != self.STORAGE_UPDATED:
-                self.refreshStorage()
-
-            domain = self._findDomain(sdUUID)
+                domain = self._findStaleDomain(sdUUID)
+            else:
+                domain = self._findDomain(sdUUID)
 
             with self._syncroot:
                 self.__domainCache[sdUUID] = domain
@@ -142,6 +171,24 @@ class StorageDomainCache:
                 self.__inProgress.remove(sdUUID)
                 self._syncroot.notifyAll()
 
+    def _findStaleDomain(self, sdUUID):
+        """
+        Find a domain when the storage is stale, refreshing only the domain
+        storage if possible.
+        """
+        if self.refreshDomainStorage(sdUUID):
+            try:
+                return self._findDomain(sdUUID)
+            except se.StorageDomainDoesNotExist:
+                self.log.info("Domain %s not found after refreshing its "
+                              "storage, refreshing all storage", sdUUID)
+
+        # If multiple calls reach this point the refreshStorage() sampling
+        # method is called serializing (and eventually grouping) the
+        # requests.
+        self.refreshStorage()
+        return self._findDomain(sdUUID)
+
     def _findDomain(self, sdUUID):
         try:
             findMethod = self.knownSDs[sdUUID]
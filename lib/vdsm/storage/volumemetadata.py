@@ -216,6 +216,25 @@ class VolumeMetadata(object):
             raise exception.MetadataOverflowError(data)
         return data
 
+    def dump(self):
+        """
+        Return metadata as a dict, using the keys of Volume.getInfo().
+        """
+        return {
+            "capacity": self.capacity,
+            "ctime": self.ctime,
+            "description": self.description,
+            "disktype": self.disktype,
+            "domain": self.domain,
+            "format": self.format,
+            "generation": self.generation,
+            "image": self.image,
+            "legality": self.legality,
+            "parent": self.puuid,
+            "type": self.type,
+            "voltype": self.voltype,
+        }
+
     # Three defs below allow us to imitate a dictionary
     # So intstead of providing a method to return a dictionary
     # with values, we return self and mimick dict behaviour.
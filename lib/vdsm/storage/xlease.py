@@ -499,9 +499,10 @@ class LeasesVolume(object):
     the index keeping volume metadata and the mapping from lease id to leased
     offset.
 
-    The index is read when creating an instance, and ever read again. To read
-    the data from storage, recreated the index. Changes to the instance are
-    written immediately to storage.
+    The index is read when creating an instance. A long lived instance can be
+    reused for another operation by calling refresh(), reading from storage
+    only the parts of the index that may have changed. Changes to the instance
+    are written immediately to storage.
     """
 
     def __init__(self, file):
@@ -516,6 +517,9 @@ class LeasesVolume(object):
         except:
             self._index.close()
             raise
+        # True if the records may have been modified on storage since the
+        # index was loaded.
+        self._stale = False
         log.debug("Loaded %s", self._md)
 
     @property
@@ -534,6 +538,37 @@ class LeasesVolume(object):
     def mtime(self):
         return self._md.mtime
 
+    def refresh(self, file):
+        """
+        Prepare the volume for another operation, using file for I/O.
+
+        If the index was formatted or rebuilt since it was loaded, the index
+        metadata mtime has changed, and the entire index is loaded again.
+
+        Adding or removing leases on another host does not modify the index
+        metadata, so the records in the index may be stale. Records found in
+        the index are verified with storage before they are used, and the
+        index is reloaded when a lease is not found in the index.
+
+        Raises:
+        - IndexIsUpdating if the index is updating
+        - InvalidMetadata if the index metadata is invalid
+        - OSError if I/O operation failed
+        """
+        self._file = file
+        md = read_metadata(file)
+        if md.updating:
+            raise IndexIsUpdating(md)
+
+        if md.bytes() != self._md.bytes():
+            log.debug("Index metadata changed from %s to %s, loading index",
+                      self._md, md)
+            self._index.load(file)
+            self._md = self._index.read_metadata()
+            self._stale = False
+        else:
+            self._stale = True
+
     def lookup(self, lease_id):
         """
         Lookup lease by lease_id and return LeaseInfo if found.
@@ -545,7 +580,7 @@ class LeasesVolume(object):
         """
         log.debug("Looking up lease %r in lockspace %r",
                   lease_id, self.lockspace)
-        recnum = self._index.find_record(lease_id)
+        recnum = self._find_record(lease_id)
         if recnum == -1:
             raise se.NoSuchLease(lease_id)
 
@@ -569,7 +604,7 @@ class LeasesVolume(object):
         """
         log.info("Adding lease %r in lockspace %r",
                  lease_id, self.lockspace)
-        recnum = self._index.find_record(lease_id)
+        recnum = self._find_record(lease_id)
         if recnum != -1:
             record = self._index.read_record(recnum)
             if record.updating:
@@ -605,7 +640,7 @@ class LeasesVolume(object):
         """
         log.info("Removing lease %r in lockspace %r",
                  lease_id, self.lockspace)
-        recnum = self._index.find_record(lease_id)
+        recnum = self._find_record(lease_id)
         if recnum == -1:
             raise se.NoSuchLease(lease_id)
 
@@ -625,6 +660,8 @@ class LeasesVolume(object):
         Return all leases in the index
         """
         log.debug("Getting all leases for lockspace %r", self.lockspace)
+        if self._stale:
+            self._reload()
         leases = {}
         for recnum in range(MAX_RECORDS):
             # TODO: handle bad records - currently will raise InvalidRecord and
@@ -644,6 +681,38 @@ class LeasesVolume(object):
         log.debug("Closing index for lockspace %r", self.lockspace)
         self._index.close()
 
+    def _find_record(self, lease_id):
+        """
+        Find lease_id record, verifying stale records with storage. Returns
+        record number if found, -1 otherwise.
+        """
+        recnum = self._index.find_record(lease_id)
+        if not self._stale:
+            return recnum
+
+        if recnum != -1:
+            # Reading the record block is enough to verify that the lease was
+            # not removed by another host.
+            self._index.reload_block(self._file, recnum)
+            if self._index.find_record(lease_id) == recnum:
+                return recnum
+
+        # The lease may have been added or moved by another host.
+        self._reload()
+        return self._index.find_record(lease_id)
+
+    def _reload(self):
+        """
+        Reload the parts of the index modified on storage.
+        """
+        log.debug("Reloading index for lockspace %r", self.lockspace)
+        self._index.reload(self._file)
+        md = self._index.read_metadata()
+        if md.updating:
+            raise IndexIsUpdating(md)
+        self._md = md
+        self._stale = False
+
     def _write_record(self, recnum, record):
         """
         Write record recnum to storage atomically.
@@ -743,6 +812,24 @@ def read_resource(path, offset):
     return ResourceInfo(res["lockspace"], res["resource"], res["version"])
 
 
+def read_metadata(file):
+    """
+    Read index metadata block from storage.
+
+    Returns: IndexMetadata
+    Raises:
+    - TruncatedIndex if the metadata block could not be read
+    - InvalidMetadata if the metadata block is invalid
+    - OSError if I/O operation failed
+    """
+    buf = mmap.mmap(-1, METADATA_SIZE, mmap.MAP_SHARED)
+    with utils.closing(buf, log=log.name):
+        nread = file.pread(INDEX_BASE, buf)
+        if nread < METADATA_SIZE:
+            raise TruncatedIndex(METADATA_SIZE, nread)
+        return IndexMetadata.fromebytes(buf[:])
+
+
 def lease_offset(recnum):
     return USER_RESOURCE_BASE + (recnum * SLOT_SIZE)
 
@@ -751,36 +838,34 @@ class VolumeIndex(object):
     """
     Index maintaining volume metadata and the mapping from lease id to lease
     offset.
+
+    The records are indexed in memory when they are loaded or written, keeping
+    a dict mapping lease id to record number, and a bitmap of free records.
     """
 
     def __init__(self):
         self._buf = mmap.mmap(-1, INDEX_SIZE, mmap.MAP_SHARED)
+        self._empty = EMPTY_RECORD.bytes()
+        # Lease id (bytes) of every record, None for records without a lease.
+        self._keys = [None] * MAX_RECORDS
+        # Mapping from lease id (bytes) to the first record using it.
+        self._records = {}
+        # Byte per record, 1 if the record is free.
+        self._free = bytearray(MAX_RECORDS)
 
     def find_record(self, lease_id):
         """
         Search for lease_id record. Returns record number if found, -1
         otherwise.
         """
-        prefix = LOOKUP_STRUCT.pack(lease_id.encode("ascii"))
-
-        # TODO: continue search if offset is not aligned to record size.
-        offset = self._buf.find(prefix, RECORD_BASE)
-        if offset == -1:
-            return -1
-
-        return self._record_number(offset)
+        return self._records.get(lease_id.encode("ascii"), -1)
 
     def find_free_record(self):
         """
         Find the first free record. Returns record number if found, -1
         otherwise.
         """
-        # TODO: continue search if offset is not aligned to record size.
-        offset = self._buf.find(EMPTY_RECORD.bytes(), RECORD_BASE)
-        if offset == -1:
-            return -1
-
-        return self._record_number(offset)
+        return self._free.find(b"\x01")
 
     def read_record(self, recnum):
         """
@@ -800,8 +885,10 @@ class VolumeIndex(object):
         storage.
         """
         offset = self._record_offset(recnum)
+        data = record.bytes()
         self._buf.seek(offset)
-        self._buf.write(record.bytes())
+        self._buf.write(data)
+        self._update_record(recnum, data)
 
     def read_metadata(self):
         """
@@ -830,9 +917,41 @@ class VolumeIndex(object):
         """
         Read index from file, replacing current contents of the index.
         """
+        # On python 2 pread() writes at the current position of the buffer,
+        # which was moved by the previous load.
+        self._buf.seek(0)
         nread = file.pread(INDEX_BASE, self._buf)
         if nread < len(self._buf):
             raise TruncatedIndex(len(self._buf), nread)
+        self._update_records(0, MAX_RECORDS)
+
+    def reload(self, file):
+        """
+        Read index from file, updating only the blocks modified on storage
+        since the index was loaded.
+        """
+        buf = mmap.mmap(-1, INDEX_SIZE, mmap.MAP_SHARED)
+        with utils.closing(buf, log=log.name):
+            nread = file.pread(INDEX_BASE, buf)
+            if nread < len(buf):
+                raise TruncatedIndex(len(buf), nread)
+            for start in range(0, INDEX_SIZE, BLOCK_SIZE):
+                end = min(start + BLOCK_SIZE, INDEX_SIZE)
+                if buf[start:end] != self._buf[start:end]:
+                    self._replace_block(start, buf[start:end])
+
+    def reload_block(self, file, recnum):
+        """
+        Read the block containing record recnum from file.
+        """
+        start = self._block_offset(recnum)
+        end = min(start + BLOCK_SIZE, INDEX_SIZE)
+        buf = mmap.mmap(-1, BLOCK_SIZE, mmap.MAP_SHARED)
+        with utils.closing(buf, log=log.name):
+            nread = file.pread(INDEX_BASE + start, buf)
+            if nread < end - start:
+                raise TruncatedIndex(end - start, nread)
+            self._replace_block(start, buf[:end - start])
 
     def dump(self, file):
         """
@@ -843,9 +962,7 @@ class VolumeIndex(object):
         file.pwrite(INDEX_BASE, self._buf)
 
     def copy_record_block(self, recnum):
-        offset = self._record_offset(recnum)
-        block_start = offset - (offset % BLOCK_SIZE)
-        return ChangeBlock(self._buf, block_start)
+        return ChangeBlock(self._buf, self._block_offset(recnum))
 
     @contextmanager
     def updating(self, lockspace, file):
@@ -879,6 +996,51 @@ class VolumeIndex(object):
     def _record_number(self, offset):
         return (offset - RECORD_BASE) // RECORD_SIZE
 
+    def _block_offset(self, recnum):
+        offset = self._record_offset(recnum)
+        return offset - (offset % BLOCK_SIZE)
+
+    def _replace_block(self, start, data):
+        """
+        Replace the block at offset start with data, updating the records in
+        this block.
+        """
+        self._buf[start:start + len(data)] = data
+        first = max(self._record_number(start), 0)
+        last = min(self._record_number(start + len(data)), MAX_RECORDS)
+        self._update_records(first, last)
+
+    def _update_records(self, first, last):
+        for recnum in range(first, last):
+            offset = self._record_offset(recnum)
+            self._update_record(recnum, self._buf[offset:offset + RECORD_SIZE])
+
+    def _update_record(self, recnum, data):
+        """
+        Update the in-memory index for record recnum containing data.
+        """
+        self._free[recnum] = 1 if data == self._empty else 0
+
+        key = data[:LOOKUP_STRUCT.size - 1].rstrip(b"\0") or None
+        old_key = self._keys[recnum]
+        if key == old_key:
+            return
+
+        self._keys[recnum] = key
+
+        if old_key is not None and self._records.get(old_key) == recnum:
+            # Like searching the index buffer, the first record with this
+            # lease id is used.
+            try:
+                self._records[old_key] = self._keys.index(old_key)
+            except ValueError:
+                del self._records[old_key]
+
+        if key is not None:
+            current = self._records.get(key, -1)
+            if current == -1 or recnum < current:
+                self._records[key] = recnum
+
 
 class ChangeBlock(object):
     """
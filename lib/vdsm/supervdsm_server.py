@@ -71,6 +71,7 @@ from vdsm.common.supervdsm import _SuperVdsmManager
 from vdsm.network.initializer import init_privileged_network_components
 
 from vdsm.storage.multipath import getScsiSerial as _getScsiSerial
+from vdsm.storage.multipath import getScsiSerials as _getScsiSerials
 from vdsm.storage import multipath
 from vdsm.config import config
 
@@ -136,6 +137,10 @@ class _SuperVdsm(object):
     def getScsiSerial(self, *args, **kwargs):
         return _getScsiSerial(*args, **kwargs)
 
+    @logDecorator
+    def getScsiSerials(self, physdevs):
+        return _getScsiSerials(physdevs)
+
     @logDecorator
     def mount(self, fs_spec, fs_file, mntOpts=None, vfstype=None,
               cgroup=None):
@@ -233,8 +238,8 @@ class _SuperVdsm(object):
         return fuser.fuser(*args, **kwargs)
 
     @logDecorator
-    def hbaRescan(self):
-        return hba._rescan()
+    def hbaRescan(self, hosts=()):
+        return hba._rescan(hosts)
 
 
 def terminate(signo, frame):
@@ -176,27 +176,22 @@ def _get_volumes_info(cli, sd_uuid):
     if not pools:
         raise NoConnectedStoragePoolError('There is no connected storage '
                                           'pool to this server')
-    sp_uuid, = pools
-    images_uuids = cli.StorageDomain.getImages(storagedomainID=sd_uuid)
+    volumes = cli.StorageDomain.getVolumesMetadata(storagedomainID=sd_uuid)
+    return _group_volumes_by_image(volumes)
 
-    volumes_info = {}
-
-    for img_uuid in images_uuids:
-        img_volumes_info = {}
 
-        volumes_uuids = cli.StorageDomain.getVolumes(
-            storagedomainID=sd_uuid, storagepoolID=sp_uuid,
-            imageID=img_uuid)
-
-        for vol_uuid in volumes_uuids:
-            vol_info = cli.Volume.getInfo(
-                volumeID=vol_uuid, storagepoolID=sp_uuid,
-                storagedomainID=sd_uuid, imageID=img_uuid)
+def _group_volumes_by_image(volumes):
+    """
+    Convert {vol_uuid: vol_info} to {img_uuid: {vol_uuid: vol_info}}.
 
+    A template volume is used by several images, and is added to all of
+    them, so chains of template based images start with the template.
+    """
+    volumes_info = {}
+    for vol_uuid, vol_info in six.iteritems(volumes):
+        for img_uuid in vol_info['imgs']:
+            img_volumes_info = volumes_info.setdefault(img_uuid, {})
             img_volumes_info[vol_uuid] = vol_info
-
-        volumes_info[img_uuid] = img_volumes_info
-
     return volumes_info
 
 
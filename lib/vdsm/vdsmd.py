@@ -46,8 +46,10 @@ from vdsm.common import time
 from vdsm.common import zombiereaper
 from vdsm.common.panic import panic
 from vdsm.config import config
+from vdsm.host import caps
 from vdsm.network.initializer import init_unprivileged_network_components
 from vdsm.profiling import profile
+from vdsm.profiling import startup
 from vdsm.storage.hsm import HSM
 from vdsm.storage.dispatcher import Dispatcher
 from vdsm.virt import periodic
@@ -91,28 +93,38 @@ def serve_clients(log):
 
     try:
         if config.getboolean('irs', 'irs_enable'):
-            try:
-                irs = Dispatcher(HSM())
-            except:
-                panic("Error initializing IRS")
+            with startup.phase("storage"):
+                try:
+                    irs = Dispatcher(HSM())
+                except:
+                    panic("Error initializing IRS")
 
         scheduler = schedule.Scheduler(name="vdsm.Scheduler",
                                        clock=time.monotonic_time)
         scheduler.start()
 
-        from vdsm.clientIF import clientIF  # must import after config is read
-        cif = clientIF.getInstance(irs, log, scheduler)
+        with startup.phase("import clientIF"):
+            # must import after config is read
+            from vdsm.clientIF import clientIF
+
+        with startup.phase("clientIF"):
+            cif = clientIF.getInstance(irs, log, scheduler)
 
         jobs.start(scheduler, cif)
 
         install_manhole({'irs': irs, 'cif': cif})
 
         cif.start()
+        startup.event("serving clients")
 
-        init_unprivileged_network_components(cif, supervdsm.getProxy())
+        with startup.phase("network"):
+            init_unprivileged_network_components(cif, supervdsm.getProxy())
+            caps.start()
 
         periodic.start(cif, scheduler)
         health.start()
+        startup.event("started")
+        startup.write()
         try:
             while running[0]:
                 sigutils.wait_for_signal()
@@ -121,6 +133,7 @@ def serve_clients(log):
         finally:
             metrics.stop()
             health.stop()
+            caps.stop()
             periodic.stop()
             cif.prepareForShutdown()
             jobs.stop()
@@ -139,6 +152,8 @@ def run():
     logging.addLevelName(logging.WARNING, 'WARN')
     logging.addLevelName(logging.CRITICAL, 'CRIT')
 
+    startup.start()
+
     log = logging.getLogger('vds')
     try:
         logging.root.handlers.append(logging.StreamHandler())
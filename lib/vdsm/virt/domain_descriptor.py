@@ -70,7 +70,7 @@ class MutableDomainDescriptor(object):
         return vmxml.find_all(self.devices, tagName)
 
     def get_device_elements_with_attrs(self, tag_name, **kwargs):
-        for element in vmxml.find_all(self.devices, tag_name):
+        for element in self.get_device_elements(tag_name):
             if all(vmxml.attr(element, key) == value
                     for key, value in kwargs.items()):
                 yield element
@@ -131,7 +131,15 @@ class DomainDescriptor(MutableDomainDescriptor):
         super(DomainDescriptor, self).__init__(xmlStr)
         self._xml = xmlStr
         self._devices = super(DomainDescriptor, self).devices
-        self._devices_hash = super(DomainDescriptor, self).devices_hash
+        # Computed on first use, since most descriptors are replaced before
+        # anyone looks at them.
+        self._devices_hash = None
+        # Device elements by tag name, filled on first lookup of a tag.
+        self._device_elements = {}
+        # Device elements by alias, filled incrementally by lookups.
+        self._device_aliases = None
+        self._device_children = None
+        self._indexed_devices = 0
 
     @property
     def xml(self):
@@ -143,8 +151,45 @@ class DomainDescriptor(MutableDomainDescriptor):
 
     @property
     def devices_hash(self):
+        if self._devices_hash is None:
+            self._devices_hash = super(DomainDescriptor, self).devices_hash
         return self._devices_hash
 
+    def get_device_elements(self, tagName):
+        elements = self._device_elements.get(tagName)
+        if elements is None:
+            elements = list(vmxml.find_all(self.devices, tagName))
+            self._device_elements[tagName] = elements
+        return iter(elements)
+
+    def get_device_element_by_alias(self, alias):
+        """
+        Return the device element with the given alias, or None.
+
+        Each lookup scans only the devices not scanned by previous lookups,
+        so looking up all devices scans the devices once.
+        """
+        if self._device_aliases is None:
+            self._device_aliases = {}
+            self._device_children = (
+                list(vmxml.children(self._devices))
+                if self._devices is not None else [])
+
+        element = self._device_aliases.get(alias)
+        if element is not None:
+            return element
+
+        while self._indexed_devices < len(self._device_children):
+            element = self._device_children[self._indexed_devices]
+            self._indexed_devices += 1
+            name = vmxml.find_attr(element, 'alias', 'name')
+            if name:
+                self._device_aliases[name] = element
+                if name == alias:
+                    return element
+
+        return None
+
     @contextmanager
     def metadata_descriptor(self):
         yield metadata.Descriptor.from_tree(self._dom)
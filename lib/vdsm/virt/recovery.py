@@ -25,8 +25,11 @@ import logging
 
 import libvirt
 
+from vdsm import utils
+from vdsm.common import concurrent
 from vdsm.common import libvirtconnection
 from vdsm.common import response
+from vdsm.config import config
 from vdsm.virt import vmchannels
 from vdsm.virt import vmstatus
 from vdsm.virt import vmxml
@@ -63,24 +66,42 @@ def _is_ignored_vm(dom_uuid, dom_obj, dom_xml):
 def _list_domains():
     conn = libvirtconnection.get()
     domains = []
-    for dom_obj in conn.listAllDomains():
-        dom_uuid = 'unknown'
-        try:
-            dom_uuid = dom_obj.UUIDString()
-            logging.debug("Found domain %s", dom_uuid)
-            dom_xml = dom_obj.XMLDesc(0)
-        except libvirt.libvirtError as e:
-            if e.get_error_code() == libvirt.VIR_ERR_NO_DOMAIN:
-                logging.exception("domain %s is dead", dom_uuid)
-            else:
-                raise
-        else:
-            if _is_ignored_vm(dom_uuid, dom_obj, dom_xml):
-                continue
-            domains.append((dom_obj, dom_xml, _is_external_vm(dom_xml),))
+    for dom_info in _tmap(_domain_info, conn.listAllDomains()):
+        if dom_info is not None:
+            domains.append(dom_info)
     return domains
 
 
+def _domain_info(dom_obj):
+    dom_uuid = 'unknown'
+    try:
+        dom_uuid = dom_obj.UUIDString()
+        logging.debug("Found domain %s", dom_uuid)
+        dom_xml = dom_obj.XMLDesc(0)
+    except libvirt.libvirtError as e:
+        if e.get_error_code() == libvirt.VIR_ERR_NO_DOMAIN:
+            logging.exception("domain %s is dead", dom_uuid)
+            return None
+        raise
+    if _is_ignored_vm(dom_uuid, dom_obj, dom_xml):
+        return None
+    return dom_obj, dom_xml, _is_external_vm(dom_xml)
+
+
+def _tmap(func, iterable):
+    """
+    Run func with every item of iterable using vars:recovery_workers threads,
+    and return the results in the order of iterable. If func failed for any
+    item, raise the first error.
+    """
+    workers = config.getint('vars', 'recovery_workers')
+    results = concurrent.tmap(func, iterable, max_workers=workers)
+    for res in results:
+        if not res.succeeded:
+            raise res.value
+    return [res.value for res in results]
+
+
 def _recover_domain(cif, vm_id, dom_xml, external):
     external_str = " (external)" if external else ""
     cif.log.debug("recovery: trying with VM%s %s", external_str, vm_id)
@@ -113,9 +134,13 @@ def _recovery_params(vm_id, dom_xml, external):
 
 
 def all_domains(cif):
-    doms = _list_domains()
+    with utils.stopwatch("recovery: listing domains", level=logging.INFO,
+                         log=cif.log):
+        doms = _list_domains()
     num_doms = len(doms)
-    for idx, (dom_obj, dom_xml, external) in enumerate(doms):
+
+    def recover(args):
+        idx, (dom_obj, dom_xml, external) = args
         vm_id = dom_obj.UUIDString()
         if _recover_domain(cif, vm_id, dom_xml, external):
             cif.log.info(
@@ -134,6 +159,10 @@ def all_domains(cif):
                     'recovery [1:%d/%d]: failed to kill loose domain %s',
                     idx + 1, num_doms, vm_id)
 
+    with utils.stopwatch("recovery: recovering %d domains" % num_doms,
+                         level=logging.INFO, log=cif.log):
+        _tmap(recover, enumerate(doms))
+
 
 def lookup_external_vms(cif):
     conn = libvirtconnection.get()
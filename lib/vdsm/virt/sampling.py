@@ -29,12 +29,14 @@ from six.moves import map
 Support for VM and host statistics sampling.
 """
 
-from collections import defaultdict, deque, namedtuple
+from collections import OrderedDict, defaultdict, deque, namedtuple
+import array
 import logging
 import os
 import re
 import threading
 import time
+import uuid
 
 from vdsm import hugepages
 from vdsm import numa
@@ -43,6 +45,7 @@ import vdsm.common.time
 from vdsm.config import config
 from vdsm.constants import P_VDSM_RUN
 from vdsm.host import api as hostapi
+from vdsm.virt import vmstats
 from vdsm.virt.utils import ExpiringCache
 
 
@@ -246,6 +249,88 @@ class StatsSample(_StatsSample):
         )
 
 
+# libvirt block counters are unsigned 64 bit integers. 'L' is 64 bit on the
+# platforms we support, and unlike 'Q' it is available on python 2.
+_COUNTER_TYPE = 'L'
+
+# Stored in BlockCounters for missing counters. A counter reaching the
+# maximum value is reported as missing; it will wrap around soon anyway.
+_MISSING = 2**(array.array(_COUNTER_TYPE).itemsize * 8) - 1
+
+
+class BlockCounters(object):
+    """
+    Block counters of all disks of all VMs in a bulk stats sample.
+
+    Counters are kept in a fixed width array per counter, with one row per
+    disk keyed by (vm_id, disk_name), instead of per-VM dicts keyed by
+    'block.<index>.<counter>'. The table is built once per sample, and the
+    disk stats of all VMs are produced from two tables once per samples
+    window, see StatsCache.get_block_stats().
+    """
+
+    __slots__ = ('_rows', '_columns')
+
+    _log = logging.getLogger("virt.sampling.BlockCounters")
+
+    def __init__(self, bulk_stats):
+        self._rows = {}
+        self._columns = tuple(
+            array.array(_COUNTER_TYPE) for _ in vmstats.BLOCK_COUNTERS)
+
+        for vm_id, stats in six.iteritems(bulk_stats):
+            for index in six.moves.xrange(stats.get('block.count', 0)):
+                name = stats.get('block.%d.name' % index)
+                if name is None:
+                    # Bulk stats count is an upper bound, see
+                    # vmstats._find_bulk_stats_reverse_map().
+                    continue
+                prefix = 'block.%d.' % index
+                try:
+                    # Convert the values before adding them, so a bad value
+                    # does not leave a partial row.
+                    values = array.array(
+                        _COUNTER_TYPE,
+                        [stats.get(prefix + counter, _MISSING)
+                         for counter in vmstats.BLOCK_COUNTERS])
+                except (OverflowError, TypeError) as e:
+                    # Skip this disk instead of failing the stats of all
+                    # VMs.
+                    self._log.warning(
+                        "Invalid block counters for vm %s disk %s: %s",
+                        vm_id, name, e)
+                    continue
+                row = self._rows.get((vm_id, name))
+                if row is None:
+                    self._rows[(vm_id, name)] = len(self._rows)
+                    for column, value in zip(self._columns, values):
+                        column.append(value)
+                else:
+                    for column, value in zip(self._columns, values):
+                        column[row] = value
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def get(self, key):
+        """
+        Return dict of available counters for key (vm_id, disk_name), or
+        None if the disk is not in the sample.
+        """
+        row = self._rows.get(key)
+        if row is None:
+            return None
+        counters = {}
+        for counter, column in zip(vmstats.BLOCK_COUNTERS, self._columns):
+            value = column[row]
+            if value != _MISSING:
+                counters[counter] = value
+        return counters
+
+
 class StatsCache(object):
     """
     Cache for bulk stats samples.
@@ -281,6 +366,11 @@ class StatsCache(object):
         self._samples = SampleWindow(size=2, timefn=self._clock)
         self._last_sample_time = 0
         self._vm_last_timestamp = defaultdict(int)
+        # (bulk_stats, BlockCounters) for the samples in the window, and
+        # (last_bulk_stats, block_stats) for the current window, built on
+        # the first get_block_stats() call.
+        self._block_counters = deque(maxlen=2)
+        self._block_stats = None
 
     def add(self, vmid):
         """
@@ -338,6 +428,36 @@ class StatsCache(object):
                                             vm_id in self._vm_last_timestamp)
             }
 
+    def get_block_stats(self):
+        """
+        Return the disk stats of all VMs, produced by
+        vmstats.produce_block_stats() once for the current samples, or None
+        if there are not enough samples.
+        """
+        with self._lock:
+            first_batch, last_batch, interval = self._samples.stats()
+
+            if first_batch is None:
+                return None
+
+            if (self._block_stats is None or
+                    self._block_stats[0] is not last_batch):
+                stats = vmstats.produce_block_stats(
+                    self._get_block_counters(first_batch),
+                    self._get_block_counters(last_batch),
+                    interval)
+                self._block_stats = (last_batch, stats)
+
+            return self._block_stats[1]
+
+    def _get_block_counters(self, bulk_stats):
+        for batch, counters in self._block_counters:
+            if batch is bulk_stats:
+                return counters
+        counters = BlockCounters(bulk_stats)
+        self._block_counters.append((bulk_stats, counters))
+        return counters
+
     def clock(self):
         """
         Provide timestamp compatible with what put() expects
@@ -374,6 +494,111 @@ class StatsCache(object):
 stats_cache = StatsCache()
 
 
+class StatsChanges(object):
+    """
+    Keep the last generations of stats reported to each client, so a
+    client can get only the stats changed since the generation it got in
+    the previous call.
+
+    Generations are opaque strings unique to this process. Every client
+    has its own history, so clients polling at different rates do not
+    expire each other's generations. If a client sends an unknown
+    generation, for example after vdsm was restarted, when the generation
+    is too old, or when the client was not seen recently, it gets all the
+    stats.
+    """
+
+    def __init__(self, history=2, max_clients=16):
+        self._history = history
+        self._max_clients = max_clients
+        self._lock = threading.Lock()
+        self._prefix = str(uuid.uuid4())
+        self._counter = 0
+        # client -> generation -> {vm_id: stats}, least recently used client
+        # first.
+        self._clients = OrderedDict()
+
+    def update(self, stats_list, generation=None, client=None):
+        """
+        Record stats_list as a new generation of client, and return the
+        changes since generation, in the format of the VmStatsChanges
+        schema type.
+        """
+        current = dict((stats['vmId'], stats) for stats in stats_list)
+
+        with self._lock:
+            generations = self._clients.pop(client, None)
+            if generations is None:
+                generations = OrderedDict()
+            self._clients[client] = generations
+            while len(self._clients) > self._max_clients:
+                self._clients.popitem(last=False)
+
+            previous = generations.get(generation)
+            self._counter += 1
+            new_generation = '%s:%d' % (self._prefix, self._counter)
+            generations[new_generation] = current
+            while len(generations) > self._history:
+                generations.popitem(last=False)
+
+        if previous is None:
+            return {
+                'generation': new_generation,
+                'full': True,
+                'statsList': stats_list,
+                'removedVms': [],
+            }
+
+        changes = []
+        for vm_id, stats in six.iteritems(current):
+            vm_changes = _vm_stats_changes(previous.get(vm_id, {}), stats)
+            if vm_changes is not None:
+                changes.append(vm_changes)
+
+        return {
+            'generation': new_generation,
+            'full': False,
+            'statsList': changes,
+            'removedVms': [vm_id for vm_id in previous
+                           if vm_id not in current],
+        }
+
+
+def _vm_stats_changes(old, new):
+    changes = {}
+    for key, value in six.iteritems(new):
+        if key not in old or not _same_stats(key, old[key], value):
+            changes[key] = value
+
+    removed = [key for key in old if key not in new]
+    if removed:
+        changes['removedFields'] = sorted(removed)
+
+    if not changes:
+        return None
+
+    changes['vmId'] = new['vmId']
+    return changes
+
+
+def _same_stats(key, old, new):
+    if key == 'network':
+        # sampleTime is the time of the call, and changes on every call even
+        # if the nic stats did not change.
+        return _without_sample_time(old) == _without_sample_time(new)
+    return old == new
+
+
+def _without_sample_time(network):
+    return dict(
+        (name, dict((k, v) for k, v in six.iteritems(nic_stats)
+                    if k != 'sampleTime'))
+        for name, nic_stats in six.iteritems(network))
+
+
+stats_changes = StatsChanges()
+
+
 # this value can be tricky to tune.
 # we should avoid as much as we can to trigger
 # false positive fast flows (getAllDomainStats call).
@@ -198,6 +198,11 @@ VolumeSize = namedtuple("VolumeSize",
                         ["apparentsize", "truesize"])
 
 
+_SampledStats = namedtuple("_SampledStats",
+                           ["first_value", "last_value", "domain",
+                            "devices_generation", "stats"])
+
+
 class MigrationError(Exception):
     pass
 
@@ -345,6 +350,13 @@ class Vm(object):
         self._external = params.get('external', False)
         self.arch = cpuarch.effective()
         self._src_domain_xml = params.get('_srcDomXML')
+        # Number of _updateDomainDescriptor() calls reusing the current
+        # descriptor, and calls parsing a new one.
+        self._domain_cache_hits = 0
+        self._domain_cache_misses = 0
+        # Set when libvirt reports a device change, so the descriptor is
+        # updated on the next non-forced update.
+        self._domain_outdated = False
         if self._src_domain_xml is not None:
             self._domain = DomainDescriptor(self._src_domain_xml)
         elif 'xml' in params:
@@ -481,6 +493,9 @@ class Vm(object):
         self._migration_downtime = None
         self._pause_code = None
         self._last_disk_mapping_hash = None
+        # Stats produced from the bulk stats samples, see _getSampledStats.
+        self._sampled_stats = None
+        self._devices_generation = 0
 
     @property
     def _hugepages_shared(self):
@@ -1419,6 +1434,7 @@ class Vm(object):
         """
         drive.apparentsize = volsize.apparentsize
         drive.truesize = volsize.truesize
+        self._devicesModified()
         self.drive_monitor.set_threshold(drive, volsize.apparentsize)
 
     def _resume_if_needed(self):
@@ -1847,20 +1863,25 @@ class Vm(object):
             # monitorable, and only if it is, consider the stats_age.
             monitorable = self._monitorable
             vm_sample = sampling.stats_cache.get(self.id)
-            decStats = vmstats.produce(self,
-                                       vm_sample.first_value,
-                                       vm_sample.last_value,
-                                       vm_sample.interval)
+            sampled_stats = self._getSampledStats(vm_sample)
             if monitorable:
                 self._setUnresponsiveIfTimeout(stats, vm_sample.stats_age)
         except Exception:
             self.log.exception("Error fetching vm stats")
         else:
-            stats.update(vmstats.translate(decStats))
+            stats.update(sampled_stats)
 
         stats.update(self._getGraphicsStats())
+        try:
+            # Engine uses the hash to detect device changes, so we must use
+            # an updated descriptor if libvirt reported a device change.
+            self._updateDomainDescriptor(force=False)
+        except (libvirt.libvirtError, virdomain.NotConnectedError) as e:
+            self.log.warning("Couldn't update domain descriptor: %s", e)
         stats['hash'] = str(hash((self._domain.devices_hash,
                                   self.guestAgent.diskMappingHash)))
+        stats['domainDescriptorHits'] = self._domain_cache_hits
+        stats['domainDescriptorMisses'] = self._domain_cache_misses
         if self._watchdogEvent:
             stats['watchdogEvent'] = self._watchdogEvent
         if self._vcpuLimit:
@@ -1871,6 +1892,46 @@ class Vm(object):
         stats.update(self._getVmTuneStats())
         return stats
 
+    def _getSampledStats(self, vm_sample):
+        """
+        Return the stats produced from the bulk stats samples.
+
+        These stats change only when a new sample is collected, or when the
+        VM devices are modified, so they are produced once and kept until
+        then. Engine polls the stats much more often than we sample.
+        """
+        cached = self._sampled_stats
+        if (cached is not None and
+                cached.first_value is vm_sample.first_value and
+                cached.last_value is vm_sample.last_value and
+                cached.domain is self._domain and
+                cached.devices_generation == self._devices_generation):
+            stats = cached.stats
+        else:
+            # Read before producing the stats, so a concurrent modification
+            # invalidates them.
+            domain = self._domain
+            devices_generation = self._devices_generation
+            block_stats = sampling.stats_cache.get_block_stats()
+            decStats = vmstats.produce(self,
+                                       vm_sample.first_value,
+                                       vm_sample.last_value,
+                                       vm_sample.interval,
+                                       block_stats=block_stats)
+            stats = vmstats.translate(decStats)
+            self._sampled_stats = _SampledStats(
+                vm_sample.first_value, vm_sample.last_value, domain,
+                devices_generation, stats)
+
+        return vmstats.refresh(stats)
+
+    def _devicesModified(self):
+        """
+        Invalidate stats depending on devices attributes, like disk sizes,
+        ioTune or balloon target.
+        """
+        self._devices_generation += 1
+
     def _getVmTuneStats(self):
         stats = {}
 
@@ -3739,6 +3800,7 @@ class Vm(object):
             # TODO: improve once libvirt gets support for iotune events
             #       see https://bugzilla.redhat.com/show_bug.cgi?id=1114492
             found_device.iotune = io_tune
+            self._devicesModified()
 
             # Make sure the cached XML representation is valid as well
             xml = xmlutils.tostring(found_device.getXML())
@@ -4190,6 +4252,7 @@ class Vm(object):
 
         vmDrive.truesize = volSize.truesize
         vmDrive.apparentsize = volSize.apparentsize
+        self._devicesModified()
 
     def updateDriveParameters(self, driveParams):
         """Update the drive with the new volume information"""
@@ -4207,6 +4270,7 @@ class Vm(object):
                         # don't belong to metadata.
                         if k in dev:
                             dev[k] = v
+                self._devicesModified()
                 self._sync_metadata()
                 break
         else:
@@ -5112,9 +5176,38 @@ class Vm(object):
     def name(self):
         return self._domain.name
 
-    def _updateDomainDescriptor(self, xml=None):
-        domxml = self._dom.XMLDesc(0) if xml is None else xml
+    def _updateDomainDescriptor(self, xml=None, force=True):
+        """
+        Update the domain descriptor using xml, or the current domain XML.
+
+        If force is False, the domain XML is fetched only if libvirt reported
+        a device change since the last update. Callers that changed the
+        domain XML must use force=True, since libvirt does not report all
+        changes (e.g. metadata updates and block job pivots), and device
+        events may arrive after the caller looks at the descriptor.
+        """
+        if xml is None:
+            if not force and not self._domain_outdated:
+                self._domain_cache_hits += 1
+                return
+            # Clear before fetching the XML, so a change reported while we
+            # fetch the XML is not lost.
+            self._domain_outdated = False
+            domxml = self._dom.XMLDesc(0)
+        else:
+            domxml = xml
+        # We update the descriptor after every change that may modify the
+        # domain XML, but many changes (e.g. syncing unchanged metadata) do
+        # not. Parsing the XML of a VM with many devices is expensive, so we
+        # keep the current descriptor if the XML did not change.
+        if domxml == self._domain.xml:
+            self._domain_cache_hits += 1
+            return
+        self._domain_cache_misses += 1
         self._domain = DomainDescriptor(domxml)
+        self.log.debug("Domain XML changed, updated domain descriptor "
+                       "(hits=%d, misses=%d)",
+                       self._domain_cache_hits, self._domain_cache_misses)
 
     def _updateMetadataDescriptor(self):
         # load will overwrite any existing content, as per doc.
@@ -5370,6 +5463,7 @@ class Vm(object):
         else:
             # TODO: update metadata once we build devices with engine XML
             self._devices[hwclass.BALLOON][0].target = target
+            self._devicesModified()
 
     def get_balloon_info(self):
         try:
@@ -5952,19 +6046,14 @@ class Vm(object):
         return True
 
     def _driveGetActualVolumeChain(self, drives):
-        def lookupDeviceXMLByAlias(domXML, targetAlias):
-            for deviceXML in vmxml.children(DomainDescriptor(domXML).devices):
-                alias = vmdevices.core.find_device_alias(deviceXML)
-                if alias and alias == targetAlias:
-                    return deviceXML
-            raise LookupError("Unable to find matching XML for device %r" %
-                              targetAlias)
-
         ret = {}
         self._updateDomainDescriptor()
         for drive in drives:
             alias = drive['alias']
-            diskXML = lookupDeviceXMLByAlias(self._domain.xml, alias)
+            diskXML = self._domain.get_device_element_by_alias(alias)
+            if diskXML is None:
+                raise LookupError("Unable to find matching XML for device %r"
+                                  % alias)
             volChain = drive.parse_volume_chain(diskXML)
             if volChain:
                 ret[alias] = volChain
@@ -6069,8 +6158,19 @@ class Vm(object):
                          stats_age)
         stats['monitorResponse'] = '-1'
 
+    def onDeviceAdded(self, device_alias):
+        self.log.info("Device addition reported: %s", device_alias)
+        self._domain_outdated = True
+
+    def onBlockJobEvent(self, path, job_type, status):
+        self.log.debug("Block job event reported: path=%s type=%s status=%s",
+                       path, job_type, status)
+        # Block jobs may change the source of the disk.
+        self._domain_outdated = True
+
     def onDeviceRemoved(self, device_alias):
         self.log.info("Device removal reported: %s", device_alias)
+        self._domain_outdated = True
         try:
             device, device_hwclass = \
                 vmdevices.lookup.hotpluggable_device_by_alias(
@@ -34,17 +34,27 @@ from vdsm.virt.utils import isVdsmImage
 
 _log = logging.getLogger('virt.vmstats')
 
+# Block counters used to produce disk stats.
+BLOCK_COUNTERS = (
+    'rd.reqs', 'rd.bytes', 'rd.times',
+    'wr.reqs', 'wr.bytes', 'wr.times',
+    'fl.reqs', 'fl.times',
+)
 
-def produce(vm, first_sample, last_sample, interval):
+
+def produce(vm, first_sample, last_sample, interval, block_stats=None):
     """
     Translates vm samples into stats.
+    `block_stats' is the optional disk stats of all VMs returned by
+    produce_block_stats(), see disks().
     """
 
     stats = {}
 
     cpu(stats, first_sample, last_sample, interval)
     networks(vm, stats, first_sample, last_sample, interval)
-    disks(vm, stats, first_sample, last_sample, interval)
+    disks(vm, stats, first_sample, last_sample, interval,
+          block_stats=block_stats)
     balloon(vm, stats, last_sample)
     cpu_count(stats, last_sample)
     tune_io(vm, stats)
@@ -77,6 +87,23 @@ def translate(vm_stats):
     return stats
 
 
+def refresh(stats):
+    """
+    Return a copy of stats returned by translate() in an earlier call,
+    updated for the current call. stats is not modified, so it can be
+    reused until the next sample.
+    """
+    stats = stats.copy()
+    network = stats.get('network')
+    if network:
+        # Reported as the time of the call since the nic stats were added.
+        now = monotonic_time()
+        stats['network'] = dict(
+            (name, dict(nic_stats, sampleTime=now))
+            for name, nic_stats in six.iteritems(network))
+    return stats
+
+
 def tune_io(vm, stats):
     """
     Collect the current ioTune settings for all disks VDSM knows about.
@@ -279,16 +306,22 @@ def nic_info(nic):
     return info
 
 
-def disks(vm, stats, first_sample, last_sample, interval):
+def disks(vm, stats, first_sample, last_sample, interval, block_stats=None):
+    """
+    Add disk statistics to the `stats' dict.
+    `block_stats' is the disk stats of all VMs returned by
+    produce_block_stats() for the same samples. If not specified, the disk
+    stats of this VM are produced from the samples.
+    """
     if first_sample is None or last_sample is None:
         return None
 
-    # libvirt does not guarantee that disk will returned in the same
-    # order across calls. It is usually like this, but not always,
-    # for example if hotplug/hotunplug comes into play.
-    # To be safe, we need to find the mapping after each call.
-    first_indexes = _find_bulk_stats_reverse_map(first_sample, 'block')
-    last_indexes = _find_bulk_stats_reverse_map(last_sample, 'block')
+    if block_stats is None:
+        block_stats = produce_block_stats(
+            _sample_block_counters(vm.id, first_sample),
+            _sample_block_counters(vm.id, last_sample),
+            interval)
+
     disk_stats = {}
 
     for vm_drive in vm.getDiskDevices():
@@ -296,28 +329,15 @@ def disks(vm, stats, first_sample, last_sample, interval):
         try:
             drive_stats = disk_info(vm_drive)
 
-            if (vm_drive.name in first_indexes and
-               vm_drive.name in last_indexes):
-                # will be None if sampled during recovery
+            # will be None if sampled during recovery
+            counters_stats = block_stats.get((vm.id, vm_drive.name))
+            if counters_stats is not None:
                 if interval <= 0:
                     _log.warning(
                         'invalid interval %i when calculating '
                         'stats for vm %s disk %s',
                         interval, vm.id, vm_drive.name)
-                else:
-                    drive_stats.update(
-                        _disk_rate(
-                            first_sample, first_indexes[vm_drive.name],
-                            last_sample, last_indexes[vm_drive.name],
-                            interval))
-                drive_stats.update(
-                    _disk_latency(
-                        first_sample, first_indexes[vm_drive.name],
-                        last_sample, last_indexes[vm_drive.name]))
-                drive_stats.update(
-                    _disk_iops_bytes(
-                        first_sample, first_indexes[vm_drive.name],
-                        last_sample, last_indexes[vm_drive.name]))
+                drive_stats.update(counters_stats)
 
         except AttributeError:
             _log.exception("Disk %s stats not available",
@@ -331,6 +351,49 @@ def disks(vm, stats, first_sample, last_sample, interval):
     return stats
 
 
+def produce_block_stats(first_counters, last_counters, interval):
+    """
+    Produce the rate, latency and operations stats of all disks of all VMs
+    in one pass, from the block counters of the first and the last samples,
+    as sampling.BlockCounters or dicts in the same format. Return a dict
+    mapping (vm_id, disk_name) to the disk stats, for disks found in both
+    samples.
+    """
+    stats = {}
+    for key in last_counters:
+        first = first_counters.get(key)
+        if first is None:
+            continue
+        last = last_counters.get(key)
+        disk_stats = {}
+        if interval > 0:
+            disk_stats.update(_disk_rate(first, last, interval))
+        disk_stats.update(_disk_latency(first, last))
+        disk_stats.update(_disk_iops_bytes(last))
+        stats[key] = disk_stats
+    return stats
+
+
+def _sample_block_counters(vm_id, sample):
+    """
+    Return the block counters of all disks in a VM sample, in the same
+    format as sampling.BlockCounters.
+    """
+    # libvirt does not guarantee that disk will returned in the same
+    # order across calls. It is usually like this, but not always,
+    # for example if hotplug/hotunplug comes into play.
+    # To be safe, we need to find the mapping after each call.
+    counters = {}
+    indexes = _find_bulk_stats_reverse_map(sample, 'block')
+    for name, index in six.iteritems(indexes):
+        prefix = 'block.%d.' % index
+        counters[(vm_id, name)] = dict(
+            (counter, sample[prefix + counter])
+            for counter in BLOCK_COUNTERS
+            if prefix + counter in sample)
+    return counters
+
+
 def disk_info(vm_drive):
     drive_stats = {
         'truesize': str(vm_drive.truesize),
@@ -352,15 +415,14 @@ def disk_info(vm_drive):
     return drive_stats
 
 
-def _disk_rate(first_sample, first_index, last_sample, last_index, interval):
+def _disk_rate(first, last, interval):
     stats = {}
 
     for name, mode in (("readRate", "rd"), ("writeRate", "wr")):
-        first_key = 'block.%d.%s.bytes' % (first_index, mode)
-        last_key = 'block.%d.%s.bytes' % (last_index, mode)
+        key = '%s.bytes' % mode
         try:
-            first_value = first_sample[first_key]
-            last_value = last_sample[last_key]
+            first_value = first[key]
+            last_value = last[key]
         except KeyError:
             continue
         stats[name] = str((last_value - first_value) / interval)
@@ -368,19 +430,17 @@ def _disk_rate(first_sample, first_index, last_sample, last_index, interval):
     return stats
 
 
-def _disk_latency(first_sample, first_index, last_sample, last_index):
+def _disk_latency(first, last):
     stats = {}
 
     for name, mode in (('readLatency', 'rd'),
                        ('writeLatency', 'wr'),
                        ('flushLatency', 'fl')):
         try:
-            last_key = "block.%d.%s" % (last_index, mode)
-            first_key = "block.%d.%s" % (first_index, mode)
-            operations = (last_sample[last_key + ".reqs"] -
-                          first_sample[first_key + ".reqs"])
-            elapsed_time = (last_sample[last_key + ".times"] -
-                            first_sample[first_key + ".times"])
+            operations = (last[mode + ".reqs"] -
+                          first[mode + ".reqs"])
+            elapsed_time = (last[mode + ".times"] -
+                            first[mode + ".times"])
         except KeyError:
             continue
         if operations:
@@ -391,16 +451,16 @@ def _disk_latency(first_sample, first_index, last_sample, last_index):
     return stats
 
 
-def _disk_iops_bytes(first_sample, first_index, last_sample, last_index):
+def _disk_iops_bytes(last):
     stats = {}
 
     for name, mode, field in (('readOps', 'rd', 'reqs'),
                               ('writeOps', 'wr', 'reqs'),
                               ('readBytes', 'rd', 'bytes'),
                               ('writtenBytes', 'wr', 'bytes')):
-        key = 'block.%d.%s.%s' % (last_index, mode, field)
+        key = '%s.%s' % (mode, field)
         try:
-            value = last_sample[key]
+            value = last[key]
         except KeyError:
             continue
         stats[name] = str(value)
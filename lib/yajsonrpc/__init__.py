@@ -15,7 +15,9 @@
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
 from __future__ import absolute_import
 from __future__ import division
+import collections
 import logging
+import threading
 from six.moves import queue
 
 from vdsm.common import exception as vdsmexception
@@ -36,6 +38,11 @@ _STATE_INCOMING = 1
 _STATE_OUTGOING = 2
 _STATE_ONESHOT = 4
 
+# Request scheduling priorities, from highest to lowest.
+PRIORITY_HIGH = "high"
+PRIORITY_NORMAL = "normal"
+PRIORITIES = (PRIORITY_HIGH, PRIORITY_NORMAL)
+
 
 class JsonRpcRequest(object):
     def __init__(self, method, params=(), reqId=None):
@@ -234,7 +241,10 @@ class _JsonRpcServeRequestContext(object):
         else:
             data = '[' + ','.join(encodedObjects) + ']'
 
-        self._client.send(data.encode('utf-8'))
+        # Pass the response ids with the encoded data, so the transport can
+        # route the reply without decoding it.
+        response_ids = [r.id for r in self._responses]
+        self._client.send(data.encode('utf-8'), response_ids=response_ids)
 
     def addResponse(self, response):
         self._responses.append(response)
@@ -253,13 +263,30 @@ class _JsonRpcServeRequestContext(object):
 
 class JsonRpcTask(object):
 
-    def __init__(self, handler, ctx, req):
+    def __init__(self, handler, ctx, req, done=None):
         self._handler = handler
         self._ctx = ctx
         self._req = req
+        self._done = done
+
+    @property
+    def ctx(self):
+        return self._ctx
+
+    @property
+    def request(self):
+        return self._req
+
+    @property
+    def method(self):
+        return self._req.method
 
     def __call__(self):
-        self._handler(self._ctx, self._req)
+        try:
+            self._handler(self._ctx, self._req)
+        finally:
+            if self._done:
+                self._done(self)
 
     def __repr__(self):
         return '<JsonRpcTask %s at 0x%x>' % (
@@ -267,19 +294,205 @@ class JsonRpcTask(object):
         )
 
 
+class _ScheduledTask(object):
+
+    def __init__(self, task, priority, limit, queued):
+        self.task = task
+        self.priority = priority
+        self.limit = limit
+        self.queued = queued
+        self.started = None
+
+
+class RequestScheduler(object):
+    """
+    Schedules requests by priority, limiting the number of running requests.
+
+    Requests are queued in priority lanes, and requests in a higher priority
+    lane run before requests in lower priority lanes, so cheap polling
+    requests do not wait behind slow requests. Methods may limit the number
+    of concurrent calls; requests exceeding the limit wait in the queue
+    until a running request of the same method is done.
+
+    Requests running longer than timeout do not count as running, neither
+    for the total nor for the method limit, so blocked requests cannot block
+    the scheduler. The number of queued requests per method may be limited,
+    so requests for a blocked method cannot fill the queue. Methods may
+    declare their own queue limit; otherwise the default limit applies to
+    normal priority methods, and high priority methods are not limited.
+
+    The scheduler does not run the tasks; schedule(), done() and poll()
+    return the tasks that should be dispatched now. poll() should be called
+    periodically, to run queued tasks when running tasks time out.
+    """
+
+    log = logging.getLogger("jsonrpc.RequestScheduler")
+
+    def __init__(self, max_running, max_queued, timeout, policy=None,
+                 report=None, max_method_queued=None):
+        """
+        Arguments:
+            max_running (int): maximum number of running requests.
+            max_queued (int): maximum number of queued requests. Scheduling
+                more requests fails with ResourceExhausted.
+            timeout (float): number of seconds a request is counted as
+                running.
+            policy (callable): called with a method name, returning the
+                method priority, concurrency limit (None for no limit), and
+                queued requests limit (None for the default limit).
+            report (callable): called with scheduler stats dict when
+                reporting stats.
+            max_method_queued (int): default maximum number of queued
+                requests for a single normal priority method (None for no
+                limit). Scheduling more requests for the method fails with
+                ResourceExhausted.
+        """
+        self._max_running = max_running
+        self._max_queued = max_queued
+        self._max_method_queued = max_method_queued
+        self._timeout = timeout
+        self._policy = policy or _default_policy
+        self._report = report
+        self._lock = threading.Lock()
+        self._lanes = collections.OrderedDict(
+            (priority, collections.deque()) for priority in PRIORITIES)
+        self._running = {}
+        self._method_queued = collections.defaultdict(int)
+        self._wait_count = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def schedule(self, task):
+        """
+        Queue task, and return a list of tasks ready to run.
+
+        Raises:
+            vdsm.common.exception.ResourceExhausted if the queue is full.
+        """
+        priority, limit, max_queued = self._policy(task.method)
+        if priority not in self._lanes:
+            priority = PRIORITY_NORMAL
+        if max_queued is None and priority != PRIORITY_HIGH:
+            max_queued = self._max_method_queued
+        entry = _ScheduledTask(task, priority, limit, monotonic_time())
+        with self._lock:
+            queued = self._queued()
+            if queued >= self._max_queued:
+                raise vdsmexception.ResourceExhausted(
+                    "Too many queued requests",
+                    resource="jsonrpc",
+                    current_tasks=queued)
+            method_queued = self._method_queued[task.method]
+            if max_queued is not None and method_queued >= max_queued:
+                raise vdsmexception.ResourceExhausted(
+                    "Too many queued requests for method",
+                    resource="jsonrpc",
+                    method=task.method,
+                    current_tasks=method_queued)
+            self._lanes[priority].append(entry)
+            self._method_queued[task.method] += 1
+            return self._pop_ready()
+
+    def done(self, task):
+        """
+        Mark task as done, and return a list of tasks ready to run.
+        """
+        with self._lock:
+            self._running.pop(task, None)
+            return self._pop_ready()
+
+    def poll(self):
+        """
+        Return a list of queued tasks that can run now because running tasks
+        timed out.
+        """
+        with self._lock:
+            return self._pop_ready()
+
+    def stats(self):
+        """
+        Return scheduler stats. Wait time stats are for requests started
+        since the last call.
+        """
+        with self._lock:
+            stats = {"queued." + priority: len(lane)
+                     for priority, lane in self._lanes.items()}
+            stats["running"] = len(self._running)
+            stats["wait_time.max"] = self._wait_max
+            if self._wait_count:
+                stats["wait_time.avg"] = self._wait_total / self._wait_count
+            else:
+                stats["wait_time.avg"] = 0.0
+            self._wait_count = 0
+            self._wait_total = 0.0
+            self._wait_max = 0.0
+        return stats
+
+    def report_stats(self):
+        stats = self.stats()
+        self.log.info("Request scheduler stats: %s", stats)
+        if self._report:
+            self._report(stats)
+
+    def _queued(self):
+        return sum(len(lane) for lane in self._lanes.values())
+
+    def _pop_ready(self):
+        ready = []
+        now = monotonic_time()
+        # Number of running tasks per method, not including timed out tasks.
+        active = collections.Counter(
+            entry.task.method for entry in self._running.values()
+            if now - entry.started < self._timeout)
+        running = sum(active.values())
+        while running < self._max_running:
+            entry = self._pop_next(active)
+            if entry is None:
+                break
+            entry.started = now
+            wait = now - entry.queued
+            self._wait_count += 1
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+            self._running[entry.task] = entry
+            active[entry.task.method] += 1
+            running += 1
+            ready.append(entry.task)
+        return ready
+
+    def _pop_next(self, active):
+        for lane in self._lanes.values():
+            for i, entry in enumerate(lane):
+                method = entry.task.method
+                if entry.limit is None or active[method] < entry.limit:
+                    del lane[i]
+                    self._method_queued[method] -= 1
+                    if self._method_queued[method] == 0:
+                        del self._method_queued[method]
+                    return entry
+        return None
+
+
+def _default_policy(method):
+    return PRIORITY_NORMAL, None, None
+
+
 class JsonRpcServer(object):
     log = logging.getLogger("jsonrpc.JsonRpcServer")
 
     """
     Creates new JsonrRpcServer by providing a bridge, timeout in seconds
     which defining how often we should log connections stats and thread
-    factory.
+    factory. If scheduler is specified, requests are dispatched to the thread
+    factory in the order determined by the scheduler.
     """
-    def __init__(self, bridge, timeout, cif, threadFactory=None):
+    def __init__(self, bridge, timeout, cif, threadFactory=None,
+                 scheduler=None):
         self._bridge = bridge
         self._cif = cif
         self._workQueue = queue.Queue()
         self._threadFactory = threadFactory
+        self._scheduler = scheduler
         self._timeout = timeout
         self._next_report = monotonic_time() + self._timeout
         self._counter = 0
@@ -297,6 +510,8 @@ class JsonRpcServer(object):
         if monotonic_time() > self._next_report:
             self.log.info('%s requests processed during %s seconds',
                           self._counter, self._timeout)
+            if self._scheduler:
+                self._scheduler.report_stats()
             self._next_report += self._timeout
             self._counter = 0
 
@@ -419,24 +634,44 @@ class JsonRpcServer(object):
     def _runRequest(self, ctx, request):
         if self._threadFactory is None:
             self._serveRequest(ctx, request)
+        elif self._scheduler is None:
+            self._dispatch(JsonRpcTask(self._serveRequest, ctx, request))
         else:
+            task = JsonRpcTask(self._serveRequest, ctx, request,
+                               done=self._taskDone)
             try:
-                self._threadFactory(
-                    JsonRpcTask(self._serveRequest, ctx, request)
-                )
+                ready = self._scheduler.schedule(task)
             except vdsmexception.ContextException as e:
                 ctx.requestDone(JsonRpcResponse(None, e, request.id))
-            except Exception as e:
-                self.log.exception("could not serve request %s", request)
-                ctx.requestDone(
-                    JsonRpcResponse(
-                        None,
-                        exception.JsonRpcInternalError(
-                            str(e)
-                        ),
-                        request.id
-                    )
-                )
+                return
+            for task in ready:
+                self._dispatch(task)
+
+    def _taskDone(self, task):
+        for ready in self._scheduler.done(task):
+            self._dispatch(ready)
+
+    def dispatch_ready(self):
+        """
+        Dispatch queued requests that can run because running requests timed
+        out. Should be called periodically when using a scheduler.
+        """
+        for ready in self._scheduler.poll():
+            self._dispatch(ready)
+
+    def _dispatch(self, task):
+        try:
+            self._threadFactory(task)
+        except Exception as e:
+            if self._scheduler:
+                # The task will never run, let other tasks run.
+                self._taskDone(task)
+            if isinstance(e, vdsmexception.ContextException):
+                error = e
+            else:
+                self.log.exception("could not serve request %s", task.request)
+                error = exception.JsonRpcInternalError(str(e))
+            task.ctx.requestDone(JsonRpcResponse(None, error, task.request.id))
 
     def stop(self):
         self.log.info("Stopping JsonRPC Server")
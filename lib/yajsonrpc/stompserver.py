@@ -302,21 +302,19 @@ class StompServer(object):
 
     """
     Sends message to all subscribes that subscribed to destination.
-    """
-    def send(self, message, destination=stomp.SUBSCRIPTION_ID_RESPONSE):
-        resp = json.loads(message)
-        if not isinstance(resp, dict):
-            raise ValueError(
-                'Provided message %s failed parsing to dictionary' % message)
-        # pylint: disable=no-member
-        response_id = resp.get("id")
 
-        try:
-            destination = self._req_dest[response_id]
-            del self._req_dest[response_id]
-        except KeyError:
-            # we could have no reply-to or we could send events (no message id)
-            pass
+    When sending responses, response_ids are the ids of the responses in the
+    encoded message, used to find the destination of the reply without
+    decoding the message.
+    """
+    def send(self, message, destination=stomp.SUBSCRIPTION_ID_RESPONSE,
+             response_ids=()):
+        for response_id in response_ids:
+            try:
+                destination = self._req_dest.pop(response_id)
+            except KeyError:
+                # we could have no reply-to
+                pass
 
         try:
             connections = self._sub_map[destination]
@@ -439,7 +437,7 @@ class ServerRpcContextAdapter(object):
     def get_local_address(self, *args, **kwargs):
         return self._address
 
-    def send(self, data):
+    def send(self, data, response_ids=()):
         if self._reply_to:
             self._client.send(
                 self._reply_to,
@@ -23,8 +23,10 @@ from __future__ import absolute_import
 from __future__ import division
 import imp
 
+from vdsm import gluster
 from vdsm.common.exception import GeneralException, VdsmException
 from vdsm.rpc.Bridge import DynamicBridge
+from yajsonrpc.exception import JsonRpcMethodNotFoundError
 
 from monkeypatch import MonkeyPatch
 from testlib import VdsmTestCase as TestCaseBase
@@ -198,3 +200,19 @@ class BridgeTests(TestCaseBase):
 
         self.assertEqual(bridge.dispatch('Host.getDeviceList')(**params),
                          [])
+
+    @MonkeyPatch(gluster, 'enabled', lambda: True)
+    def testGlusterSchemaLoadedOnFirstUse(self):
+        bridge = DynamicBridge()
+        bridge.dispatch('Host.ping')
+        self.assertIsNone(bridge._gluster_schema)
+
+        bridge.dispatch('GlusterVolume.delete')
+        self.assertIsNotNone(bridge._gluster_schema)
+
+    @MonkeyPatch(gluster, 'enabled', lambda: False)
+    def testGlusterDisabled(self):
+        bridge = DynamicBridge()
+        with self.assertRaises(JsonRpcMethodNotFoundError):
+            bridge.dispatch('GlusterVolume.delete')
+        self.assertIsNone(bridge._gluster_schema)
@@ -26,8 +26,12 @@ from __future__ import division
 import os
 import platform
 import tempfile
+
+from six.moves import queue
+
 from testlib import VdsmTestCase as TestCaseBase
 from monkeypatch import MonkeyPatch
+from monkeypatch import MonkeyPatchScope
 
 from vdsm.host import caps
 from vdsm import numa
@@ -252,3 +256,91 @@ class TestCaps(TestCaseBase):
         self.assertEqual(t.sockets, 1)
         self.assertEqual(t.online_cpus,
                          ['0', '1', '2', '3', '4', '5', '6', '7'])
+
+
+class FakeMonitor(object):
+
+    def __init__(self, groups=()):
+        self._queue = queue.Queue()
+        self._stopped = False
+
+    def start(self):
+        pass
+
+    def stop(self):
+        self._stopped = True
+        self._queue.put(None)
+
+    def is_stopped(self):
+        return self._stopped
+
+    def __iter__(self):
+        return iter(self._queue.get, None)
+
+
+class FakeSupervdsm(object):
+
+    def __init__(self):
+        self.calls = 0
+
+    def getProxy(self):
+        return self
+
+    def network_caps(self):
+        self.calls += 1
+        return {'networks': {'ovirtmgmt': {'mtu': 1500}}}
+
+
+class TestNetworkCaps(TestCaseBase):
+
+    def setUp(self):
+        self.supervdsm = FakeSupervdsm()
+        self.net_caps = caps._NetworkCaps()
+
+    def test_not_monitoring(self):
+        with MonkeyPatchScope([(caps, 'supervdsm', self.supervdsm)]):
+            self.net_caps.get()
+            self.net_caps.get()
+        self.assertEqual(self.supervdsm.calls, 2)
+
+    def test_cached(self):
+        with MonkeyPatchScope([
+            (caps, 'supervdsm', self.supervdsm),
+            (caps.monitor, 'Monitor', FakeMonitor),
+        ]):
+            self.net_caps.start()
+            try:
+                first = self.net_caps.get()
+                # Modifying the returned value must not modify the cache.
+                first['networks']['ovirtmgmt']['mtu'] = 9000
+                second = self.net_caps.get()
+            finally:
+                self.net_caps.stop()
+        self.assertEqual(self.supervdsm.calls, 1)
+        self.assertEqual(second['networks']['ovirtmgmt']['mtu'], 1500)
+
+    def test_invalidate(self):
+        with MonkeyPatchScope([
+            (caps, 'supervdsm', self.supervdsm),
+            (caps.monitor, 'Monitor', FakeMonitor),
+        ]):
+            self.net_caps.start()
+            try:
+                self.net_caps.get()
+                self.net_caps.invalidate()
+                self.net_caps.get()
+            finally:
+                self.net_caps.stop()
+        self.assertEqual(self.supervdsm.calls, 2)
+
+    def test_monitor_stopped(self):
+        with MonkeyPatchScope([
+            (caps, 'supervdsm', self.supervdsm),
+            (caps.monitor, 'Monitor', FakeMonitor),
+        ]):
+            self.net_caps.start()
+            self.net_caps.get()
+            self.net_caps.stop()
+            self.net_caps.get()
+            self.net_caps.get()
+        self.assertEqual(self.supervdsm.calls, 3)
@@ -43,6 +43,7 @@ from vdsm.client import \
     ServerError, \
     TimeoutError
 
+from yajsonrpc import PRIORITY_NORMAL
 from yajsonrpc import stompclient
 
 from yajsonrpc.exception import \
@@ -69,6 +70,9 @@ class _Bridge(object):
     def event_schema(self):
         return _FakeEventSchema()
 
+    def scheduling_policy(self, method):
+        return PRIORITY_NORMAL, None, None
+
     def dispatch(self, method):
         class_name, method_name = method.split('.', 1)
         if class_name != "Test":
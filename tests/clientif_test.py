@@ -355,7 +355,6 @@ class NotSoFakeClientIF(clientIF.clientIF):
         scheduler = None
         fake_start = mock.Mock()
         with MonkeyPatchScope([
-                (clientIF, '_glusterEnabled', False),
                 (clientIF, 'secret', {}),
                 (clientIF, 'MomClient', lambda *args: mock.Mock()),
                 (clientIF, 'QemuGuestAgentPoller', lambda *args: fake_start),
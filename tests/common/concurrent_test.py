@@ -192,6 +192,7 @@ class BarrierTests(VdsmTestCase):
                 t.join()
 
 
+@expandPermutations
 class TMapTests(VdsmTestCase):
 
     def test_results(self):
@@ -227,6 +228,38 @@ class TMapTests(VdsmTestCase):
         expected = [concurrent.Result(False, error)] * 10
         self.assertEqual(results, expected)
 
+    def test_max_workers(self):
+        lock = threading.Lock()
+        running = [0]
+        peak = [0]
+
+        def func(x):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.05)
+            with lock:
+                running[0] -= 1
+            return x
+
+        values = tuple(range(10))
+        results = concurrent.tmap(func, values, max_workers=3)
+        expected = [concurrent.Result(True, x) for x in values]
+        self.assertEqual(results, expected)
+        self.assertEqual(peak[0], 3)
+
+    def test_max_workers_concurrency(self):
+        start = monotonic_time()
+        concurrent.tmap(time.sleep, [0.25] * 10, max_workers=5)
+        elapsed = monotonic_time() - start
+        self.assertGreaterEqual(elapsed, 0.5)
+        self.assertLess(elapsed, 1.0)
+
+    @permutations([[0], [-1]])
+    def test_invalid_max_workers(self, max_workers):
+        self.assertRaises(ValueError, concurrent.tmap, lambda x: x, [1, 2],
+                          max_workers=max_workers)
+
 
 @expandPermutations
 class ThreadTests(VdsmTestCase):
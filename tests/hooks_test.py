@@ -25,6 +25,7 @@ from __future__ import division
 
 
 import contextlib
+import hashlib
 import libvirt
 import tempfile
 import os
@@ -80,6 +81,83 @@ echo -n %s >> "$_hook_domxml"
             res = hooks._runHooksDir(DOMXML, dirName)
             self.assertEqual(expectedResult, res)
 
+    def test_missingDir(self):
+        DOMXML = "algo"
+        self.assertEqual(
+            DOMXML, hooks._runHooksDir(DOMXML, '/tmp/nonExistent'))
+
+    def test_scriptsPerDirCache(self):
+        with self.tempScripts() as (dirName, scripts):
+            self.assertEqual(3, len(hooks._scriptsPerDir(dirName)))
+            os.unlink(scripts[0].name)
+            # Removing a script modifies the directory mtime, but the
+            # modification may happen in the same mtime tick.
+            os.utime(dirName, (0, 0))
+            self.assertEqual(
+                [s.name for s in scripts[1:]],
+                hooks._scriptsPerDir(dirName))
+
+    def writePythonHook(self, dirName, name, code):
+        path = os.path.join(dirName, name + hooks._PYTHON_HOOK_SUFFIX)
+        with open(path, "w") as f:
+            f.write(code)
+        return path
+
+    def test_runPythonHooks(self):
+        with namedTemporaryDir() as dirName:
+            self.writePythonHook(dirName, "01", """
+def run(data, env):
+    data["vms"].append(env["vmId"])
+    return data
+""")
+            self.writePythonHook(dirName, "02", """
+def run(data, env):
+    data["count"] = len(data["vms"])
+    return data
+""")
+            res = hooks._runHooksDir(
+                {"vms": []}, dirName, vmconf={"vmId": "vm-1"},
+                hookType=hooks._JSON_HOOK)
+            self.assertEqual({"vms": ["vm-1"], "count": 1}, res)
+
+    def test_runPythonHookError(self):
+        with namedTemporaryDir() as dirName:
+            self.writePythonHook(dirName, "01", """
+def run(data, env):
+    raise RuntimeError("fake error")
+""")
+            with self.assertRaises(hooks.exception.HookError):
+                hooks._runHooksDir("algo", dirName)
+            errors = []
+            res = hooks._runHooksDir(
+                "algo", dirName, raiseError=False, errors=errors)
+            self.assertEqual("algo", res)
+            self.assertEqual(["fake error"], errors)
+
+    def test_runPythonHookReload(self):
+        with namedTemporaryDir() as dirName:
+            path = self.writePythonHook(dirName, "01", """
+def run(data, env):
+    return data + "1"
+""")
+            self.assertEqual("algo1", hooks._runHooksDir("algo", dirName))
+            self.writePythonHook(dirName, "01", """
+def run(data, env):
+    return data + "2"
+""")
+            # The module may be modified in the same mtime tick.
+            os.utime(path, (0, 0))
+            self.assertEqual("algo2", hooks._runHooksDir("algo", dirName))
+
+    def test_runMixedHooks(self):
+        with self.tempScripts() as (dirName, scripts):
+            self.writePythonHook(dirName, os.path.basename(scripts[0].name), """
+def run(data, env):
+    return data + "py"
+""")
+            res = hooks._runHooksDir("algo", dirName)
+            self.assertEqual("algo0py12", res)
+
     def test_getNEScriptInfo(self):
         path = '/tmp/nonExistent'
         info = hooks._getScriptInfo(path)
@@ -101,6 +179,18 @@ echo "81212590184644762"
         os.unlink(sName)
         self.assertEqual({'md5': md5}, info)
 
+    def test_getScriptInfo_modified(self):
+        sName, md5 = self.createScript()
+        try:
+            self.assertEqual({'md5': md5}, hooks._getScriptInfo(sName))
+            with open(sName, 'a') as f:
+                f.write('echo "modified"\n')
+            with open(sName) as f:
+                expected = hashlib.md5(f.read()).hexdigest()
+            self.assertEqual({'md5': expected}, hooks._getScriptInfo(sName))
+        finally:
+            os.unlink(sName)
+
     def test_getHookInfo(self):
         with namedTemporaryDir() as dir:
             sName, md5 = self.createScript(dir)
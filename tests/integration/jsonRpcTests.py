@@ -40,6 +40,7 @@ from jsonRpcHelper import \
     constructAcceptor
 
 from yajsonrpc import JsonRpcRequest
+from yajsonrpc import PRIORITY_NORMAL
 from yajsonrpc.exception import \
     JsonRpcErrorBase, \
     JsonRpcMethodNotFoundError, \
@@ -71,6 +72,9 @@ class _DummyBridge(object):
         except AttributeError:
             raise JsonRpcMethodNotFoundError(method=method)
 
+    def scheduling_policy(self, method):
+        return PRIORITY_NORMAL, None, None
+
     def echo(self, text):
         self.log.info("ECHO: '%s'", text)
         return text
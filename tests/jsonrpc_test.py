@@ -21,10 +21,15 @@
 from __future__ import absolute_import
 from __future__ import division
 from yajsonrpc import JsonRpcRequest, JsonRpcServer
+from yajsonrpc import RequestScheduler
+from yajsonrpc import PRIORITY_HIGH, PRIORITY_NORMAL
+
+import yajsonrpc
 
 from vdsm.common import exception
 from vdsm.common.compat import json
 
+from monkeypatch import MonkeyPatch
 from testlib import VdsmTestCase
 
 
@@ -63,3 +68,226 @@ class ServerTests(VdsmTestCase):
         self.assertEqual({"reason": "Too many tasks",
                           "resource": "test",
                           "current_tasks": 0}, reason)
+
+
+class FakeTask(object):
+
+    def __init__(self, method):
+        self.method = method
+
+    def __repr__(self):
+        return "<FakeTask %s>" % self.method
+
+
+def policy(method):
+    return {
+        "Host.getStats": (PRIORITY_HIGH, None, None),
+        "Volume.copy": (PRIORITY_NORMAL, 1, None),
+        "Volume.create": (PRIORITY_NORMAL, 1, 1),
+    }.get(method, (PRIORITY_NORMAL, None, None))
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.time = 0
+
+    def __call__(self):
+        return self.time
+
+
+class SchedulerTests(VdsmTestCase):
+
+    def test_run_immediately(self):
+        scheduler = RequestScheduler(2, 10, 60, policy=policy)
+        task = FakeTask("Host.getCapabilities")
+        self.assertEqual(scheduler.schedule(task), [task])
+
+    def test_max_running(self):
+        scheduler = RequestScheduler(2, 10, 60, policy=policy)
+        tasks = [FakeTask("Host.getCapabilities") for i in range(3)]
+        self.assertEqual(scheduler.schedule(tasks[0]), [tasks[0]])
+        self.assertEqual(scheduler.schedule(tasks[1]), [tasks[1]])
+        self.assertEqual(scheduler.schedule(tasks[2]), [])
+        self.assertEqual(scheduler.done(tasks[0]), [tasks[2]])
+        self.assertEqual(scheduler.done(tasks[1]), [])
+
+    def test_priority(self):
+        scheduler = RequestScheduler(1, 10, 60, policy=policy)
+        running = FakeTask("Volume.create")
+        normal = FakeTask("Host.getCapabilities")
+        high = FakeTask("Host.getStats")
+        scheduler.schedule(running)
+        scheduler.schedule(normal)
+        scheduler.schedule(high)
+        # High priority task runs first, although it was queued later.
+        self.assertEqual(scheduler.done(running), [high])
+        self.assertEqual(scheduler.done(high), [normal])
+
+    def test_method_limit(self):
+        scheduler = RequestScheduler(4, 10, 60, policy=policy)
+        copy1 = FakeTask("Volume.copy")
+        copy2 = FakeTask("Volume.copy")
+        other = FakeTask("Host.getCapabilities")
+        self.assertEqual(scheduler.schedule(copy1), [copy1])
+        # Limited method waits, but does not block other methods.
+        self.assertEqual(scheduler.schedule(copy2), [])
+        self.assertEqual(scheduler.schedule(other), [other])
+        self.assertEqual(scheduler.done(copy1), [copy2])
+
+    def test_queue_full(self):
+        scheduler = RequestScheduler(1, 2, 60, policy=policy)
+        scheduler.schedule(FakeTask("Host.getCapabilities"))
+        scheduler.schedule(FakeTask("Host.getCapabilities"))
+        scheduler.schedule(FakeTask("Host.getCapabilities"))
+        with self.assertRaises(exception.ResourceExhausted):
+            scheduler.schedule(FakeTask("Host.getCapabilities"))
+
+    @MonkeyPatch(yajsonrpc, "monotonic_time", FakeClock())
+    def test_blocked_task(self):
+        clock = yajsonrpc.monotonic_time
+        scheduler = RequestScheduler(1, 10, 60, policy=policy)
+        blocked = FakeTask("Host.getCapabilities")
+        waiting = FakeTask("Host.getCapabilities")
+        scheduler.schedule(blocked)
+        self.assertEqual(scheduler.schedule(waiting), [])
+
+        # Task running longer than timeout does not count as running.
+        clock.time = 61
+        self.assertEqual(scheduler.done(FakeTask("unknown")), [waiting])
+
+    @MonkeyPatch(yajsonrpc, "monotonic_time", FakeClock())
+    def test_blocked_method(self):
+        clock = yajsonrpc.monotonic_time
+        scheduler = RequestScheduler(4, 10, 60, policy=policy)
+        blocked = FakeTask("Volume.copy")
+        waiting = FakeTask("Volume.copy")
+        scheduler.schedule(blocked)
+        self.assertEqual(scheduler.schedule(waiting), [])
+        self.assertEqual(scheduler.poll(), [])
+
+        # Task running longer than timeout does not count for the method
+        # limit, and polling runs the waiting task.
+        clock.time = 61
+        self.assertEqual(scheduler.poll(), [waiting])
+
+    def test_method_queue_full(self):
+        scheduler = RequestScheduler(4, 10, 60, policy=policy,
+                                     max_method_queued=2)
+        for i in range(3):
+            scheduler.schedule(FakeTask("Volume.copy"))
+        with self.assertRaises(exception.ResourceExhausted):
+            scheduler.schedule(FakeTask("Volume.copy"))
+
+        # Other methods are not affected.
+        high = FakeTask("Host.getStats")
+        self.assertEqual(scheduler.schedule(high), [high])
+
+    def test_method_queue_full_dequeue(self):
+        scheduler = RequestScheduler(4, 10, 60, policy=policy,
+                                     max_method_queued=1)
+        running = FakeTask("Volume.copy")
+        waiting = FakeTask("Volume.copy")
+        scheduler.schedule(running)
+        scheduler.schedule(waiting)
+        self.assertEqual(scheduler.done(running), [waiting])
+
+        # The waiting task is not queued now.
+        queued = FakeTask("Volume.copy")
+        self.assertEqual(scheduler.schedule(queued), [])
+
+    def test_method_queue_high_priority(self):
+        scheduler = RequestScheduler(1, 10, 60, policy=policy,
+                                     max_method_queued=1)
+        scheduler.schedule(FakeTask("Volume.copy"))
+        # High priority methods are not limited by the default limit.
+        for i in range(3):
+            self.assertEqual(scheduler.schedule(FakeTask("Host.getStats")),
+                             [])
+
+    def test_method_queue_method_limit(self):
+        scheduler = RequestScheduler(1, 10, 60, policy=policy,
+                                     max_method_queued=5)
+        scheduler.schedule(FakeTask("Host.getCapabilities"))
+        scheduler.schedule(FakeTask("Volume.create"))
+        # The method limit overrides the default limit.
+        with self.assertRaises(exception.ResourceExhausted):
+            scheduler.schedule(FakeTask("Volume.create"))
+
+    @MonkeyPatch(yajsonrpc, "monotonic_time", FakeClock())
+    def test_stats(self):
+        clock = yajsonrpc.monotonic_time
+        scheduler = RequestScheduler(1, 10, 60, policy=policy)
+        tasks = [FakeTask("Host.getCapabilities") for i in range(3)]
+        for task in tasks:
+            scheduler.schedule(task)
+        clock.time = 2
+        scheduler.done(tasks[0])
+
+        stats = scheduler.stats()
+        self.assertEqual(stats, {
+            "queued.high": 0,
+            "queued.normal": 1,
+            "running": 1,
+            "wait_time.max": 2,
+            "wait_time.avg": 1,
+        })
+
+        # Wait time stats are reset after reporting.
+        stats = scheduler.stats()
+        self.assertEqual(stats["wait_time.max"], 0)
+
+    def test_server_dispatch(self):
+        dispatched = []
+        scheduler = RequestScheduler(1, 10, 60, policy=policy)
+        server = JsonRpcServer(None, 0, None, threadFactory=dispatched.append,
+                               scheduler=scheduler)
+        ctx1 = FakeContext()
+        ctx2 = FakeContext()
+        request = JsonRpcRequest.decode(
+            '{"jsonrpc":"2.0","method":"Host.stats","params":{},"id":"1"}')
+
+        server._runRequest(ctx1, request)
+        server._runRequest(ctx2, request)
+        self.assertEqual(len(dispatched), 1)
+
+        # Completing the task dispatches the next one.
+        server._taskDone(dispatched[0])
+        self.assertEqual(len(dispatched), 2)
+        self.assertIs(dispatched[1].ctx, ctx2)
+
+    @MonkeyPatch(yajsonrpc, "monotonic_time", FakeClock())
+    def test_server_dispatch_ready(self):
+        clock = yajsonrpc.monotonic_time
+        dispatched = []
+        scheduler = RequestScheduler(1, 10, 60, policy=policy)
+        server = JsonRpcServer(None, 0, None, threadFactory=dispatched.append,
+                               scheduler=scheduler)
+        request = JsonRpcRequest.decode(
+            '{"jsonrpc":"2.0","method":"Host.stats","params":{},"id":"1"}')
+        server._runRequest(FakeContext(), request)
+        server._runRequest(FakeContext(), request)
+        server.dispatch_ready()
+        self.assertEqual(len(dispatched), 1)
+
+        # The first task is blocked, dispatch the next one.
+        clock.time = 61
+        server.dispatch_ready()
+        self.assertEqual(len(dispatched), 2)
+
+    def test_server_dispatch_failure(self):
+        def thread_factory(callable):
+            raise exception.ResourceExhausted("Too many tasks",
+                                              resource="test", current_tasks=0)
+
+        scheduler = RequestScheduler(1, 10, 60, policy=policy)
+        server = JsonRpcServer(None, 0, None, threadFactory=thread_factory,
+                               scheduler=scheduler)
+        ctx = FakeContext()
+        request = JsonRpcRequest.decode(
+            '{"jsonrpc":"2.0","method":"Host.stats","params":{},"id":"1"}')
+        server._runRequest(ctx, request)
+
+        error = ctx.response.toDict().get('error')
+        self.assertEqual(1100, error.get('code'))
+        self.assertEqual(scheduler.stats()["running"], 0)
@@ -21,8 +21,10 @@
 from __future__ import absolute_import
 from __future__ import division
 
+import os
 import tempfile
 
+from monkeypatch import MonkeyPatchScope
 from testlib import VdsmTestCase
 from testlib import permutations, expandPermutations
 
@@ -49,3 +51,47 @@ class TestOsinfo(VdsmTestCase):
     def test_package_versions(self):
         pkgs = osinfo.package_versions()
         self.assertIn('kernel', pkgs)
+
+    def test_package_versions_cached(self):
+        calls = []
+
+        def package_versions():
+            calls.append(1)
+            return {'vdsm': {'version': '4.30', 'release': str(len(calls))}}
+
+        with tempfile.NamedTemporaryFile() as db:
+            with MonkeyPatchScope([
+                (osinfo, '_PACKAGE_DB_FILES', (db.name,)),
+                (osinfo, '_package_versions', package_versions),
+                (osinfo, '_packages', None),
+            ]):
+                pkgs = osinfo.package_versions()
+                self.assertEqual(pkgs['vdsm']['release'], '1')
+
+                # Modifying the result does not modify the cache.
+                pkgs['vdsm']['release'] = 'modified'
+                pkgs = osinfo.package_versions()
+                self.assertEqual(pkgs['vdsm']['release'], '1')
+                self.assertEqual(len(calls), 1)
+
+                # Modifying the database invalidates the cache.
+                st = os.stat(db.name)
+                os.utime(db.name, (st.st_atime, st.st_mtime + 1))
+                pkgs = osinfo.package_versions()
+                self.assertEqual(pkgs['vdsm']['release'], '2')
+
+    def test_package_versions_no_db(self):
+        calls = []
+
+        def package_versions():
+            calls.append(1)
+            return {}
+
+        with MonkeyPatchScope([
+            (osinfo, '_PACKAGE_DB_FILES', ('/no/such/db',)),
+            (osinfo, '_package_versions', package_versions),
+            (osinfo, '_packages', None),
+        ]):
+            osinfo.package_versions()
+            osinfo.package_versions()
+            self.assertEqual(len(calls), 2)
@@ -0,0 +1,106 @@
+#
+# Copyright 2019 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+
+from __future__ import absolute_import
+from __future__ import division
+
+import io
+import json
+import os
+
+import pytest
+
+from vdsm.common import concurrent
+from vdsm.profiling import startup
+
+from monkeypatch import MonkeyPatchScope
+from testlib import make_config
+from testlib import namedTemporaryDir
+
+
+@pytest.fixture
+def report_file():
+    with namedTemporaryDir() as tmpdir:
+        path = os.path.join(tmpdir, "startup.json")
+        config = make_config([("devel", "startup_report_filename", path)])
+        with MonkeyPatchScope([(startup, "config", config)]):
+            yield path
+
+
+def test_timeline():
+    startup.start()
+    with startup.phase("phase"):
+        pass
+    startup.event("event")
+
+    phases = startup.report()["phases"]
+    assert [p["name"] for p in phases] == ["imports", "phase", "event"]
+
+    imports, phase, event = phases
+    assert imports["start"] == 0.0
+    assert imports["duration"] > 0.0
+    assert phase["start"] >= imports["duration"]
+    assert event["start"] >= phase["start"] + phase["duration"]
+    assert event["duration"] == 0.0
+
+
+def test_phase_failure():
+    startup.start()
+    with pytest.raises(RuntimeError):
+        with startup.phase("failed"):
+            raise RuntimeError
+    names = [p["name"] for p in startup.report()["phases"]]
+    assert names == ["imports", "failed"]
+
+
+def test_restart():
+    startup.start()
+    startup.event("old")
+    startup.start()
+    names = [p["name"] for p in startup.report()["phases"]]
+    assert names == ["imports"]
+
+
+def test_write(report_file):
+    startup.start()
+    startup.event("started")
+    startup.write()
+    with io.open(report_file, "rb") as f:
+        assert json.loads(f.read().decode("utf-8")) == startup.report()
+    assert not os.path.exists(report_file + ".tmp")
+
+
+def test_write_concurrently(report_file):
+    # Called from both the main thread and the recovery thread.
+    startup.start()
+    startup.event("started")
+    results = concurrent.tmap(lambda i: startup.write(), range(8))
+    assert all(r.succeeded for r in results)
+    with io.open(report_file, "rb") as f:
+        assert json.loads(f.read().decode("utf-8")) == startup.report()
+    assert not os.path.exists(report_file + ".tmp")
+
+
+def test_write_disabled():
+    config = make_config([("devel", "startup_report_filename", "")])
+    with MonkeyPatchScope([(startup, "config", config)]):
+        startup.start()
+        # Should only log the timeline.
+        startup.write()
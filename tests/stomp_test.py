@@ -64,6 +64,9 @@ class _SampleBridge(object):
     def unregister_server_address(self):
         self.server_address = None
 
+    def scheduling_policy(self, method):
+        return yajsonrpc.PRIORITY_NORMAL, None, None
+
     def dispatch(self, method):
         try:
             return getattr(self, method)
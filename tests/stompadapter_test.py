@@ -20,10 +20,15 @@
 
 from __future__ import absolute_import
 from __future__ import division
+import time
 from collections import defaultdict
 
+import pytest
+
 from testlib import VdsmTestCase as TestCaseBase
+from vdsm.common.compat import json
 from yajsonrpc import JsonRpcRequest
+from yajsonrpc import _JsonRpcServeRequestContext
 from yajsonrpc.betterAsyncore import Reactor
 from yajsonrpc.stomp import \
     Command, \
@@ -32,6 +37,7 @@ from yajsonrpc.stomp import \
     SUBSCRIPTION_ID_REQUEST
 from yajsonrpc.stomp import AsyncDispatcher
 from yajsonrpc.stompserver import StompAdapterImpl
+from yajsonrpc.stompserver import StompServer
 from stomp_test_utils import (
     FakeAsyncClient,
     FakeAsyncDispatcher,
@@ -461,3 +467,119 @@ class ServerTimeoutTests(TestCaseBase):
 
         self.assertEqual(len(adapter._sub_ids), 0)
         self.assertEqual(len(destinations), 0)
+
+
+RESPONSES = 'jms.topic.vdsm_responses'
+EVENTS = 'jms.queue.events'
+
+
+def make_server(req_dest):
+    subscriptions = defaultdict(list)
+    clients = {}
+    for destination in (RESPONSES, EVENTS):
+        subscription = FakeSubscription(destination, destination + '-id')
+        clients[destination] = FakeAsyncClient()
+        subscription.set_client(clients[destination])
+        subscriptions[destination].append(subscription)
+    server = StompServer(Reactor(), subscriptions)
+    server._req_dest = req_dest
+    return server, clients
+
+
+class ServerSendTest(TestCaseBase):
+
+    def test_send_response(self):
+        server, clients = make_server({"id-1": RESPONSES})
+        # Message is not parsed, the destination is found using the id.
+        server.send(b'not json', EVENTS, response_ids=["id-1"])
+
+        frame = clients[RESPONSES].pop_message()
+        self.assertEqual(frame.command, Command.MESSAGE)
+        self.assertEqual(frame.headers[Headers.DESTINATION], RESPONSES)
+        self.assertEqual(frame.body, b'not json')
+        self.assertTrue(clients[EVENTS].empty())
+        self.assertEqual(server._req_dest, {})
+
+    def test_send_batch_response(self):
+        server, clients = make_server({"id-1": RESPONSES, "id-2": RESPONSES})
+        server.send(b'[]', EVENTS, response_ids=["id-1", "id-2"])
+
+        frame = clients[RESPONSES].pop_message()
+        self.assertEqual(frame.headers[Headers.DESTINATION], RESPONSES)
+        self.assertEqual(server._req_dest, {})
+
+    def test_send_event(self):
+        server, clients = make_server({"id-1": RESPONSES})
+        server.send(b'{"jsonrpc": "2.0", "method": "event"}', EVENTS)
+
+        frame = clients[EVENTS].pop_message()
+        self.assertEqual(frame.headers[Headers.DESTINATION], EVENTS)
+        self.assertTrue(clients[RESPONSES].empty())
+        self.assertEqual(server._req_dest, {"id-1": RESPONSES})
+
+    def test_reply_context(self):
+        server, clients = make_server({"id-1": RESPONSES})
+        ctx = _JsonRpcServeRequestContext(server, None, None)
+        ctx.requestDone(FakeResponse("id-1", '{"id": "id-1"}'))
+
+        frame = clients[RESPONSES].pop_message()
+        self.assertEqual(frame.body, b'{"id": "id-1"}')
+        self.assertEqual(server._req_dest, {})
+
+
+class FakeResponse(object):
+
+    def __init__(self, id, data):
+        self.id = id
+        self._data = data
+
+    def encode(self):
+        return self._data
+
+
+@pytest.mark.slow
+def test_benchmark_reply():
+    # Simulate Host.getAllVmStats reply on a dense host.
+    vm_stats = {
+        "vmId": "e8a936a6-d886-4cfa-97b9-2d54209053ff",
+        "status": "Up",
+        "network": {
+            "vnet%d" % i: {"rxErrors": "0", "txDropped": "0", "rx": "1024"}
+            for i in range(4)
+        },
+        "disks": {
+            "vd%s" % c: {"readLatency": "0.000", "writeRate": "1024.0"}
+            for c in "abcd"
+        },
+        "guestName": "vm-name",
+        "balloonInfo": {"balloon_max": "4194304", "balloon_cur": "4194304"},
+    }
+    message = json.dumps({
+        "jsonrpc": "2.0",
+        "id": "e8a936a6-d886-4cfa-97b9-2d54209053ff",
+        "result": [vm_stats] * 500,
+    }).encode("utf-8")
+    count = 100
+
+    # The cost of decoding the message, needed before the response ids were
+    # passed with the message.
+    start = time.time()
+    for i in range(count):
+        json.loads(message)
+    decode_elapsed = time.time() - start
+
+    server, clients = make_server({})
+    start = time.time()
+    for i in range(count):
+        req_id = str(i)
+        server._req_dest[req_id] = RESPONSES
+        server.send(message, response_ids=[req_id])
+        clients[RESPONSES].pop_message()
+    send_elapsed = time.time() - start
+
+    print("decode: %d messages of %d bytes in %.6f seconds "
+          "(%.6f seconds per message)"
+          % (count, len(message), decode_elapsed, decode_elapsed / count))
+    print("send: %d messages of %d bytes in %.6f seconds "
+          "(%.6f seconds per message)"
+          % (count, len(message), send_elapsed, send_elapsed / count))
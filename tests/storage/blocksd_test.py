@@ -88,21 +88,40 @@ def fakeGetLV(vgName):
     return lvs
 
 
+def fakeGetLvIndex(vgName):
+    return lvm.LVIndex(fakeGetLV(vgName))
+
+
 class TestGetAllVolumes:
     # TODO: add more tests, see fileSDTests.py
 
     def test_volumes_count(self, monkeypatch):
-        monkeypatch.setattr(lvm, 'getLV', fakeGetLV)
+        monkeypatch.setattr(lvm, 'getLvIndex', fakeGetLvIndex)
         sdName = "3386c6f2-926f-42c4-839c-38287fac8998"
         allVols = blockSD.getAllVolumes(sdName)
         assert len(allVols) == 23
 
     def test_missing_tags(self, monkeypatch):
-        monkeypatch.setattr(lvm, 'getLV', fakeGetLV)
+        monkeypatch.setattr(lvm, 'getLvIndex', fakeGetLvIndex)
         sdName = "f9e55e18-67c4-4377-8e39-5833ca422bef"
         allVols = blockSD.getAllVolumes(sdName)
         assert len(allVols) == 1
 
+    def test_cached_per_index(self, monkeypatch):
+        sdName = "3386c6f2-926f-42c4-839c-38287fac8998"
+        index = fakeGetLvIndex(sdName)
+        monkeypatch.setattr(lvm, 'getLvIndex', lambda vgName: index)
+        monkeypatch.setattr(blockSD, '_allVolumes', {})
+        allVols = blockSD.getAllVolumes(sdName)
+
+        # Same index: modifying the result must not affect the cache.
+        allVols.clear()
+        assert len(blockSD.getAllVolumes(sdName)) == 23
+
+        # LVs changed: the result is computed again.
+        index = lvm.LVIndex(index.lvs[:1])
+        assert len(blockSD.getAllVolumes(sdName)) == 1
+
 
 class TestDecodeValidity:
 
@@ -146,6 +165,47 @@ def test_metadata_offset(monkeypatch):
     assert 1867776 == sd_manifest.metadata_offset(100, version=5)
 
 
+def test_get_volumes_metadata_invalid_slot(monkeypatch):
+    sd_uuid = str(uuid.uuid4())
+    fake_metadata = {
+        sd.DMDK_VERSION: 5,
+        sd.DMDK_LOGBLKSIZE: 512,
+        sd.DMDK_PHYBLKSIZE: 512,
+    }
+
+    monkeypatch.setattr(sd.StorageDomainManifest, "_makeDomainLock",
+                        lambda _: None)
+    sd_manifest = blockSD.BlockStorageDomainManifest(sd_uuid, fake_metadata)
+
+    good = (
+        "CAP=1073741824\n"
+        "CTIME=1550522547\n"
+        "DESCRIPTION=good\n"
+        "DISKTYPE=DATA\n"
+        "DOMAIN=%s\n"
+        "FORMAT=COW\n"
+        "IMAGE=img-id\n"
+        "LEGALITY=LEGAL\n"
+        "PUUID=%s\n"
+        "TYPE=SPARSE\n"
+        "VOLTYPE=LEAF\n"
+        "EOF\n" % (sd_uuid, sc.BLANK_UUID))
+    bad_ctime = good.replace("CTIME=1550522547", "CTIME=corrupted")
+    missing_key = good.replace("FORMAT=COW\n", "")
+
+    monkeypatch.setattr(
+        sd_manifest, "_volumes_metadata_slots",
+        lambda: [(4, "vol-1"), (5, "vol-2"), (6, "vol-3")])
+    monkeypatch.setattr(
+        sd_manifest, "read_metadata_blocks",
+        lambda slots: {4: good, 5: bad_ctime, 6: missing_key})
+
+    # Volumes with invalid metadata are logged and skipped.
+    volumes = sd_manifest.get_volumes_metadata()
+    assert list(volumes) == ["vol-1"]
+    assert volumes["vol-1"].description == "good"
+
+
 @requires_root
 @xfail_python3
 @pytest.mark.root
@@ -310,6 +370,19 @@ def test_volume_life_cycle(monkeypatch, tmp_storage, tmp_repo, fake_access,
     assert actual["voltype"] == "LEAF"
     assert actual["uuid"] == vol_uuid
 
+    # test reading metadata of all volumes
+    volumes = dom.dump_volumes()
+    assert list(volumes) == [vol_uuid]
+    info = volumes[vol_uuid]
+    assert info["capacity"] == vol_capacity
+    assert info["ctime"] == 1550522547
+    assert info["description"] == vol_desc
+    assert info["image"] == img_uuid
+    assert info["imgs"] == [img_uuid]
+    assert info["parent"] == sc.BLANK_UUID
+    assert info["status"] == "OK"
+    assert info["truesize"] == int(actual["truesize"])
+
     vol_path = vol.getVolumePath()
 
     # Keep the slot before deleting the volume.
@@ -345,6 +418,9 @@ def test_volume_life_cycle(monkeypatch, tmp_storage, tmp_repo, fake_access,
     data = dom.manifest.read_metadata_block(slot)
     assert data == b"\0" * sc.METADATA_SIZE
 
+    blocks = dom.manifest.read_metadata_blocks([slot])
+    assert blocks == {slot: b"\0" * sc.METADATA_SIZE}
+
 
 @requires_root
 @xfail_python3
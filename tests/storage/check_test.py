@@ -22,10 +22,12 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import functools
 import logging
 import os
 import pprint
 import re
+import sys
 import threading
 import time
 from contextlib import contextmanager
@@ -46,6 +48,11 @@ from vdsm.storage import check
 from vdsm.storage import asyncevent
 from vdsm.storage import exception
 
+HELPER = os.path.join(os.path.dirname(__file__), "..", "..", "lib", "vdsm",
+                      "storage", "check-helper")
+
+FAKE_HELPER = os.path.join(os.path.dirname(__file__), "fake-check-helper")
+
 
 @expandPermutations
 class TestDirectioChecker(VdsmTestCase):
@@ -353,6 +360,158 @@ class TestDirectioCheckerTimings(VdsmTestCase):
             self.assertRaises(exception.MiscFileReadException, res.delay)
 
 
+class TestHelperChecker(VdsmTestCase):
+
+    def setUp(self):
+        self.loop = asyncevent.EventLoop()
+        self.helper = check.CheckHelper(
+            self.loop, cmd=[sys.executable, HELPER])
+        self.results = []
+        self.checks = 1
+
+    def tearDown(self):
+        self.helper.close()
+        self.loop.close()
+
+    def complete(self, result):
+        self.results.append(result)
+        if len(self.results) == self.checks:
+            self.loop.stop()
+
+    def test_path_missing(self):
+        checker = check.HelperChecker(self.loop, "/no/such/path",
+                                      self.complete, self.helper)
+        checker.start()
+        self.loop.run_forever()
+        pprint.pprint(self.results)
+        result = self.results[0]
+        self.assertRaises(exception.MiscFileReadException, result.delay)
+
+    def test_path_ok(self):
+        with temporaryPath(data=b"blah") as path:
+            checker = check.HelperChecker(self.loop, path, self.complete,
+                                          self.helper)
+            checker.start()
+            self.loop.run_forever()
+            pprint.pprint(self.results)
+            result = self.results[0]
+            delay = result.delay()
+            print("delay:", delay)
+            self.assertEqual(type(delay), float)
+
+    def test_shared_helper(self):
+        self.checks = 10
+        with temporaryPath(data=b"blah") as path:
+            for i in range(self.checks):
+                checker = check.HelperChecker(self.loop, path, self.complete,
+                                              self.helper)
+                checker.start()
+            self.loop.run_forever()
+            pprint.pprint(self.results)
+            for result in self.results:
+                result.delay()
+
+    def test_helper_missing(self):
+        helper = check.CheckHelper(self.loop, cmd=["/no/such/executable"])
+        checker = check.HelperChecker(self.loop, "/path", self.complete,
+                                      helper)
+        checker.start()
+        self.loop.run_forever()
+        pprint.pprint(self.results)
+        result = self.results[0]
+        self.assertEqual(result.rc, check.EXEC_ERROR)
+        self.assertRaises(exception.MiscFileReadException, result.delay)
+
+    def test_timeout(self):
+        # Expected events:
+        # +0.0 start checker
+        # +0.3 fail with timeout
+        # +0.4 helper completes, result ignored
+        # +0.5 loop stopped
+
+        def complete(result):
+            self.results.append(result)
+            self.loop.call_later(0.2, self.loop.stop)
+
+        helper = check.CheckHelper(
+            self.loop, cmd=[sys.executable, FAKE_HELPER, "0.4"])
+        try:
+            checker = check.HelperChecker(self.loop, "/path", complete,
+                                          helper, interval=0.3)
+            checker.start()
+            self.loop.run_forever()
+        finally:
+            helper.close()
+
+        self.assertEqual(len(self.results), 1)
+        with self.assertRaises(exception.MiscFileReadException) as e:
+            self.results[0].delay()
+        self.assertIn("Read timeout", str(e.exception))
+
+    def test_helper_terminated(self):
+        # Expected events:
+        # +0.0 start checker
+        # +0.1 helper killed, check fails
+        # +0.4 start check, new helper started
+        # +0.6 check succeeds
+
+        self.checks = 2
+        helper = check.CheckHelper(
+            self.loop, cmd=[sys.executable, FAKE_HELPER, "0.2"])
+        try:
+            checker = check.HelperChecker(self.loop, "/path", self.complete,
+                                          helper, interval=0.4)
+            checker.start()
+            first_pid = helper._proc.pid
+            self.loop.call_later(0.1, helper._proc.kill)
+            self.loop.run_forever()
+            second_pid = helper._proc.pid
+        finally:
+            helper.close()
+
+        pprint.pprint(self.results)
+        self.assertEqual(self.results[0].rc, check.EXEC_ERROR)
+        self.assertEqual(self.results[1].delay(), 0.2)
+        self.assertNotEqual(first_pid, second_pid)
+
+
+@expandPermutations
+class TestHelperCheckerTimings(VdsmTestCase):
+
+    def setUp(self):
+        self.loop = asyncevent.EventLoop()
+        self.helper = check.CheckHelper(
+            self.loop, cmd=[sys.executable, HELPER])
+        self.results = []
+
+    def tearDown(self):
+        self.helper.close()
+        self.loop.close()
+
+    def complete(self, result):
+        self.results.append(result)
+        if len(self.results) == self.checkers:
+            self.loop.stop()
+
+    @pytest.mark.slow
+    @permutations([[1], [50], [100], [200]])
+    def test_path_ok(self, checkers):
+        self.checkers = checkers
+        with temporaryPath(data=b"blah") as path:
+            start = time.time()
+            for i in range(checkers):
+                checker = check.HelperChecker(self.loop, path, self.complete,
+                                              self.helper)
+                checker.start()
+            self.loop.run_forever()
+            elapsed = time.time() - start
+            self.assertEqual(len(self.results), self.checkers)
+            print("%d checkers: %f seconds" % (checkers, elapsed))
+            # Make sure all succeeded
+            for res in self.results:
+                res.delay()
+
+
 @expandPermutations
 class TestCheckResult(VdsmTestCase):
 
@@ -405,6 +564,15 @@ class TestCheckResult(VdsmTestCase):
         result = check.CheckResult("/path", 0, err, 0, 0)
         self.assertRaises(exception.MiscFileReadException, result.delay)
 
+    def test_helper_success(self):
+        result = check.CheckResult("/path", 0, "", 0, 0, seconds=0.5)
+        self.assertEqual(result.delay(), 0.5)
+
+    def test_helper_failure(self):
+        result = check.CheckResult("/path", 2, "No such file or directory",
+                                   0, 0)
+        self.assertRaises(exception.MiscFileReadException, result.delay)
+
 
 class TestCheckService(VdsmTestCase):
 
@@ -458,6 +626,44 @@ class TestCheckService(VdsmTestCase):
             self.assertFalse(self.service.is_checking("/path"))
 
 
+class TestCheckServiceHelper(VdsmTestCase):
+
+    def setUp(self):
+        helper = functools.partial(check.CheckHelper,
+                                   cmd=[sys.executable, HELPER])
+        with MonkeyPatchScope([(check, "CheckHelper", helper)]):
+            self.service = check.CheckService(backend=check.HELPER)
+        self.service.start()
+        self.result = None
+        self.completed = threading.Event()
+
+    def tearDown(self):
+        self.service.stop()
+
+    def complete(self, result):
+        self.result = result
+        self.completed.set()
+
+    def test_start_checking(self):
+        with temporaryPath(data=b"blah") as path:
+            self.service.start_checking(path, self.complete)
+            self.assertTrue(self.service.is_checking(path))
+            self.assertTrue(self.completed.wait(5.0))
+            self.assertEqual(self.result.rc, 0)
+            self.assertEqual(type(self.result.delay()), float)
+
+    def test_stop_checking_and_wait(self):
+        with temporaryPath(data=b"blah") as path:
+            self.service.start_checking(path, self.complete)
+            self.assertTrue(self.service.stop_checking(path, timeout=5.0))
+            self.assertFalse(self.service.is_checking(path))
+
+
+def test_invalid_backend():
+    with pytest.raises(ValueError):
+        check.CheckService(backend="invalid")
+
+
 @contextmanager
 def fake_dd(delay):
     """
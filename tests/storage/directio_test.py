@@ -97,3 +97,65 @@ class TestDirectFile(VdsmTestCase):
                 directio.open(srcPath) as direct_file, \
                 io.open(srcPath, "rb") as buffered_file:
             self.assertEqual(direct_file.read(), buffered_file.read())
+
+    @permutations([
+        # offset, size
+        [0, BLOCK_SIZE],
+        [BLOCK_SIZE, 2 * BLOCK_SIZE],
+        [0, len(DATA)],
+        [BLOCK_SIZE, len(DATA)],
+    ])
+    def test_pread(self, offset, size):
+        with temporaryPath(data=self.DATA) as srcPath:
+            self.assertEqual(directio.pread(srcPath, offset, size),
+                             self.DATA[offset:offset + size])
+
+    def test_pread_unaligned(self):
+        with temporaryPath(data=self.DATA) as srcPath:
+            self.assertRaises(ValueError, directio.pread, srcPath, 1,
+                              BLOCK_SIZE)
+
+    def test_pread_reuse_buffer(self):
+        with temporaryPath(data=self.DATA) as srcPath:
+            for i in range(2):
+                self.assertEqual(directio.pread(srcPath, 0, len(self.DATA)),
+                                 self.DATA)
+                self.assertEqual(directio.pread(srcPath, 0, BLOCK_SIZE),
+                                 self.DATA[:BLOCK_SIZE])
+
+    def test_read_blocks(self):
+        offsets = [BLOCK_SIZE, 0, BLOCK_SIZE, len(self.DATA) - BLOCK_SIZE,
+                   len(self.DATA)]
+        with temporaryPath(data=self.DATA) as srcPath:
+            blocks = directio.read_blocks(srcPath, offsets, BLOCK_SIZE)
+        expected = [self.DATA[offset:offset + BLOCK_SIZE]
+                    for offset in offsets]
+        self.assertEqual(blocks, expected)
+
+    def test_read_blocks_unaligned(self):
+        with temporaryPath(data=self.DATA) as srcPath:
+            self.assertRaises(ValueError, directio.read_blocks, srcPath,
+                              [0, 1], BLOCK_SIZE)
+
+
+class TestMergeRanges(VdsmTestCase):
+
+    def test_empty(self):
+        self.assertEqual(list(directio._merge_ranges([], 512)), [])
+
+    def test_merge_contiguous(self):
+        ranges = directio._merge_ranges([1024, 0, 512], 512)
+        self.assertEqual(list(ranges), [(0, 1536)])
+
+    def test_merge_small_gap(self):
+        ranges = directio._merge_ranges([0, 8192], 512)
+        self.assertEqual(list(ranges), [(0, 8704)])
+
+    def test_split_large_gap(self):
+        offset = directio.MAX_MERGE_GAP + 512
+        ranges = directio._merge_ranges([0, offset], 512)
+        self.assertEqual(list(ranges), [(0, 512), (offset, offset + 512)])
+
+    def test_split_unaligned_blocks(self):
+        ranges = directio._merge_ranges([0, 512], 8192)
+        self.assertEqual(list(ranges), [(0, 8192), (512, 8704)])
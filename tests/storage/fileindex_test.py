@@ -0,0 +1,349 @@
+#
+# Copyright 2019 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+
+from __future__ import absolute_import
+from __future__ import division
+
+import glob
+import os
+import threading
+import time
+import uuid
+
+import pytest
+
+from vdsm.common import concurrent
+from vdsm.storage import fileindex
+
+
+class LocalGlob(object):
+
+    def __init__(self):
+        self.calls = 0
+
+    def glob(self, pattern):
+        self.calls += 1
+        return glob.glob(pattern)
+
+
+class LocalOOP(object):
+    """
+    Access local file system like ioprocess, counting glob calls.
+    """
+
+    def __init__(self):
+        self.glob = LocalGlob()
+        self.os = os
+
+
+@pytest.fixture
+def images_dir(tmpdir):
+    return str(tmpdir.mkdir("images"))
+
+
+@pytest.fixture
+def oop():
+    return LocalOOP()
+
+
+@pytest.fixture
+def index(images_dir):
+    return fileindex.VolumeIndex(images_dir, max_age=60)
+
+
+def add_volume(images_dir, img_id, vol_id):
+    img_dir = os.path.join(images_dir, img_id)
+    if not os.path.isdir(img_dir):
+        os.mkdir(img_dir)
+    for ext in ("", fileindex.META_FILEEXT):
+        with open(os.path.join(img_dir, vol_id + ext), "w"):
+            pass
+
+
+def remove_volume(images_dir, img_id, vol_id):
+    for ext in ("", fileindex.META_FILEEXT):
+        os.unlink(os.path.join(images_dir, img_id, vol_id + ext))
+
+
+def make_old(path):
+    # Make path modification time old enough to be trusted.
+    mtime = time.time() - fileindex.RACY_INTERVAL - 10
+    os.utime(path, (mtime, mtime))
+
+
+def test_empty(index, oop):
+    _, images = index.images(oop)
+    assert images == {}
+
+
+def test_missing_images_dir(tmpdir, oop):
+    index = fileindex.VolumeIndex(str(tmpdir.join("missing")), max_age=60)
+    _, images = index.images(oop)
+    assert images == {}
+
+
+def test_scan(images_dir, index, oop):
+    add_volume(images_dir, "img-1", "vol-1")
+    add_volume(images_dir, "img-1", "vol-2")
+    add_volume(images_dir, "img-2", "vol-3")
+    os.mkdir(os.path.join(images_dir, "img-3"))
+
+    _, images = index.images(oop)
+    assert images == {
+        "img-1": frozenset(["vol-1", "vol-2"]),
+        "img-2": frozenset(["vol-3"]),
+        "img-3": frozenset(),
+    }
+
+
+def test_unchanged(images_dir, index, oop):
+    add_volume(images_dir, "img-1", "vol-1")
+    make_old(images_dir)
+
+    generation1, images1 = index.images(oop)
+    calls = oop.glob.calls
+
+    generation2, images2 = index.images(oop)
+    assert generation2 == generation1
+    assert images2 is images1
+    # Using the index should not read any directory.
+    assert oop.glob.calls == calls
+
+
+def test_image_added_removed(images_dir, index, oop):
+    add_volume(images_dir, "img-1", "vol-1")
+    add_volume(images_dir, "img-2", "vol-2")
+    generation1, _ = index.images(oop)
+
+    add_volume(images_dir, "img-3", "vol-3")
+    os.rename(os.path.join(images_dir, "img-1"),
+              os.path.join(images_dir, "_remove_me_img-1"))
+
+    generation2, images = index.images(oop)
+    assert generation2 != generation1
+    assert images == {
+        "_remove_me_img-1": frozenset(["vol-1"]),
+        "img-2": frozenset(["vol-2"]),
+        "img-3": frozenset(["vol-3"]),
+    }
+
+
+def test_invalidate_image(images_dir, index, oop):
+    add_volume(images_dir, "img-1", "vol-1")
+    add_volume(images_dir, "img-2", "vol-2")
+    make_old(images_dir)
+    index.images(oop)
+
+    # Changing an image directory does not change the images directory.
+    add_volume(images_dir, "img-1", "vol-3")
+    remove_volume(images_dir, "img-2", "vol-2")
+    make_old(images_dir)
+    _, images = index.images(oop)
+    assert images == {
+        "img-1": frozenset(["vol-1"]),
+        "img-2": frozenset(["vol-2"]),
+    }
+
+    index.invalidate("img-1")
+    index.invalidate("img-2")
+    calls = oop.glob.calls
+    _, images = index.images(oop)
+    assert images == {
+        "img-1": frozenset(["vol-1", "vol-3"]),
+        "img-2": frozenset(),
+    }
+    # Only the invalidated images should be read.
+    assert oop.glob.calls == calls + 2
+
+
+def test_invalidate_all(images_dir, index, oop):
+    add_volume(images_dir, "img-1", "vol-1")
+    make_old(images_dir)
+    index.images(oop)
+
+    add_volume(images_dir, "img-1", "vol-2")
+    make_old(images_dir)
+    index.invalidate()
+
+    _, images = index.images(oop)
+    assert images == {"img-1": frozenset(["vol-1", "vol-2"])}
+
+
+def test_refresh_image(images_dir, index, oop):
+    add_volume(images_dir, "img-1", "vol-1")
+    add_volume(images_dir, "img-2", "vol-2")
+    make_old(os.path.join(images_dir, "img-1"))
+    make_old(images_dir)
+    index.images(oop)
+
+    # The image modification times are not known after a full scan.
+    index.refresh_image(oop, "img-1")
+    index.images(oop)
+
+    # Another host adds a volume to an existing image, without invalidating
+    # the image.
+    add_volume(images_dir, "img-1", "vol-3")
+    make_old(os.path.join(images_dir, "img-1"))
+
+    index.refresh_image(oop, "img-1")
+    calls = oop.glob.calls
+    _, images = index.images(oop)
+    assert images == {
+        "img-1": frozenset(["vol-1", "vol-3"]),
+        "img-2": frozenset(["vol-2"]),
+    }
+    # Only the modified image should be read.
+    assert oop.glob.calls == calls + 1
+
+
+def test_refresh_image_unchanged(images_dir, index, oop):
+    add_volume(images_dir, "img-1", "vol-1")
+    make_old(os.path.join(images_dir, "img-1"))
+    make_old(images_dir)
+    index.images(oop)
+    index.refresh_image(oop, "img-1")
+    generation1, _ = index.images(oop)
+
+    index.refresh_image(oop, "img-1")
+    calls = oop.glob.calls
+    generation2, _ = index.images(oop)
+    assert generation2 == generation1
+    assert oop.glob.calls == calls
+
+
+def test_refresh_image_racy(images_dir, index, oop):
+    add_volume(images_dir, "img-1", "vol-1")
+    make_old(images_dir)
+    index.refresh_image(oop, "img-1")
+    index.images(oop)
+
+    # The image directory was modified recently; it may be modified again
+    # without changing the modification time.
+    add_volume(images_dir, "img-1", "vol-2")
+    make_old(images_dir)
+    index.refresh_image(oop, "img-1")
+    _, images = index.images(oop)
+    assert images == {"img-1": frozenset(["vol-1", "vol-2"])}
+
+
+def test_refresh_removed_image(images_dir, index, oop):
+    add_volume(images_dir, "img-1", "vol-1")
+    make_old(images_dir)
+    index.images(oop)
+
+    index.refresh_image(oop, "img-2")
+    _, images = index.images(oop)
+    assert images == {"img-1": frozenset(["vol-1"])}
+
+
+class BlockingGlob(LocalGlob):
+    """
+    Glob blocking until unblocked, like a glob on unresponsive storage.
+    """
+
+    def __init__(self):
+        super(BlockingGlob, self).__init__()
+        self.started = threading.Event()
+        self.unblocked = threading.Event()
+
+    def glob(self, pattern):
+        self.started.set()
+        self.unblocked.wait(5)
+        return super(BlockingGlob, self).glob(pattern)
+
+
+def test_invalidate_during_refresh(images_dir, index, oop):
+    add_volume(images_dir, "img-1", "vol-1")
+    make_old(images_dir)
+    oop.glob = BlockingGlob()
+
+    t = concurrent.thread(index.images, args=(oop,))
+    t.start()
+    try:
+        assert oop.glob.started.wait(5)
+        # Invalidating does not wait for the blocked refresh.
+        start = time.time()
+        add_volume(images_dir, "img-1", "vol-2")
+        index.invalidate("img-1")
+        index.refresh_image(oop, "img-1")
+        assert time.time() - start < 1
+    finally:
+        oop.glob.unblocked.set()
+        t.join()
+
+    # The image invalidated during the refresh is read again.
+    _, images = index.images(oop)
+    assert images == {"img-1": frozenset(["vol-1", "vol-2"])}
+
+
+def test_invalidate_all_during_refresh(images_dir, index, oop):
+    add_volume(images_dir, "img-1", "vol-1")
+    make_old(images_dir)
+    oop.glob = BlockingGlob()
+
+    t = concurrent.thread(index.images, args=(oop,))
+    t.start()
+    try:
+        assert oop.glob.started.wait(5)
+        add_volume(images_dir, "img-1", "vol-2")
+        make_old(images_dir)
+        index.invalidate()
+    finally:
+        oop.glob.unblocked.set()
+        t.join()
+
+    # The entire index is read again.
+    _, images = index.images(oop)
+    assert images == {"img-1": frozenset(["vol-1", "vol-2"])}
+
+
+def test_max_age(images_dir, oop):
+    index = fileindex.VolumeIndex(images_dir, max_age=0)
+    add_volume(images_dir, "img-1", "vol-1")
+    make_old(images_dir)
+    index.images(oop)
+
+    add_volume(images_dir, "img-1", "vol-2")
+    make_old(images_dir)
+
+    _, images = index.images(oop)
+    assert images == {"img-1": frozenset(["vol-1", "vol-2"])}
+
+
+def test_invalidate_domain(images_dir, oop):
+    sd_id = str(uuid.uuid4())
+    index = fileindex.get(sd_id, images_dir)
+    assert fileindex.get(sd_id, images_dir) is index
+
+    add_volume(images_dir, "img-1", "vol-1")
+    make_old(images_dir)
+    index.images(oop)
+
+    add_volume(images_dir, "img-1", "vol-2")
+    make_old(images_dir)
+    fileindex.invalidate(sd_id, "img-1")
+
+    _, images = index.images(oop)
+    assert images == {"img-1": frozenset(["vol-1", "vol-2"])}
+
+
+def test_invalidate_unknown_domain():
+    # Nothing to invalidate, should not fail.
+    fileindex.invalidate(str(uuid.uuid4()), "img-1")
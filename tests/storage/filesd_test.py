@@ -23,8 +23,10 @@ from __future__ import division
 from __future__ import print_function
 
 import collections
-import fnmatch
+import errno
+import itertools
 import os
+import re
 import time
 import uuid
 
@@ -68,22 +70,61 @@ class FakeGlob(object):
 
     def __init__(self, files):
         self.files = files
+        # Parent directories of the files, like a real file system.
+        self.dirs = set()
+        for path in files:
+            path = os.path.dirname(path)
+            while path not in self.dirs and path != "/":
+                self.dirs.add(path)
+                path = os.path.dirname(path)
 
     def glob(self, pattern):
-        return fnmatch.filter(self.files, pattern)
+        # Like glob, "*" does not match "/".
+        regex = re.compile(re.escape(pattern).replace(r"\*", "[^/]*") + "$")
+        return [path for path in itertools.chain(self.files, self.dirs)
+                if regex.match(path)]
+
+
+class FakeOS(object):
+
+    def __init__(self, glob):
+        self.path = FakePath(glob)
+
+    def stat(self, path):
+        if path not in self.path.glob.dirs:
+            raise OSError(errno.ENOENT, "No such file or directory", path)
+        return FakeStat(st_mtime=0)
+
+
+class FakePath(object):
+
+    def __init__(self, glob):
+        self.glob = glob
+
+    def isdir(self, path):
+        return path in self.glob.dirs
+
+
+FakeStat = collections.namedtuple("FakeStat", "st_mtime")
 
 
 class FakeOOP(object):
 
     def __init__(self, glob=None):
         self.glob = glob
+        self.os = FakeOS(glob)
 
 
 class TestGetAllVolumes(VdsmTestCase):
 
     MOUNTPOINT = "/rhev/data-center/%s" % uuid.uuid4()
-    SD_UUID = str(uuid.uuid4())
-    IMAGES_DIR = os.path.join(MOUNTPOINT, SD_UUID, sd.DOMAIN_IMAGES)
+
+    def setUp(self):
+        # Use new domain for every test, since the volume index is cached
+        # per domain.
+        self.SD_UUID = str(uuid.uuid4())
+        self.IMAGES_DIR = os.path.join(self.MOUNTPOINT, self.SD_UUID,
+                                       sd.DOMAIN_IMAGES)
 
     def test_no_volumes(self):
         oop = FakeOOP(FakeGlob([]))
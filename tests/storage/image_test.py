@@ -21,6 +21,8 @@
 from __future__ import absolute_import
 from __future__ import division
 
+import threading
+
 from monkeypatch import MonkeyPatch
 import pytest
 
@@ -33,6 +35,7 @@ from testlib import make_config
 from testlib import VdsmTestCase
 
 from vdsm.common import constants
+from vdsm.common import exception
 from vdsm.storage import constants as sc
 from vdsm.storage import image
 from vdsm.storage import qemuimg
@@ -168,3 +171,129 @@ class TestEstimateQcow2Size:
         estimated_size = img.estimate_qcow2_size(vol_params, "sdUUID")
 
         assert estimated_size == 2097920
+
+
+class FakeOperation(object):
+    """
+    Operation recording concurrent runs. If started is set, run() blocks
+    until the operation is aborted; otherwise it takes delay seconds.
+    """
+
+    def __init__(self, runs):
+        self.runs = runs
+        self.error = None
+        self.delay = 0
+        self.started = None
+        self.aborted = threading.Event()
+        self.progress = 0.0
+
+    def run(self):
+        if self.aborted.is_set():
+            raise exception.ActionStopped
+        with self.runs.lock:
+            self.runs.running += 1
+            self.runs.max_running = max(self.runs.max_running,
+                                        self.runs.running)
+        try:
+            if self.started:
+                self.started.set()
+                self.aborted.wait(5)
+            elif self.delay:
+                self.aborted.wait(self.delay)
+            if self.aborted.is_set():
+                raise exception.ActionStopped
+            if self.error:
+                raise self.error
+            self.progress = 100.0
+        finally:
+            with self.runs.lock:
+                self.runs.running -= 1
+
+    def abort(self):
+        self.aborted.set()
+
+
+class Runs(object):
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+
+
+def make_operations(runs, count):
+    return [("op %d" % i, FakeOperation(runs)) for i in range(count)]
+
+
+class TestChainCopy:
+
+    @pytest.mark.parametrize("parallelism,max_running", [
+        (1, 1),
+        (4, 4),
+        (20, 10),
+    ])
+    def test_run(self, parallelism, max_running):
+        runs = Runs()
+        operations = make_operations(runs, 10)
+        for _, op in operations:
+            op.delay = 0.05
+
+        copy = image.ChainCopy(operations, parallelism)
+        assert copy.progress == 0.0
+        copy.run()
+
+        assert all(op.progress == 100.0 for _, op in operations)
+        assert copy.progress == 100.0
+        assert 1 <= runs.max_running <= max_running
+        if parallelism > 1:
+            assert runs.max_running > 1
+
+    def test_empty(self):
+        copy = image.ChainCopy([], 4)
+        copy.run()
+        assert copy.progress == 100.0
+
+    @pytest.mark.parametrize("parallelism", [1, 2])
+    def test_failure_aborts_other_operations(self, parallelism):
+        runs = Runs()
+        operations = make_operations(runs, 4)
+        error = RuntimeError("copy failed")
+        # The first operation is blocked, the second one fails.
+        operations[0][1].started = threading.Event()
+        operations[1][1].error = error
+
+        copy = image.ChainCopy(operations, parallelism)
+        if parallelism == 1:
+            # The first operation blocks until aborted.
+            threading.Timer(0.1, copy.abort).start()
+            with pytest.raises(exception.ActionStopped):
+                copy.run()
+        else:
+            with pytest.raises(RuntimeError) as e:
+                copy.run()
+            assert e.value is error
+
+        # Operations not started are aborted and never run.
+        for _, op in operations[2:]:
+            assert op.aborted.is_set()
+            assert op.progress == 0.0
+
+    def test_abort(self):
+        runs = Runs()
+        operations = make_operations(runs, 4)
+        for _, op in operations:
+            op.started = threading.Event()
+
+        copy = image.ChainCopy(operations, 2)
+        t = threading.Thread(target=copy.run)
+        t.start()
+        try:
+            operations[0][1].started.wait(5)
+            operations[1][1].started.wait(5)
+            assert copy.progress == 0.0
+            copy.abort()
+        finally:
+            t.join()
+
+        assert all(op.aborted.is_set() for _, op in operations)
+        assert runs.max_running == 2
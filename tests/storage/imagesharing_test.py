@@ -0,0 +1,234 @@
+#
+# Copyright 2019 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+
+from __future__ import absolute_import
+from __future__ import division
+
+import io
+import os
+import uuid
+
+from contextlib import contextmanager
+
+import pytest
+
+from fakelib import FakeNotifier
+from fakelib import FakeScheduler
+from testlib import temporaryPath
+
+from vdsm import jobs
+from vdsm.common import exception
+from vdsm.storage import exception as se
+from vdsm.storage import imageSharing
+
+SIZES = [
+    0,
+    512,
+    imageSharing.ALIGNMENT,
+    imageSharing.ALIGNMENT + 512,
+    imageSharing.BUFFER_SIZE,
+    imageSharing.BUFFER_SIZE * 2 + imageSharing.ALIGNMENT + 42,
+]
+
+
+class Stream(object):
+    """
+    Stream without readinto(), like python 2 socket file object.
+    """
+
+    def __init__(self, data=b""):
+        self._file = io.BytesIO(data)
+        self.flushes = 0
+
+    def read(self, n):
+        # Return short reads, like a socket.
+        return self._file.read(min(n, 64 * 1024))
+
+    def write(self, data):
+        self._file.write(data)
+
+    def flush(self):
+        self.flushes += 1
+
+    def getvalue(self):
+        return self._file.getvalue()
+
+
+class Task(object):
+
+    def __init__(self):
+        self.id = str(uuid.uuid4())
+
+    @contextmanager
+    def abort_callback(self, cb):
+        yield
+
+
+class AbortingTask(Task):
+
+    @contextmanager
+    def abort_callback(self, cb):
+        # Invoke the abort callback immediately, aborting the operation before
+        # it was started.
+        cb()
+        yield
+
+
+@pytest.fixture
+def jobs_started():
+    jobs.start(FakeScheduler(), FakeNotifier())
+    yield
+    jobs._clear()
+
+
+def data_of(size):
+    return os.urandom(size)
+
+
+@pytest.mark.parametrize("size", SIZES)
+@pytest.mark.parametrize("stream_type", [io.BytesIO, Stream])
+def test_copy_to_image(size, stream_type):
+    data = data_of(size)
+    with temporaryPath(data=b"x" * size) as path:
+        methodArgs = {"fileObj": stream_type(data), "length": size}
+        imageSharing.copyToImage(path, methodArgs)
+        with io.open(path, "rb") as f:
+            assert f.read() == data
+
+
+def test_copy_to_image_keeps_trailing_data():
+    size = imageSharing.ALIGNMENT + 42
+    data = data_of(size)
+    with temporaryPath(data=b"x" * (size + 10)) as path:
+        methodArgs = {"fileObj": io.BytesIO(data), "length": size}
+        imageSharing.copyToImage(path, methodArgs)
+        with io.open(path, "rb") as f:
+            assert f.read() == data + b"x" * 10
+
+
+@pytest.mark.parametrize("stream_type", [io.BytesIO, Stream])
+def test_copy_to_image_partial_data(stream_type):
+    size = imageSharing.BUFFER_SIZE
+    with temporaryPath(data=b"x" * size) as path:
+        methodArgs = {"fileObj": stream_type(b"y" * (size - 1)),
+                      "length": size}
+        with pytest.raises(se.MiscFileReadException):
+            imageSharing.copyToImage(path, methodArgs)
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_copy_from_image(size):
+    data = data_of(size)
+    with temporaryPath(data=data) as path:
+        stream = Stream()
+        methodArgs = {"fileObj": stream, "length": size}
+        imageSharing.copyFromImage(path, methodArgs)
+        assert stream.getvalue() == data
+
+
+def test_copy_from_image_partial_data():
+    size = imageSharing.BUFFER_SIZE
+    with temporaryPath(data=b"x" * (size - 512)) as path:
+        methodArgs = {"fileObj": Stream(), "length": size}
+        with pytest.raises(se.MiscFileReadException):
+            imageSharing.copyFromImage(path, methodArgs)
+
+
+def test_progress():
+    size = imageSharing.BUFFER_SIZE * 4
+    with temporaryPath(data=b"x" * size) as path:
+        stream = Stream()
+        op = imageSharing.ImageToStream(path, stream, size)
+        assert op.progress == 0.0
+        op.run()
+        assert op.progress == 100.0
+        # One flush per I/O.
+        assert stream.flushes == 4
+
+
+def test_abort():
+    size = imageSharing.BUFFER_SIZE
+    with temporaryPath(data=b"x" * size) as path:
+        op = imageSharing.StreamToImage(io.BytesIO(b"y" * size), path, size)
+        op.abort()
+        with pytest.raises(exception.ActionStopped):
+            op.run()
+        assert op.progress == 0.0
+
+
+def test_copy_to_image_job(jobs_started):
+    size = imageSharing.BUFFER_SIZE
+    data = data_of(size)
+    with temporaryPath(data=b"x" * size) as path:
+        methodArgs = {"fileObj": io.BytesIO(data), "length": size}
+        task = Task()
+        imageSharing.copyToImage(path, methodArgs, task=task)
+        with io.open(path, "rb") as f:
+            assert f.read() == data
+
+    info = jobs.info(job_ids=[task.id])[task.id]
+    assert info["job_type"] == "storage"
+    assert info["status"] == jobs.STATUS.DONE
+    assert info["progress"] == 100.0
+
+
+def test_copy_from_image_job_failed(jobs_started):
+    size = imageSharing.BUFFER_SIZE
+    with temporaryPath(data=b"x" * (size - 512)) as path:
+        methodArgs = {"fileObj": Stream(), "length": size}
+        task = Task()
+        with pytest.raises(se.MiscFileReadException):
+            imageSharing.copyFromImage(path, methodArgs, task=task)
+
+    info = jobs.info(job_ids=[task.id])[task.id]
+    assert info["status"] == jobs.STATUS.FAILED
+    assert info["error"]["code"] == se.MiscFileReadException.code
+
+
+def test_copy_to_image_timeout(monkeypatch):
+    monkeypatch.setattr(imageSharing, "WAIT_TIMEOUT", 0)
+    # dd blocks reading from the fifo, so the pipe to dd fills up.
+    with temporaryPath() as path:
+        os.unlink(path)
+        os.mkfifo(path)
+        size = imageSharing.BUFFER_SIZE * 2
+        methodArgs = {"fileObj": io.BytesIO(b"y" * size), "length": size}
+        with pytest.raises(se.MiscFileWriteException):
+            imageSharing.copyToImage(path, methodArgs)
+
+
+def test_copy_to_image_abort(jobs_started):
+    size = imageSharing.BUFFER_SIZE
+    with temporaryPath(data=b"x" * size) as path:
+        methodArgs = {"fileObj": io.BytesIO(b"y" * size), "length": size}
+        with pytest.raises(exception.ActionStopped):
+            imageSharing.copyToImage(path, methodArgs, task=AbortingTask())
+        with io.open(path, "rb") as f:
+            assert f.read() == b"x" * size
+
+
+def test_copy_from_image_abort(jobs_started):
+    size = imageSharing.BUFFER_SIZE
+    with temporaryPath(data=b"x" * size) as path:
+        stream = Stream()
+        methodArgs = {"fileObj": stream, "length": size}
+        with pytest.raises(exception.ActionStopped):
+            imageSharing.copyFromImage(path, methodArgs, task=AbortingTask())
+        assert stream.getvalue() == b""
@@ -482,6 +482,253 @@ def test_change_read_only_mode(fake_devices, fake_runner, workers):
     assert elapsed > fake_runner.delay * 2
 
 
+class FakeReporter(object):
+    """
+    Simulate vgs and lvs output for a single VG, recording the commands.
+    Modify seqno and lvs to simulate changes made by another host.
+    """
+
+    def __init__(self):
+        self.seqno = 1
+        self.lvs = ["lv-1", "lv-2"]
+        # {lv_name: "tag1,tag2"}
+        self.tags = {}
+        self.calls = []
+
+    def __call__(self, cmd, **kwargs):
+        name = cmd[1]
+        self.calls.append(name)
+        if name == "vgs":
+            return 0, [self._vg_line()], []
+        elif name == "lvs":
+            return 0, [self._lv_line(lv) for lv in self.lvs], []
+        else:
+            return 0, [], []
+
+    def _vg_line(self):
+        fields = ["vg-uuid", "vg", "wz--n-", "1", "1", "1", "1", "1", "",
+                  "1", "1", str(len(self.lvs)), "1", str(self.seqno),
+                  "/dev/mapper/a"]
+        return lvm.SEPARATOR.join(fields)
+
+    def _lv_line(self, name):
+        fields = [name + "-uuid", name, "vg", "-wi-------", "1", "0",
+                  "/dev/mapper/a(0)", self.tags.get(name, "")]
+        return lvm.SEPARATOR.join(fields)
+
+
+@pytest.fixture
+def fake_reporter(fake_devices, monkeypatch):
+    reporter = FakeReporter()
+    monkeypatch.setattr(misc, "execCmd", reporter)
+    return reporter
+
+
+def test_vg_seqno(fake_reporter):
+    lc = lvm.LVMCache()
+    fake_reporter.seqno = 42
+    vg = lc.getVg("vg")
+    assert vg.seqno == "42"
+
+
+def test_invalidate_vg_unchanged_seqno(fake_reporter):
+    lc = lvm.LVMCache()
+    lc.bootstrap()
+    del fake_reporter.calls[:]
+
+    # VG metadata did not change, LVs should not be reloaded.
+    lc._invalidatevgs("vg")
+    lc._invalidatelvs("vg", check_seqno=True)
+    lv = lc.getLv("vg", "lv-1")
+    assert lv.name == "lv-1"
+    assert fake_reporter.calls == ["vgs"]
+
+    lvs = lc.getLv("vg")
+    assert sorted(lv.name for lv in lvs) == ["lv-1", "lv-2"]
+    assert fake_reporter.calls == ["vgs"]
+
+
+def test_invalidate_vg_changed_seqno(fake_reporter):
+    lc = lvm.LVMCache()
+    lc.bootstrap()
+    del fake_reporter.calls[:]
+
+    # Another host created a new LV.
+    fake_reporter.seqno += 1
+    fake_reporter.lvs.append("lv-3")
+
+    lc._invalidatevgs("vg")
+    lc._invalidatelvs("vg", check_seqno=True)
+    lvs = lc.getLv("vg")
+    assert sorted(lv.name for lv in lvs) == ["lv-1", "lv-2", "lv-3"]
+    assert fake_reporter.calls == ["vgs", "lvs"]
+
+
+def test_invalidate_vg_without_seqno_check(fake_reporter):
+    lc = lvm.LVMCache()
+    lc.bootstrap()
+    del fake_reporter.calls[:]
+
+    # Local changes not modifying VG metadata (e.g. activation) must reload
+    # the LVs.
+    lc._invalidatelvs("vg")
+    lc.getLv("vg", "lv-1")
+    assert fake_reporter.calls == ["lvs"]
+
+
+def test_invalidate_vg_unknown_seqno(fake_reporter):
+    lc = lvm.LVMCache()
+    # LVs loaded before the VG; we don't know the VG seqno.
+    lc.getLv("vg")
+    lc.getVg("vg")
+    del fake_reporter.calls[:]
+
+    lc._invalidatevgs("vg")
+    lc._invalidatelvs("vg", check_seqno=True)
+    lc.getLv("vg", "lv-1")
+    assert fake_reporter.calls == ["lvs"]
+
+
+def test_invalidate_lv_after_vg(fake_reporter):
+    lc = lvm.LVMCache()
+    lc.bootstrap()
+    del fake_reporter.calls[:]
+
+    # A specific LV invalidated after the VG must be reloaded.
+    lc._invalidatevgs("vg")
+    lc._invalidatelvs("vg", check_seqno=True)
+    lc._invalidatelvs("vg", "lv-2")
+    lvs = lc.getLv("vg")
+    assert sorted(lv.name for lv in lvs) == ["lv-1", "lv-2"]
+    assert fake_reporter.calls == ["vgs", "lvs"]
+
+
+def test_flush_drops_seqno(fake_reporter):
+    lc = lvm.LVMCache()
+    lc.bootstrap()
+    lc.flush()
+    del fake_reporter.calls[:]
+
+    lc._invalidatevgs("vg")
+    lc._invalidatelvs("vg", check_seqno=True)
+    lc.getLv("vg", "lv-1")
+    assert fake_reporter.calls == ["lvs"]
+
+
+def test_lv_index():
+    lvs = [
+        make_lv("vol-1", "IU_img-1,PU_00000000-0000-0000-0000-000000000000"),
+        make_lv("vol-2", "MD_2,PU_vol-1,IU_img-1"),
+        make_lv("vol-3", "IU_img-2,PU_vol-1,OVIRT_VOL_VOLATILE"),
+        make_lv("metadata", ""),
+        make_lv("vol-4", "IU_img-3"),
+    ]
+    index = lvm.LVIndex(lvs)
+
+    assert index.volumes == {
+        "vol-1": ("img-1", "00000000-0000-0000-0000-000000000000"),
+        "vol-2": ("img-1", "vol-1"),
+    }
+    assert [lv.name for lv in index.untagged] == ["metadata", "vol-4"]
+    assert [lv.name for lv in index.lvsByTag("IU_img-1")] == [
+        "vol-1", "vol-2"]
+    assert [lv.name for lv in index.lvsByTag("PU_vol-1")] == [
+        "vol-2", "vol-3"]
+    assert index.lvsByTag("IU_no-such-image") == []
+
+
+def make_lv(name, tags):
+    fields = [name + "-uuid", name, "vg", "-wi-------", "1", "0",
+              "/dev/mapper/a(0)", tags]
+    return lvm.makeLV(*fields)
+
+
+def test_lv_index_cached(fake_reporter):
+    fake_reporter.tags["lv-1"] = "IU_img-1,PU_parent"
+    lc = lvm.LVMCache()
+    lc.bootstrap()
+    del fake_reporter.calls[:]
+
+    index = lc.getLvIndex("vg")
+    assert index.volumes == {"lv-1": ("img-1", "parent")}
+    assert lc.getLvIndex("vg") is index
+    assert fake_reporter.calls == []
+
+
+def test_lv_index_invalidate_lv(fake_reporter):
+    lc = lvm.LVMCache()
+    lc.bootstrap()
+    index = lc.getLvIndex("vg")
+    del fake_reporter.calls[:]
+
+    # Tags changed on this host.
+    fake_reporter.tags["lv-2"] = "IU_img-1,PU_parent"
+    lc._invalidatelvs("vg", "lv-2")
+
+    new_index = lc.getLvIndex("vg")
+    assert new_index is not index
+    assert [lv.name for lv in new_index.lvsByTag("IU_img-1")] == ["lv-2"]
+    assert fake_reporter.calls == ["lvs"]
+
+
+def test_lv_index_invalidate_vg_unchanged_seqno(fake_reporter):
+    lc = lvm.LVMCache()
+    lc.bootstrap()
+    index = lc.getLvIndex("vg")
+    del fake_reporter.calls[:]
+
+    lc._invalidatevgs("vg")
+    lc._invalidatelvs("vg", check_seqno=True)
+
+    new_index = lc.getLvIndex("vg")
+    assert sorted(lv.name for lv in new_index.lvs) == ["lv-1", "lv-2"]
+    assert sorted(lv.name for lv in index.lvs) == ["lv-1", "lv-2"]
+    assert fake_reporter.calls == ["vgs"]
+
+
+def test_lv_index_remove_lvs(fake_reporter):
+    lc = lvm.LVMCache()
+    lc.bootstrap()
+    lc.getLvIndex("vg")
+
+    lc._removeLvs("vg", ["lv-1"])
+    del fake_reporter.calls[:]
+
+    index = lc.getLvIndex("vg")
+    assert [lv.name for lv in index.lvs] == ["lv-2"]
+    assert fake_reporter.calls == []
+
+
+def test_lv_index_flush(fake_reporter):
+    lc = lvm.LVMCache()
+    lc.bootstrap()
+    index = lc.getLvIndex("vg")
+    lc.flush()
+
+    fake_reporter.lvs.append("lv-3")
+    new_index = lc.getLvIndex("vg")
+    assert new_index is not index
+    assert sorted(lv.name for lv in new_index.lvs) == [
+        "lv-1", "lv-2", "lv-3"]
+
+
+def test_cached_pv_names(fake_reporter, monkeypatch):
+    lc = lvm.LVMCache()
+    monkeypatch.setattr(lvm, "_lvminfo", lc)
+
+    # VG not loaded yet.
+    assert lvm.getCachedPVNames("vg") is None
+
+    lc.getVg("vg")
+    del fake_reporter.calls[:]
+    assert lvm.getCachedPVNames("vg") == ("/dev/mapper/a",)
+    assert fake_reporter.calls == []
+
+    # Stale VG.
+    lc._invalidatevgs("vg")
+    assert lvm.getCachedPVNames("vg") is None
+
+
 @requires_root
 @xfail_python3
 @pytest.mark.root
@@ -0,0 +1,313 @@
+#
+# Copyright 2019 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301  USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+
+from __future__ import absolute_import
+from __future__ import division
+
+import functools
+import os
+import sys
+import time
+import uuid
+
+import pytest
+
+from vdsm.common import concurrent
+from vdsm.storage import lvm
+from vdsm.storage import lvmshell
+
+from . marks import requires_root
+
+FAKE_SHELL = os.path.join(os.path.dirname(__file__), "fake-lvm-shell")
+
+
+def fake_shell(timeout=5):
+    return lvmshell.Shell(
+        cmd=(sys.executable, FAKE_SHELL), sudo=False, timeout=timeout)
+
+
+def full_cmd(name, *args):
+    return ["/sbin/lvm", name, "--config", "devices {}"] + list(args)
+
+
+@pytest.fixture
+def shell():
+    shell = fake_shell()
+    try:
+        yield shell
+    finally:
+        shell.close()
+
+
+@pytest.fixture
+def pool():
+    pool = lvmshell.ShellPool(2, shell_factory=fake_shell)
+    try:
+        yield pool
+    finally:
+        pool.close()
+
+
+def test_separator():
+    assert lvmshell.SEPARATOR == lvm.SEPARATOR
+
+
+@pytest.mark.parametrize("cmd,expected", [
+    (["/sbin/lvm", "vgs", "--config", "x", "-o", "name"], True),
+    (["/sbin/lvm", "lvs", "--config", "x", "vg"], True),
+    (["/sbin/lvm", "pvs", "--config", "x"], True),
+    (["/sbin/lvm", "lvcreate", "--config", "x", "vg"], False),
+    (["/sbin/lvm", "vgs"], False),
+])
+def test_is_report_command(cmd, expected):
+    assert lvmshell.is_report_command(cmd) == expected
+
+
+def test_format_command():
+    cmd = ["/sbin/lvm", "vgs", "--config", 'devices { filter=["r|.*|"] }',
+           "-o", "uuid,name"]
+    line = lvmshell.format_command(cmd)
+    assert line == (
+        b"'vgs' '--config' "
+        b"'devices { filter=[\"r|.*|\"] } log { report_command_log=1 }' "
+        b"'-o' 'uuid,name' '--reportformat' 'json'\n")
+
+
+def test_format_command_unquotable():
+    with pytest.raises(lvmshell.Error):
+        lvmshell.format_command(full_cmd("vgs", "it's"))
+
+
+def test_parse_output_echo():
+    out = b"""vgs '--config' 'devices { }'
+  {
+      "report": [
+          {
+              "vg": [
+                  {"vg_uuid":"uuid-1", "vg_name":"vg-1", "vg_tags":"a,b"},
+                  {"vg_uuid":"uuid-2", "vg_name":"vg-2", "vg_tags":""}
+              ]
+          }
+      ]
+      ,
+      "log": [
+          {"log_type":"status", "log_message":"success", "log_ret_code":"1"}
+      ]
+  }
+"""
+    rc, out, err = lvmshell.parse_output(out)
+    assert rc == 0
+    assert out == ["uuid-1|vg-1|a,b", "uuid-2|vg-2|"]
+    assert err == []
+
+
+def test_parse_output_failure():
+    out = b"""{
+    "report": [],
+    "log": [
+        {"log_type":"error", "log_message":"not found", "log_ret_code":"5"},
+        {"log_type":"status", "log_message":"failure", "log_ret_code":"5"}
+    ]
+}
+"""
+    rc, out, err = lvmshell.parse_output(out)
+    assert rc == lvmshell.ECMD_FAILED
+    assert out == []
+    assert err == ["not found"]
+
+
+@pytest.mark.parametrize("out", [
+    b"",
+    b"garbage",
+    b"{\ngarbage\n",
+    b'{\n"report": []\n}\n',
+])
+def test_parse_output_invalid(out):
+    with pytest.raises(lvmshell.Error):
+        lvmshell.parse_output(out)
+
+
+def test_shell_run(shell):
+    rc, out, err = shell.run(full_cmd("vgs", "vg-1", "vg-2"))
+    assert rc == 0
+    assert out == ["vg-1|vgs", "vg-2|vgs"]
+    assert err == []
+
+
+def test_shell_run_many(shell):
+    for i in range(10):
+        rc, out, err = shell.run(full_cmd("lvs", str(i)))
+        assert out == ["%d|lvs" % i]
+
+
+def test_shell_run_failure(shell):
+    rc, out, err = shell.run(full_cmd("fail"))
+    assert rc == lvmshell.ECMD_FAILED
+    assert err == ["fake error"]
+
+    # Command failure does not break the shell.
+    rc, out, err = shell.run(full_cmd("vgs"))
+    assert rc == 0
+
+
+def test_shell_terminated(shell):
+    with pytest.raises(lvmshell.Error):
+        shell.run(full_cmd("exit"))
+
+
+def test_shell_timeout():
+    shell = fake_shell(timeout=0.2)
+    try:
+        with pytest.raises(lvmshell.Timeout):
+            shell.run(full_cmd("sleep", "1"))
+    finally:
+        shell.close()
+
+
+def test_pool_respawn_after_error(pool):
+    with pytest.raises(lvmshell.Error):
+        pool.run(full_cmd("garbage"))
+
+    rc, out, err = pool.run(full_cmd("vgs", "vg"))
+    assert rc == 0
+    assert out == ["vg|vgs"]
+
+
+def test_pool_respawn_terminated_shell(pool):
+    pool.run(full_cmd("vgs"))
+    shell = pool._idle[0]
+    shell.close()
+
+    rc, out, err = pool.run(full_cmd("vgs", "vg"))
+    assert rc == 0
+    assert pool._idle[0] is not shell
+
+
+def test_pool_start_failure():
+    def fail():
+        raise OSError("No such file")
+
+    pool = lvmshell.ShellPool(1, shell_factory=fail)
+    with pytest.raises(lvmshell.Error):
+        pool.run(full_cmd("vgs"))
+
+
+def test_pool_closed(pool):
+    pool.close()
+    with pytest.raises(lvmshell.Error):
+        pool.run(full_cmd("vgs"))
+
+
+def test_pool_concurrency(pool):
+    results = []
+
+    def run(i):
+        results.append(pool.run(full_cmd("lvs", str(i))))
+
+    threads = [concurrent.thread(functools.partial(run, i))
+               for i in range(10)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(results) == 10
+    assert len(pool._idle) <= pool.size
+
+
+class FakePool(object):
+
+    def __init__(self, error=None):
+        self.error = error
+        self.calls = []
+
+    def run(self, cmd):
+        self.calls.append(cmd)
+        if self.error:
+            raise self.error
+        return 0, ["from|shell"], []
+
+
+def test_cache_uses_shell_for_reports(monkeypatch):
+    monkeypatch.setattr(lvm.multipath, "getMPDevNamesIter", lambda: ())
+    monkeypatch.setattr(lvm.misc, "execCmd", lambda cmd, **kw: (0, [], []))
+    pool = FakePool()
+    lc = lvm.LVMCache(shell_pool=pool)
+
+    rc, out, err = lc.cmd(["vgs", "-o", "name"])
+    assert out == ["from|shell"]
+    assert len(pool.calls) == 1
+
+    # Modifying commands never run in the shell.
+    lc.cmd(["lvcreate", "vg"])
+    assert len(pool.calls) == 1
+
+
+def test_cache_fallback_on_shell_error(monkeypatch):
+    monkeypatch.setattr(lvm.multipath, "getMPDevNamesIter", lambda: ())
+    monkeypatch.setattr(
+        lvm.misc, "execCmd", lambda cmd, **kw: (0, ["from|process"], []))
+    pool = FakePool(error=lvmshell.Error("fake"))
+    lc = lvm.LVMCache(shell_pool=pool)
+
+    rc, out, err = lc.cmd(["vgs", "-o", "name"])
+    assert out == ["from|process"]
+    assert len(pool.calls) == 1
+
+
+@requires_root
+@pytest.mark.root
+@pytest.mark.slow
+def test_benchmark_shell_vs_process(tmp_storage):
+    # Compare per-command latency of running "vgs" in a new lvm process for
+    # every command, and streaming the commands to a lvm shell pool.
+    dev = tmp_storage.create_device(10 * 1024**3)
+    vg_name = str(uuid.uuid4())
+    lvm.set_read_only(False)
+    lvm.createVG(vg_name, [dev], "initial-tag", 128)
+
+    count = 100
+    cmd = list(lvm.VGS_CMD) + [vg_name]
+
+    lc = lvm.LVMCache()
+    start = time.time()
+    for i in range(count):
+        rc, process_out, err = lc.cmd(cmd, devices=(dev,))
+        assert rc == 0
+    process_elapsed = time.time() - start
+
+    pool = lvmshell.ShellPool(1)
+    try:
+        lc = lvm.LVMCache(shell_pool=pool)
+        start = time.time()
+        for i in range(count):
+            rc, shell_out, err = lc.cmd(cmd, devices=(dev,))
+            assert rc == 0
+        shell_elapsed = time.time() - start
+    finally:
+        pool.close()
+
+    assert [l.strip() for l in process_out] == shell_out
+
+    print("process: %d commands in %.6f seconds (%.6f seconds per command)"
+          % (count, process_elapsed, process_elapsed / count))
+    print("shell: %d commands in %.6f seconds (%.6f seconds per command)"
+          % (count, shell_elapsed, shell_elapsed / count))
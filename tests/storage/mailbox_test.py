@@ -40,6 +40,9 @@ MAILER_TIMEOUT = 6
 MONITOR_INTERVAL = 0.2
 
 SPUUID = '5d928855-b09b-47a7-b920-bd2d2eb5808c'
+SDUUID = '8adbc85e-e554-4ae0-b318-8a5465fe5fe1'
+VOL1 = 'd772f1c6-3ebb-43c3-a42e-73fcd8255a5f'
+VOL2 = '3b4bb8c3-a2b1-4e6c-8d52-6a1b0f7f4b13'
 
 
 MboxFiles = collections.namedtuple("MboxFiles", "inbox, outbox")
@@ -55,6 +58,18 @@ def mboxfiles(tmpdir):
     yield MboxFiles(str(inbox), str(outbox))
 
 
+def make_host_mailbox(*messages):
+    data = b"".join(messages).ljust(
+        sm.MAILBOX_SIZE - sm.CHECKSUM_BYTES, b"\0")
+    n = sm.checksum(data, sm.CHECKSUM_BYTES)
+    return data + struct.pack('<l', n)
+
+
+def make_extend_payload(vol_id, size):
+    vol_data = dict(poolID=SPUUID, domainID=SDUUID, volumeID=vol_id)
+    return sm.SPM_Extend_Message(vol_data, size).payload
+
+
 def read_mbox(mboxfiles):
     with io.open(mboxfiles.inbox, 'rb') as inf, \
             io.open(mboxfiles.outbox, 'rb') as outf:
@@ -183,6 +198,77 @@ class TestCommunicate:
             b"\xd8\xfcs.\xa4\xc3C\xbb>\xc6\xf1r\xd700000000000000640"
             b"0000000000"))]
 
+    def test_receive_batch(self, mboxfiles):
+        msg_processed = threading.Event()
+        received_batches = []
+
+        def spm_callback(requests):
+            received_batches.append(requests)
+            msg_processed.set()
+
+        payload1 = make_extend_payload(VOL1, 100)
+        payload2 = make_extend_payload(VOL2, 200)
+        with io.open(mboxfiles.inbox, "r+b") as f:
+            f.seek(3 * sm.MAILBOX_SIZE)
+            f.write(make_host_mailbox(payload1))
+            f.seek(7 * sm.MAILBOX_SIZE)
+            f.write(make_host_mailbox(b"\0" * sm.MESSAGE_SIZE, payload2))
+
+        mailbox = sm.SPM_MailMonitor(
+            SPUUID,
+            MAX_HOSTS,
+            inbox=mboxfiles.inbox,
+            outbox=mboxfiles.outbox,
+            monitorInterval=MONITOR_INTERVAL)
+        mailbox.registerMessageType(
+            sm.EXTEND_CODE, spm_callback,
+            batchKey=sm.SPM_Extend_Message.domainKey)
+        mailbox.start()
+        try:
+            assert msg_processed.wait(10 * MONITOR_INTERVAL), \
+                'message was not processed on time'
+        finally:
+            mailbox.stop()
+            assert mailbox.wait(timeout=MAILER_TIMEOUT)
+
+        # Both requests are for the same domain, processed in one batch.
+        assert received_batches == [[
+            (3 * sm.SLOTS_PER_MAILBOX, payload1),
+            (7 * sm.SLOTS_PER_MAILBOX + 1, payload2),
+        ]]
+
+    def test_send_replies(self, mboxfiles):
+        msg1 = sm.SPM_Extend_Message(
+            dict(poolID=SPUUID, domainID=SDUUID, volumeID=VOL1), 100)
+        msg2 = sm.SPM_Extend_Message(
+            dict(poolID=SPUUID, domainID=SDUUID, volumeID=VOL2), 200)
+        msg_id1 = 2 * sm.SLOTS_PER_MAILBOX + 5
+        msg_id2 = 6 * sm.SLOTS_PER_MAILBOX
+
+        writes = []
+        write_mailbox = sm._write_mailbox
+
+        def record_write(path, offset, data):
+            writes.append((offset, len(data)))
+            write_mailbox(path, offset, data)
+
+        with make_spm_mailbox(mboxfiles) as spm_mm:
+            with mock.patch.object(sm, "_write_mailbox", record_write):
+                spm_mm.sendReplies([(msg_id1, msg1), (msg_id2, msg2)])
+
+        # Only the modified mailboxes are written.
+        assert writes == [
+            (2 * sm.MAILBOX_SIZE, sm.MAILBOX_SIZE),
+            (6 * sm.MAILBOX_SIZE, sm.MAILBOX_SIZE),
+        ]
+
+        inbox, outbox = read_mbox(mboxfiles)
+        expected = bytearray(sm.EMPTYMAILBOX * MAX_HOSTS)
+        for msg_id, msg in (msg_id1, msg1), (msg_id2, msg2):
+            offset = msg_id * sm.MESSAGE_SIZE
+            expected[offset:offset + sm.MESSAGE_SIZE] = msg.payload
+        assert outbox == expected
+
     def test_send_reply(self, mboxfiles):
         HOST_ID = 3
         MSG_ID = HOST_ID * sm.SLOTS_PER_MAILBOX + 12
@@ -236,16 +322,16 @@ class TestExtendMessage:
         pool = mock.MagicMock()
         pool.spUUID = SPUUID
 
-        ret = sm.SPM_Extend_Message.processRequest(
-            pool=pool, msgID=MSG_ID, payload=PAYLOAD)
+        ret = sm.SPM_Extend_Message.processRequests(
+            pool=pool, requests=[(MSG_ID, PAYLOAD)])
 
         assert ret == {'status': {'code': 0, 'message': 'Done'}}
         pool.extendVolume.assert_called_with(
             self.VOL_DATA['domainID'], self.VOL_DATA['volumeID'], 4242)
 
         called_name, called_args, called_kwargs = pool.mock_calls[1]
-        assert called_name == 'spmMailer.sendReply'
-        called_msgid, called_msg = called_args
+        assert called_name == 'spmMailer.sendReplies'
+        [(called_msgid, called_msg)] = called_args[0]
         assert called_msgid == MSG_ID
         assert called_msg.payload == (
             b'1xtnd\xe1_\xfeeT\x8a\x18\xb3\xe0JT\xe5^\xc8\xdb\x8a_Z%'
@@ -253,6 +339,85 @@ class TestExtendMessage:
             b'0000000000')
         assert called_msg.callback is None
 
+    def test_process_requests(self):
+        pool = mock.MagicMock()
+        pool.spUUID = SPUUID
+
+        def extend_volume(sd_id, vol_id, size):
+            if vol_id == VOL2:
+                raise RuntimeError("No space left")
+
+        pool.extendVolume.side_effect = extend_volume
+
+        requests = [
+            (1, make_extend_payload(VOL1, 1024)),
+            (70, make_extend_payload(VOL2, 2048)),
+            (130, make_extend_payload(VOL1, 4096)),
+        ]
+        ret = sm.SPM_Extend_Message.processRequests(pool, requests)
+        assert ret == {'status': {'code': 0, 'message': 'Done'}}
+
+        # Requests for the same volume are merged.
+        assert pool.extendVolume.call_args_list == [
+            mock.call(SDUUID, VOL1, 4096),
+            mock.call(SDUUID, VOL2, 2048),
+        ]
+
+        # Replies for all requests are sent at once.
+        assert pool.spmMailer.sendReplies.call_count == 1
+        replies = pool.spmMailer.sendReplies.call_args[0][0]
+        assert [(msg_id, msg.payload) for msg_id, msg in replies] == [
+            (1, make_extend_payload(VOL1, 4096)),
+            (130, make_extend_payload(VOL1, 4096)),
+            # Failed extend is reported with zero size.
+            (70, make_extend_payload(VOL2, 0)),
+        ]
+
+    def test_process_requests_invalid(self):
+        pool = mock.MagicMock()
+        pool.spUUID = SPUUID
+
+        bad_payload = bytearray(make_extend_payload(VOL2, 2048))
+        bad_payload[sm._SIZE_OFFSET] = ord(b"x")
+        requests = [
+            (1, make_extend_payload(VOL1, 1024)),
+            (70, bytes(bad_payload)),
+        ]
+        sm.SPM_Extend_Message.processRequests(pool, requests)
+
+        # The invalid request is skipped, other requests are handled.
+        assert pool.extendVolume.call_args_list == [
+            mock.call(SDUUID, VOL1, 1024),
+        ]
+        replies = pool.spmMailer.sendReplies.call_args[0][0]
+        assert [(msg_id, msg.payload) for msg_id, msg in replies] == [
+            (1, make_extend_payload(VOL1, 1024)),
+        ]
+
+    def test_process_requests_all_invalid(self):
+        pool = mock.MagicMock()
+        pool.spUUID = SPUUID
+
+        ret = sm.SPM_Extend_Message.processRequests(pool, [(1, b"x" * 64)])
+        assert ret == {'status': {'code': 0, 'message': 'Done'}}
+        assert not pool.extendVolume.called
+        assert not pool.spmMailer.sendReplies.called
+
+    def test_domain_key(self):
+        payload = make_extend_payload(VOL1, 1024)
+        assert sm.SPM_Extend_Message.domainKey(payload) == \
+            sm.misc.packUuid(SDUUID)
+
+
+@pytest.mark.parametrize("numbers,runs", [
+    ([], []),
+    ([3], [(3, 3)]),
+    ([1, 2, 3], [(1, 3)]),
+    ([1, 2, 5, 7, 8], [(1, 2), (5, 5), (7, 8)]),
+])
+def test_runs(numbers, runs):
+    assert sm._runs(numbers) == runs
+
 
 class TestValidation:
 
@@ -289,6 +454,47 @@ class TestChecksum:
         assert sm.checksum(data, 16) == sm.checksum(data, 16)
 
 
+class TestDirectIO:
+
+    def test_read(self, mboxfiles):
+        data = b"x" * sm.MAILBOX_SIZE
+        with io.open(mboxfiles.inbox, "r+b") as f:
+            f.seek(3 * sm.MAILBOX_SIZE)
+            f.write(data)
+        assert sm._read_mailbox(
+            mboxfiles.inbox, 3 * sm.MAILBOX_SIZE, sm.MAILBOX_SIZE) == data
+
+    def test_read_short(self, mboxfiles):
+        offset = (MAX_HOSTS - 1) * sm.MAILBOX_SIZE
+        with pytest.raises(IOError):
+            sm._read_mailbox(mboxfiles.inbox, offset, 2 * sm.MAILBOX_SIZE)
+
+    def test_write(self, mboxfiles):
+        data = b"x" * sm.MAILBOX_SIZE
+        sm._write_mailbox(mboxfiles.outbox, 5 * sm.MAILBOX_SIZE, data)
+        inbox, outbox = read_mbox(mboxfiles)
+        assert outbox == (sm.EMPTYMAILBOX * 5 + data +
+                          sm.EMPTYMAILBOX * (MAX_HOSTS - 6))
+
+
+class TestPollInterval:
+
+    def test_idle(self):
+        interval = sm.PollInterval(2, 0.25)
+        assert [interval.next() for i in range(3)] == [2, 2, 2]
+
+    def test_shorten(self):
+        interval = sm.PollInterval(2, 0.25)
+        interval.shorten()
+        assert [interval.next() for i in range(6)] == [
+            0.25, 0.5, 1, 2, 2, 2]
+
+    def test_minimum_larger_than_maximum(self):
+        interval = sm.PollInterval(0.2, 0.5)
+        interval.shorten()
+        assert interval.next() == 0.2
+
+
 class TestWaitTimeout:
 
     def test_production_config(self):
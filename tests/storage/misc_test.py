@@ -528,57 +528,6 @@ class TestParseBool(VdsmTestCase):
         self.assertRaises(AttributeError, misc.parseBool, None)
 
 
-class TestAlignData(VdsmTestCase):
-
-    def test(self):
-        """
-        Test various inputs and see that they are correct.
-        """
-        self.assertEqual(misc._alignData(100, 100), (4, 25, 25))
-        self.assertEqual(misc._alignData(512, 512), (512, 1, 1))
-        self.assertEqual(misc._alignData(1, 1024), (1, 1, 1024))
-        self.assertEqual(misc._alignData(10240, 512), (512, 20, 1))
-        self.assertEqual(misc._alignData(1, 1), (1, 1, 1))
-
-
-class TestValidateDDBytes(VdsmTestCase):
-
-    def testValidInputTrue(self):
-        """
-        Test that it works when given valid and correct input.
-        """
-        count = 802
-        with tempfile.NamedTemporaryFile() as f:
-            cmd = [EXT_DD, "bs=1", "if=/dev/urandom", 'of=%s' % f.name,
-                   'count=%d' % count]
-            rc, out, err = commands.execCmd(cmd)
-
-        self.assertTrue(misc.validateDDBytes(err, count))
-
-    def testValidInputFalse(self):
-        """
-        Test that is work when given valid but incorrect input.
-        """
-        count = 802
-        with tempfile.NamedTemporaryFile() as f:
-            cmd = [EXT_DD, "bs=1", "if=/dev/urandom", 'of=%s' % f.name,
-                   'count=%d' % count]
-            rc, out, err = commands.execCmd(cmd)
-
-        self.assertFalse(misc.validateDDBytes(err, count + 1))
-
-    def testInvalidInput(self):
-        """
-        Test that the method handles wired input.
-        """
-        self.assertRaises(misc.se.InvalidParameterException,
-                          misc.validateDDBytes,
-                          ["I AM", "PRETENDING TO", "BE DD"], "BE")
-        self.assertRaises(misc.se.InvalidParameterException,
-                          misc.validateDDBytes,
-                          ["I AM", "PRETENDING TO", "BE DD"], 32)
-
-
 @pytest.mark.skipif(six.PY3, reason="try to write text to binary file")
 class TestReadBlock(VdsmTestCase):
 
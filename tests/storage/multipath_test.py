@@ -0,0 +1,269 @@
+#
+# Copyright 2019 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import pytest
+
+from vdsm.storage import multipath
+from vdsm.storage import udev
+
+DEVICES = [
+    # dm_id, guid, slaves
+    ("dm-0", "guid-0", ["sda", "sdb"]),
+    ("dm-1", "guid-1", ["sdc"]),
+    ("dm-2", "guid-2", ["sdd"]),
+]
+
+
+class FakeSupervdsm(object):
+
+    def __init__(self):
+        self.calls = []
+        self.scsi_id_fails = False
+
+    def getScsiSerials(self, physdevs):
+        self.calls.append(list(physdevs))
+        if self.scsi_id_fails:
+            # getScsiSerial() returns empty serial if scsi_id failed.
+            return {dev: "" for dev in physdevs}
+        return {dev: "serial-" + dev for dev in physdevs}
+
+
+class FakeSysfs(object):
+
+    def __init__(self):
+        self.vendor_reads = 0
+
+    def vendor(self, physdev):
+        self.vendor_reads += 1
+        return "vendor-" + physdev
+
+
+@pytest.fixture
+def fake_devices(monkeypatch):
+    slaves = {dm_id: slaves for dm_id, guid, slaves in DEVICES}
+    svdsm = FakeSupervdsm()
+    sysfs = FakeSysfs()
+
+    monkeypatch.setattr(multipath, "device_cache", multipath.DeviceCache())
+    monkeypatch.setattr(
+        multipath, "getMPDevsIter",
+        lambda: [(dm_id, guid) for dm_id, guid, _ in DEVICES])
+    monkeypatch.setattr(multipath.supervdsm, "getProxy", lambda: svdsm)
+    monkeypatch.setattr(
+        multipath.devicemapper, "getSlaves", lambda dm_id: slaves[dm_id])
+    monkeypatch.setattr(
+        multipath.devicemapper, "isBlockDevice", lambda dev: True)
+    monkeypatch.setattr(
+        multipath.devicemapper, "getPathsStatus",
+        lambda: {"sda": "active", "sdb": "failed"})
+    monkeypatch.setattr(multipath, "getVendor", sysfs.vendor)
+    monkeypatch.setattr(multipath, "getModel", lambda dev: "model")
+    monkeypatch.setattr(multipath, "getFwRev", lambda dev: "fwrev")
+    monkeypatch.setattr(
+        multipath, "getDeviceBlockSizes", lambda dev: (512, 4096))
+    monkeypatch.setattr(multipath, "getDeviceSize", lambda dev: 1024**3)
+    monkeypatch.setattr(
+        multipath, "getDeviceDiscardMaxBytes", lambda dev: 0)
+    monkeypatch.setattr(
+        multipath, "getHBTL", lambda dev: multipath.HBTL("1", "0", "0", "3"))
+    monkeypatch.setattr(multipath.iscsi, "devIsiSCSI", lambda dev: False)
+
+    return svdsm, sysfs, slaves
+
+
+def test_path_list(fake_devices):
+    devices = list(multipath.pathListIter())
+    assert [d["guid"] for d in devices] == ["guid-0", "guid-1", "guid-2"]
+
+    dev = devices[0]
+    assert dev["dm"] == "dm-0"
+    assert dev["serial"] == "serial-dm-0"
+    assert dev["vendor"] == "vendor-sda"
+    assert dev["product"] == "model"
+    assert dev["fwrev"] == "fwrev"
+    assert dev["logicalblocksize"] == "512"
+    assert dev["physicalblocksize"] == "4096"
+    assert dev["capacity"] == str(1024**3)
+    assert dev["devtype"] == multipath.DEV_FCP
+    assert dev["paths"] == [
+        {"physdev": "sda", "state": "active", "capacity": str(1024**3),
+         "lun": "3", "type": multipath.DEV_FCP},
+        {"physdev": "sdb", "state": "failed", "capacity": str(1024**3),
+         "lun": "3", "type": multipath.DEV_FCP},
+    ]
+
+
+def test_path_list_filter(fake_devices):
+    svdsm, sysfs, slaves = fake_devices
+    devices = list(multipath.pathListIter(["guid-2"]))
+    assert [d["guid"] for d in devices] == ["guid-2"]
+    assert svdsm.calls == [["dm-2"]]
+
+
+def test_path_list_batch_serials(fake_devices):
+    svdsm, sysfs, slaves = fake_devices
+    list(multipath.pathListIter())
+    assert svdsm.calls == [["dm-0", "dm-1", "dm-2"]]
+
+
+def test_path_list_cached(fake_devices):
+    svdsm, sysfs, slaves = fake_devices
+    first = list(multipath.pathListIter())
+    second = list(multipath.pathListIter())
+    assert first == second
+    assert len(svdsm.calls) == 1
+    assert sysfs.vendor_reads == len(DEVICES)
+
+
+def test_path_list_slaves_changed(fake_devices):
+    svdsm, sysfs, slaves = fake_devices
+    list(multipath.pathListIter())
+    slaves["dm-1"] = ["sdc", "sde"]
+    devices = list(multipath.pathListIter())
+    assert svdsm.calls[1] == ["dm-1"]
+    assert [p["physdev"] for p in devices[1]["paths"]] == ["sdc", "sde"]
+
+
+def test_path_list_device_removed(fake_devices):
+    svdsm, sysfs, slaves = fake_devices
+    list(multipath.pathListIter())
+    event = udev.MultipathEvent(
+        udev.MPATH_REMOVED, "guid-0", None, None, None)
+    multipath.device_cache.handle(event)
+    list(multipath.pathListIter())
+    assert svdsm.calls[1] == ["dm-0"]
+
+
+def test_path_list_incomplete_not_cached(fake_devices, monkeypatch):
+    svdsm, sysfs, slaves = fake_devices
+
+    def fail(dev):
+        raise IOError("No such file")
+
+    monkeypatch.setattr(multipath, "getFwRev", fail)
+    devices = list(multipath.pathListIter(["guid-1"]))
+    assert devices[0]["fwrev"] == ""
+    list(multipath.pathListIter(["guid-1"]))
+    assert len(svdsm.calls) == 2
+
+
+def test_path_list_no_serial_not_cached(fake_devices):
+    svdsm, sysfs, slaves = fake_devices
+    svdsm.scsi_id_fails = True
+    devices = list(multipath.pathListIter(["guid-1"]))
+    assert devices[0]["serial"] == ""
+    list(multipath.pathListIter(["guid-1"]))
+    assert len(svdsm.calls) == 2
+
+
+def test_device_cache():
+    cache = multipath.DeviceCache()
+    cache.update("guid", "dm-0", ["sda"], {"vendor": "vendor"})
+    assert cache.get("guid", "dm-0", ["sda"]) == {"vendor": "vendor"}
+    assert cache.get("guid", "dm-1", ["sda"]) is None
+    assert cache.get("guid", "dm-0", ["sda", "sdb"]) is None
+    assert cache.get("other", "dm-0", ["sda"]) is None
+
+
+@pytest.mark.parametrize("event_type", [
+    udev.PATH_FAILED, udev.PATH_REINSTATED
+])
+def test_device_cache_path_events(event_type):
+    cache = multipath.DeviceCache()
+    cache.update("guid", "dm-0", ["sda"], {"vendor": "vendor"})
+    cache.handle(udev.MultipathEvent(event_type, "guid", "sda", 0, 1))
+    assert cache.get("guid", "dm-0", ["sda"]) == {"vendor": "vendor"}
+
+
+def test_device_cache_start_stop():
+    cache = multipath.DeviceCache()
+    cache.update("guid", "dm-0", ["sda"], {"vendor": "vendor"})
+    cache.start()
+    assert cache.get("guid", "dm-0", ["sda"]) is None
+    cache.update("guid", "dm-0", ["sda"], {"vendor": "vendor"})
+    cache.stop()
+    assert cache.get("guid", "dm-0", ["sda"]) is None
+
+
+@pytest.mark.parametrize("count,workers", [
+    (0, 10),
+    (1, 10),
+    (10, 3),
+    (25, 10),
+])
+def test_parallel(count, workers):
+    args = list(range(count))
+    assert multipath._parallel(lambda x: x * 2, args, workers) == [
+        x * 2 for x in args]
+
+
+def test_parallel_error():
+    def func(x):
+        if x == 5:
+            raise RuntimeError("error")
+        return x
+
+    with pytest.raises(RuntimeError):
+        multipath._parallel(func, list(range(10)), 3)
+
+
+def test_rescan_devices(monkeypatch):
+    slaves = {"dm-0": ["sda", "sdb"], "dm-1": ["sdc"], "dm-2": ["sdd"]}
+    sessions = {"sda": 1, "sdb": 2}
+    hosts = {"sdc": "3", "sdd": "3"}
+    calls = []
+
+    monkeypatch.setattr(
+        multipath.devicemapper, "getDmId", lambda guid: "dm-" + guid[-1])
+    monkeypatch.setattr(
+        multipath.devicemapper, "getSlaves", lambda dm_id: slaves[dm_id])
+    monkeypatch.setattr(
+        multipath.iscsi, "devIsiSCSI", lambda dev: dev in sessions)
+    monkeypatch.setattr(
+        multipath.iscsi, "getiScsiSession", lambda dev: sessions[dev])
+    monkeypatch.setattr(
+        multipath, "getHBTL",
+        lambda dev: multipath.HBTL(hosts[dev], "0", "0", "1"))
+    monkeypatch.setattr(
+        multipath.iscsi, "rescan_sessions",
+        lambda ids: calls.append(("sessions", sorted(ids))))
+    monkeypatch.setattr(
+        multipath.hba, "rescan_hosts",
+        lambda names: calls.append(("hosts", names)))
+    monkeypatch.setattr(
+        multipath.udevadm, "settle",
+        lambda timeout: calls.append(("settle",)))
+
+    multipath.rescan_devices(["guid-0", "guid-1", "guid-2"])
+    assert calls == [("sessions", [1, 2]), ("hosts", ["host3"]), ("settle",)]
+
+    del calls[:]
+    multipath.rescan_devices(["guid-0"])
+    assert calls == [("sessions", [1, 2]), ("settle",)]
+
+
+def test_scsi_serials(monkeypatch):
+    monkeypatch.setattr(multipath, "getScsiSerial", lambda dev: "s-" + dev)
+    assert multipath.getScsiSerials(["sda", "sdb"]) == {
+        "sda": "s-sda", "sdb": "s-sdb"}
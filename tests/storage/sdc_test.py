@@ -0,0 +1,152 @@
+#
+# Copyright 2019 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+
+from __future__ import absolute_import
+from __future__ import division
+
+import pytest
+
+from vdsm.storage import exception as se
+from vdsm.storage import sdc
+
+SD_UUID = "sd-uuid"
+
+
+class FakeStorage(object):
+
+    def __init__(self, pvs=None):
+        self.pvs = pvs or {}
+        self.calls = []
+        self.domains = set()
+        self.rescan_error = None
+
+    def getCachedPVNames(self, vgName):
+        return self.pvs.get(vgName)
+
+    def rescan(self):
+        self.calls.append(("rescan",))
+
+    def rescan_devices(self, guids):
+        self.calls.append(("rescan_devices", guids))
+        if self.rescan_error:
+            raise self.rescan_error
+
+    def resize_devices(self, guids=None):
+        self.calls.append(("resize_devices", guids))
+
+    def invalidateCache(self):
+        self.calls.append(("invalidateCache",))
+
+    def invalidateVG(self, vgName, invalidateLVs=True, invalidatePVs=False):
+        self.calls.append(("invalidateVG", vgName))
+
+    def findDomain(self, sdUUID):
+        if sdUUID not in self.domains:
+            raise se.StorageDomainDoesNotExist(sdUUID)
+        return "domain-" + sdUUID
+
+
+@pytest.fixture
+def storage(monkeypatch):
+    storage = FakeStorage()
+    monkeypatch.setattr(sdc.lvm, "getCachedPVNames", storage.getCachedPVNames)
+    monkeypatch.setattr(sdc.lvm, "invalidateCache", storage.invalidateCache)
+    monkeypatch.setattr(sdc.lvm, "invalidateVG", storage.invalidateVG)
+    monkeypatch.setattr(sdc.multipath, "rescan", storage.rescan)
+    monkeypatch.setattr(sdc.multipath, "rescan_devices",
+                        storage.rescan_devices)
+    monkeypatch.setattr(sdc.multipath, "resize_devices",
+                        storage.resize_devices)
+    return storage
+
+
+@pytest.fixture
+def cache(storage):
+    cache = sdc.StorageDomainCache("/repo")
+    cache.knownSDs[SD_UUID] = storage.findDomain
+    return cache
+
+
+def test_refresh_domain_storage(cache, storage):
+    storage.pvs[SD_UUID] = ("/dev/mapper/guid-1", "/dev/mapper/guid-2")
+    assert cache.refreshDomainStorage(SD_UUID)
+    assert storage.calls == [
+        ("rescan_devices", ["guid-1", "guid-2"]),
+        ("resize_devices", ["guid-1", "guid-2"]),
+        ("invalidateVG", SD_UUID),
+    ]
+
+
+def test_refresh_domain_storage_unknown_vg(cache, storage):
+    assert not cache.refreshDomainStorage(SD_UUID)
+    assert storage.calls == []
+
+
+def test_refresh_domain_storage_error(cache, storage):
+    storage.pvs[SD_UUID] = ("/dev/mapper/guid-1",)
+    storage.rescan_error = OSError("No such device")
+    assert not cache.refreshDomainStorage(SD_UUID)
+    assert ("invalidateVG", SD_UUID) not in storage.calls
+
+
+def test_produce_stale_scoped(cache, storage):
+    storage.pvs[SD_UUID] = ("/dev/mapper/guid-1",)
+    storage.domains.add(SD_UUID)
+    assert cache._realProduce(SD_UUID) == "domain-" + SD_UUID
+    assert ("rescan",) not in storage.calls
+    assert ("invalidateCache",) not in storage.calls
+
+
+def test_produce_stale_unknown_vg(cache, storage):
+    storage.domains.add(SD_UUID)
+    assert cache._realProduce(SD_UUID) == "domain-" + SD_UUID
+    assert storage.calls == [
+        ("rescan",),
+        ("resize_devices", None),
+        ("invalidateCache",),
+    ]
+
+
+def test_produce_stale_fallback(cache, storage, monkeypatch):
+    # The domain is not found after the scoped refresh; the global refresh
+    # is used as a fallback.
+    storage.pvs[SD_UUID] = ("/dev/mapper/guid-1",)
+
+    def rescan():
+        storage.calls.append(("rescan",))
+        storage.domains.add(SD_UUID)
+
+    monkeypatch.setattr(sdc.multipath, "rescan", rescan)
+    assert cache._realProduce(SD_UUID) == "domain-" + SD_UUID
+    assert storage.calls[0] == ("rescan_devices", ["guid-1"])
+    assert ("rescan",) in storage.calls
+
+
+def test_produce_updated(cache, storage):
+    storage.domains.add(SD_UUID)
+    cache.refreshStorage()
+    del storage.calls[:]
+    assert cache._realProduce(SD_UUID) == "domain-" + SD_UUID
+    assert storage.calls == []
+
+
+def test_produce_missing(cache, storage):
+    with pytest.raises(se.StorageDomainDoesNotExist):
+        cache._realProduce(SD_UUID)
@@ -180,6 +180,10 @@ class FakeDomainManifest(object):
     def refresh(self):
         pass
 
+    @recorded
+    def refreshImageVolumes(self, imgUUID):
+        pass
+
     @classmethod
     @recorded
     def validateCreateVolumeParams(cls, volFormat, srcVolUUID, diskType=None,
@@ -736,6 +740,7 @@ class DomainTestMixin(object):
         ['hasVolumeLeases', 0],
         ['refreshDirTree', 0],
         ['refresh', 0],
+        ['refreshImageVolumes', 1],
         ['getVolumeLease', 2],
         ['external_leases_path', 0],
     ])
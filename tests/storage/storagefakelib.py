@@ -98,6 +98,7 @@ class FakeLVM(object):
                      vg_mda_free=None,
                      lv_count='0',
                      pv_count=str(len(devices)),
+                     seqno='1',
                      pv_name=pv_name,
                      writeable=True,
                      partial='OK')
@@ -220,8 +221,11 @@ class FakeLVM(object):
         tags -= set(delTags)
         lv_md['tags'] = tuple(tags)
 
+    def getLvIndex(self, vgName):
+        return real_lvm.LVIndex(self.getLV(vgName))
+
     def lvsByTag(self, vgName, tag):
-        return [lv for lv in self.getLV(vgName) if tag in lv.tags]
+        return self.getLvIndex(vgName).lvsByTag(tag)
 
     def lvPath(self, vgName, lvName):
         return os.path.join(self.root, "dev", vgName, lvName)
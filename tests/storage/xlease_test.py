@@ -26,6 +26,7 @@ import functools
 import io
 import mmap
 import os
+import time
 import timeit
 
 from contextlib import contextmanager
@@ -332,6 +333,121 @@ class TestIndex:
             assert (leases[uuids[2]]["offset"] ==
                     xlease.USER_RESOURCE_BASE + xlease.SLOT_SIZE * 2)
 
+    def test_find_record_duplicate(self):
+        # If an index contains duplicate records, the first one is used, like
+        # searching the index on storage.
+        lease_id = make_uuid()
+        index = xlease.VolumeIndex()
+        with utils.closing(index):
+            index.write_record(7, xlease.Record(lease_id, 7))
+            index.write_record(3, xlease.Record(lease_id, 3))
+            assert index.find_record(lease_id) == 3
+            index.write_record(3, xlease.EMPTY_RECORD)
+            assert index.find_record(lease_id) == 7
+            index.write_record(7, xlease.EMPTY_RECORD)
+            assert index.find_record(lease_id) == -1
+
+    def test_find_free_record(self):
+        index = xlease.VolumeIndex()
+        with utils.closing(index):
+            assert index.find_free_record() == -1
+            index.write_record(5, xlease.EMPTY_RECORD)
+            index.write_record(9, xlease.EMPTY_RECORD)
+            assert index.find_free_record() == 5
+            index.write_record(5, xlease.Record(make_uuid(), 5))
+            assert index.find_free_record() == 9
+
+    def test_refresh_unchanged(self, fake_sanlock):
+        with make_volume() as vol:
+            lease_id = make_uuid()
+            vol.add(lease_id)
+            file = CountingFile(vol.path)
+            with utils.closing(file):
+                vol.refresh(file)
+                lease = vol.lookup(lease_id)
+                assert lease.path == vol.path
+                # Read only the metadata block and the record block.
+                assert file.reads == [xlease.BLOCK_SIZE, xlease.BLOCK_SIZE]
+
+    def test_refresh_lease_added(self, fake_sanlock):
+        with make_volume() as vol:
+            lease_id = make_uuid()
+            with other_volume(vol.path) as other:
+                other.add(lease_id)
+            file = xlease.DirectFile(vol.path)
+            with utils.closing(file):
+                vol.refresh(file)
+                lease = vol.lookup(lease_id)
+                assert lease.offset == xlease.USER_RESOURCE_BASE
+                with pytest.raises(xlease.LeaseExists):
+                    vol.add(lease_id)
+
+    def test_refresh_lease_removed(self, fake_sanlock):
+        with make_volume() as vol:
+            lease_id = make_uuid()
+            vol.add(lease_id)
+            with other_volume(vol.path) as other:
+                other.remove(lease_id)
+            file = xlease.DirectFile(vol.path)
+            with utils.closing(file):
+                vol.refresh(file)
+                with pytest.raises(se.NoSuchLease):
+                    vol.lookup(lease_id)
+
+    def test_refresh_slot_reused(self, fake_sanlock):
+        with make_volume() as vol:
+            old_id = make_uuid()
+            new_id = make_uuid()
+            vol.add(old_id)
+            with other_volume(vol.path) as other:
+                other.remove(old_id)
+                other.add(new_id)
+            file = xlease.DirectFile(vol.path)
+            with utils.closing(file):
+                vol.refresh(file)
+                with pytest.raises(se.NoSuchLease):
+                    vol.lookup(old_id)
+                lease = vol.lookup(new_id)
+                assert lease.offset == xlease.USER_RESOURCE_BASE
+
+    def test_refresh_add_uses_free_slot(self, fake_sanlock):
+        with make_volume() as vol:
+            uuids = [make_uuid() for i in range(3)]
+            with other_volume(vol.path) as other:
+                other.add(uuids[0])
+                other.add(uuids[1])
+            file = xlease.DirectFile(vol.path)
+            with utils.closing(file):
+                vol.refresh(file)
+                lease = vol.add(uuids[2])
+                assert (lease.offset ==
+                        xlease.USER_RESOURCE_BASE + xlease.SLOT_SIZE * 2)
+                assert sorted(vol.leases()) == sorted(uuids)
+
+    def test_refresh_formatted(self, fake_sanlock, monkeypatch):
+        with make_volume() as vol:
+            vol.add(make_uuid())
+            mtime = vol.mtime + 1
+            monkeypatch.setattr("time.time", lambda: mtime)
+            file = xlease.DirectFile(vol.path)
+            with utils.closing(file):
+                xlease.format_index(vol.lockspace, file)
+                vol.refresh(file)
+                assert vol.mtime == mtime
+                assert vol.leases() == {}
+
+    def test_refresh_updating(self):
+        with make_volume() as vol:
+            file = xlease.DirectFile(vol.path)
+            with utils.closing(file):
+                md = xlease.IndexMetadata(
+                    xlease.INDEX_VERSION, vol.lockspace, updating=True)
+                with io.open(vol.path, "r+b") as f:
+                    f.seek(xlease.INDEX_BASE)
+                    f.write(md.bytes())
+                with pytest.raises(xlease.IndexIsUpdating):
+                    vol.refresh(file)
+
     @pytest.mark.slow
     def test_time_lookup(self):
         setup = """
@@ -390,6 +506,60 @@ def bench():
                   % (count, elapsed, elapsed / count))
 
 
+class TestIndexBenchmark:
+
+    # The index is limited to MAX_RECORDS leases, so we benchmark the largest
+    # possible volume.
+    COUNT = 100
+
+    @pytest.mark.slow
+    def test_time_lookup_full(self):
+        with make_full_volume(xlease.MAX_RECORDS) as (path, uuids):
+            lease_ids = uuids[-self.COUNT:]
+
+            elapsed = self.run(path, lease_ids, cached=False, op="lookup")
+            print("uncached: %d lookups in %.6f seconds (%.6f per lookup)"
+                  % (self.COUNT, elapsed, elapsed / self.COUNT))
+
+            elapsed = self.run(path, lease_ids, cached=True, op="lookup")
+            print("cached: %d lookups in %.6f seconds (%.6f per lookup)"
+                  % (self.COUNT, elapsed, elapsed / self.COUNT))
+
+    @pytest.mark.slow
+    def test_time_add_full(self, fake_sanlock):
+        count = xlease.MAX_RECORDS - 2 * self.COUNT
+        with make_full_volume(count) as (path, uuids):
+            lease_ids = [make_uuid() for i in range(self.COUNT)]
+            elapsed = self.run(path, lease_ids, cached=False, op="add")
+            print("uncached: %d adds in %.6f seconds (%.6f per add)"
+                  % (self.COUNT, elapsed, elapsed / self.COUNT))
+
+            lease_ids = [make_uuid() for i in range(self.COUNT)]
+            elapsed = self.run(path, lease_ids, cached=True, op="add")
+            # Note: this does not include the time to create the real sanlock
+            # resource.
+            print("cached: %d adds in %.6f seconds (%.6f per add)"
+                  % (self.COUNT, elapsed, elapsed / self.COUNT))
+
+    def run(self, path, lease_ids, cached, op):
+        file = xlease.DirectFile(path)
+        with utils.closing(file):
+            vol = xlease.LeasesVolume(file)
+            with utils.closing(vol):
+                start = time.time()
+                for lease_id in lease_ids:
+                    file = xlease.DirectFile(path)
+                    with utils.closing(file):
+                        if cached:
+                            vol.refresh(file)
+                            getattr(vol, op)(lease_id)
+                        else:
+                            tmp = xlease.LeasesVolume(file)
+                            with utils.closing(tmp):
+                                getattr(tmp, op)(lease_id)
+                return time.time() - start
+
+
 @pytest.fixture(params=[
     xlease.DirectFile,
     pytest.param(
@@ -520,3 +690,52 @@ def write_records(records, file):
             with utils.closing(block):
                 block.write_record(recnum, record)
                 block.dump(file)
+
+
+@contextmanager
+def other_volume(path):
+    """
+    Open another instance of the volume at path, simulating access from
+    another host.
+    """
+    file = xlease.DirectFile(path)
+    with utils.closing(file):
+        vol = xlease.LeasesVolume(file)
+        with utils.closing(vol):
+            yield vol
+
+
+@contextmanager
+def make_full_volume(count):
+    """
+    Create a volume with count leases, returning the volume path and the lease
+    ids.
+    """
+    with make_leases() as path:
+        lockspace = os.path.basename(os.path.dirname(path))
+        uuids = [make_uuid() for i in range(count)]
+        file = xlease.DirectFile(path)
+        with utils.closing(file):
+            index = xlease.VolumeIndex()
+            with utils.closing(index):
+                with index.updating(lockspace, file):
+                    for recnum in range(xlease.MAX_RECORDS):
+                        if recnum < count:
+                            record = xlease.Record(
+                                uuids[recnum], xlease.lease_offset(recnum))
+                        else:
+                            record = xlease.EMPTY_RECORD
+                        index.write_record(recnum, record)
+                    index.dump(file)
+        yield path, uuids
+
+
+class CountingFile(xlease.DirectFile):
+
+    def __init__(self, path):
+        super(CountingFile, self).__init__(path)
+        self.reads = []
+
+    def pread(self, offset, buf):
+        self.reads.append(len(buf))
+        return super(CountingFile, self).pread(offset, buf)
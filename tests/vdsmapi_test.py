@@ -145,6 +145,27 @@ class DataVerificationTests(TestCaseBase):
 
         self.assertIn('StorageDomainType', str(e.exception))
 
+    def test_wrong_param_type_cached(self):
+        # Verifying the same method again uses the compiled validator.
+        params = {u"storagepoolID": u"00000000-0000-0000-0000-000000000000",
+                  u"domainType": u"1",
+                  u"connectionParams": []}
+        rep = vdsmapi.MethodRep('StoragePool', 'disconnectStorageServer')
+
+        for i in range(2):
+            with self.assertRaises(JsonRpcErrorBase) as e:
+                _schema.verify_args(rep, params)
+            self.assertIn('StorageDomainType', str(e.exception))
+
+        params[u"domainType"] = u"NFS"
+        _schema.verify_args(rep, params)
+
+    def test_unknown_method(self):
+        with self.assertRaises(JsonRpcErrorBase) as e:
+            _schema.verify_args(vdsmapi.MethodRep('Host', 'noSuchMethod'), {})
+
+        self.assertIn('Host.noSuchMethod', str(e.exception))
+
     def test_list_ret(self):
         ret = [{u"status": 0, u"id": u"f6de012c-be35-47cb-94fb-f01074a5f9ef"}]
 
@@ -438,11 +459,80 @@ class DataVerificationTests(TestCaseBase):
 
         _schema.verify_retval(vdsmapi.MethodRep('Host', 'getAllVmStats'), ret)
 
+    def test_vm_stats_changes(self):
+        ret = {'generation': '7d6a2a0c-6c9e-4c5b-a4a4-12b7f85b5b6d:2',
+               'full': False,
+               'statsList': [
+                   {'vmId': u'b3f6fa00-b315-4ad4-8108-f73da817b5c5',
+                    'statusTime': '4319358220',
+                    'cpuUser': '0.31',
+                    'removedFields': ['migrationProgress']},
+                   {'vmId': u'1c2b0a4e-5b8b-4d9c-a4a2-3f1b2b3c4d5e',
+                    'removedFields': ['pauseCode']},
+               ],
+               'removedVms': [u'2a7a4b5c-4a1b-4c2d-9e3f-5a6b7c8d9e0f']}
+
+        _schema.verify_retval(
+            vdsmapi.MethodRep('Host', 'getAllVmStatsChanges'), ret)
+
+    def test_volumes_metadata(self):
+        ret = {
+            '3a7f7f3c-5f83-4a7f-a4b4-8d7b0a4e1f6b': {
+                'uuid': '3a7f7f3c-5f83-4a7f-a4b4-8d7b0a4e1f6b',
+                'domain': '5b3c9d7c-1f2e-4a3b-9c8d-7e6f5a4b3c2d',
+                'image': 'c1d2e3f4-a5b6-4c7d-8e9f-0a1b2c3d4e5f',
+                'imgs': ['c1d2e3f4-a5b6-4c7d-8e9f-0a1b2c3d4e5f'],
+                'parent': '00000000-0000-0000-0000-000000000000',
+                'status': 'OK',
+                'capacity': 10737418240,
+                'apparentsize': 1073741824,
+                'truesize': 1073741824,
+                'format': 'COW',
+                'type': 'SPARSE',
+                'voltype': 'LEAF',
+                'disktype': 'DATA',
+                'description': 'Test volume',
+                'legality': 'LEGAL',
+                'ctime': 1550522547,
+                'generation': 0,
+            },
+        }
+
+        _schema.verify_retval(
+            vdsmapi.MethodRep('StorageDomain', 'getVolumesMetadata'), ret)
+
     def test_missing_method(self):
         with self.assertRaises(vdsmapi.MethodNotFound):
             _schema.get_method(
                 vdsmapi.MethodRep('missing_class', 'missing_method'))
 
+    def test_method_priority(self):
+        self.assertEqual(
+            _schema.get_method_priority(
+                vdsmapi.MethodRep('Host', 'getAllVmStats')),
+            'high')
+        self.assertEqual(
+            _schema.get_method_priority(vdsmapi.MethodRep('Volume', 'copy')),
+            'normal')
+
+    def test_method_concurrency(self):
+        self.assertEqual(
+            _schema.get_method_concurrency(
+                vdsmapi.MethodRep('Volume', 'copy')),
+            4)
+        self.assertIsNone(
+            _schema.get_method_concurrency(
+                vdsmapi.MethodRep('Host', 'getAllVmStats')))
+
+    def test_method_max_queued(self):
+        self.assertEqual(
+            _schema.get_method_max_queued(
+                vdsmapi.MethodRep('Host', 'getDeviceList')),
+            4)
+        self.assertIsNone(
+            _schema.get_method_max_queued(
+                vdsmapi.MethodRep('Host', 'getAllVmStats')))
+
     def test_missing_type(self):
         with self.assertRaises(vdsmapi.TypeNotFound):
             _schema.get_type('Missing_type')
@@ -997,6 +1087,33 @@ class SchemaInconsistencyFormatterTest(TestCaseBase):
                       log_entries)
         self.assertNotIn(u"With backtrace:", log_entries)
 
+    def test_union_value_without_properties(self):
+        types = """
+            MyObject: &MyObject
+                name: MyObject
+                properties:
+                -   name: a
+                    type: uint
+                type: object
+            MyUnion: &MyUnion
+                name: MyUnion
+                type: union
+                values:
+                -   name: NoProperties
+                    type: object
+                - *MyObject
+            """
+        parameters = """
+            -   description: An union argument
+                name: my_union
+                type: *MyUnion
+            """
+        call_args = {"my_union": {"a": 1}}
+        log_entries = self.log_entries_for(types, parameters, call_args)
+
+        self.assertIn(u"Unexpected issue with request type verification",
+                      log_entries)
+
     def test_primitive_type_visitor(self):
         types = None
         parameters = """
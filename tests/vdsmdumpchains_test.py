@@ -22,6 +22,8 @@ from __future__ import division
 
 from testlib import VdsmTestCase as TestCaseBase
 from vdsm.tool.dump_volume_chains import (_build_volume_chain, _BLANK_UUID,
+                                          _group_volumes_by_image,
+                                          _get_volumes_chains,
                                           OrphanVolumes, ChainLoopError,
                                           NoBaseVolume, DuplicateParentError)
 
@@ -57,3 +59,36 @@ class GetVolumeChainTests(TestCaseBase):
         with self.assertRaises(DuplicateParentError):
             _build_volume_chain(
                 [(_BLANK_UUID, 'a'), ('a', 'b'), ('a', 'c')])
+
+
+class GroupVolumesByImageTests(TestCaseBase):
+    def test_empty(self):
+        self.assertEqual(_group_volumes_by_image({}), {})
+
+    def test_group(self):
+        volumes = {
+            'a': {'image': 'img1', 'imgs': ['img1'], 'parent': _BLANK_UUID},
+            'b': {'image': 'img1', 'imgs': ['img1'], 'parent': 'a'},
+            'c': {'image': 'img2', 'imgs': ['img2'], 'parent': _BLANK_UUID},
+        }
+        expected = {
+            'img1': {'a': volumes['a'], 'b': volumes['b']},
+            'img2': {'c': volumes['c']},
+        }
+        self.assertEqual(_group_volumes_by_image(volumes), expected)
+
+    def test_template(self):
+        volumes = {
+            'tmpl': {'image': 'tmpl-img', 'imgs': ['tmpl-img', 'img1', 'img2'],
+                     'parent': _BLANK_UUID},
+            'a': {'image': 'img1', 'imgs': ['img1'], 'parent': 'tmpl'},
+            'b': {'image': 'img2', 'imgs': ['img2'], 'parent': 'tmpl'},
+        }
+        volumes_info = _group_volumes_by_image(volumes)
+        self.assertEqual(sorted(volumes_info),
+                         ['img1', 'img2', 'tmpl-img'])
+        self.assertEqual(_get_volumes_chains(volumes_info), {
+            'tmpl-img': ['tmpl'],
+            'img1': ['tmpl', 'a'],
+            'img2': ['tmpl', 'b'],
+        })
@@ -63,6 +63,17 @@ SOME_DISK_DEVICES = """
 </domain>
 """
 
+ALIASED_DEVICES = """
+<domain>
+    <uuid>xyz</uuid>
+    <devices>
+        <disk device="disk" name="vda"><alias name="ua-vda"/></disk>
+        <controller type="usb"/>
+        <disk device="disk" name="vdb"><alias name="ua-vdb"/></disk>
+    </devices>
+</domain>
+"""
+
 REORDERED_DEVICES = """
 <domain>
     <uuid>xyz</uuid>
@@ -136,6 +147,11 @@ class DevicesHashTests(VdsmTestCase):
         desc2 = DomainDescriptor(SOME_DEVICES)
         self.assertEqual(desc1.devices_hash, desc2.devices_hash)
 
+    def test_same_hash_as_mutable(self):
+        desc1 = DomainDescriptor(SOME_DEVICES)
+        desc2 = MutableDomainDescriptor(SOME_DEVICES)
+        self.assertEqual(desc1.devices_hash, desc2.devices_hash)
+
 
 @expandPermutations
 class DomainDescriptorTests(XMLTestCase):
@@ -178,6 +194,37 @@ class DomainDescriptorTests(XMLTestCase):
             expected
         )
 
+    def test_device_elements_cached(self):
+        desc = DomainDescriptor(SOME_DISK_DEVICES)
+        first = list(desc.get_device_elements('disk'))
+        second = list(desc.get_device_elements('disk'))
+        self.assertEqual(len(first), 3)
+        self.assertEqual(
+            [id(e) for e in first], [id(e) for e in second])
+
+    @permutations([
+        # alias, expected_name
+        ['ua-vda', 'vda'],
+        ['ua-vdb', 'vdb'],
+        ['ua-missing', None],
+    ])
+    def test_device_element_by_alias(self, alias, expected_name):
+        desc = DomainDescriptor(ALIASED_DEVICES)
+        element = desc.get_device_element_by_alias(alias)
+        if expected_name is None:
+            self.assertIsNone(element)
+        else:
+            self.assertEqual(element.get('name'), expected_name)
+
+    def test_device_element_by_alias_incremental(self):
+        desc = DomainDescriptor(ALIASED_DEVICES)
+        desc.get_device_element_by_alias('ua-vda')
+        self.assertEqual(desc._indexed_devices, 1)
+        desc.get_device_element_by_alias('ua-vdb')
+        self.assertEqual(desc._indexed_devices, 3)
+        desc.get_device_element_by_alias('ua-vda')
+        self.assertEqual(desc._indexed_devices, 3)
+
     @permutations([
         # attrs, expected_devs
         [{}, 3],
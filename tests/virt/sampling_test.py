@@ -222,11 +222,205 @@ class StatsCacheTests(TestCaseBase):
         self.assertTrue(res.is_empty())
         self.assertEqual(res.stats_age, 100)
 
+    def test_get_block_stats_empty(self):
+        self._feed_cache((
+            ({'a': {}}, 1),
+        ))
+        self.assertIs(self.cache.get_block_stats(), None)
+
+    def test_get_block_stats(self):
+        self._feed_cache((
+            ({'a': _block_stats('vda', 1)}, 1),
+            ({'a': _block_stats('vda', 2)}, 2),
+        ))
+        res = self.cache.get_block_stats()
+        self.assertEqual(res[('a', 'vda')]['readOps'], '2')
+        self.assertEqual(res[('a', 'vda')]['readRate'],
+                         str(1024 / FakeClock.STEP))
+
+    def test_get_block_stats_cached(self):
+        self._feed_cache((
+            ({'a': _block_stats('vda', 1)}, 1),
+            ({'a': _block_stats('vda', 2)}, 2),
+        ))
+        res = self.cache.get_block_stats()
+        self.assertIs(self.cache.get_block_stats(), res)
+        self._feed_cache((
+            ({'a': _block_stats('vda', 3)}, 3),
+        ))
+        res = self.cache.get_block_stats()
+        self.assertEqual(res[('a', 'vda')]['readOps'], '3')
+
     def _feed_cache(self, samples):
         for sample in samples:
             self.cache.put(*sample)
 
 
+class BlockCountersTests(TestCaseBase):
+
+    def test_empty(self):
+        counters = sampling.BlockCounters({})
+        self.assertEqual(len(counters), 0)
+        self.assertIs(counters.get(('a', 'vda')), None)
+
+    def test_get(self):
+        counters = sampling.BlockCounters({
+            'a': _block_stats('vda', 1),
+            'b': _block_stats('vda', 2),
+        })
+        self.assertEqual(sorted(counters), [('a', 'vda'), ('b', 'vda')])
+        self.assertEqual(counters.get(('a', 'vda')), {
+            'rd.reqs': 1,
+            'rd.bytes': 1024,
+            'rd.times': 1000,
+            'wr.reqs': 1,
+            'wr.bytes': 1024,
+            'wr.times': 1000,
+            'fl.reqs': 1,
+            'fl.times': 1000,
+        })
+        self.assertEqual(counters.get(('b', 'vda'))['rd.reqs'], 2)
+
+    def test_missing_counters(self):
+        stats = _block_stats('vda', 1)
+        del stats['block.0.fl.reqs']
+        del stats['block.0.fl.times']
+        counters = sampling.BlockCounters({'a': stats})
+        res = counters.get(('a', 'vda'))
+        self.assertNotIn('fl.reqs', res)
+        self.assertNotIn('fl.times', res)
+        self.assertEqual(res['rd.reqs'], 1)
+
+    def test_large_counter(self):
+        stats = _block_stats('vda', 1)
+        stats['block.0.rd.bytes'] = 2**63 + 1
+        counters = sampling.BlockCounters({'a': stats})
+        self.assertEqual(counters.get(('a', 'vda'))['rd.bytes'], 2**63 + 1)
+
+    def test_invalid_counter(self):
+        bad = _block_stats('vda', 1)
+        bad['block.0.rd.bytes'] = 2**64
+        counters = sampling.BlockCounters({
+            'a': bad,
+            'b': _block_stats('vda', 2),
+        })
+        # Other VMs are not affected.
+        self.assertIs(counters.get(('a', 'vda')), None)
+        self.assertEqual(counters.get(('b', 'vda'))['rd.reqs'], 2)
+
+    def test_missing_name(self):
+        # Bulk stats count is an upper bound.
+        stats = _block_stats('vda', 1)
+        stats['block.count'] = 2
+        counters = sampling.BlockCounters({'a': stats})
+        self.assertEqual(len(counters), 1)
+
+
+class StatsChangesTests(TestCaseBase):
+
+    def setUp(self):
+        self.changes = sampling.StatsChanges()
+
+    def test_first_call(self):
+        stats_list = [{'vmId': 'a', 'cpuUser': '1.0'}]
+        res = self.changes.update(stats_list)
+        self.assertTrue(res['full'])
+        self.assertEqual(res['statsList'], stats_list)
+        self.assertEqual(res['removedVms'], [])
+
+    def test_unknown_generation(self):
+        stats_list = [{'vmId': 'a', 'cpuUser': '1.0'}]
+        self.changes.update(stats_list)
+        res = self.changes.update(stats_list, generation='unknown')
+        self.assertTrue(res['full'])
+        self.assertEqual(res['statsList'], stats_list)
+
+    def test_no_changes(self):
+        stats_list = [{'vmId': 'a', 'cpuUser': '1.0'}]
+        first = self.changes.update(stats_list)
+        res = self.changes.update(stats_list, first['generation'])
+        self.assertFalse(res['full'])
+        self.assertEqual(res['statsList'], [])
+        self.assertEqual(res['removedVms'], [])
+        self.assertNotEqual(res['generation'], first['generation'])
+
+    def test_changed_fields(self):
+        first = self.changes.update([
+            {'vmId': 'a', 'cpuUser': '1.0', 'status': 'Up'},
+            {'vmId': 'b', 'cpuUser': '1.0', 'pauseCode': 'EIO'},
+            {'vmId': 'c', 'cpuUser': '1.0'},
+        ])
+        res = self.changes.update([
+            {'vmId': 'a', 'cpuUser': '2.0', 'status': 'Up'},
+            {'vmId': 'b', 'cpuUser': '1.0'},
+            {'vmId': 'd', 'cpuUser': '1.0'},
+        ], first['generation'])
+        self.assertFalse(res['full'])
+        self.assertEqual(
+            sorted(res['statsList'], key=lambda stats: stats['vmId']), [
+                {'vmId': 'a', 'cpuUser': '2.0'},
+                {'vmId': 'b', 'removedFields': ['pauseCode']},
+                {'vmId': 'd', 'cpuUser': '1.0'},
+            ])
+        self.assertEqual(res['removedVms'], ['c'])
+
+    def test_network_sample_time(self):
+        def stats(sample_time, rx):
+            return [{'vmId': 'a', 'network': {
+                'vnet0': {'rx': rx, 'sampleTime': sample_time}}}]
+
+        first = self.changes.update(stats(1, '100'))
+        res = self.changes.update(stats(2, '100'), first['generation'])
+        self.assertEqual(res['statsList'], [])
+
+        res = self.changes.update(stats(3, '200'), res['generation'])
+        self.assertEqual(res['statsList'], stats(3, '200'))
+
+    def test_history(self):
+        stats_list = [{'vmId': 'a', 'cpuUser': '1.0'}]
+        first = self.changes.update(stats_list)
+        res = self.changes.update(stats_list, first['generation'])
+        self.assertFalse(res['full'])
+        self.changes.update(stats_list)
+        res = self.changes.update(stats_list, first['generation'])
+        self.assertTrue(res['full'])
+
+    def test_history_per_client(self):
+        stats_list = [{'vmId': 'a', 'cpuUser': '1.0'}]
+        first = self.changes.update(stats_list, client='a:1')
+        for i in range(3):
+            self.changes.update(stats_list, client='b:1')
+        res = self.changes.update(
+            stats_list, first['generation'], client='a:1')
+        self.assertFalse(res['full'])
+
+    def test_generation_of_other_client(self):
+        stats_list = [{'vmId': 'a', 'cpuUser': '1.0'}]
+        first = self.changes.update(stats_list, client='a:1')
+        res = self.changes.update(
+            stats_list, first['generation'], client='b:1')
+        self.assertTrue(res['full'])
+
+    def test_max_clients(self):
+        changes = sampling.StatsChanges(max_clients=2)
+        stats_list = [{'vmId': 'a', 'cpuUser': '1.0'}]
+        first = changes.update(stats_list, client='a:1')
+        changes.update(stats_list, client='b:1')
+        changes.update(stats_list, client='c:1')
+        res = changes.update(stats_list, first['generation'], client='a:1')
+        self.assertTrue(res['full'])
+
+
+def _block_stats(name, value):
+    stats = {'block.count': 1, 'block.0.name': name}
+    for mode in ('rd', 'wr', 'fl'):
+        stats['block.0.%s.reqs' % mode] = value
+        stats['block.0.%s.times' % mode] = value * 1000
+    for mode in ('rd', 'wr'):
+        stats['block.0.%s.bytes' % mode] = value * 1024
+    return stats
+
+
 class NumaNodeMemorySampleTests(TestCaseBase):
 
     def _monkeyPatchedMemorySample(self, freeMemory, totalMemory):
@@ -50,6 +50,7 @@ from vdsm.common import xmlutils
 import vdsm.common.time
 
 from vdsm.virt import periodic
+from vdsm.virt import sampling
 from vdsm.virt import virdomain
 from vdsm.virt import vm
 from vdsm.virt import vmchannels
@@ -1172,6 +1173,37 @@ class TestVmStats(TestCaseBase):
                 self.assertIn(statsDev['type'], confDev['device'])
                 self.assertIn('port', statsDev)
 
+    def testSampledStatsCached(self):
+        calls = []
+
+        def produce(vm, first_sample, last_sample, interval, **kwargs):
+            calls.append(last_sample)
+            return {'cpuUser': last_sample['cpu.user']}
+
+        with fake.VM(_VM_PARAMS) as testvm, \
+                MonkeyPatchScope([(vmstats, 'produce', produce)]):
+            first = sampling.StatsSample(
+                {'cpu.user': 1}, {'cpu.user': 2}, 15, 0)
+            res = testvm._getSampledStats(first)
+            self.assertEqual(res, {'cpuUser': '2'})
+            self.assertEqual(len(calls), 1)
+
+            # Same sample: stats are not produced again.
+            self.assertEqual(testvm._getSampledStats(first), res)
+            self.assertEqual(len(calls), 1)
+
+            # New sample.
+            second = sampling.StatsSample(
+                first.last_value, {'cpu.user': 3}, 15, 0)
+            res = testvm._getSampledStats(second)
+            self.assertEqual(res, {'cpuUser': '3'})
+            self.assertEqual(len(calls), 2)
+
+            # Devices modified.
+            testvm._devicesModified()
+            testvm._getSampledStats(second)
+            self.assertEqual(len(calls), 3)
+
     def testDiskMappingHashInStatsHash(self):
         with fake.VM(_VM_PARAMS) as testvm:
             res = testvm.getStats()
@@ -1257,6 +1289,72 @@ class TestLibVirtCallbacks(TestCaseBase):
                 kept_aliases)
 
 
+@expandPermutations
+class TestDomainDescriptorUpdate(TestCaseBase):
+
+    # fake.VM replaces _updateDomainDescriptor, so we call the real method.
+
+    XML = u"""<domain>
+  <uuid>TESTING</uuid>
+  <devices>
+    <disk device="disk"/>
+  </devices>
+</domain>"""
+
+    def test_unchanged_xml(self):
+        with fake.VM(_VM_PARAMS) as testvm:
+            testvm._dom = fake.Domain(self.XML)
+            vm.Vm._updateDomainDescriptor(testvm)
+            domain = testvm._domain
+            vm.Vm._updateDomainDescriptor(testvm)
+            self.assertIs(testvm._domain, domain)
+            self.assertEqual(testvm._domain_cache_hits, 1)
+            self.assertEqual(testvm._domain_cache_misses, 1)
+
+    def test_changed_xml(self):
+        with fake.VM(_VM_PARAMS) as testvm:
+            testvm._dom = fake.Domain(self.XML)
+            vm.Vm._updateDomainDescriptor(testvm)
+            domain = testvm._domain
+            testvm._dom = fake.Domain(self.XML.replace('disk"', 'cdrom"'))
+            vm.Vm._updateDomainDescriptor(testvm)
+            self.assertIsNot(testvm._domain, domain)
+            self.assertEqual(
+                len(list(testvm._domain.get_device_elements_with_attrs(
+                    'disk', device='cdrom'))),
+                1)
+            self.assertEqual(testvm._domain_cache_hits, 0)
+            self.assertEqual(testvm._domain_cache_misses, 2)
+
+    def test_not_forced_skips_xml(self):
+        with fake.VM(_VM_PARAMS) as testvm:
+            testvm._dom = fake.Domain(self.XML)
+            vm.Vm._updateDomainDescriptor(testvm)
+            domain = testvm._domain
+            testvm._dom = fake.Domain(self.XML.replace('disk"', 'cdrom"'))
+            vm.Vm._updateDomainDescriptor(testvm, force=False)
+            self.assertIs(testvm._domain, domain)
+            self.assertEqual(testvm._domain_cache_hits, 1)
+            self.assertEqual(testvm._domain_cache_misses, 1)
+
+    @permutations([
+        # event, args
+        ['onDeviceAdded', ('ua-cdrom',)],
+        ['onBlockJobEvent', ('/path', 0, 0)],
+    ])
+    def test_not_forced_after_device_event(self, event, args):
+        with fake.VM(_VM_PARAMS) as testvm:
+            testvm._dom = fake.Domain(self.XML)
+            vm.Vm._updateDomainDescriptor(testvm)
+            domain = testvm._domain
+            testvm._dom = fake.Domain(self.XML.replace('disk"', 'cdrom"'))
+            getattr(testvm, event)(*args)
+            vm.Vm._updateDomainDescriptor(testvm, force=False)
+            self.assertIsNot(testvm._domain, domain)
+            self.assertFalse(testvm._domain_outdated)
+            self.assertEqual(testvm._domain_cache_misses, 2)
+
+
 class TestVmStatusTransitions(TestCaseBase):
     @slowtest
     def testSavingState(self):
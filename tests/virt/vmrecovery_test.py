@@ -21,6 +21,9 @@
 from __future__ import absolute_import
 from __future__ import division
 
+import threading
+import time
+
 import libvirt
 
 from vdsm.common import libvirtconnection
@@ -32,6 +35,7 @@ from monkeypatch import MonkeyPatchScope
 from monkeypatch import Patch
 from testlib import VdsmTestCase as TestCaseBase
 from testlib import permutations, expandPermutations
+from testlib import make_config
 import vmfakelib as fake
 
 
@@ -217,6 +221,56 @@ class TestAllDomains(TestCaseBase):
             expect_destroy = not vm_is_ext
             self.assertEqual(vm_obj.destroyed, expect_destroy)
 
+    def test_recover_many_domains(self):
+        vm_uuids = ['vm-%03d' % i for i in range(100)]
+        self.conn.domains = _make_domains_collection(
+            [(vm_uuid, False) for vm_uuid in vm_uuids])
+        with MonkeyPatchScope([
+            (recovery, 'config',
+             make_config([('vars', 'recovery_workers', '8')])),
+        ]):
+            recovery.all_domains(self.cif)
+        self.assertEqual(set(self.cif.vmRequests.keys()), set(vm_uuids))
+
+    def test_recover_workers(self):
+        lock = threading.Lock()
+        running = [0]
+        peak = [0]
+        create_vm = self.cif.createVm
+
+        def slow_create_vm(vmParams, vmRecover=False):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.05)
+            with lock:
+                running[0] -= 1
+            return create_vm(vmParams, vmRecover=vmRecover)
+
+        vm_uuids = ['vm-%03d' % i for i in range(10)]
+        self.conn.domains = _make_domains_collection(
+            [(vm_uuid, False) for vm_uuid in vm_uuids])
+        with MonkeyPatchScope([
+            (self.cif, 'createVm', slow_create_vm),
+            (recovery, 'config',
+             make_config([('vars', 'recovery_workers', '3')])),
+        ]):
+            recovery.all_domains(self.cif)
+        self.assertEqual(set(self.cif.vmRequests.keys()), set(vm_uuids))
+        self.assertEqual(peak[0], 3)
+
+    def test_list_domains_error(self):
+        """
+        Unexpected libvirt errors fail the recovery, so it will be retried.
+        """
+        def fail(*args, **kwargs):
+            raise libvirt.libvirtError("Internal error")
+
+        self.conn.domains['a'].XMLDesc = fail
+        with self.assertRaises(libvirt.libvirtError):
+            recovery.all_domains(self.cif)
+        self.assertEqual(self.cif.vmRequests, {})
+
     def test_lookup_external_vms(self):
         vm_ext = [True] * len(self.vm_uuids)
         self.conn.domains = _make_domains_collection(
@@ -23,10 +23,13 @@ from __future__ import division
 
 import copy
 import logging
+import time
 import uuid
 
+import pytest
 import six
 
+from vdsm.virt import sampling
 from vdsm.virt import vmstats
 
 from fakelib import FakeLogger
@@ -416,6 +419,38 @@ class NetworkStatsTests(VmStatsTestCase):
         )
 
 
+class RefreshTests(VmStatsTestCase):
+
+    def test_refresh_sample_time(self):
+        nics = (
+            FakeNic(name='vnet0', model='virtio',
+                    mac_addr='00:1a:4a:16:01:51', is_hostdevice=False),
+        )
+        testvm = FakeVM(nics=nics)
+        stats = {}
+        vmstats.networks(testvm, stats,
+                         self.bulk_stats, self.bulk_stats,
+                         self.interval)
+        stats = vmstats.translate(stats)
+        sample_time = stats['network']['vnet0']['sampleTime']
+
+        res = vmstats.refresh(stats)
+        self.assertGreaterEqual(res['network']['vnet0']['sampleTime'],
+                                sample_time)
+        self.assertEqual(res['network']['vnet0']['rx'],
+                         stats['network']['vnet0']['rx'])
+        # Cached stats are not modified.
+        self.assertEqual(stats['network']['vnet0']['sampleTime'],
+                         sample_time)
+        self.assertIsNot(res['network'], stats['network'])
+
+    def test_refresh_without_network(self):
+        stats = {'cpuUser': '1.0'}
+        res = vmstats.refresh(stats)
+        self.assertEqual(res, stats)
+        self.assertIsNot(res, stats)
+
+
 class DiskStatsTests(VmStatsTestCase):
 
     # TODO: grab them from the schema
@@ -502,6 +537,38 @@ class DiskStatsTests(VmStatsTestCase):
                              partial_stats, partial_stats,
                              interval)
 
+    def test_disk_block_counters(self):
+        interval = 10  # seconds
+        drives = (FakeDrive(name='hdc', size=700 * 1024 * 1024),
+                  FakeDrive(name='vda', size=8 * 1024 * 1024 * 1024),
+                  FakeDrive(name='hdd', size=700 * 1024 * 1024))
+        testvm = FakeVM(drives=drives)
+
+        stats_before = copy.deepcopy(self.samples[0])
+        stats_after = copy.deepcopy(self.samples[1])
+        _ensure_delta(stats_before, stats_after,
+                      'block.1.rd.reqs', 1024)
+        _ensure_delta(stats_before, stats_after,
+                      'block.1.rd.times', 1024 * 1000)
+        _ensure_delta(stats_before, stats_after,
+                      'block.1.rd.bytes', 128 * 1024)
+        block_stats = vmstats.produce_block_stats(
+            sampling.BlockCounters({testvm.id: stats_before}),
+            sampling.BlockCounters({testvm.id: stats_after}),
+            interval)
+
+        expected = {}
+        vmstats.disks(testvm, expected,
+                      stats_before, stats_after,
+                      interval)
+        stats = {}
+        vmstats.disks(testvm, stats,
+                      stats_before, stats_after,
+                      interval, block_stats=block_stats)
+        self.assertEqual(expected, stats)
+        self.assertEqual(stats['disks']['vda']['readLatency'], '1000.0')
+        self.assertEqual(stats['disks']['vda']['readOps'], '1024')
+
     def test_iotune(self):
         iotune = {
             'total_bytes_sec': 0,
@@ -638,6 +705,63 @@ class BalloonStatsTests(VmStatsTestCase):
 
 # helpers
 
+@pytest.mark.slow
+def test_benchmark_disks():
+    # Produce disk stats for a host with 500 VMs, with 4 disks per VM,
+    # parsing the bulk stats samples on every call, or using disk stats
+    # produced once per samples window from the block counters tables.
+    vms = []
+    first_batch = {}
+    last_batch = {}
+    for i in range(500):
+        drives = [FakeDrive(name='vd%s' % c, size=8 * 1024**3)
+                  for c in 'abcd']
+        vm = FakeVM(drives=drives)
+        vms.append(vm)
+        first_batch[vm.id] = _fake_block_stats(drives, 1000)
+        last_batch[vm.id] = _fake_block_stats(drives, 2000)
+
+    interval = 15
+    count = 10
+
+    start = time.time()
+    for i in range(count):
+        for vm in vms:
+            vmstats.disks(vm, {}, first_batch[vm.id], last_batch[vm.id],
+                          interval)
+    parse_elapsed = time.time() - start
+
+    # Done by the stats cache once per samples window.
+    start = time.time()
+    block_stats = vmstats.produce_block_stats(
+        sampling.BlockCounters(first_batch),
+        sampling.BlockCounters(last_batch),
+        interval)
+    produce_elapsed = time.time() - start
+
+    start = time.time()
+    for i in range(count):
+        for vm in vms:
+            vmstats.disks(vm, {}, first_batch[vm.id], last_batch[vm.id],
+                          interval, block_stats=block_stats)
+    cached_elapsed = time.time() - start
+
+    print("produce block stats: %.6f seconds" % produce_elapsed)
+    print("parse: %d calls in %.6f seconds (%.6f seconds per call)"
+          % (count, parse_elapsed, parse_elapsed / count))
+    print("cached: %d calls in %.6f seconds (%.6f seconds per call)"
+          % (count, cached_elapsed, cached_elapsed / count))
+
+
+def _fake_block_stats(drives, value):
+    stats = {'block.count': len(drives)}
+    for i, drive in enumerate(drives):
+        stats['block.%d.name' % i] = drive.name
+        for counter in vmstats.BLOCK_COUNTERS:
+            stats['block.%d.%s' % (i, counter)] = value
+    return stats
+
+
 def _ensure_delta(stats_before, stats_after, key, delta):
     """
     Set stats_before[key] and stats_after[key] so that